@@ -0,0 +1,261 @@
+"""
+Incremental checksums of uploads and downloads.
+
+Checksums are computed on the chunks while they pass through the upload
+and download paths, so verifying an object costs no extra pass over the
+data. They are compared with the ETag the data store returns: a plain md5
+for single part objects and the md5 of the part md5s (``<md5>-<parts>``)
+for objects MinIO stored as a multipart upload. A multipart ETag can only
+be checked when the part size of the upload is known, e.g. for an upload
+made here; the ETag of a downloaded object does not tell its part size.
+
+CRC32C needs the optional ``crc32c`` package.
+"""
+import hashlib
+import io
+import os
+import re
+import threading
+
+from storageprovider.utils import IterStream
+
+try:
+    import crc32c as _crc32c
+except ImportError:  # pragma: no cover
+    _crc32c = None
+
+#: part size of the multipart uploads of the MinIO provider
+MULTIPART_PART_SIZE = 10 * 1024 * 1024
+
+MD5_RE = re.compile(r"^[0-9a-f]{32}$")
+MULTIPART_ETAG_RE = re.compile(r"^([0-9a-f]{32})-(\d+)$")
+
+
+class _CRC32C:
+    name = "crc32c"
+
+    def __init__(self):
+        self.value = 0
+
+    def update(self, data):
+        self.value = _crc32c.crc32c(data, self.value)
+
+    def hexdigest(self):
+        return f"{self.value:08x}"
+
+
+def _new_hash(algorithm):
+    if algorithm == "crc32c":
+        if _crc32c is None:
+            raise ValueError("crc32c checksums need the crc32c package")
+        return _CRC32C()
+    return hashlib.new(algorithm)
+
+
+class Checksums:
+    """
+    Checksums of one object, updated chunk by chunk.
+    """
+
+    def __init__(self, algorithms=("md5",), part_size=None):
+        """
+        :param algorithms: names of hashlib algorithms, or ``crc32c``
+        :param part_size: part size of the multipart upload of the object,
+            None when it is unknown and multipart ETags can not be checked
+        """
+        self.hashes = {algorithm: _new_hash(algorithm) for algorithm in algorithms}
+        self.size = 0
+        self.part_size = part_size
+        self._part = hashlib.md5()
+        self._part_filled = 0
+        self._part_digests = []
+
+    def update(self, chunk):
+        for digest in self.hashes.values():
+            digest.update(chunk)
+        self.size += len(chunk)
+        if self.part_size is None:
+            return
+        view = memoryview(chunk)
+        while view:
+            take = min(len(view), self.part_size - self._part_filled)
+            self._part.update(view[:take])
+            self._part_filled += take
+            view = view[take:]
+            if self._part_filled == self.part_size:
+                self._part_digests.append(self._part.digest())
+                self._part = hashlib.md5()
+                self._part_filled = 0
+
+    def hexdigests(self):
+        """
+        :return: dict of algorithm name to hex digest
+        """
+        return {name: digest.hexdigest() for name, digest in self.hashes.items()}
+
+    def multipart_etag(self):
+        """
+        :return: the multipart ETag of the data, None without a part size
+        """
+        if self.part_size is None:
+            return None
+        parts = list(self._part_digests)
+        if self._part_filled or not parts:
+            parts.append(self._part.digest())
+        return f"{hashlib.md5(b''.join(parts)).hexdigest()}-{len(parts)}"
+
+    def matches_etag(self, etag):
+        """
+        :return: True or False, None when the ETag is no md5 based checksum,
+            is a multipart ETag while the part size is unknown or was made with
+            another part size
+        """
+        if not isinstance(etag, str):
+            return None
+        etag = etag.strip('"').lower()
+        if MD5_RE.match(etag):
+            if "md5" not in self.hashes:
+                return None
+            return etag == self.hashes["md5"].hexdigest()
+        match = MULTIPART_ETAG_RE.match(etag)
+        if match and self.part_size is not None:
+            expected_parts = max(1, -(-self.size // self.part_size))
+            if int(match.group(2)) != expected_parts:
+                return None
+            return etag == self.multipart_etag()
+        return None
+
+
+class HashingReader(io.RawIOBase):
+    """
+    Readable file object updating checksums with everything read from it.
+    """
+
+    def __init__(self, data, checksums):
+        if not hasattr(data, "read"):
+            data = IterStream(data)
+        self.raw = data
+        self.checksums = checksums
+        self.position = 0
+        size = self._remaining(data)
+        if size is not None:
+            # lets requests send a Content-Length instead of chunks
+            self.len = size
+
+    @staticmethod
+    def _remaining(data):
+        try:
+            return os.fstat(data.fileno()).st_size - data.tell()
+        except (AttributeError, OSError, ValueError):
+            pass
+        try:
+            if data.seekable():
+                position = data.tell()
+                end = data.seek(0, io.SEEK_END)
+                data.seek(position)
+                return end - position
+        except (AttributeError, OSError, ValueError):
+            pass
+        return None
+
+    def readable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def readinto(self, b):
+        data = self.raw.read(len(b))
+        if isinstance(data, str):
+            data = data.encode()
+        if not data:
+            return 0
+        size = len(data)
+        b[:size] = data
+        self.checksums.update(data)
+        self.position += size
+        return size
+
+
+class ChecksumVerifier:
+    """
+    Computes and verifies checksums for a provider.
+
+    The checksums of the last finished upload or download in the current
+    thread are available as :attr:`last`.
+    """
+
+    def __init__(self, algorithms=("md5",)):
+        """
+        :param algorithms: names of hashlib algorithms, or ``crc32c``
+        """
+        self.algorithms = tuple(algorithms)
+        for algorithm in self.algorithms:
+            _new_hash(algorithm)
+        self._local = threading.local()
+
+    @property
+    def last(self) -> Checksums:
+        return getattr(self._local, "last", None)
+
+    def new(self, part_size=None):
+        """
+        :param part_size: part size of the multipart upload, None if unknown
+        """
+        return Checksums(self.algorithms, part_size)
+
+    def wrap_upload(self, object_data, part_size=None):
+        """
+        :param part_size: part size the data is uploaded with
+        :return: (data to upload, checksums filled while it is read)
+        """
+        checksums = self.new(part_size)
+        if isinstance(object_data, (bytes, bytearray, memoryview)):
+            checksums.update(object_data)
+            return object_data, checksums
+        if isinstance(object_data, str):
+            checksums.update(object_data.encode())
+            return object_data, checksums
+        return HashingReader(object_data, checksums), checksums
+
+    def verify(self, checksums, etag, container_key, object_key):
+        """
+        Compare the checksums with an ETag and remember them as :attr:`last`.
+
+        :raises ChecksumMismatchException: if the ETag does not match
+        """
+        self._local.last = checksums
+        if checksums.matches_etag(etag) is False:
+            raise ChecksumMismatchException(
+                container_key,
+                object_key,
+                f"ETag {etag} does not match {checksums.hexdigests()}",
+            )
+
+    def verify_data(self, data, etag, container_key, object_key):
+        checksums = self.new()
+        checksums.update(data)
+        self.verify(checksums, etag, container_key, object_key)
+
+    def wrap_stream(self, chunks, etag, container_key, object_key):
+        """
+        Update checksums with every chunk and verify them at the end.
+
+        :raises ChecksumMismatchException: after the last chunk if the ETag
+            does not match
+        """
+        checksums = self.new()
+        for chunk in chunks:
+            checksums.update(chunk)
+            yield chunk
+        self.verify(checksums, etag, container_key, object_key)
+
+
+class ChecksumMismatchException(Exception):
+    def __init__(self, container_key, object_key, message):
+        self.container_key = container_key
+        self.object_key = object_key
+        self.message = message
+
+    def __str__(self):
+        return f"{self.container_key}/{self.object_key}: {self.message}"
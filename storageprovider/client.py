@@ -1,21 +1,102 @@
+from storageprovider.dedup import Deduplicator
+from storageprovider.download import download_to_path
+from storageprovider.manifest import Manifests
 from storageprovider.providers import BaseStorageProvider
+from storageprovider.utils import spool
 
 
 class StorageProviderClient:
-    def __init__(self, provider: BaseStorageProvider):
+    def __init__(
+        self,
+        provider: BaseStorageProvider,
+        dedup_container_key=None,
+        spool_size=8 * 1024 * 1024,
+        export_cache=None,
+        manifest_container_key=None,
+    ):
+        """
+        :param provider: the storage provider
+        :param dedup_container_key: enables deduplication of uploads, with the
+            hash index kept in this container
+        :param spool_size: spooled results up to this many bytes are kept in
+            memory, larger ones are spilled to a temporary file
+        :param export_cache: an :class:`storageprovider.export_cache.ExportCache`
+            serving the container exports
+        :param manifest_container_key: enables container manifests, kept in
+            this container, which serve list_object_keys and
+            list_objects_with_metadata and are updated by the writes and
+            deletes made through this client. Only one process may write to
+            a container with manifests enabled
+        """
         self.provider = provider
+        self.spool_size = spool_size
+        self.export_cache = export_cache
+        self.dedup = None
+        if dedup_container_key is not None:
+            self.dedup = Deduplicator(provider, dedup_container_key)
+        self.manifests = None
+        if manifest_container_key is not None:
+            self.manifests = Manifests(provider, manifest_container_key)
+
+    def _record(self, container_key, object_key, system_token=None):
+        if self.manifests is not None:
+            self.manifests.record(container_key, object_key, system_token)
+
+    def _forget(self, container_key, object_key, system_token=None):
+        # the content of the object changed outside the deduplication
+        if self.dedup is not None:
+            self.dedup.forget(container_key, object_key, system_token)
 
     def delete_object(self, container_key, object_key, system_token=None):
-        return self.provider.delete_object(container_key, object_key, system_token)
+        result = self.provider.delete_object(container_key, object_key, system_token)
+        self._forget(container_key, object_key, system_token)
+        if self.manifests is not None:
+            self.manifests.forget(container_key, object_key, system_token)
+        return result
 
     def get_object_streaming(self, container_key, object_key, system_token=None):
         return self.provider.get_object_streaming(
             container_key, object_key, system_token
         )
 
-    def get_object(self, container_key, object_key, system_token=None):
+    def get_object(self, container_key, object_key, system_token=None, spooled=False):
+        """
+        :param spooled: return a file object that spills to disk beyond
+            spool_size bytes instead of bytes
+        """
+        if spooled:
+            return spool(
+                self.provider.get_object_streaming(
+                    container_key, object_key, system_token
+                ),
+                self.spool_size,
+            )
         return self.provider.get_object(container_key, object_key, system_token)
 
+    def get_object_into(self, container_key, object_key, buffer, system_token=None):
+        return self.provider.get_object_into(
+            container_key, object_key, buffer, system_token
+        )
+
+    def get_object_range_streaming(
+        self, container_key, object_key, offset, length=None, system_token=None
+    ):
+        return self.provider.get_object_range_streaming(
+            container_key, object_key, offset, length, system_token
+        )
+
+    def download_to_path(self, container_key, object_key, path, system_token=None):
+        """
+        download an object to a local file, resuming an earlier partial
+        download of the same object version and renaming the file into
+        place when it is complete
+
+        :return: the size of the downloaded object
+        """
+        return download_to_path(
+            self.provider, container_key, object_key, path, system_token
+        )
+
     def get_object_and_metadata(self, container_key, object_key, system_token=None):
         return self.provider.get_object_and_metadata(
             container_key, object_key, system_token
@@ -26,6 +107,12 @@ class StorageProviderClient:
             container_key, object_key, system_token
         )
 
+    def object_exists(self, container_key, object_key, system_token=None):
+        return self.provider.object_exists(container_key, object_key, system_token)
+
+    def objects_exist(self, container_key, object_keys, system_token=None):
+        return self.provider.objects_exist(container_key, object_keys, system_token)
+
     def copy_object_and_create_key(
         self,
         source_container_key,
@@ -33,9 +120,11 @@ class StorageProviderClient:
         output_container_key,
         system_token=None,
     ):
-        return self.provider.copy_object_and_create_key(
+        output_object_key = self.provider.copy_object_and_create_key(
             source_container_key, source_object_key, output_container_key, system_token
         )
+        self._record(output_container_key, output_object_key, system_token)
+        return output_object_key
 
     def copy_object(
         self,
@@ -52,30 +141,111 @@ class StorageProviderClient:
             output_object_key,
             system_token,
         )
+        self._forget(output_container_key, output_object_key, system_token)
+        self._record(output_container_key, output_object_key, system_token)
 
-    def update_object_and_key(self, container_key, object_data, system_token=None):
-        return self.provider.update_object_and_key(
-            container_key, object_data, system_token
+    def copy_container(
+        self,
+        source_container_key,
+        output_container_key,
+        system_token=None,
+        max_workers=8,
+    ):
+        report = self.provider.copy_container(
+            source_container_key, output_container_key, system_token, max_workers
         )
+        if self.manifests is not None:
+            self.manifests.repair(output_container_key, system_token)
+        return report
+
+    def update_object_and_key(self, container_key, object_data, system_token=None):
+        if self.dedup is not None:
+            object_key = self.dedup.update_object_and_key(
+                container_key, object_data, system_token
+            )
+        else:
+            object_key = self.provider.update_object_and_key(
+                container_key, object_data, system_token
+            )
+        self._record(container_key, object_key, system_token)
+        return object_key
 
     def update_object(self, container_key, object_key, object_data, system_token=None):
-        return self.provider.update_object(
-            container_key, object_key, object_data, system_token
-        )
+        if self.dedup is not None:
+            # the copy_object result when the upload was replaced by a copy
+            result = self.dedup.update_object(
+                container_key, object_key, object_data, system_token
+            )
+        else:
+            result = self.provider.update_object(
+                container_key, object_key, object_data, system_token
+            )
+        self._record(container_key, object_key, system_token)
+        return result
 
     def list_object_keys_for_container(self, container_key, system_token=None):
+        # returns what the provider returns (raw JSON for Augeias), not the manifest
         return self.provider.list_object_keys_for_container(container_key, system_token)
 
+    def list_object_keys(self, container_key, system_token=None):
+        if self.manifests is not None:
+            return self.manifests.list_object_keys(container_key, system_token)
+        return self.provider.list_object_keys(container_key, system_token)
+
+    def list_objects_with_metadata(self, container_key, system_token=None):
+        if self.manifests is not None:
+            return self.manifests.list_objects_with_metadata(container_key, system_token)
+        return self.provider.list_objects_with_metadata(container_key, system_token)
+
+    def repair_manifest(self, container_key, system_token=None):
+        """
+        rebuild the manifest of a container from a full listing
+
+        :return: :class:`storageprovider.manifest.ManifestDiff` of what had
+            drifted
+        """
+        if self.manifests is None:
+            raise ValueError("Manifests are not enabled for this client.")
+        return self.manifests.repair(container_key, system_token)
+
+    @property
+    def _exports(self):
+        return self.export_cache if self.export_cache is not None else self.provider
+
     def get_container_data_streaming(
-        self, container_key, system_token=None, translations=None
+        self, container_key, system_token=None, translations=None, archive_format="zip"
     ):
-        return self.provider.get_container_data_streaming(
-            container_key, system_token, translations
+        return self._exports.get_container_data_streaming(
+            container_key, system_token, translations, archive_format
         )
 
-    def get_container_data(self, container_key, system_token=None, translations=None):
-        return self.provider.get_container_data(
-            container_key, system_token, translations
+    def get_container_data(
+        self,
+        container_key,
+        system_token=None,
+        translations=None,
+        spooled=False,
+        archive_format="zip",
+    ):
+        """
+        :param spooled: return a file object that spills to disk beyond
+            spool_size bytes instead of bytes
+        :param archive_format: ``zip``, ``tar``, ``tar.gz`` or ``tar.zst``
+        """
+        if spooled:
+            try:
+                chunks = self._exports.get_container_data_streaming(
+                    container_key, system_token, translations, archive_format
+                )
+            except NotImplementedError:
+                chunks = [
+                    self._exports.get_container_data(
+                        container_key, system_token, translations, archive_format
+                    )
+                ]
+            return spool(chunks, self.spool_size)
+        return self._exports.get_container_data(
+            container_key, system_token, translations, archive_format
         )
 
     def create_container(self, container_key, system_token=None):
@@ -85,11 +255,25 @@ class StorageProviderClient:
         return self.provider.create_container_and_key(system_token)
 
     def delete_container(self, container_key, system_token=None):
-        return self.provider.delete_container(container_key, system_token)
+        result = self.provider.delete_container(container_key, system_token)
+        if self.manifests is not None:
+            self.manifests.drop(container_key, system_token)
+        return result
 
     def get_object_from_archive(
-        self, container_key, object_key, file_name, system_token=None
+        self, container_key, object_key, file_name, system_token=None, spooled=False
     ):
+        """
+        :param spooled: return a file object that spills to disk beyond
+            spool_size bytes instead of bytes
+        """
+        if spooled:
+            return spool(
+                self.provider.get_object_from_archive_streaming(
+                    container_key, object_key, file_name, system_token
+                ),
+                self.spool_size,
+            )
         return self.provider.get_object_from_archive(
             container_key, object_key, file_name, system_token
         )
@@ -110,7 +294,7 @@ class StorageProviderClient:
         new_file_name,
         system_token=None,
     ):
-        return self.provider.replace_file_in_zip_object(
+        result = self.provider.replace_file_in_zip_object(
             container_key,
             object_key,
             file_to_replace,
@@ -118,3 +302,29 @@ class StorageProviderClient:
             new_file_name,
             system_token,
         )
+        self._forget(container_key, object_key, system_token)
+        self._record(container_key, object_key, system_token)
+        return result
+
+    def get_object_url(
+        self,
+        container_key,
+        object_key,
+        system_token=None,
+        expires=3600,
+        content_disposition=None,
+        content_type=None,
+    ):
+        return self.provider.get_object_url(
+            container_key,
+            object_key,
+            system_token,
+            expires,
+            content_disposition,
+            content_type,
+        )
+
+    def get_upload_url(self, container_key, object_key, system_token=None, expires=3600):
+        return self.provider.get_upload_url(
+            container_key, object_key, system_token, expires
+        )
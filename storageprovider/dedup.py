@@ -0,0 +1,265 @@
+"""
+Content-addressed deduplication of uploads.
+
+The content of an upload is hashed while it is spooled. When the hash index
+already knows an object with that content, the upload is replaced by a
+server-side ``copy_object`` of that object, so the data is not sent to the
+data store again.
+
+The index lives in the data store itself: one small JSON object per content
+hash in a dedicated container, pointing at the first object stored with
+that content, and one per indexed object naming its content hash. The
+second lets an overwrite or delete of the object drop its index entry.
+An entry is only used when the object it points at still has the size and
+ETag the content had (or, for data stores without ETags, the size and time
+of last modification it had when it was indexed); otherwise the data is
+uploaded again.
+"""
+import hashlib
+import json
+import logging
+import tempfile
+import threading
+import uuid
+
+from storageprovider.checksum import MD5_RE
+from storageprovider.utils import metadata_etag
+from storageprovider.utils import metadata_last_modified
+from storageprovider.utils import metadata_size
+
+LOG = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class Deduplicator:
+    def __init__(
+        self,
+        provider,
+        index_container_key="dedup-index",
+        algorithm="sha256",
+        spool_size=8 * 1024 * 1024,
+    ):
+        """
+        :param provider: the storage provider
+        :param index_container_key: container holding the hash index
+        :param algorithm: hashlib algorithm used for the content hash
+        :param spool_size: uploads up to this many bytes are spooled in
+            memory, larger ones in a temporary file
+        """
+        self.provider = provider
+        self.index_container_key = index_container_key
+        self.algorithm = algorithm
+        self.spool_size = spool_size
+        self._index_created = False
+        self._lock = threading.Lock()
+
+    def _spool(self, object_data):
+        """
+        Copy the object data to a spooled temporary file while hashing it.
+
+        :return: (hex digest, md5 hex digest, size, spooled file positioned
+            at the start)
+        """
+        digest = hashlib.new(self.algorithm)
+        md5 = hashlib.md5()
+        spool = tempfile.SpooledTemporaryFile(max_size=self.spool_size)
+        if isinstance(object_data, str):
+            object_data = object_data.encode()
+        if isinstance(object_data, (bytes, bytearray, memoryview)):
+            chunks = [object_data]
+        elif hasattr(object_data, "read"):
+            chunks = iter(lambda: object_data.read(CHUNK_SIZE), b"")
+        else:
+            chunks = object_data
+        size = 0
+        for chunk in chunks:
+            digest.update(chunk)
+            md5.update(chunk)
+            spool.write(chunk)
+            size += len(chunk)
+        spool.seek(0)
+        return digest.hexdigest(), md5.hexdigest(), size, spool
+
+    def _index_key(self, digest):
+        return f"{self.algorithm}-{digest}"
+
+    @staticmethod
+    def _object_index_key(container_key, object_key):
+        # flat, data stores treat slashes in keys as paths or archive entries
+        key = hashlib.sha256(f"{container_key}\0{object_key}".encode()).hexdigest()
+        return f"objects-{key}"
+
+    def _read(self, index_key, system_token=None):
+        """
+        :return: the decoded index object, None if there is none
+        """
+        try:
+            if not self.provider.object_exists(
+                self.index_container_key, index_key, system_token
+            ):
+                return None
+            data = self.provider.get_object(
+                self.index_container_key, index_key, system_token
+            )
+        except Exception:
+            LOG.warning(f"Dedup index lookup of {index_key} failed.", exc_info=True)
+            return None
+        return json.loads(data)
+
+    def lookup(self, digest, system_token=None):
+        """
+        :param digest: hex digest of the content
+        :param system_token: oauth system token
+        :return: (container_key, object_key) of the object indexed with that
+            content, or None. The object may have changed since, see
+            :meth:`update_object`
+        """
+        entry = self._read(self._index_key(digest), system_token)
+        if entry is None:
+            return None
+        return entry["container_key"], entry["object_key"]
+
+    def _holds(self, entry, md5, size, system_token=None):
+        """
+        Check that the object of an index entry still holds the content: its
+        size must match and its ETag must be the md5 of the content or the
+        ETag it had when it was indexed. Without an ETag, its time of last
+        modification must be the one it had when it was indexed.
+        """
+        try:
+            metadata = self.provider.get_object_metadata(
+                entry["container_key"], entry["object_key"], system_token
+            )
+        except Exception:
+            return False
+        if metadata_size(metadata) != size:
+            return False
+        etag = metadata_etag(metadata)
+        if etag is None:
+            modified = metadata_last_modified(metadata)
+            return modified is not None and modified.isoformat() == entry.get(
+                "modified"
+            )
+        if MD5_RE.match(etag):
+            return etag == md5
+        return etag == entry.get("etag")
+
+    def _remove(self, index_key, system_token=None):
+        try:
+            self.provider.delete_object(self.index_container_key, index_key, system_token)
+        except Exception:
+            LOG.warning(
+                f"Removing {index_key} from the dedup index failed.", exc_info=True
+            )
+
+    def forget(self, container_key, object_key, system_token=None, digest=None):
+        """
+        Drop the index entry pointing at an object that was deleted or
+        overwritten.
+
+        :param digest: hex digest of the new content of the object, its
+            entry is kept when the content did not change
+        """
+        object_index_key = self._object_index_key(container_key, object_key)
+        indexed = self._read(object_index_key, system_token)
+        if indexed is None or indexed["digest"] == digest:
+            return
+        index_key = self._index_key(indexed["digest"])
+        entry = self._read(index_key, system_token)
+        if entry is not None and (entry["container_key"], entry["object_key"]) == (
+            container_key,
+            object_key,
+        ):
+            self._remove(index_key, system_token)
+        self._remove(object_index_key, system_token)
+
+    def record(self, digest, container_key, object_key, system_token=None):
+        """
+        Point the index entry of a content hash at an object.
+        """
+        with self._lock:
+            if not self._index_created:
+                try:
+                    self.provider.create_container(
+                        self.index_container_key, system_token
+                    )
+                except NotImplementedError:
+                    pass
+                except Exception:
+                    LOG.debug("Dedup index container not created.", exc_info=True)
+                self._index_created = True
+        entry = {"container_key": container_key, "object_key": object_key}
+        try:
+            metadata = self.provider.get_object_metadata(
+                container_key, object_key, system_token
+            )
+            # a multipart ETag can not be computed here, keep the one stored
+            entry["etag"] = metadata_etag(metadata)
+            modified = metadata_last_modified(metadata)
+            entry["modified"] = modified.isoformat() if modified else None
+            self.provider.update_object(
+                self.index_container_key,
+                self._index_key(digest),
+                json.dumps(entry).encode(),
+                system_token,
+            )
+            self.provider.update_object(
+                self.index_container_key,
+                self._object_index_key(container_key, object_key),
+                json.dumps({"digest": digest}).encode(),
+                system_token,
+            )
+        except Exception:
+            LOG.warning(f"Recording {digest} in the dedup index failed.", exc_info=True)
+
+    def update_object(self, container_key, object_key, object_data, system_token=None):
+        """
+        update (or create) an object, copying an existing object with the
+        same content instead of uploading it when possible
+
+        The indexed object is only copied (or, when it is the object itself,
+        left as it is) when it still holds the content. Otherwise the data is
+        uploaded and the index entry points at the new object.
+
+        :return: the result of the provider's update_object when the data was
+            uploaded, of its copy_object when the upload was replaced by a
+            copy, None when the object already held the content
+        """
+        digest, md5, size, spool = self._spool(object_data)
+        copied = False
+        with spool:
+            entry = self._read(self._index_key(digest), system_token)
+            if entry is not None and self._holds(entry, md5, size, system_token):
+                source = entry["container_key"], entry["object_key"]
+                if source == (container_key, object_key):
+                    return None
+                try:
+                    result = self.provider.copy_object(
+                        *source, container_key, object_key, system_token
+                    )
+                    copied = True
+                except Exception:
+                    # the indexed object is gone, upload and re-index
+                    LOG.info(f"Dedup source {source} for {digest} can not be copied.")
+            if not copied:
+                data = spool.read() if size <= self.spool_size else spool
+                result = self.provider.update_object(
+                    container_key, object_key, data, system_token
+                )
+        # the object may have been indexed with its previous content
+        self.forget(container_key, object_key, system_token, digest)
+        if not copied:
+            self.record(digest, container_key, object_key, system_token)
+        return result
+
+    def update_object_and_key(self, container_key, object_data, system_token=None):
+        """
+        create an object and key, copying an existing object with the same
+        content instead of uploading it when possible
+
+        :return: the key generated for the object
+        """
+        object_key = str(uuid.uuid4())
+        self.update_object(container_key, object_key, object_data, system_token)
+        return object_key
@@ -0,0 +1,156 @@
+"""
+Resumable downloads of objects to local files.
+
+The object is written to ``<path>.part``, preallocated to its full size,
+through a large write buffer. Progress is checkpointed to
+``<path>.part.json`` together with the ETag (or size and modification time
+when the data store reports no ETag) of the object. A later call with the
+same path resumes from the checkpoint with a range request when the object
+did not change, and starts over otherwise. A finished download is fsynced
+and renamed into place, so ``path`` never holds a partial object.
+"""
+import json
+import logging
+import os
+
+from storageprovider.utils import metadata_etag
+from storageprovider.utils import metadata_size
+
+LOG = logging.getLogger(__name__)
+
+BUFFER_SIZE = 8 * 1024 * 1024
+CHECKPOINT_SIZE = 64 * 1024 * 1024
+PART_SUFFIX = ".part"
+
+
+def _version(metadata):
+    """
+    :return: what identifies this version of the object, None if nothing does
+    """
+    etag = metadata_etag(metadata)
+    if etag:
+        return {"etag": etag}
+    modified = metadata.get("time_last_modification")
+    if modified is None:
+        return None
+    return {"size": metadata_size(metadata), "modified": str(modified)}
+
+
+def _preallocate(f, size):
+    try:
+        os.posix_fallocate(f.fileno(), 0, size)
+    except (AttributeError, OSError):
+        # not available on this platform or file system
+        f.truncate(size)
+
+
+def _resume_offset(part_path, state_path, version):
+    if version is None:
+        return 0
+    try:
+        with open(state_path, encoding="utf-8") as f:
+            state = json.load(f)
+        if state["version"] != version:
+            LOG.info(f"{part_path} is of an older version, starting over.")
+            return 0
+        offset = int(state["offset"])
+        if os.path.getsize(part_path) < offset:
+            return 0
+        return offset
+    except (OSError, ValueError, KeyError, TypeError):
+        return 0
+
+
+def _checkpoint(f, state_path, version, offset):
+    f.flush()
+    os.fsync(f.fileno())
+    temp_path = f"{state_path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as state:
+        json.dump({"version": version, "offset": offset}, state)
+    os.replace(temp_path, state_path)
+
+
+def _remove(path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def download_to_path(
+    provider,
+    container_key,
+    object_key,
+    path,
+    system_token=None,
+    buffer_size=BUFFER_SIZE,
+    checkpoint_size=CHECKPOINT_SIZE,
+):
+    """
+    download an object to a local file, resuming an earlier partial download
+
+    :param provider: the storage provider
+    :param container_key: key of the container in the data store
+    :param object_key: specific object key for the object in the container
+    :param path: the file to write
+    :param system_token: oauth system token
+    :param buffer_size: size of the write buffer
+    :param checkpoint_size: bytes written between progress checkpoints
+    :return: the size of the downloaded object
+    :raises IncompleteDownloadException: if the data store sent less data than
+        the object size, rerun to resume
+    """
+    path = os.fspath(path)
+    part_path = path + PART_SUFFIX
+    state_path = part_path + ".json"
+    metadata = provider.get_object_metadata(container_key, object_key, system_token)
+    size = metadata_size(metadata)
+    version = _version(metadata)
+    offset = _resume_offset(part_path, state_path, version)
+    if offset:
+        LOG.info(f"Resuming download of {container_key}/{object_key} at {offset}.")
+        chunks = provider.get_object_range_streaming(
+            container_key, object_key, offset, None, system_token
+        )
+    else:
+        _remove(state_path)
+        chunks = provider.get_object_streaming(container_key, object_key, system_token)
+    with open(part_path, "r+b" if offset else "wb", buffering=buffer_size) as f:
+        if not offset and size:
+            _preallocate(f, size)
+        f.seek(offset)
+        unsaved = 0
+        try:
+            for chunk in chunks:
+                f.write(chunk)
+                offset += len(chunk)
+                unsaved += len(chunk)
+                if version is not None and unsaved >= checkpoint_size:
+                    _checkpoint(f, state_path, version, offset)
+                    unsaved = 0
+            if size is not None and offset != size:
+                raise IncompleteDownloadException(container_key, object_key, offset, size)
+        except BaseException:
+            if version is not None:
+                _checkpoint(f, state_path, version, offset)
+            raise
+        f.truncate(offset)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(part_path, path)
+    _remove(state_path)
+    return offset
+
+
+class IncompleteDownloadException(IOError):
+    def __init__(self, container_key, object_key, received, size):
+        self.container_key = container_key
+        self.object_key = object_key
+        self.received = received
+        self.size = size
+
+    def __str__(self):
+        return (
+            f"{self.container_key}/{self.object_key}: received {self.received} "
+            f"of {self.size} bytes"
+        )
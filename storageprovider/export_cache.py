@@ -0,0 +1,210 @@
+"""
+Cache of container exports.
+
+A container is fingerprinted with one listing pass: the hash of its object
+keys and ETags (size and modification time when the data store has no
+ETags), the translations and the archive format. An export whose
+fingerprint matches is served from the cache; otherwise it is built once,
+stored and served while it is being built. Older exports of the same
+container, archive format and translations are removed when a new one is
+stored; exports in other formats or with other translations are kept.
+
+Exports are cached in a local directory or as objects in a container of
+the data store.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+
+LOG = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class ExportCache:
+    def __init__(
+        self,
+        provider,
+        cache_dir=None,
+        cache_container_key=None,
+        spool_size=8 * 1024 * 1024,
+    ):
+        """
+        :param provider: the storage provider
+        :param cache_dir: directory to keep the exports in
+        :param cache_container_key: container to keep the exports in, when no
+            cache_dir is given
+        :param spool_size: exports up to this many bytes are kept in memory
+            before they are uploaded to the cache container
+        """
+        if (cache_dir is None) == (cache_container_key is None):
+            raise ValueError("Pass either cache_dir or cache_container_key.")
+        self.provider = provider
+        self.cache_dir = cache_dir
+        self.cache_container_key = cache_container_key
+        self.spool_size = spool_size
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def fingerprint(
+        self, container_key, system_token=None, translations=None, archive_format="zip"
+    ):
+        """
+        :return: hex digest identifying the current state of the container
+        """
+        digest = hashlib.sha256()
+        digest.update(
+            json.dumps(
+                [container_key, archive_format, sorted((translations or {}).items())]
+            ).encode()
+        )
+        infos = self.provider.list_objects_with_metadata(container_key, system_token)
+        for info in sorted(infos, key=lambda info: info.key):
+            version = info.etag or f"{info.size}:{info.last_modified}"
+            digest.update(f"\n{info.key}\0{version}".encode())
+        return digest.hexdigest()
+
+    @staticmethod
+    def _prefix(container_key, translations, archive_format):
+        """
+        :return: start of the names of all exports of a container in one
+            archive format with the same translations
+        """
+        container = hashlib.sha256(container_key.encode()).hexdigest()[:32]
+        variant = hashlib.sha256(
+            json.dumps([archive_format, sorted((translations or {}).items())]).encode()
+        ).hexdigest()[:16]
+        return f"{container}-{variant}-"
+
+    def _name(self, container_key, fingerprint, translations, archive_format):
+        prefix = self._prefix(container_key, translations, archive_format)
+        return f"{prefix}{fingerprint}.{archive_format}"
+
+    def _cached(self, name, system_token):
+        """
+        :return: chunks of the cached export, None on a miss
+        """
+        if self.cache_dir is not None:
+            try:
+                f = open(os.path.join(self.cache_dir, name), "rb")
+            except FileNotFoundError:
+                return None
+            return _read_file(f)
+        if not self.provider.object_exists(self.cache_container_key, name, system_token):
+            return None
+        return self.provider.get_object_streaming(
+            self.cache_container_key, name, system_token
+        )
+
+    def _stale(self, prefix, name, system_token):
+        if self.cache_dir is not None:
+            names = os.listdir(self.cache_dir)
+        else:
+            names = self.provider.list_object_keys(self.cache_container_key, system_token)
+        return [other for other in names if other.startswith(prefix) and other != name]
+
+    def _remove_stale(self, prefix, name, system_token):
+        for stale in self._stale(prefix, name, system_token):
+            try:
+                if self.cache_dir is not None:
+                    os.unlink(os.path.join(self.cache_dir, stale))
+                else:
+                    self.provider.delete_object(
+                        self.cache_container_key, stale, system_token
+                    )
+            except Exception:
+                LOG.debug(f"Removing stale export {stale} failed.", exc_info=True)
+
+    def _export(self, container_key, system_token, translations, archive_format):
+        try:
+            return self.provider.get_container_data_streaming(
+                container_key, system_token, translations, archive_format
+            )
+        except NotImplementedError:
+            return [
+                self.provider.get_container_data(
+                    container_key, system_token, translations, archive_format
+                )
+            ]
+
+    def _build(self, container_key, name, system_token, translations, archive_format):
+        """
+        Stream a new export while it is written to the cache.
+        """
+        chunks = self._export(container_key, system_token, translations, archive_format)
+        if self.cache_dir is not None:
+            fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, prefix=".tmp-")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    for chunk in chunks:
+                        f.write(chunk)
+                        yield chunk
+                os.replace(temp_path, os.path.join(self.cache_dir, name))
+            except BaseException:
+                os.unlink(temp_path)
+                raise
+        else:
+            with tempfile.SpooledTemporaryFile(max_size=self.spool_size) as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    yield chunk
+                size = f.tell()
+                f.seek(0)
+                try:
+                    self.provider.update_object(
+                        self.cache_container_key,
+                        name,
+                        f.read() if size <= self.spool_size else f,
+                        system_token,
+                    )
+                except Exception:
+                    # the export was served, only caching it failed
+                    LOG.warning(f"Caching export {name} failed.", exc_info=True)
+                    return
+        self._remove_stale(
+            self._prefix(container_key, translations, archive_format), name, system_token
+        )
+
+    def get_container_data_streaming(
+        self, container_key, system_token=None, translations=None, archive_format="zip"
+    ):
+        """
+        retrieve an export of a container as a stream, from the cache when the
+        container did not change
+
+        :param container_key: key of the container in the data store
+        :param system_token: oauth system token
+        :param translations: Dict of object IDs and file names to use for them.
+        :param archive_format: ``zip``, ``tar``, ``tar.gz`` or ``tar.zst``
+        :return archive of the objects as a stream
+        """
+        fingerprint = self.fingerprint(
+            container_key, system_token, translations, archive_format
+        )
+        name = self._name(container_key, fingerprint, translations, archive_format)
+        chunks = self._cached(name, system_token)
+        if chunks is not None:
+            return chunks
+        return self._build(
+            container_key, name, system_token, translations, archive_format
+        )
+
+    def get_container_data(
+        self, container_key, system_token=None, translations=None, archive_format="zip"
+    ):
+        """
+        retrieve an export of a container, from the cache when the container
+        did not change, see :meth:`get_container_data_streaming`
+        """
+        return b"".join(
+            self.get_container_data_streaming(
+                container_key, system_token, translations, archive_format
+            )
+        )
+
+
+def _read_file(f, chunk_size=CHUNK_SIZE):
+    with f:
+        yield from iter(lambda: f.read(chunk_size), b"")
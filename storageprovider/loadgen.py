@@ -0,0 +1,408 @@
+"""
+Load generator for storage providers.
+
+Runs a configurable mix of operations through a
+:class:`storageprovider.client.StorageProviderClient` at a fixed concurrency
+or target rate and reports throughput and latency percentiles per operation.
+
+Examples::
+
+    storageprovider-loadgen --provider standin --duration 10
+    storageprovider-loadgen --provider augeias --base-url http://augeias:6543 \\
+        --collection test --mix read=70,write=20,metadata=10 --concurrency 32
+    storageprovider-loadgen --provider minio --server-url minio:9000 \\
+        --access-key key --secret-key secret --bucket test --rate 200
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from storageprovider.client import StorageProviderClient
+
+OPERATIONS = ("read", "write", "metadata", "list", "export")
+DEFAULT_MIX = "read=60,write=20,metadata=10,list=5,export=5"
+SIZE_UNITS = {"": 1, "b": 1, "k": 1000, "kb": 1000, "kib": 1024}
+SIZE_UNITS.update({"m": 1000**2, "mb": 1000**2, "mib": 1024**2})
+SIZE_UNITS.update({"g": 1000**3, "gb": 1000**3, "gib": 1024**3})
+
+
+def parse_size(value: str) -> int:
+    """
+    Parse a size like ``512``, ``64KiB`` or ``10MB`` into bytes.
+    """
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([a-zA-Z]*)\s*", value)
+    if not match or match[2].lower() not in SIZE_UNITS:
+        raise argparse.ArgumentTypeError(f"invalid size: {value!r}")
+    return int(float(match[1]) * SIZE_UNITS[match[2].lower()])
+
+
+def parse_mix(value: str) -> dict:
+    """
+    Parse an operation mix like ``read=70,write=30`` into weights.
+    """
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(
+                f"unknown operation {name!r}, choose from {', '.join(OPERATIONS)}"
+            )
+        try:
+            mix[name] = float(weight)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"invalid weight for {name!r}")
+    if not any(weight > 0 for weight in mix.values()):
+        raise argparse.ArgumentTypeError("the mix needs at least one positive weight")
+    return mix
+
+
+def percentile(sorted_values, fraction):
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not sorted_values:
+        return None
+    rank = int(len(sorted_values) * fraction + 0.5)
+    return sorted_values[max(0, min(len(sorted_values), rank) - 1)]
+
+
+class _Pacer:
+    """
+    Spreads operations evenly over time to reach a target rate.
+    """
+
+    def __init__(self, rate):
+        self.interval = 1 / rate
+        self.lock = threading.Lock()
+        self.next_time = time.perf_counter()
+
+    def wait(self):
+        with self.lock:
+            scheduled = max(self.next_time, time.perf_counter())
+            self.next_time = scheduled + self.interval
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+
+class LoadGenerator:
+    """
+    Runs an operation mix against a storage provider.
+
+    :param client: the :class:`StorageProviderClient` to load
+    :param container_key: container to work in, it is created if needed
+    :param mix: dict of operation name to relative weight
+    :param object_size: size in bytes of the objects written
+    :param objects: number of objects written before the run starts
+    :param system_token: oauth system token
+    """
+
+    def __init__(
+        self,
+        client: StorageProviderClient,
+        container_key: str,
+        mix: dict,
+        object_size: int = 64 * 1024,
+        objects: int = 100,
+        system_token: str = None,
+        seed: int = None,
+    ):
+        self.client = client
+        self.container_key = container_key
+        self.operations = [op for op, weight in mix.items() if weight > 0]
+        self.weights = [mix[op] for op in self.operations]
+        self.object_size = object_size
+        self.objects = objects
+        self.system_token = system_token
+        self.random = random.Random(seed)
+        self.payload = os.urandom(object_size)
+        self.keys = []
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def prepare(self):
+        """
+        Create the container and write the initial objects.
+        """
+        try:
+            self.client.create_container(self.container_key, self.system_token)
+        except NotImplementedError:
+            pass  # containers are implicit for this provider
+        for _ in range(max(self.objects, 1)):
+            object_key = str(uuid.uuid4())
+            self.client.update_object(
+                self.container_key, object_key, self.payload, self.system_token
+            )
+            self.keys.append(object_key)
+
+    def cleanup(self, delete_container=False):
+        """
+        Delete the objects written by :meth:`prepare`.
+
+        :param delete_container: delete the whole container instead, only for
+            containers created for the run
+        """
+        if delete_container:
+            self.client.delete_container(self.container_key, self.system_token)
+            return
+        for object_key in self.keys:
+            self.client.delete_object(self.container_key, object_key, self.system_token)
+        self.keys = []
+
+    def _random_key(self):
+        with self.lock:
+            return self.random.choice(self.keys)
+
+    def _execute(self, operation):
+        if operation == "read":
+            self.client.get_object(
+                self.container_key, self._random_key(), self.system_token
+            )
+        elif operation == "write":
+            self.client.update_object(
+                self.container_key, self._random_key(), self.payload, self.system_token
+            )
+        elif operation == "metadata":
+            self.client.get_object_metadata(
+                self.container_key, self._random_key(), self.system_token
+            )
+        elif operation == "list":
+            keys = self.client.list_object_keys_for_container(
+                self.container_key, self.system_token
+            )
+            if not isinstance(keys, (bytes, str)):
+                list(keys)
+        elif operation == "export":
+            self.client.get_container_data(self.container_key, self.system_token)
+
+    def _choose(self):
+        with self.lock:
+            return self.random.choices(self.operations, self.weights)[0]
+
+    def _worker(self, deadline, remaining, pacer):
+        while time.perf_counter() < deadline:
+            if remaining is not None:
+                with self.lock:
+                    if remaining[0] <= 0:
+                        return
+                    remaining[0] -= 1
+            if pacer is not None:
+                pacer.wait()
+                if time.perf_counter() >= deadline:
+                    return
+            operation = self._choose()
+            start = time.perf_counter()
+            try:
+                self._execute(operation)
+            except Exception:
+                with self.lock:
+                    self.errors[operation] += 1
+                continue
+            latency = time.perf_counter() - start
+            with self.lock:
+                self.latencies[operation].append(latency)
+
+    def run(self, concurrency=8, duration=None, operations=None, rate=None):
+        """
+        Run the load.
+
+        :param concurrency: number of concurrent workers
+        :param duration: stop after this many seconds
+        :param operations: stop after this many operations
+        :param rate: target number of operations per second over all workers
+        :return: a :class:`LoadReport`
+        """
+        if duration is None and operations is None:
+            raise ValueError("Either duration or operations is required.")
+        deadline = time.perf_counter() + (duration if duration is not None else 1e9)
+        remaining = [operations] if operations is not None else None
+        pacer = _Pacer(rate) if rate else None
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = [
+                executor.submit(self._worker, deadline, remaining, pacer)
+                for _ in range(concurrency)
+            ]
+            for future in futures:
+                future.result()
+        return LoadReport(
+            time.perf_counter() - start, dict(self.latencies), dict(self.errors)
+        )
+
+
+class LoadReport:
+    def __init__(self, elapsed, latencies, errors):
+        self.elapsed = elapsed
+        self.latencies = latencies
+        self.errors = errors
+
+    @property
+    def total_operations(self):
+        return sum(len(values) for values in self.latencies.values())
+
+    def summary(self):
+        """
+        :return: dict of operation name to its statistics, latencies in seconds
+        """
+        summary = {}
+        for operation in OPERATIONS:
+            latencies = sorted(self.latencies.get(operation, []))
+            errors = self.errors.get(operation, 0)
+            if not latencies and not errors:
+                continue
+            summary[operation] = {
+                "count": len(latencies),
+                "errors": errors,
+                "ops_per_second": len(latencies) / self.elapsed,
+                "p50": percentile(latencies, 0.50),
+                "p95": percentile(latencies, 0.95),
+                "p99": percentile(latencies, 0.99),
+            }
+        return summary
+
+    def format(self):
+        lines = [
+            f"{'operation':<10} {'count':>8} {'errors':>7} {'ops/s':>9} "
+            f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+        ]
+        for operation, stats in self.summary().items():
+            lines.append(
+                f"{operation:<10} {stats['count']:>8} {stats['errors']:>7} "
+                f"{stats['ops_per_second']:>9.1f} "
+                + " ".join(
+                    f"{stats[p] * 1000:>9.2f}" if stats[p] is not None else f"{'-':>9}"
+                    for p in ("p50", "p95", "p99")
+                )
+            )
+        lines.append(
+            f"total: {self.total_operations} operations in {self.elapsed:.2f}s, "
+            f"{self.total_operations / self.elapsed:.1f} ops/s"
+        )
+        return "\n".join(lines)
+
+
+def build_provider(args):
+    if args.provider == "augeias":
+        from storageprovider.providers.augeias import AugeiasProvider
+
+        return AugeiasProvider(args.base_url, args.collection)
+    if args.provider == "minio":
+        from storageprovider.providers.minio import MinioProvider
+
+        return MinioProvider(
+            args.server_url, args.access_key, args.secret_key, args.bucket
+        )
+    raise ValueError(f"Unknown provider {args.provider}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="storageprovider-loadgen",
+        description="Generate load against a storage provider.",
+    )
+    parser.add_argument(
+        "--provider",
+        choices=("augeias", "minio", "standin"),
+        required=True,
+        help="'standin' starts a local in-process Augeias stand-in server",
+    )
+    augeias = parser.add_argument_group("augeias")
+    augeias.add_argument("--base-url")
+    augeias.add_argument("--collection", default="loadgen")
+    minio = parser.add_argument_group("minio")
+    minio.add_argument("--server-url")
+    minio.add_argument("--access-key")
+    minio.add_argument("--secret-key")
+    minio.add_argument("--bucket")
+    parser.add_argument("--system-token")
+    parser.add_argument(
+        "--mix",
+        type=parse_mix,
+        default=parse_mix(DEFAULT_MIX),
+        help=f"weighted operation mix (default {DEFAULT_MIX})",
+    )
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rate", type=float, help="target operations per second")
+    parser.add_argument("--duration", type=float, help="run time in seconds")
+    parser.add_argument("--operations", type=int, help="number of operations")
+    parser.add_argument("--object-size", type=parse_size, default=64 * 1024)
+    parser.add_argument("--objects", type=int, default=100)
+    parser.add_argument("--container", help="container key (default: a new one)")
+    parser.add_argument(
+        "--keep",
+        action="store_true",
+        help="do not delete the objects or the container afterwards",
+    )
+    parser.add_argument(
+        "--delete-container",
+        action="store_true",
+        help="delete the container given with --container afterwards, by default "
+        "only the objects written by the run are deleted",
+    )
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args(argv)
+    if args.duration is None and args.operations is None:
+        args.duration = 10.0
+    if args.provider == "augeias" and not args.base_url:
+        parser.error("--base-url is required for the augeias provider")
+    if args.provider == "minio" and not all(
+        (args.server_url, args.access_key, args.secret_key, args.bucket)
+    ):
+        parser.error(
+            "--server-url, --access-key, --secret-key and --bucket are required "
+            "for the minio provider"
+        )
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    server = None
+    if args.provider == "standin":
+        from storageprovider.standin import StandinServer
+
+        server = StandinServer().start()
+        args.provider = "augeias"
+        args.base_url = server.url
+    try:
+        generator = LoadGenerator(
+            StorageProviderClient(build_provider(args)),
+            args.container or f"loadgen-{uuid.uuid4()}",
+            args.mix,
+            object_size=args.object_size,
+            objects=args.objects,
+            system_token=args.system_token,
+            seed=args.seed,
+        )
+        generator.prepare()
+        try:
+            report = generator.run(
+                concurrency=args.concurrency,
+                duration=args.duration,
+                operations=args.operations,
+                rate=args.rate,
+            )
+        finally:
+            if not args.keep:
+                # never delete a container the user pointed us at unless asked
+                generator.cleanup(
+                    delete_container=args.container is None or args.delete_container
+                )
+        print(report.format())
+    finally:
+        if server is not None:
+            server.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,255 @@
+"""
+Materialised manifests of containers.
+
+A manifest is one compact JSON object per container, kept in a dedicated
+manifest container under the key of the container it describes. It holds
+the key, size, ETag, content type and time of last modification of every
+object, so a container is listed with a single GET instead of a listing
+that grows with the number of objects.
+
+Writes and deletes made through :class:`Manifests` (or a
+:class:`storageprovider.client.StorageProviderClient` created with a
+``manifest_container_key``) update the manifest of their container, and
+every update increases its version. Changes made around it, and updates of
+the manifest that failed, make it drift; :meth:`Manifests.repair` rebuilds a
+manifest from a full listing and reports what had drifted.
+
+An update loads the manifest, changes it and writes it back. The data
+stores offer no conditional write to detect that another process changed
+the manifest in between, so each container must have a single writer: one
+process updating its manifest. Updates within a process are serialised per
+container. Other processes may read the manifests, and a manifest changed
+by a second writer is brought back in line with :meth:`Manifests.repair`.
+"""
+import json
+import logging
+import threading
+from dataclasses import dataclass
+from dataclasses import field
+from datetime import datetime
+
+from storageprovider.providers import ObjectInfo
+
+LOG = logging.getLogger(__name__)
+
+FORMAT = 1
+
+
+@dataclass
+class ManifestDiff:
+    """
+    Result of a repair: the keys the manifest was missing, the keys of
+    objects that no longer exist and the keys with outdated metadata.
+    """
+
+    added: list = field(default_factory=list)
+    removed: list = field(default_factory=list)
+    changed: list = field(default_factory=list)
+
+    @property
+    def ok(self):
+        return not (self.added or self.removed or self.changed)
+
+
+def _entry(info):
+    last_modified = info.last_modified
+    if isinstance(last_modified, datetime):
+        last_modified = last_modified.isoformat()
+    return [info.size, info.etag, info.content_type, last_modified]
+
+
+def _info(key, entry):
+    size, etag, content_type, last_modified = entry
+    if isinstance(last_modified, str):
+        try:
+            last_modified = datetime.fromisoformat(last_modified)
+        except ValueError:
+            pass
+    return ObjectInfo(key, size, content_type, etag, last_modified)
+
+
+class Manifests:
+    def __init__(self, provider, manifest_container_key="manifests"):
+        """
+        :param provider: the storage provider
+        :param manifest_container_key: container holding the manifests, whose
+            manifests only this process may update
+        """
+        self.provider = provider
+        self.manifest_container_key = manifest_container_key
+        self._container_created = False
+        self._lock = threading.Lock()
+        # {container_key: lock serialising the updates of its manifest}
+        self._locks = {}
+
+    def _container_lock(self, container_key):
+        with self._lock:
+            return self._locks.setdefault(container_key, threading.Lock())
+
+    def _load(self, container_key, system_token=None):
+        """
+        :return: the stored manifest, None if there is none
+        """
+        try:
+            data = self.provider.get_object(
+                self.manifest_container_key, container_key, system_token
+            )
+        except Exception:
+            # providers raise different exceptions for missing objects
+            if self.provider.object_exists(
+                self.manifest_container_key, container_key, system_token
+            ):
+                raise
+            return None
+        return json.loads(data)
+
+    def _save(self, container_key, manifest, system_token=None):
+        if not self._container_created:
+            try:
+                self.provider.create_container(self.manifest_container_key, system_token)
+            except NotImplementedError:
+                pass
+            except Exception:
+                LOG.debug("Manifest container not created.", exc_info=True)
+            self._container_created = True
+        self.provider.update_object(
+            self.manifest_container_key,
+            container_key,
+            json.dumps(manifest, separators=(",", ":")).encode(),
+            system_token,
+        )
+
+    def _build(self, container_key, system_token=None, version=0):
+        manifest = {
+            "format": FORMAT,
+            "version": version + 1,
+            "objects": {
+                info.key: _entry(info)
+                for info in self.provider.list_objects_with_metadata(
+                    container_key, system_token
+                )
+            },
+        }
+        self._save(container_key, manifest, system_token)
+        return manifest
+
+    def get(self, container_key, system_token=None):
+        """
+        retrieve the manifest of a container, building it from a full listing
+        when there is none yet
+
+        :param container_key: key of the container in the data store
+        :param system_token: oauth system token
+        :return: dict with the ``version`` of the manifest and its ``objects``,
+            a dict of object key to [size, etag, content type, last modified]
+        """
+        manifest = self._load(container_key, system_token)
+        if manifest is None or manifest.get("format") != FORMAT:
+            with self._container_lock(container_key):
+                manifest = self._build(
+                    container_key, system_token, (manifest or {}).get("version", 0)
+                )
+        return manifest
+
+    def list_object_keys(self, container_key, system_token=None):
+        """
+        :return: sorted list of the object keys of the container
+        """
+        return sorted(self.get(container_key, system_token)["objects"])
+
+    def list_objects_with_metadata(self, container_key, system_token=None):
+        """
+        :return: list of ObjectInfo, sorted by key
+        """
+        objects = self.get(container_key, system_token)["objects"]
+        return [_info(key, objects[key]) for key in sorted(objects)]
+
+    def _change(self, container_key, changes, system_token=None):
+        """
+        Apply changes to a manifest: a dict of object key to entry, None for
+        removed objects. A missing manifest is left to be built by the next
+        read. Failures are logged, the manifest then drifts until it is
+        repaired.
+        """
+        try:
+            with self._container_lock(container_key):
+                manifest = self._load(container_key, system_token)
+                if manifest is None:
+                    return
+                objects = manifest["objects"]
+                for object_key, entry in changes.items():
+                    if entry is None:
+                        objects.pop(object_key, None)
+                    else:
+                        objects[object_key] = entry
+                manifest["version"] += 1
+                self._save(container_key, manifest, system_token)
+        except Exception:
+            LOG.warning(
+                f"Updating the manifest of {container_key} failed.", exc_info=True
+            )
+
+    def record(self, container_key, object_key, system_token=None):
+        """
+        Record the current metadata of a written object in the manifest of
+        its container.
+        """
+        try:
+            metadata = self.provider.get_object_metadata(
+                container_key, object_key, system_token
+            )
+        except Exception:
+            LOG.warning(f"Metadata of {container_key}/{object_key} not found.")
+            return
+        info = ObjectInfo.from_metadata(object_key, metadata)
+        self._change(container_key, {object_key: _entry(info)}, system_token)
+
+    def forget(self, container_key, object_key, system_token=None):
+        """
+        Remove a deleted object from the manifest of its container.
+        """
+        self._change(container_key, {object_key: None}, system_token)
+
+    def drop(self, container_key, system_token=None):
+        """
+        Remove the manifest of a deleted container.
+        """
+        try:
+            with self._container_lock(container_key):
+                if self.provider.object_exists(
+                    self.manifest_container_key, container_key, system_token
+                ):
+                    self.provider.delete_object(
+                        self.manifest_container_key, container_key, system_token
+                    )
+        except Exception:
+            LOG.warning(
+                f"Removing the manifest of {container_key} failed.", exc_info=True
+            )
+
+    def repair(self, container_key, system_token=None):
+        """
+        Rebuild the manifest of a container from a full listing.
+
+        :param container_key: key of the container in the data store
+        :param system_token: oauth system token
+        :return: ManifestDiff of the stored manifest with the rebuilt one
+        """
+        with self._container_lock(container_key):
+            try:
+                old = self._load(container_key, system_token)
+            except ValueError:
+                # unreadable, rebuild it from scratch
+                old = None
+            old = old or {"version": 0, "objects": {}}
+            new = self._build(container_key, system_token, old.get("version", 0))
+        old_objects, new_objects = old.get("objects", {}), new["objects"]
+        return ManifestDiff(
+            added=sorted(set(new_objects) - set(old_objects)),
+            removed=sorted(set(old_objects) - set(new_objects)),
+            changed=sorted(
+                key
+                for key in set(new_objects) & set(old_objects)
+                if new_objects[key] != old_objects[key]
+            ),
+        )
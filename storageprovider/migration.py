@@ -0,0 +1,430 @@
+"""
+Copy containers from one storage provider to another.
+
+Objects are streamed from the source to the target by a bounded pool of
+workers, verified against an md5 computed while streaming and recorded in
+an append-only state file, so an interrupted migration can be resumed
+without copying the finished objects again.
+
+Usage::
+
+    storageprovider-migrate \\
+        --source augeias --source-base-url https://augeias/ \\
+        --source-collection oeaanduidingsobjecten \\
+        --target minio --target-server-url minio:9000 --target-access-key ... \\
+        --target-secret-key ... --target-bucket oeaanduidingsobjecten \\
+        --state-file migration.state container-1 container-2
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from dataclasses import field
+
+from storageprovider.checksum import MULTIPART_PART_SIZE
+from storageprovider.checksum import ChecksumMismatchException
+from storageprovider.checksum import Checksums
+from storageprovider.utils import IterStream
+from storageprovider.utils import metadata_etag as _etag
+from storageprovider.utils import metadata_last_modified as _last_modified
+from storageprovider.utils import metadata_size as _size
+
+LOG = logging.getLogger(__name__)
+
+
+class MigrationState:
+    """
+    Objects that were migrated, persisted to an append-only JSON lines file.
+
+    Every finished object is appended as one line; the file is fsynced every
+    ``sync_every`` objects and on :meth:`close`. A line that was only half
+    written when the process died is ignored on load.
+    """
+
+    def __init__(self, path=None, sync_every=100):
+        """
+        :param path: the state file, None to keep the state in memory only
+        :param sync_every: number of finished objects between fsyncs
+        """
+        self.path = path
+        self.sync_every = sync_every
+        self.done = set()
+        self.lock = threading.Lock()
+        self._unsynced = 0
+        self._file = None
+        if path is not None:
+            torn = os.path.exists(path) and self._load(path)
+            self._file = open(path, "a", encoding="utf-8")
+            if torn:
+                # keep the torn line from swallowing the next entry
+                self._file.write("\n")
+
+    def _load(self, path):
+        """
+        :return: True if the last line was not completely written
+        """
+        line = "\n"
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                self.done.add((entry["container"], entry["object"]))
+        return not line.endswith("\n")
+
+    def is_done(self, container_key, object_key):
+        with self.lock:
+            return (container_key, object_key) in self.done
+
+    def mark_done(self, container_key, object_key):
+        with self.lock:
+            self.done.add((container_key, object_key))
+            if self._file is None:
+                return
+            self._file.write(
+                json.dumps({"container": container_key, "object": object_key}) + "\n"
+            )
+            self._file.flush()
+            self._unsynced += 1
+            if self._unsynced >= self.sync_every:
+                os.fsync(self._file.fileno())
+                self._unsynced = 0
+
+    def close(self):
+        with self.lock:
+            if self._file is not None:
+                os.fsync(self._file.fileno())
+                self._file.close()
+                self._file = None
+
+
+@dataclass
+class MigrationReport:
+    container_key: str
+    copied: int = 0
+    skipped: int = 0
+    resumed: int = 0
+    bytes: int = 0
+    failed: dict = field(default_factory=dict)
+
+    @property
+    def ok(self):
+        return not self.failed
+
+    def format(self):
+        return (
+            f"{self.container_key}: {self.copied} copied ({self.bytes} bytes), "
+            f"{self.skipped} already present, {self.resumed} resumed, "
+            f"{len(self.failed)} failed"
+        )
+
+
+class Migrator:
+    """
+    Copies containers between two providers.
+
+    At most ``workers`` objects are copied at the same time and at most
+    twice as many are queued, so listing millions of keys does not turn
+    into millions of pending tasks.
+    """
+
+    def __init__(
+        self,
+        source,
+        target,
+        workers=8,
+        state=None,
+        verify=True,
+        skip_existing=True,
+        system_token=None,
+        target_system_token=None,
+        part_size=MULTIPART_PART_SIZE,
+    ):
+        """
+        :param source: provider to copy from
+        :param target: provider to copy to
+        :param workers: number of objects copied concurrently
+        :param state: a :class:`MigrationState` or the path of a state file
+        :param verify: check the size and md5 of every copied object
+        :param skip_existing: skip objects the target already has with the
+            same size and ETag; without ETags on both sides, with the same
+            size and written after the source object was last modified
+        :param system_token: oauth system token for the source
+        :param target_system_token: oauth system token for the target,
+            defaults to ``system_token``
+        :param part_size: part size of the multipart uploads of the target,
+            used to verify multipart ETags without reading the copy back,
+            None if unknown
+        """
+        if not isinstance(state, MigrationState):
+            state = MigrationState(state)
+        self.source = source
+        self.target = target
+        self.workers = workers
+        self.state = state
+        self.verify = verify
+        self.skip_existing = skip_existing
+        self.system_token = system_token
+        self.target_system_token = target_system_token or system_token
+        self.part_size = part_size
+
+    def close(self):
+        self.state.close()
+
+    def migrate_container(self, container_key, target_container_key=None):
+        """
+        copy all objects of a container to the target provider
+
+        :param container_key: key of the container in the source
+        :param target_container_key: key of the container in the target,
+            defaults to ``container_key``
+        :return: a :class:`MigrationReport`
+        """
+        target_container_key = target_container_key or container_key
+        report = MigrationReport(container_key)
+        lock = threading.Lock()
+        slots = threading.BoundedSemaphore(2 * self.workers)
+        try:
+            self.target.create_container(target_container_key, self.target_system_token)
+        except NotImplementedError:
+            pass
+        except Exception:
+            LOG.debug(f"Container {target_container_key} not created.", exc_info=True)
+
+        def done(object_key, future):
+            slots.release()
+            try:
+                status, size = future.result()
+            except Exception as e:
+                LOG.warning(f"Migrating {container_key}/{object_key} failed: {e}")
+                with lock:
+                    report.failed[object_key] = str(e)
+                return
+            self.state.mark_done(container_key, object_key)
+            with lock:
+                if status == "copied":
+                    report.copied += 1
+                    report.bytes += size
+                else:
+                    report.skipped += 1
+
+        keys = self.source.list_object_keys(container_key, self.system_token)
+        with ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="migration"
+        ) as executor:
+            for object_key in keys:
+                if self.state.is_done(container_key, object_key):
+                    report.resumed += 1
+                    continue
+                slots.acquire()
+                future = executor.submit(
+                    self._migrate_object, container_key, target_container_key, object_key
+                )
+                future.add_done_callback(
+                    lambda f, object_key=object_key: done(object_key, f)
+                )
+        LOG.info(report.format())
+        return report
+
+    def _migrate_object(self, container_key, target_container_key, object_key):
+        if self.skip_existing and self._is_present(
+            container_key, target_container_key, object_key
+        ):
+            return "skipped", 0
+        checksums = Checksums(part_size=self.part_size)
+
+        def chunks():
+            for chunk in self.source.get_object_streaming(
+                container_key, object_key, self.system_token
+            ):
+                checksums.update(chunk)
+                yield chunk
+
+        self.target.update_object(
+            target_container_key,
+            object_key,
+            IterStream(chunks()),
+            self.target_system_token,
+        )
+        if self.verify:
+            self._verify(target_container_key, object_key, checksums)
+        return "copied", checksums.size
+
+    def _is_present(self, container_key, target_container_key, object_key):
+        try:
+            target = self.target.get_object_metadata(
+                target_container_key, object_key, self.target_system_token
+            )
+        except Exception:
+            return False
+        source = self.source.get_object_metadata(
+            container_key, object_key, self.system_token
+        )
+        if _size(source) is None or _size(source) != _size(target):
+            return False
+        if _etag(source) and _etag(target):
+            return _etag(source) == _etag(target)
+        source_modified = _last_modified(source)
+        target_modified = _last_modified(target)
+        if source_modified is not None and target_modified is not None:
+            # copied after the source object last changed
+            return target_modified >= source_modified
+        return self._md5(
+            self.source, container_key, object_key, self.system_token
+        ) == self._md5(
+            self.target, target_container_key, object_key, self.target_system_token
+        )
+
+    @staticmethod
+    def _md5(provider, container_key, object_key, system_token):
+        digest = hashlib.md5()
+        for chunk in provider.get_object_streaming(
+            container_key, object_key, system_token
+        ):
+            digest.update(chunk)
+        return digest.hexdigest()
+
+    def _verify(self, container_key, object_key, checksums):
+        metadata = self.target.get_object_metadata(
+            container_key, object_key, self.target_system_token
+        )
+        size = checksums.size
+        if _size(metadata) is not None and _size(metadata) != size:
+            raise ChecksumMismatchException(
+                container_key, object_key, f"size {_size(metadata)} != {size}"
+            )
+        etag = _etag(metadata)
+        md5 = checksums.hexdigests()["md5"]
+        matches = checksums.matches_etag(etag)
+        if matches is None:
+            # no md5 based ETag, or a multipart one of an unknown part size:
+            # read the copy back
+            etag = self._md5(
+                self.target, container_key, object_key, self.target_system_token
+            )
+            matches = etag == md5
+        if not matches:
+            raise ChecksumMismatchException(
+                container_key, object_key, f"md5 {etag} != {md5}"
+            )
+
+
+def migrate_container(source, target, container_key, target_container_key=None, **kw):
+    """
+    copy all objects of a container from one provider to another
+
+    :param source: provider to copy from
+    :param target: provider to copy to
+    :param container_key: key of the container in the source
+    :param target_container_key: key of the container in the target
+    :param kw: options of :class:`Migrator`
+    :return: a :class:`MigrationReport`
+    """
+    migrator = Migrator(source, target, **kw)
+    try:
+        return migrator.migrate_container(container_key, target_container_key)
+    finally:
+        migrator.close()
+
+
+PROVIDERS = ("augeias", "minio", "filesystem")
+
+
+def _add_provider_arguments(parser, prefix):
+    group = parser.add_argument_group(prefix)
+    group.add_argument(f"--{prefix}", choices=PROVIDERS, required=True)
+    group.add_argument(f"--{prefix}-base-url", help="augeias")
+    group.add_argument(f"--{prefix}-collection", help="augeias")
+    group.add_argument(f"--{prefix}-server-url", help="minio")
+    group.add_argument(f"--{prefix}-access-key", help="minio")
+    group.add_argument(f"--{prefix}-secret-key", help="minio")
+    group.add_argument(f"--{prefix}-bucket", help="minio")
+    group.add_argument(f"--{prefix}-root", help="filesystem")
+    group.add_argument(f"--{prefix}-system-token")
+
+
+def build_provider(args, prefix):
+    options = {
+        key[len(prefix) + 1:]: value
+        for key, value in vars(args).items()
+        if key.startswith(f"{prefix}_")
+    }
+    provider = getattr(args, prefix)
+    if provider == "augeias":
+        from storageprovider.providers.augeias import AugeiasProvider
+
+        return AugeiasProvider(options["base_url"], options["collection"])
+    if provider == "minio":
+        from storageprovider.providers.minio import MinioProvider
+
+        return MinioProvider(
+            options["server_url"],
+            options["access_key"],
+            options["secret_key"],
+            options["bucket"],
+        )
+    if provider == "filesystem":
+        from storageprovider.providers.filesystem import FilesystemProvider
+
+        return FilesystemProvider(options["root"])
+    raise ValueError(f"Unknown provider {provider}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="storageprovider-migrate",
+        description="Copy containers from one storage provider to another.",
+    )
+    _add_provider_arguments(parser, "source")
+    _add_provider_arguments(parser, "target")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument(
+        "--state-file", help="checkpoint file, rerun with the same file to resume"
+    )
+    parser.add_argument(
+        "--no-verify", dest="verify", action="store_false", help="skip md5 checks"
+    )
+    parser.add_argument(
+        "--no-skip-existing",
+        dest="skip_existing",
+        action="store_false",
+        help="copy objects the target already has with the same size and ETag",
+    )
+    parser.add_argument("container_keys", nargs="+", metavar="container_key")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    args = parse_args(argv)
+    migrator = Migrator(
+        build_provider(args, "source"),
+        build_provider(args, "target"),
+        workers=args.workers,
+        state=args.state_file,
+        verify=args.verify,
+        skip_existing=args.skip_existing,
+        system_token=args.source_system_token,
+        target_system_token=args.target_system_token,
+    )
+    ok = True
+    try:
+        for container_key in args.container_keys:
+            report = migrator.migrate_container(container_key)
+            print(report.format())
+            for object_key, error in sorted(report.failed.items()):
+                print(f"  {object_key}: {error}")
+            ok = ok and report.ok
+    finally:
+        migrator.close()
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
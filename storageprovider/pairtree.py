@@ -0,0 +1,27 @@
+def clean_identifier(identifier: str) -> str:
+    """
+    https://datatracker.ietf.org/doc/html/draft-kunze-pairtree-01#section-3
+    """
+    chars_to_hex = '"*+,<=>?\\^|'
+    chars_conversion = {"/": "=", ":": "+", ".": ","}
+    cleaned = []
+
+    for c in identifier:
+        c_dec = ord(c)
+        if c_dec >= 33 and c_dec <= 126 and c not in chars_to_hex:
+            c_lower = c.lower()
+            cleaned.append(c_lower)
+        elif c in chars_to_hex:
+            cleaned.append("^" + format(ord(c), "x"))
+
+    converted = [chars_conversion.get(char, char) for char in cleaned]
+    return "".join(converted)
+
+
+def id_to_pairtree_path(identifier: str) -> str:
+    """
+    Converts a cleaned identifier to a PairTree path using 2-character segments.
+    """
+    cleaned = clean_identifier(identifier)
+    segments = [cleaned[i : i + 2] for i in range(0, len(cleaned), 2)]
+    return "/".join(segments) + "/"
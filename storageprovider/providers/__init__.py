@@ -1,7 +1,177 @@
+import collections
+import itertools
+import threading
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from dataclasses import field
+from datetime import datetime
+
+from storageprovider.utils import iter_tar
+
+
+@dataclass
+class ObjectInfo:
+    """
+    Key and metadata of an object, as returned by list_objects_with_metadata.
+    """
+
+    key: str
+    size: int = None
+    content_type: str = None
+    etag: str = None
+    last_modified: datetime = None
+
+    @classmethod
+    def from_metadata(cls, key, metadata):
+        """
+        :param key: the object key
+        :param metadata: the dict returned by get_object_metadata
+        """
+        return cls(
+            key,
+            metadata.get("size"),
+            metadata.get("mime"),
+            metadata.get("etag"),
+            metadata.get("time_last_modification"),
+        )
+
+
+@dataclass
+class CopyReport:
+    """
+    Result of copy_container: the keys that were copied and the error of
+    every object that could not be copied.
+    """
+
+    copied: list = field(default_factory=list)
+    failed: dict = field(default_factory=dict)
+
+    @property
+    def ok(self):
+        return not self.failed
+
+
+class BufferTooSmallException(ValueError):
+    def __init__(self, buffer_size, object_size=None):
+        self.buffer_size = buffer_size
+        self.object_size = object_size
+
+    def __str__(self):
+        size = "more" if self.object_size is None else self.object_size
+        return f"object of {size} bytes does not fit in {self.buffer_size} bytes"
+
+
+def writable_view(buffer):
+    """
+    :return: a writable, flat byte memoryview of buffer
+    :raises TypeError: if the buffer is read-only
+    """
+    view = memoryview(buffer)
+    if view.readonly:
+        raise TypeError("get_object_into needs a writable buffer")
+    return view.cast("B") if view.format != "B" or view.ndim != 1 else view
+
+
+def readinto_buffer(readinto, buffer, size=None):
+    """
+    Fill buffer with repeated readinto calls.
+
+    :param readinto: readinto method of the source
+    :param buffer: writable buffer
+    :param size: number of bytes the source will produce, if known
+    :return: number of bytes written
+    :raises BufferTooSmallException: if the source holds more than fits
+    """
+    view = writable_view(buffer)
+    if size is not None and size > len(view):
+        raise BufferTooSmallException(len(view), size)
+    written = 0
+    while written < len(view):
+        count = readinto(view[written:])
+        if not count:
+            return written
+        written += count
+    if size is None and readinto(bytearray(1)):
+        raise BufferTooSmallException(len(view))
+    return written
+
+
+def skip_range(chunks, offset, length=None):
+    """
+    Cut a range out of a stream of chunks.
+
+    :param chunks: the chunks of the whole object
+    :param offset: position of the first byte
+    :param length: number of bytes, None to read up to the end
+    """
+    end = None if length is None else offset + length
+    position = 0
+    try:
+        for chunk in chunks:
+            start = position
+            position += len(chunk)
+            if position <= offset:
+                continue
+            if end is not None and start >= end:
+                break
+            if start < offset or (end is not None and position > end):
+                chunk = chunk[max(offset - start, 0):None if end is None else end - start]
+            yield chunk
+            if end is not None and position >= end:
+                break
+    finally:
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            close()
+
+
+def concurrent_map(function, items, max_workers=8):
+    """
+    Call function for every item in a small thread pool.
+
+    :return: list of the results, in the order of the items
+    """
+    items = list(items)
+    if len(items) <= 1:
+        return [function(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as executor:
+        return list(executor.map(function, items))
+
+
+def read_ahead(function, items, max_workers=8, window=16):
+    """
+    Call function for every item in a thread pool, yielding the results in
+    the order of the items with at most ``window`` results computed ahead
+    of the consumer.
+    """
+    items = iter(items)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = collections.deque(
+            executor.submit(function, item) for item in itertools.islice(items, window)
+        )
+        try:
+            while pending:
+                result = pending.popleft().result()
+                for item in itertools.islice(items, 1):
+                    pending.append(executor.submit(function, item))
+                yield result
+        finally:
+            for future in pending:
+                future.cancel()
 
 
 class BaseStorageProvider(ABC):
+    #: number of keys from which objects_exist lists the container once instead
+    #: of calling object_exists for every key, None to always list. Providers
+    #: setting this must implement object_exists without objects_exist.
+    exists_listing_threshold = None
+    #: objects up to this many bytes are fetched concurrently ahead of the
+    #: archive writer when a container is exported as tar
+    read_ahead_size = 1024 * 1024
+    #: number of objects fetched ahead of the archive writer
+    read_ahead_window = 16
+
     @abstractmethod
     def delete_object(self, container_key, object_key, system_token=None): # pragma: no cover
         pass
@@ -55,14 +225,247 @@ class BaseStorageProvider(ABC):
     def list_object_keys_for_container(self, container_key, system_token=None): # pragma: no cover
         pass
 
+    def get_object_into(self, container_key, object_key, buffer, system_token=None):
+        """
+        retrieve an object from the data store into a writable buffer, e.g. a
+        bytearray, mmap or shared memory
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param buffer: writable buffer the object is written to
+        :param system_token: oauth system token
+        :return number of bytes written
+        :raises BufferTooSmallException: if the object does not fit in the buffer
+        """
+        view = writable_view(buffer)
+        chunks = self.get_object_streaming(container_key, object_key, system_token)
+        written = 0
+        try:
+            for chunk in chunks:
+                end = written + len(chunk)
+                if end > len(view):
+                    raise BufferTooSmallException(len(view))
+                view[written:end] = chunk
+                written = end
+        finally:
+            close = getattr(chunks, "close", None)
+            if close is not None:
+                close()
+        return written
+
+    def get_object_range_streaming(
+        self, container_key, object_key, offset, length=None, system_token=None
+    ):
+        """
+        retrieve part of an object from the data store as a stream
+
+        Providers that can not request a range from the data store skip the
+        bytes before ``offset`` while streaming.
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param offset: position of the first byte
+        :param length: number of bytes, None to read up to the end
+        :param system_token: oauth system token
+        :return content of the range as a stream
+        """
+        return skip_range(
+            self.get_object_streaming(container_key, object_key, system_token),
+            offset,
+            length,
+        )
+
+    def get_object_range(
+        self, container_key, object_key, offset, length=None, system_token=None
+    ):
+        """
+        retrieve part of an object from the data store
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param offset: position of the first byte
+        :param length: number of bytes, None to read up to the end
+        :param system_token: oauth system token
+        :return content of the range
+        """
+        return b"".join(
+            self.get_object_range_streaming(
+                container_key, object_key, offset, length, system_token
+            )
+        )
+
+    def _fetch_archive_entries(
+        self, container_key, system_token=None, translations=None
+    ):
+        """
+        Archive entries of the objects of a container, see
+        :func:`storageprovider.utils.iter_tar`. Small objects are fetched
+        concurrently, at most read_ahead_window ahead of the archive writer;
+        larger ones are streamed when their turn comes.
+        """
+        translations = translations or {}
+
+        def stream(object_key):
+            yield from self.get_object_streaming(container_key, object_key, system_token)
+
+        def fetch(info):
+            name = translations.get(info.key, info.key)
+            if info.size is not None and info.size <= self.read_ahead_size:
+                data = self.get_object(container_key, info.key, system_token)
+                return name, len(data), [data]
+            return name, info.size, stream(info.key)
+
+        return read_ahead(
+            fetch,
+            self.list_objects_with_metadata(container_key, system_token),
+            window=self.read_ahead_window,
+        )
+
+    def _tar_container(
+        self, container_key, system_token=None, translations=None, archive_format="tar"
+    ):
+        """
+        :return: tar archive of a container as a stream
+        """
+        return iter_tar(
+            self._fetch_archive_entries(container_key, system_token, translations),
+            archive_format,
+        )
+
+    def list_object_keys(self, container_key, system_token=None):
+        """
+        list all object keys for a container as a list of strings
+
+        :param container_key: key of the container in the data store
+        :param system_token: oauth system token
+        :return list of object keys found in the container
+        """
+        return list(self.list_object_keys_for_container(container_key, system_token))
+
+    def object_exists(self, container_key, object_key, system_token=None):
+        """
+        check if an object exists in the data store
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param system_token: oauth system token
+        :return True if the object exists
+        """
+        return self.objects_exist(container_key, [object_key], system_token)[object_key]
+
+    def objects_exist(self, container_key, object_keys, system_token=None):
+        """
+        check which objects exist in a container of the data store
+
+        Fewer than exists_listing_threshold keys are checked one by one (a few
+        at the same time), more keys with a single listing of the container.
+
+        :param container_key: key of the container in the data store
+        :param object_keys: keys of the objects to check
+        :param system_token: oauth system token
+        :return dict with True for every object key that exists, else False
+        """
+        object_keys = list(object_keys)
+        threshold = self.exists_listing_threshold
+        if not object_keys:
+            return {}
+        if threshold is not None and len(object_keys) < threshold:
+            exists = concurrent_map(
+                lambda key: self.object_exists(container_key, key, system_token),
+                object_keys,
+            )
+            return dict(zip(object_keys, exists))
+        existing = set(self.list_object_keys(container_key, system_token))
+        return {key: key in existing for key in object_keys}
+
+    def list_objects_with_metadata(self, container_key, system_token=None):
+        """
+        list all objects of a container with their size, content type, etag and
+        time of last modification
+
+        By default the metadata of every object is retrieved separately, a few
+        objects at the same time.
+
+        :param container_key: key of the container in the data store
+        :param system_token: oauth system token
+        :return list of ObjectInfo
+        """
+        return concurrent_map(
+            lambda key: ObjectInfo.from_metadata(
+                key, self.get_object_metadata(container_key, key, system_token)
+            ),
+            self.list_object_keys(container_key, system_token),
+        )
+
+    def _iter_object_keys(self, container_key, system_token=None):
+        """
+        iterate over the object keys of a container, lazily where the data
+        store pages its listing
+        """
+        return iter(self.list_object_keys(container_key, system_token))
+
+    def copy_container(
+        self,
+        source_container_key,
+        output_container_key,
+        system_token=None,
+        max_workers=8,
+    ):
+        """
+        copy all objects of a container to another container, keeping their keys
+
+        The objects are copied with copy_object, max_workers at the same time,
+        while the source container is still being listed.
+
+        :param source_container_key: key of the source container in the data store
+        :param output_container_key: key of output container in the data store
+        :param system_token: oauth system token
+        :param max_workers: number of objects copied at the same time
+        :return CopyReport
+        """
+        try:
+            self.create_container(output_container_key, system_token)
+        except NotImplementedError:
+            pass
+        report = CopyReport()
+        lock = threading.Lock()
+        slots = threading.BoundedSemaphore(2 * max_workers)
+
+        def copy(object_key):
+            try:
+                self.copy_object(
+                    source_container_key,
+                    object_key,
+                    output_container_key,
+                    object_key,
+                    system_token,
+                )
+            except Exception as e:
+                with lock:
+                    report.failed[object_key] = e
+            else:
+                with lock:
+                    report.copied.append(object_key)
+            finally:
+                slots.release()
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for object_key in self._iter_object_keys(source_container_key, system_token):
+                slots.acquire()
+                executor.submit(copy, object_key)
+        report.copied.sort()
+        return report
+
     @abstractmethod
     def get_container_data_streaming(
-        self, container_key, system_token=None, translations=None
+        self, container_key, system_token=None, translations=None, archive_format="zip"
     ): # pragma: no cover
         pass
 
     @abstractmethod
-    def get_container_data(self, container_key, system_token=None, translations=None): # pragma: no cover
+    def get_container_data(
+        self, container_key, system_token=None, translations=None, archive_format="zip"
+    ): # pragma: no cover
         pass
 
     @abstractmethod
@@ -100,3 +503,44 @@ class BaseStorageProvider(ABC):
         system_token=None,
     ): # pragma: no cover
         pass
+
+    def get_object_url(
+        self,
+        container_key,
+        object_key,
+        system_token=None,
+        expires=3600,
+        content_disposition=None,
+        content_type=None,
+    ):
+        """
+        get a temporary url to download an object directly from the data store
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param system_token: oauth system token
+        :param expires: seconds (or a timedelta) the url stays valid
+        :param content_disposition: Content-Disposition header of the download
+        :param content_type: Content-Type header of the download
+        :return the url
+        :raises NotImplementedError: if the data store can not hand out urls
+        """
+        raise NotImplementedError(
+            f"{type(self).__name__} does not support direct download urls."
+        )
+
+    def get_upload_url(self, container_key, object_key, system_token=None, expires=3600):
+        """
+        get a temporary url to upload an object directly to the data store
+        with a PUT request
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param system_token: oauth system token
+        :param expires: seconds (or a timedelta) the url stays valid
+        :return the url
+        :raises NotImplementedError: if the data store can not hand out urls
+        """
+        raise NotImplementedError(
+            f"{type(self).__name__} does not support direct upload urls."
+        )
@@ -1,7 +1,20 @@
+import json
 import logging
+import time
+from datetime import timedelta
+from email.utils import parsedate_to_datetime
 from typing import Callable
 
+from storageprovider.checksum import ChecksumVerifier
 from storageprovider.providers import BaseStorageProvider
+from storageprovider.providers import ObjectInfo
+from storageprovider.providers import concurrent_map
+from storageprovider.providers import readinto_buffer
+from storageprovider.providers import skip_range
+from storageprovider.providers import writable_view
+from storageprovider.timing import TimingRecorder
+from storageprovider.timing import timed
+from storageprovider.utils import ExpiringSet
 
 import requests
 from requests import RequestException
@@ -11,10 +24,32 @@ LOG = logging.getLogger(__name__)
 
 
 class AugeiasProvider(BaseStorageProvider):
-    def __init__(self, base_url, collection):
+    exists_listing_threshold = 20
+
+    def __init__(
+        self,
+        base_url,
+        collection,
+        slow_call_threshold=None,
+        missing_cache_ttl=None,
+        checksums=None,
+    ):
+        """
+        :param base_url: url of the Augeias instance
+        :param collection: key of the collection in Augeias
+        :param slow_call_threshold: log calls taking longer than this many seconds
+        :param missing_cache_ttl: seconds object_exists remembers that an object
+            does not exist, None to always ask Augeias
+        :param checksums: algorithms (e.g. ``("md5", "sha256")``) computed while
+            uploading and streaming objects and checked against the ETag, the
+            result is available as ``checksums.last``
+        """
         self.host_url = base_url
         self.base_url = base_url + "/collections/" + collection
         self.collection = collection
+        self.timing = TimingRecorder(slow_call_threshold=slow_call_threshold)
+        self.missing_objects = ExpiringSet(missing_cache_ttl)
+        self.checksums = ChecksumVerifier(checksums) if checksums else None
 
     @staticmethod
     def get_auth_header(system_token):
@@ -38,7 +73,7 @@ class AugeiasProvider(BaseStorageProvider):
         :param requests_method: a requests method to call. eg. requests.get, requests.post
         :param system_token: oauth system token
         :param url: url to post to.
-        :param response_code: expected response code
+        :param response_code: expected response code, or a tuple of them
         :param headers: extra headers to add to the request
         :param requests_kwargs: extra kwargs which will be added to the requests call.
         :return: The response
@@ -46,16 +81,27 @@ class AugeiasProvider(BaseStorageProvider):
         headers = headers or {}
         if system_token:
             headers.update(self.get_auth_header(system_token))
+        request_started = time.perf_counter()
         try:
             response = requests_method(url, headers=headers, **requests_kwargs)
         except RequestException:
             LOG.exception(f"{requests_method} {url} failed.")
             raise
-        if response.status_code != response_code:
+        elapsed = getattr(response, "elapsed", None)
+        if requests_kwargs.get("stream") or not isinstance(elapsed, timedelta):
+            self.timing.mark_ttfb()
+        else:
+            # requests reads the whole body before returning, elapsed only
+            # covers the time until the response headers were parsed.
+            self.timing.mark_ttfb(request_started + elapsed.total_seconds())
+        if not isinstance(response_code, tuple):
+            response_code = (response_code,)
+        if response.status_code not in response_code:
             raise InvalidStateException(response.status_code, response.text)
 
         return response
 
+    @timed
     def delete_object(self, container_key, object_key, system_token=None):
         """
         delete an object from the data store
@@ -72,6 +118,7 @@ class AugeiasProvider(BaseStorageProvider):
         )
         return response
 
+    @timed
     def get_object_streaming(self, container_key, object_key, system_token=None):
         """
         retrieve an object from the data store as a stream
@@ -87,9 +134,14 @@ class AugeiasProvider(BaseStorageProvider):
             f"{self.base_url}/containers/{container_key}/{object_key}",
             stream=True,
         )
-
-        return response.iter_content(1024 * 1024)
-
+        chunks = response.iter_content(1024 * 1024)
+        if self.checksums is not None:
+            chunks = self.checksums.wrap_stream(
+                chunks, response.headers.get("ETag"), container_key, object_key
+            )
+        return chunks
+
+    @timed
     def get_object(self, container_key, object_key, system_token=None):
         """
         retrieve an object from the data store
@@ -105,8 +157,82 @@ class AugeiasProvider(BaseStorageProvider):
             system_token,
             f"{self.base_url}/containers/{container_key}/{object_key}",
         )
+        if self.checksums is not None:
+            self.checksums.verify_data(
+                response.content, response.headers.get("ETag"), container_key, object_key
+            )
         return response.content
 
+    @timed
+    def get_object_into(self, container_key, object_key, buffer, system_token=None):
+        """
+        retrieve an object from the data store into a writable buffer, e.g. a
+        bytearray, mmap or shared memory
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param buffer: writable buffer the object is written to
+        :param system_token: oauth system token
+        :return number of bytes written
+        :raises BufferTooSmallException: if the object does not fit in the buffer
+        :raises InvalidStateException: if the response is in an invalid state
+        """
+        response = self._execute_requests_method(
+            requests.get,
+            system_token,
+            f"{self.base_url}/containers/{container_key}/{object_key}",
+            stream=True,
+        )
+        try:
+            size = response.headers.get("Content-Length")
+            if size is not None and not response.headers.get("Content-Encoding"):
+                size = int(size)
+            else:
+                size = None
+            response.raw.decode_content = True
+            written = readinto_buffer(response.raw.readinto, buffer, size)
+        finally:
+            response.close()
+        if self.checksums is not None:
+            self.checksums.verify_data(
+                writable_view(buffer)[:written],
+                response.headers.get("ETag"),
+                container_key,
+                object_key,
+            )
+        return written
+
+    @timed
+    def get_object_range_streaming(
+        self, container_key, object_key, offset, length=None, system_token=None
+    ):
+        """
+        retrieve part of an object from the data store as a stream
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param offset: position of the first byte
+        :param length: number of bytes, None to read up to the end
+        :param system_token: oauth system token
+        :return content of the range as a stream
+        :raises InvalidStateException: if the response is in an invalid state
+        """
+        last = "" if length is None else offset + length - 1
+        response = self._execute_requests_method(
+            requests.get,
+            system_token,
+            f"{self.base_url}/containers/{container_key}/{object_key}",
+            response_code=(200, 206),
+            headers={"Range": f"bytes={offset}-{last}"},
+            stream=True,
+        )
+        chunks = response.iter_content(1024 * 1024)
+        if response.status_code == 200:
+            # the range was ignored, the whole object is coming
+            chunks = skip_range(chunks, offset, length)
+        return chunks
+
+    @timed
     def get_object_and_metadata(self, container_key, object_key, system_token=None):
         """
         retrieve an object from the data store and also return header meta data
@@ -127,6 +253,7 @@ class AugeiasProvider(BaseStorageProvider):
         metadata["size"] = metadata["Content-Length"]
         return {"object": response.content, "metadata": metadata}
 
+    @timed
     def get_object_metadata(self, container_key, object_key, system_token=None):
         """
         retrieve an object from the data store
@@ -147,6 +274,56 @@ class AugeiasProvider(BaseStorageProvider):
         result["Content-Length"] = result["size"]  # backwards compatibility
         return result
 
+    @timed
+    def object_exists(self, container_key, object_key, system_token=None):
+        """
+        check if an object exists in the data store with a HEAD request
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param system_token: oauth system token
+        :return True if the object exists
+        :raises InvalidStateException: if the response is in an invalid state
+        """
+        if (container_key, object_key) in self.missing_objects:
+            return False
+        try:
+            self._execute_requests_method(
+                requests.head,
+                system_token,
+                f"{self.base_url}/containers/{container_key}/{object_key}",
+            )
+        except InvalidStateException as e:
+            if e.status_code != 404:
+                raise
+            self.missing_objects.add((container_key, object_key))
+            return False
+        return True
+
+    @timed
+    def objects_exist(self, container_key, object_keys, system_token=None):
+        """
+        check which objects exist in a container of the data store
+
+        :param container_key: key of the container in the data store
+        :param object_keys: keys of the objects to check
+        :param system_token: oauth system token
+        :return dict with True for every object key that exists, else False
+        :raises InvalidStateException: if the response is in an invalid state
+        """
+        object_keys = list(object_keys)
+        try:
+            result = super().objects_exist(container_key, object_keys, system_token)
+        except InvalidStateException as e:
+            if e.status_code != 404:
+                raise
+            result = dict.fromkeys(object_keys, False)
+        for object_key, exists in result.items():
+            if not exists:
+                self.missing_objects.add((container_key, object_key))
+        return result
+
+    @timed
     def copy_object_and_create_key(
         self,
         source_container_key,
@@ -183,6 +360,7 @@ class AugeiasProvider(BaseStorageProvider):
             object_key = str(object_key)
         return object_key
 
+    @timed
     def copy_object(
         self,
         source_container_key,
@@ -215,7 +393,9 @@ class AugeiasProvider(BaseStorageProvider):
             headers=headers,
             json=object_data,
         )
+        self.missing_objects.discard((output_container_key, output_object_key))
 
+    @timed
     def update_object_and_key(self, container_key, object_data, system_token=None):
         """
         create an object and key in the data store
@@ -226,6 +406,9 @@ class AugeiasProvider(BaseStorageProvider):
          :raises InvalidStateException: if the response is in an invalid state
         """
         headers = {"content-type": "application/octet-stream"}
+        checksums = None
+        if self.checksums is not None:
+            object_data, checksums = self.checksums.wrap_upload(object_data)
         response = self._execute_requests_method(
             requests.post,
             system_token,
@@ -237,8 +420,13 @@ class AugeiasProvider(BaseStorageProvider):
         object_key = response.json()["object_key"]
         if isinstance(object_key, str):
             object_key = str(object_key)
+        if checksums is not None:
+            self.checksums.verify(
+                checksums, response.headers.get("ETag"), container_key, object_key
+            )
         return object_key
 
+    @timed
     def update_object(self, container_key, object_key, object_data, system_token=None):
         """
         update (or create) an object in the data store
@@ -250,14 +438,24 @@ class AugeiasProvider(BaseStorageProvider):
         :raises InvalidStateException: if the response is in an invalid state
         """
         headers = {"content-type": "application/octet-stream"}
-        return self._execute_requests_method(
+        checksums = None
+        if self.checksums is not None:
+            object_data, checksums = self.checksums.wrap_upload(object_data)
+        response = self._execute_requests_method(
             requests.put,
             system_token,
             f"{self.base_url}/containers/{container_key}/{object_key}",
             headers=headers,
             data=object_data,
         )
+        self.missing_objects.discard((container_key, object_key))
+        if checksums is not None:
+            self.checksums.verify(
+                checksums, response.headers.get("ETag"), container_key, object_key
+            )
+        return response
 
+    @timed
     def list_object_keys_for_container(self, container_key, system_token=None):
         """
         list all object keys for a container in the data store
@@ -276,17 +474,72 @@ class AugeiasProvider(BaseStorageProvider):
         )
         return response.content
 
+    def list_object_keys(self, container_key, system_token=None):
+        """
+        list all object keys for a container as a list of strings
+
+        :param container_key: key of the container in the data store
+        :param system_token: oauth system token
+        :return list of object keys found in the container
+        :raises InvalidStateException: if the response is in an invalid state
+        """
+        return json.loads(
+            self.list_object_keys_for_container(container_key, system_token)
+        )
+
+    @timed
+    def list_objects_with_metadata(self, container_key, system_token=None):
+        """
+        list all objects of a container with their size, content type, etag and
+        time of last modification
+
+        The Augeias listing only holds keys, the metadata is taken from HEAD
+        requests sent a few at the same time.
+
+        :param container_key: key of the container in the data store
+        :param system_token: oauth system token
+        :return list of ObjectInfo
+        :raises InvalidStateException: if the response is in an invalid state
+        """
+
+        def head(object_key):
+            response = self._execute_requests_method(
+                requests.head,
+                system_token,
+                f"{self.base_url}/containers/{container_key}/{object_key}",
+            )
+            headers = response.headers
+            size = headers.get("Content-Length")
+            last_modified = headers.get("Last-Modified")
+            etag = headers.get("ETag")
+            return ObjectInfo(
+                object_key,
+                int(size) if size is not None else None,
+                headers.get("Content-Type"),
+                etag.strip('"') if etag else None,
+                parsedate_to_datetime(last_modified) if last_modified else None,
+            )
+
+        return concurrent_map(head, self.list_object_keys(container_key, system_token))
+
+    @timed
     def get_container_data_streaming(
-        self, container_key, system_token=None, translations=None
+        self, container_key, system_token=None, translations=None, archive_format="zip"
     ):
         """
         Retrieve a zip of a container in the data store as a stream
         :param container_key: key of the container in the data store
         :param system_token: oauth system token
         :param translations: Dict of object IDs and file names to use for them.
+        :param archive_format: ``zip``, ``tar``, ``tar.gz`` or ``tar.zst``
         :return zip of objects as a stream
         :raises InvalidStateException: if the response is in an invalid state
         """
+        if archive_format != "zip":
+            # Augeias only builds zips, tars are built here
+            return self._tar_container(
+                container_key, system_token, translations, archive_format
+            )
         translations = translations or {}
         headers = {"Accept": "application/zip"}
         response = self._execute_requests_method(
@@ -299,16 +552,26 @@ class AugeiasProvider(BaseStorageProvider):
         )
         return response.iter_content(1024 * 1024)
 
-    def get_container_data(self, container_key, system_token=None, translations=None):
+    @timed
+    def get_container_data(
+        self, container_key, system_token=None, translations=None, archive_format="zip"
+    ):
         """
         Retrieve a zip of a container in the data store.
 
         :param container_key: key of the container in the data store
         :param system_token: oauth system token
         :param translations: Dict of object IDs and file names to use for them.
+        :param archive_format: ``zip``, ``tar``, ``tar.gz`` or ``tar.zst``
         :return list of object keys found in the container
         :raises InvalidStateException: if the response is in an invalid state
         """
+        if archive_format != "zip":
+            return b"".join(
+                self._tar_container(
+                    container_key, system_token, translations, archive_format
+                )
+            )
         translations = translations or {}
         headers = {"Accept": "application/zip"}
         response = self._execute_requests_method(
@@ -320,6 +583,7 @@ class AugeiasProvider(BaseStorageProvider):
         )
         return response.content
 
+    @timed
     def create_container(self, container_key, system_token=None):
         """
         create a new container with specific key in the data store
@@ -334,6 +598,7 @@ class AugeiasProvider(BaseStorageProvider):
             f"{self.base_url}/containers/{container_key}",
         )
 
+    @timed
     def create_container_and_key(self, system_token=None):
         """
         create a new container in the data store and generate key
@@ -355,6 +620,7 @@ class AugeiasProvider(BaseStorageProvider):
             container_key = str(container_key)
         return container_key
 
+    @timed
     def delete_container(self, container_key, system_token=None):
         """
         delete a container in the data store
@@ -369,6 +635,7 @@ class AugeiasProvider(BaseStorageProvider):
             f"{self.base_url}/containers/{container_key}",
         )
 
+    @timed
     def get_object_from_archive(
         self, container_key, object_key, file_name, system_token=None
     ):
@@ -389,6 +656,7 @@ class AugeiasProvider(BaseStorageProvider):
 
         return response.content
 
+    @timed
     def get_object_from_archive_streaming(
         self, container_key, object_key, file_name, system_token=None
     ):
@@ -406,9 +674,10 @@ class AugeiasProvider(BaseStorageProvider):
             f"{self.base_url}/containers/{container_key}/{object_key}/{file_name}",
             stream=True,
         )
-
+        # the ETag is that of the archive, not of the extracted file
         return response.iter_content(1024 * 1024)
 
+    @timed
     def replace_file_in_zip_object(
         self,
         container_key,
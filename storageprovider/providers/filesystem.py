@@ -0,0 +1,590 @@
+import mimetypes
+import mmap
+import os
+import shutil
+import tempfile
+import uuid
+import zipfile
+from datetime import datetime
+from datetime import timezone
+
+from storageprovider.pairtree import id_to_pairtree_path
+from storageprovider.providers import BaseStorageProvider
+from storageprovider.providers import ObjectInfo
+from storageprovider.providers import readinto_buffer
+from storageprovider.timing import TimingRecorder
+from storageprovider.timing import timed
+from storageprovider.utils import iter_archive
+
+CHUNK_SIZE = 1024 * 1024
+TEMP_PREFIX = ".tmp-"
+
+
+class FilesystemProvider(BaseStorageProvider):
+    """
+    Storage provider keeping objects as files on a local or mounted disk.
+
+    Containers use the same pairtree layout as
+    :class:`storageprovider.providers.minio.MinioProvider`, so a container
+    ``container`` with object ``object`` is stored as
+    ``<root_path>/co/nt/ai/ne/r/object``. Writes go to a temporary file which
+    is renamed into place, so readers never see partially written objects.
+
+    For zero-copy reads use :meth:`open_object`, whose file handle can be
+    passed to ``os.sendfile`` or ``wsgi.file_wrapper``, or
+    :meth:`get_object_mmap`.
+    """
+
+    def __init__(self, root_path, fsync=True, slow_call_threshold=None):
+        """
+        :param root_path: directory holding the containers
+        :param fsync: flush written files to disk before renaming them
+        :param slow_call_threshold: log calls taking longer than this many seconds
+        """
+        self.root_path = os.path.abspath(root_path)
+        self.fsync = fsync
+        self.timing = TimingRecorder(slow_call_threshold=slow_call_threshold)
+        os.makedirs(self.root_path, exist_ok=True)
+
+    def _container_path(self, container_key):
+        return os.path.join(self.root_path, id_to_pairtree_path(container_key))
+
+    def _object_path(self, container_key, object_key):
+        if (
+            not object_key
+            or object_key in (".", "..")
+            or "/" in object_key
+            or os.sep in object_key
+            or object_key.startswith(TEMP_PREFIX)
+        ):
+            raise ValueError(f"Invalid object key: {object_key!r}")
+        return os.path.join(self._container_path(container_key), object_key)
+
+    def _write_atomic(self, path, write):
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=TEMP_PREFIX)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                write(f)
+                if self.fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(temp_path, path)
+        except BaseException:
+            try:
+                os.unlink(temp_path)
+            except FileNotFoundError:
+                pass
+            raise
+
+    def _write_object(self, container_key, object_key, object_data):
+        def write(f):
+            if hasattr(object_data, "read"):
+                shutil.copyfileobj(object_data, f, CHUNK_SIZE)
+            elif isinstance(object_data, (bytes, bytearray, memoryview)):
+                f.write(object_data)
+            else:
+                for chunk in object_data:
+                    f.write(chunk)
+
+        self._write_atomic(self._object_path(container_key, object_key), write)
+
+    def _object_paths(self, container_key):
+        with os.scandir(self._container_path(container_key)) as entries:
+            return sorted(
+                (entry.name, entry.path)
+                for entry in entries
+                if entry.is_file() and not entry.name.startswith(TEMP_PREFIX)
+            )
+
+    @staticmethod
+    def _read_chunks(f, chunk_size=CHUNK_SIZE):
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    def _stream_file(self, path):
+        with open(path, "rb") as f:
+            yield from self._read_chunks(f)
+
+    def _metadata(self, object_key, path):
+        stat = os.stat(path)
+        mime = mimetypes.guess_type(object_key)[0] or "application/octet-stream"
+        return {
+            "time_last_modification": datetime.fromtimestamp(
+                stat.st_mtime, timezone.utc
+            ),
+            "mime": mime,
+            "size": stat.st_size,
+            "content-type": mime,
+            "content-length": stat.st_size,
+            "etag": f"{stat.st_mtime_ns:x}-{stat.st_size:x}",
+        }
+
+    def open_object(self, container_key, object_key):
+        """
+        Open an object as a binary file, e.g. for ``wsgi.file_wrapper``.
+
+        The caller has to close the file.
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :return: file object opened for reading
+        :raises FileNotFoundError: if the object does not exist
+        """
+        return open(self._object_path(container_key, object_key), "rb")
+
+    def get_object_mmap(self, container_key, object_key):
+        """
+        Memory-map an object read-only, its content is not copied.
+
+        The caller has to close the map. Empty objects return ``b""`` as
+        they cannot be mapped.
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :return: read-only :class:`mmap.mmap`
+        :raises FileNotFoundError: if the object does not exist
+        """
+        with self.open_object(container_key, object_key) as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return b""
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    @timed
+    def delete_object(self, container_key, object_key, system_token=None):
+        """
+        delete an object from the data store
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param system_token: oauth system token
+        :raises FileNotFoundError: if the object does not exist
+        """
+        os.unlink(self._object_path(container_key, object_key))
+
+    @timed
+    def get_object_streaming(self, container_key, object_key, system_token=None):
+        """
+        retrieve an object from the data store as a stream
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param system_token: oauth system token
+        :return content of the object as a stream
+        :raises FileNotFoundError: if the object does not exist
+        """
+        with self.open_object(container_key, object_key) as f:
+            yield from self._read_chunks(f)
+
+    @timed
+    def get_object(self, container_key, object_key, system_token=None):
+        """
+        retrieve an object from the data store
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param system_token: oauth system token
+        :return content of the object
+        :raises FileNotFoundError: if the object does not exist
+        """
+        with self.open_object(container_key, object_key) as f:
+            return f.read()
+
+    @timed
+    def get_object_into(self, container_key, object_key, buffer, system_token=None):
+        """
+        retrieve an object from the data store into a writable buffer, e.g. a
+        bytearray, mmap or shared memory
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param buffer: writable buffer the object is written to
+        :param system_token: oauth system token
+        :return number of bytes written
+        :raises BufferTooSmallException: if the object does not fit in the buffer
+        :raises FileNotFoundError: if the object does not exist
+        """
+        with self.open_object(container_key, object_key) as f:
+            size = os.fstat(f.fileno()).st_size
+            return readinto_buffer(f.readinto, buffer, size)
+
+    @timed
+    def get_object_range_streaming(
+        self, container_key, object_key, offset, length=None, system_token=None
+    ):
+        """
+        retrieve part of an object from the data store as a stream
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param offset: position of the first byte
+        :param length: number of bytes, None to read up to the end
+        :param system_token: oauth system token
+        :return content of the range as a stream
+        :raises FileNotFoundError: if the object does not exist
+        """
+        with self.open_object(container_key, object_key) as f:
+            f.seek(offset)
+            remaining = length
+            while remaining is None or remaining > 0:
+                size = CHUNK_SIZE if remaining is None else min(CHUNK_SIZE, remaining)
+                chunk = f.read(size)
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+    @timed
+    def get_object_and_metadata(self, container_key, object_key, system_token=None):
+        """
+        retrieve an object from the data store and also return header meta data
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param system_token: oauth system token
+        :return content of the object
+        :raises FileNotFoundError: if the object does not exist
+        """
+        with self.open_object(container_key, object_key) as f:
+            metadata = self._metadata(object_key, f.name)
+            return {"object": f.read(), "metadata": metadata}
+
+    @timed
+    def get_object_metadata(self, container_key, object_key, system_token=None):
+        """
+        retrieve an object from the data store
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param system_token: oauth system token
+        :return headers of the object
+        :raises FileNotFoundError: if the object does not exist
+        """
+        return self._metadata(
+            object_key, self._object_path(container_key, object_key)
+        )
+
+    @timed
+    def object_exists(self, container_key, object_key, system_token=None):
+        """
+        check if an object exists in the data store
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param system_token: oauth system token
+        :return True if the object exists
+        :raises ValueError: if the object key is not a valid file name
+        """
+        return os.path.isfile(self._object_path(container_key, object_key))
+
+    @timed
+    def objects_exist(self, container_key, object_keys, system_token=None):
+        """
+        check which objects exist in a container of the data store
+
+        :param container_key: key of the container in the data store
+        :param object_keys: keys of the objects to check
+        :param system_token: oauth system token
+        :return dict with True for every object key that exists, else False
+        :raises ValueError: if an object key is not a valid file name
+        """
+        return {
+            object_key: self.object_exists(container_key, object_key)
+            for object_key in object_keys
+        }
+
+    @timed
+    def copy_object_and_create_key(
+        self,
+        source_container_key,
+        source_object_key,
+        output_container_key,
+        system_token=None,
+    ):
+        """
+        Copy an object and create key in the data store
+
+        :param source_container_key: key of the source container in the data store
+        :param source_object_key: key of the source object in the container
+        :param output_container_key: key of output container in the data store
+        :param system_token: oauth system token
+        :raises FileNotFoundError: if the source object does not exist
+        """
+        output_object_key = str(uuid.uuid4())
+        self.copy_object(
+            source_container_key,
+            source_object_key,
+            output_container_key,
+            output_object_key,
+        )
+        return output_object_key
+
+    @timed
+    def copy_object(
+        self,
+        source_container_key,
+        source_object_key,
+        output_container_key,
+        output_object_key,
+        system_token=None,
+    ):
+        """
+        Copy an object in the data store to specific key
+
+        :param source_container_key: key of the source container in the data store
+        :param source_object_key: key of the source object in the container
+        :param output_container_key: key of output container in the data store
+        :param output_object_key: specific object key for the output object in the container
+        :param system_token: oauth system token
+        :raises FileNotFoundError: if the source object does not exist
+        """
+        source_path = self._object_path(source_container_key, source_object_key)
+        with open(source_path, "rb") as source:
+            self._write_atomic(
+                self._object_path(output_container_key, output_object_key),
+                lambda f: _copy_file(source, f),
+            )
+
+    @timed
+    def update_object_and_key(self, container_key, object_data, system_token=None):
+        """
+        create an object and key in the data store
+
+         :param container_key: key of the container in the data store
+         :param object_data: data of the object
+         :param system_token: oauth system token
+        """
+        object_key = str(uuid.uuid4())
+        self._write_object(container_key, object_key, object_data)
+        return object_key
+
+    @timed
+    def update_object(self, container_key, object_key, object_data, system_token=None):
+        """
+        update (or create) an object in the data store
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param object_data: data of the object
+        :param system_token: oauth system token
+        """
+        self._write_object(container_key, object_key, object_data)
+
+    @timed
+    def list_object_keys_for_container(self, container_key, system_token=None):
+        """
+        list all object keys for a container in the data store
+
+        :param container_key: key of the container in the data store
+        :param system_token: oauth system token
+        :return list of object keys found in the container
+        :raises FileNotFoundError: if the container does not exist
+        """
+        return [name for name, _ in self._object_paths(container_key)]
+
+    def _zip_entries(self, container_key, translations):
+        for name, path in self._object_paths(container_key):
+            yield (
+                translations.get(name, name),
+                os.path.getsize(path),
+                self._stream_file(path),
+            )
+
+    @timed
+    def list_objects_with_metadata(self, container_key, system_token=None):
+        """
+        list all objects of a container with their size, content type, etag and
+        time of last modification
+
+        :param container_key: key of the container in the data store
+        :param system_token: oauth system token
+        :return list of ObjectInfo
+        :raises FileNotFoundError: if the container does not exist
+        """
+        return [
+            ObjectInfo.from_metadata(object_key, self._metadata(object_key, path))
+            for object_key, path in self._object_paths(container_key)
+        ]
+
+    @timed
+    def get_container_data_streaming(
+        self, container_key, system_token=None, translations=None, archive_format="zip"
+    ):
+        """
+        Retrieve a zip of a container in the data store as a stream
+        :param container_key: key of the container in the data store
+        :param system_token: oauth system token
+        :param translations: Dict of object IDs and file names to use for them.
+        :param archive_format: ``zip``, ``tar``, ``tar.gz`` or ``tar.zst``
+        :return zip of objects as a stream
+        :raises FileNotFoundError: if the container does not exist
+        """
+        entries = self._zip_entries(container_key, translations or {})
+        yield from iter_archive(entries, archive_format)
+
+    @timed
+    def get_container_data(
+        self, container_key, system_token=None, translations=None, archive_format="zip"
+    ):
+        """
+        Retrieve a zip of a container in the data store.
+
+        :param container_key: key of the container in the data store
+        :param system_token: oauth system token
+        :param translations: Dict of object IDs and file names to use for them.
+        :param archive_format: ``zip``, ``tar``, ``tar.gz`` or ``tar.zst``
+        :return zip of the objects in the container
+        :raises FileNotFoundError: if the container does not exist
+        """
+        entries = self._zip_entries(container_key, translations or {})
+        return b"".join(iter_archive(entries, archive_format))
+
+    @timed
+    def create_container(self, container_key, system_token=None):
+        """
+        create a new container with specific key in the data store
+
+        :param container_key: key of the container in the data store
+        :param system_token: oauth system token
+        """
+        os.makedirs(self._container_path(container_key), exist_ok=True)
+
+    @timed
+    def create_container_and_key(self, system_token=None):
+        """
+        create a new container in the data store and generate key
+
+        :param system_token: oauth system token
+        :return the key generated for the container
+        """
+        container_key = str(uuid.uuid4())
+        self.create_container(container_key)
+        return container_key
+
+    @timed
+    def delete_container(self, container_key, system_token=None):
+        """
+        delete a container in the data store
+
+        Subdirectories belong to other containers in the pairtree layout and
+        are left alone.
+
+        :param container_key: key of the container in the data store
+        :param system_token: oauth system token
+        :raises FileNotFoundError: if the container does not exist
+        """
+        container_path = self._container_path(container_key)
+        with os.scandir(container_path) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    os.unlink(entry.path)
+        directory = os.path.normpath(container_path)
+        while directory != self.root_path:
+            try:
+                os.rmdir(directory)
+            except OSError:
+                break  # not empty, other containers live below it
+            directory = os.path.dirname(directory)
+
+    def _read_from_archive(self, container_key, object_key, file_name):
+        with zipfile.ZipFile(self._object_path(container_key, object_key)) as zip_file:
+            try:
+                with zip_file.open(file_name) as entry:
+                    yield from self._read_chunks(entry)
+            except KeyError:
+                raise FileNotFoundError(f"File {file_name} not found in {object_key}")
+
+    @timed
+    def get_object_from_archive(
+        self, container_key, object_key, file_name, system_token=None
+    ):
+        """
+        retrieve an object from an archive in the data store
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param file_name: name of the file to get from the zip
+        :param system_token: oauth system token
+        :return content of the file
+        :raises FileNotFoundError: if the object or the file does not exist
+        :raises zipfile.BadZipFile: if the object is not a zip file
+        """
+        return b"".join(self._read_from_archive(container_key, object_key, file_name))
+
+    @timed
+    def get_object_from_archive_streaming(
+        self, container_key, object_key, file_name, system_token=None
+    ):
+        """
+        retrieve an object from an archive in the data storeas a stream
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param system_token: oauth system token
+        :return content of the file as a stream
+        :raises FileNotFoundError: if the object or the file does not exist
+        :raises zipfile.BadZipFile: if the object is not a zip file
+        """
+        yield from self._read_from_archive(container_key, object_key, file_name)
+
+    @timed
+    def replace_file_in_zip_object(
+        self,
+        container_key,
+        object_key,
+        file_to_replace,
+        new_file_content,
+        new_file_name,
+        system_token=None,
+    ):
+        """
+        replace a file in a zip in the data store
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param file_to_replace: name of the file to replace in the zip
+        :param new_file_content: content of the new file
+        :param new_file_name: name of the new file
+        :param system_token: oauth system token
+        :return container and object key of the updated zip file
+        :raises FileNotFoundError: if the object does not exist
+        :raises zipfile.BadZipFile: if the object is not a zip file
+        """
+        path = self._object_path(container_key, object_key)
+
+        def write(f):
+            with zipfile.ZipFile(path) as zip_file, zipfile.ZipFile(f, "w") as new_zip:
+                for info in zip_file.infolist():
+                    if info.filename == file_to_replace:
+                        continue
+                    with zip_file.open(info) as source, new_zip.open(info, "w") as dest:
+                        shutil.copyfileobj(source, dest, CHUNK_SIZE)
+                with new_zip.open(new_file_name, "w") as dest:
+                    if hasattr(new_file_content, "read"):
+                        shutil.copyfileobj(new_file_content, dest, CHUNK_SIZE)
+                    else:
+                        dest.write(new_file_content)
+
+        self._write_atomic(path, write)
+        return {"container_key": container_key, "object_key": object_key}
+
+
+def _copy_file(source, dest):
+    """
+    Copy between two open files in the kernel with sendfile when possible.
+    """
+    size = os.fstat(source.fileno()).st_size
+    offset = 0
+    if hasattr(os, "sendfile"):
+        try:
+            while offset < size:
+                sent = os.sendfile(dest.fileno(), source.fileno(), offset, size - offset)
+                if sent == 0:
+                    break
+                offset += sent
+        except OSError:
+            pass  # not supported for files on this platform
+    source.seek(offset)
+    dest.seek(offset)
+    shutil.copyfileobj(source, dest, CHUNK_SIZE)
@@ -0,0 +1,534 @@
+import hashlib
+import io
+import threading
+import time
+import uuid
+import zipfile
+from datetime import datetime
+from datetime import timezone
+
+from storageprovider.providers import BaseStorageProvider
+from storageprovider.providers import BufferTooSmallException
+from storageprovider.providers import ObjectInfo
+from storageprovider.providers import writable_view
+from storageprovider.timing import TimingRecorder
+from storageprovider.timing import timed
+from storageprovider.utils import iter_archive
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class StoredObject:
+    def __init__(self, data, content_type="application/octet-stream"):
+        self.data = bytes(data)
+        self.content_type = content_type
+        self.last_modified = datetime.now(timezone.utc)
+        self.etag = hashlib.md5(self.data).hexdigest()
+
+    @property
+    def metadata(self):
+        return {
+            "time_last_modification": self.last_modified,
+            "mime": self.content_type,
+            "size": len(self.data),
+            "content-type": self.content_type,
+            "content-length": len(self.data),
+            "etag": self.etag,
+        }
+
+
+class InMemoryProvider(BaseStorageProvider):
+    """
+    Storage provider keeping all containers in memory.
+
+    Meant for tests and benchmarks: it behaves like a real backend, including
+    container zip exports and archive entries, without any network traffic.
+    Latency and bandwidth of a remote backend can be simulated.
+    """
+
+    def __init__(
+        self, latency=0.0, bandwidth=None, sleep=time.sleep, slow_call_threshold=None
+    ):
+        """
+        :param latency: seconds added to every call
+        :param bandwidth: transfer speed in bytes per second, None for unlimited
+        :param sleep: function used to wait, replace it to simulate time
+            deterministically
+        :param slow_call_threshold: log calls taking longer than this many seconds
+        """
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.sleep = sleep
+        self.timing = TimingRecorder(slow_call_threshold=slow_call_threshold)
+        self.containers = {}
+        self.lock = threading.Lock()
+
+    def _simulate(self, size=0, latency=True):
+        delay = self.latency if latency else 0.0
+        if self.bandwidth and size:
+            delay += size / self.bandwidth
+        if delay > 0:
+            self.sleep(delay)
+
+    def _container(self, container_key):
+        try:
+            return self.containers[container_key]
+        except KeyError:
+            raise NotFoundException(f"Container {container_key} not found")
+
+    def _get(self, container_key, object_key) -> StoredObject:
+        with self.lock:
+            try:
+                return self._container(container_key)[object_key]
+            except KeyError:
+                raise NotFoundException(
+                    f"Object {object_key} not found in container {container_key}"
+                )
+
+    def _put(self, container_key, object_key, data):
+        if hasattr(data, "read"):
+            data = data.read()
+        elif not isinstance(data, (bytes, bytearray, memoryview)):
+            data = b"".join(data)
+        stored = StoredObject(data)
+        self._simulate(len(stored.data))
+        with self.lock:
+            self.containers.setdefault(container_key, {})[object_key] = stored
+        return stored
+
+    def _stream(self, data, chunk_size=CHUNK_SIZE):
+        self._simulate()
+        for i in range(0, len(data), chunk_size):
+            chunk = data[i : i + chunk_size]
+            self._simulate(len(chunk), latency=False)
+            yield chunk
+
+    def _zip_entries(self, container_key, translations):
+        with self.lock:
+            objects = dict(self._container(container_key))
+        for object_key, stored in objects.items():
+            yield (
+                translations.get(object_key, object_key),
+                len(stored.data),
+                self._stream(stored.data),
+            )
+
+    def _archive(self, container_key, object_key):
+        stored = self._get(container_key, object_key)
+        try:
+            return zipfile.ZipFile(io.BytesIO(stored.data))
+        except zipfile.BadZipFile:
+            raise InvalidArchiveException(f"Object {object_key} is not a zip file")
+
+    @timed
+    def delete_object(self, container_key, object_key, system_token=None):
+        """
+        delete an object from the data store
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param system_token: oauth system token
+        :raises NotFoundException: if the object does not exist
+        """
+        self._simulate()
+        with self.lock:
+            if self._container(container_key).pop(object_key, None) is None:
+                raise NotFoundException(
+                    f"Object {object_key} not found in container {container_key}"
+                )
+
+    @timed
+    def get_object_streaming(self, container_key, object_key, system_token=None):
+        """
+        retrieve an object from the data store as a stream
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param system_token: oauth system token
+        :return content of the object as a stream
+        :raises NotFoundException: if the object does not exist
+        """
+        yield from self._stream(self._get(container_key, object_key).data)
+
+    @timed
+    def get_object(self, container_key, object_key, system_token=None):
+        """
+        retrieve an object from the data store
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param system_token: oauth system token
+        :return content of the object
+        :raises NotFoundException: if the object does not exist
+        """
+        stored = self._get(container_key, object_key)
+        self._simulate(len(stored.data))
+        return stored.data
+
+    @timed
+    def get_object_into(self, container_key, object_key, buffer, system_token=None):
+        """
+        retrieve an object from the data store into a writable buffer, e.g. a
+        bytearray, mmap or shared memory
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param buffer: writable buffer the object is written to
+        :param system_token: oauth system token
+        :return number of bytes written
+        :raises BufferTooSmallException: if the object does not fit in the buffer
+        :raises NotFoundException: if the object does not exist
+        """
+        view = writable_view(buffer)
+        data = self._get(container_key, object_key).data
+        if len(data) > len(view):
+            raise BufferTooSmallException(len(view), len(data))
+        self._simulate(len(data))
+        view[: len(data)] = data
+        return len(data)
+
+    @timed
+    def get_object_range_streaming(
+        self, container_key, object_key, offset, length=None, system_token=None
+    ):
+        """
+        retrieve part of an object from the data store as a stream
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param offset: position of the first byte
+        :param length: number of bytes, None to read up to the end
+        :param system_token: oauth system token
+        :return content of the range as a stream
+        :raises NotFoundException: if the object does not exist
+        """
+        data = self._get(container_key, object_key).data
+        end = None if length is None else offset + length
+        yield from self._stream(data[offset:end])
+
+    @timed
+    def get_object_and_metadata(self, container_key, object_key, system_token=None):
+        """
+        retrieve an object from the data store and also return header meta data
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param system_token: oauth system token
+        :return content of the object
+        :raises NotFoundException: if the object does not exist
+        """
+        stored = self._get(container_key, object_key)
+        self._simulate(len(stored.data))
+        return {"object": stored.data, "metadata": stored.metadata}
+
+    @timed
+    def get_object_metadata(self, container_key, object_key, system_token=None):
+        """
+        retrieve an object from the data store
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param system_token: oauth system token
+        :return headers of the object
+        :raises NotFoundException: if the object does not exist
+        """
+        stored = self._get(container_key, object_key)
+        self._simulate()
+        return stored.metadata
+
+    @timed
+    def object_exists(self, container_key, object_key, system_token=None):
+        """
+        check if an object exists in the data store
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param system_token: oauth system token
+        :return True if the object exists
+        """
+        self._simulate()
+        with self.lock:
+            return object_key in self.containers.get(container_key, {})
+
+    @timed
+    def objects_exist(self, container_key, object_keys, system_token=None):
+        """
+        check which objects exist in a container of the data store
+
+        :param container_key: key of the container in the data store
+        :param object_keys: keys of the objects to check
+        :param system_token: oauth system token
+        :return dict with True for every object key that exists, else False
+        """
+        self._simulate()
+        with self.lock:
+            container = self.containers.get(container_key, {})
+            return {object_key: object_key in container for object_key in object_keys}
+
+    @timed
+    def copy_object_and_create_key(
+        self,
+        source_container_key,
+        source_object_key,
+        output_container_key,
+        system_token=None,
+    ):
+        """
+        Copy an object and create key in the data store
+
+        :param source_container_key: key of the source container in the data store
+        :param source_object_key: key of the source object in the container
+        :param output_container_key: key of output container in the data store
+        :param system_token: oauth system token
+        :raises NotFoundException: if the source object does not exist
+        """
+        output_object_key = str(uuid.uuid4())
+        self.copy_object(
+            source_container_key,
+            source_object_key,
+            output_container_key,
+            output_object_key,
+        )
+        return output_object_key
+
+    @timed
+    def copy_object(
+        self,
+        source_container_key,
+        source_object_key,
+        output_container_key,
+        output_object_key,
+        system_token=None,
+    ):
+        """
+        Copy an object in the data store to specific key
+
+        :param source_container_key: key of the source container in the data store
+        :param source_object_key: key of the source object in the container
+        :param output_container_key: key of output container in the data store
+        :param output_object_key: specific object key for the output object in the container
+        :param system_token: oauth system token
+        :raises NotFoundException: if the source object does not exist
+        """
+        stored = self._get(source_container_key, source_object_key)
+        self._simulate()
+        with self.lock:
+            container = self.containers.setdefault(output_container_key, {})
+            container[output_object_key] = StoredObject(
+                stored.data, stored.content_type
+            )
+
+    @timed
+    def update_object_and_key(self, container_key, object_data, system_token=None):
+        """
+        create an object and key in the data store
+
+         :param container_key: key of the container in the data store
+         :param object_data: data of the object
+         :param system_token: oauth system token
+        """
+        object_key = str(uuid.uuid4())
+        self._put(container_key, object_key, object_data)
+        return object_key
+
+    @timed
+    def update_object(self, container_key, object_key, object_data, system_token=None):
+        """
+        update (or create) an object in the data store
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param object_data: data of the object
+        :param system_token: oauth system token
+        """
+        self._put(container_key, object_key, object_data)
+
+    @timed
+    def list_object_keys_for_container(self, container_key, system_token=None):
+        """
+        list all object keys for a container in the data store
+
+        :param container_key: key of the container in the data store
+        :param system_token: oauth system token
+        :return list of object keys found in the container
+        :raises NotFoundException: if the container does not exist
+        """
+        self._simulate()
+        with self.lock:
+            return sorted(self._container(container_key))
+
+    @timed
+    def list_objects_with_metadata(self, container_key, system_token=None):
+        """
+        list all objects of a container with their size, content type, etag and
+        time of last modification
+
+        :param container_key: key of the container in the data store
+        :param system_token: oauth system token
+        :return list of ObjectInfo
+        :raises NotFoundException: if the container does not exist
+        """
+        self._simulate()
+        with self.lock:
+            return [
+                ObjectInfo.from_metadata(object_key, stored.metadata)
+                for object_key, stored in sorted(self._container(container_key).items())
+            ]
+
+    @timed
+    def get_container_data_streaming(
+        self, container_key, system_token=None, translations=None, archive_format="zip"
+    ):
+        """
+        Retrieve a zip of a container in the data store as a stream
+        :param container_key: key of the container in the data store
+        :param system_token: oauth system token
+        :param translations: Dict of object IDs and file names to use for them.
+        :param archive_format: ``zip``, ``tar``, ``tar.gz`` or ``tar.zst``
+        :return zip of objects as a stream
+        :raises NotFoundException: if the container does not exist
+        """
+        entries = self._zip_entries(container_key, translations or {})
+        yield from iter_archive(entries, archive_format)
+
+    @timed
+    def get_container_data(
+        self, container_key, system_token=None, translations=None, archive_format="zip"
+    ):
+        """
+        Retrieve a zip of a container in the data store.
+
+        :param container_key: key of the container in the data store
+        :param system_token: oauth system token
+        :param translations: Dict of object IDs and file names to use for them.
+        :param archive_format: ``zip``, ``tar``, ``tar.gz`` or ``tar.zst``
+        :return zip of the objects in the container
+        :raises NotFoundException: if the container does not exist
+        """
+        entries = self._zip_entries(container_key, translations or {})
+        return b"".join(iter_archive(entries, archive_format))
+
+    @timed
+    def create_container(self, container_key, system_token=None):
+        """
+        create a new container with specific key in the data store
+
+        :param container_key: key of the container in the data store
+        :param system_token: oauth system token
+        """
+        self._simulate()
+        with self.lock:
+            self.containers.setdefault(container_key, {})
+
+    @timed
+    def create_container_and_key(self, system_token=None):
+        """
+        create a new container in the data store and generate key
+
+        :param system_token: oauth system token
+        :return the key generated for the container
+        """
+        container_key = str(uuid.uuid4())
+        self.create_container(container_key)
+        return container_key
+
+    @timed
+    def delete_container(self, container_key, system_token=None):
+        """
+        delete a container in the data store
+
+        :param container_key: key of the container in the data store
+        :param system_token: oauth system token
+        :raises NotFoundException: if the container does not exist
+        """
+        self._simulate()
+        with self.lock:
+            self._container(container_key)
+            del self.containers[container_key]
+
+    @timed
+    def get_object_from_archive(
+        self, container_key, object_key, file_name, system_token=None
+    ):
+        """
+        retrieve an object from an archive in the data store
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param file_name: name of the file to get from the zip
+        :param system_token: oauth system token
+        :return content of the file
+        :raises NotFoundException: if the object or the file does not exist
+        :raises InvalidArchiveException: if the object is not a zip file
+        """
+        with self._archive(container_key, object_key) as zip_file:
+            try:
+                content = zip_file.read(file_name)
+            except KeyError:
+                raise NotFoundException(f"File {file_name} not found in {object_key}")
+        self._simulate(len(content))
+        return content
+
+    @timed
+    def get_object_from_archive_streaming(
+        self, container_key, object_key, file_name, system_token=None
+    ):
+        """
+        retrieve an object from an archive in the data storeas a stream
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param system_token: oauth system token
+        :return content of the file as a stream
+        :raises NotFoundException: if the object or the file does not exist
+        :raises InvalidArchiveException: if the object is not a zip file
+        """
+        with self._archive(container_key, object_key) as zip_file:
+            try:
+                content = zip_file.read(file_name)
+            except KeyError:
+                raise NotFoundException(f"File {file_name} not found in {object_key}")
+        yield from self._stream(content)
+
+    @timed
+    def replace_file_in_zip_object(
+        self,
+        container_key,
+        object_key,
+        file_to_replace,
+        new_file_content,
+        new_file_name,
+        system_token=None,
+    ):
+        """
+        replace a file in a zip in the data store
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param file_to_replace: name of the file to replace in the zip
+        :param new_file_content: content of the new file
+        :param new_file_name: name of the new file
+        :param system_token: oauth system token
+        :return container and object key of the updated zip file
+        :raises NotFoundException: if the object does not exist
+        :raises InvalidArchiveException: if the object is not a zip file
+        """
+        if hasattr(new_file_content, "read"):
+            new_file_content = new_file_content.read()
+        buffer = io.BytesIO()
+        with self._archive(container_key, object_key) as zip_file:
+            with zipfile.ZipFile(buffer, "w") as new_zip:
+                for info in zip_file.infolist():
+                    if info.filename != file_to_replace:
+                        new_zip.writestr(info, zip_file.read(info))
+                new_zip.writestr(new_file_name, new_file_content)
+        self._put(container_key, object_key, buffer.getvalue())
+        return {"container_key": container_key, "object_key": object_key}
+
+
+class NotFoundException(Exception):
+    """
+    Raised when a container, object or archive entry does not exist.
+    """
+
+
+class InvalidArchiveException(Exception):
+    """
+    Raised when an archive operation is done on an object that is no zip file.
+    """
@@ -1,49 +1,207 @@
 import concurrent
+import hashlib
 import io
+import json
+import math
+import os
 import uuid
 import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from datetime import timedelta
+from datetime import timezone
 
 from minio.commonconfig import CopySource
-
+from minio.datatypes import Part
+from minio.error import S3Error
+
+from storageprovider.checksum import MULTIPART_PART_SIZE
+from storageprovider.checksum import Checksums
+from storageprovider.checksum import ChecksumVerifier
+from storageprovider.pairtree import clean_identifier
+from storageprovider.pairtree import id_to_pairtree_path
 from storageprovider.providers import BaseStorageProvider
+from storageprovider.providers import ObjectInfo
+from storageprovider.providers import concurrent_map
+from storageprovider.providers import readinto_buffer
+from storageprovider.providers import writable_view
+from storageprovider.timing import TimingRecorder
+from storageprovider.timing import timed
+from storageprovider.utils import ExpiringSet
 
 from minio import Minio
 
 
+MIN_PART_SIZE = 5 * 1024 * 1024
+MAX_PART_SIZE = 5 * 1024 * 1024 * 1024
+MAX_PARTS = 10000
+COPY_PART_SIZE = 256 * 1024 * 1024
+# error codes of a CopyObject refused because the source is too large
+COPY_TOO_LARGE_CODES = ("EntityTooLarge", "InvalidRequest")
+# headers of the source object carried over to a multipart copy
+COPY_HEADERS = {
+    "cache-control",
+    "content-disposition",
+    "content-encoding",
+    "content-language",
+    "content-type",
+    "expires",
+}
+
+
 class MinioProvider(BaseStorageProvider):
-    def __init__(self, server_url, access_key, secret_key, bucket_name):
+    exists_listing_threshold = 20
+
+    def __init__(
+        self,
+        server_url,
+        access_key,
+        secret_key,
+        bucket_name,
+        slow_call_threshold=None,
+        missing_cache_ttl=None,
+        multipart_copy_threshold=None,
+        copy_part_size=COPY_PART_SIZE,
+        copy_workers=8,
+        checksums=None,
+    ):
+        """
+        :param server_url: host and port of the MinIO server
+        :param access_key: MinIO access key
+        :param secret_key: MinIO secret key
+        :param bucket_name: bucket holding the containers
+        :param slow_call_threshold: log calls taking longer than this many seconds
+        :param missing_cache_ttl: seconds object_exists remembers that an object
+            does not exist, None to always ask MinIO
+        :param multipart_copy_threshold: objects larger than this many bytes are
+            copied with concurrent server-side part copies, at the cost of a
+            stat before every copy. None to only copy in parts the objects a
+            single CopyObject refuses (larger than 5 GiB)
+        :param copy_part_size: size in bytes of one part copy, raised when the
+            object would need more than 10000 parts
+        :param copy_workers: number of part copies running at the same time
+        :param checksums: algorithms (e.g. ``("md5", "sha256")``) computed while
+            uploading and streaming objects and checked against the ETag, the
+            result is available as ``checksums.last``
+        """
+        if not MIN_PART_SIZE <= copy_part_size <= MAX_PART_SIZE:
+            raise ValueError(
+                f"copy_part_size must be between {MIN_PART_SIZE} and {MAX_PART_SIZE}"
+            )
         self.bucket_name = bucket_name
         self.client = Minio(
             server_url, access_key=access_key, secret_key=secret_key, secure=False
         )
+        self.timing = TimingRecorder(slow_call_threshold=slow_call_threshold)
+        self.missing_objects = ExpiringSet(missing_cache_ttl)
+        self.multipart_copy_threshold = multipart_copy_threshold
+        self.copy_part_size = copy_part_size
+        self.copy_workers = copy_workers
+        self.checksums = ChecksumVerifier(checksums) if checksums else None
 
     def _clean_identifier(self, identifier: str) -> str:
-        """
-        https://datatracker.ietf.org/doc/html/draft-kunze-pairtree-01#section-3
-        """
-        chars_to_hex = '"*+,<=>?\^|'
-        chars_conversion = {"/": "=", ":": "+", ".": ","}
-        cleaned = []
+        return clean_identifier(identifier)
 
-        for c in identifier:
-            c_dec = ord(c)
-            if c_dec >= 33 and c_dec <= 126 and c not in chars_to_hex:
-                c_lower = c.lower()
-                cleaned.append(c_lower)
-            elif c in chars_to_hex:
-                cleaned.append("^" + format(ord(c), "x"))
+    def _id_to_pairtree_path(self, identifier: str) -> str:
+        return id_to_pairtree_path(identifier)
 
-        converted = [chars_conversion.get(char, char) for char in cleaned]
-        return "".join(converted)
+    def _put(self, container_key, object_key, object_data):
+        checksums = None
+        if self.checksums is not None:
+            object_data, checksums = self.checksums.wrap_upload(
+                object_data, MULTIPART_PART_SIZE
+            )
+        result = self.client.put_object(
+            self.bucket_name,
+            f"{self._id_to_pairtree_path(container_key)}{object_key}",
+            object_data,
+            length=-1,
+            part_size=MULTIPART_PART_SIZE,
+        )
+        if checksums is not None:
+            self.checksums.verify(checksums, result.etag, container_key, object_key)
 
-    def _id_to_pairtree_path(self, identifier: str) -> str:
+    def _copy(self, source_name, output_name):
         """
-        Converts a cleaned identifier to a PairTree path using 2-character segments.
+        Copy an object within the bucket without downloading it.
+
+        Without a multipart_copy_threshold an object is copied with a single
+        CopyObject request, without a stat first. Only when that is refused
+        because the object is too large, it is stat-ed and copied with a
+        multipart upload whose parts are copied server-side (UploadPartCopy)
+        concurrently, which lifts the 5 GiB limit of CopyObject. With a
+        threshold the object is stat-ed first and copied in parts when it is
+        larger than the threshold.
         """
-        cleaned = self._clean_identifier(identifier)
-        segments = [cleaned[i : i + 2] for i in range(0, len(cleaned), 2)]
-        return "/".join(segments) + "/"
+        if self.multipart_copy_threshold is None:
+            try:
+                self._copy_object(source_name, output_name)
+                return
+            except S3Error as e:
+                if e.code not in COPY_TOO_LARGE_CODES:
+                    raise
+                stat = self.client.stat_object(self.bucket_name, source_name)
+                if stat.size <= MAX_PART_SIZE:
+                    raise
+        else:
+            stat = self.client.stat_object(self.bucket_name, source_name)
+            if stat.size <= self.multipart_copy_threshold:
+                self._copy_object(source_name, output_name)
+                return
+        self._copy_parts(source_name, output_name, stat)
+
+    def _copy_object(self, source_name, output_name):
+        # minio's copy_object stats the source before copying it
+        self.client._execute(
+            "PUT",
+            self.bucket_name,
+            object_name=output_name,
+            headers=CopySource(self.bucket_name, source_name).gen_copy_headers(),
+        )
 
+    def _copy_parts(self, source_name, output_name, stat):
+        part_size = max(self.copy_part_size, math.ceil(stat.size / MAX_PARTS))
+        # copy exactly the version that was stat-ed
+        source_headers = CopySource(
+            self.bucket_name, source_name, match_etag=stat.etag
+        ).gen_copy_headers()
+        # a multipart upload starts without metadata, carry over that of the source
+        headers = {
+            key: value
+            for key, value in stat.metadata.items()
+            if key.lower() in COPY_HEADERS or key.lower().startswith("x-amz-meta-")
+        }
+        if not any(key.lower() == "content-type" for key in headers):
+            headers["Content-Type"] = "application/octet-stream"
+        upload_id = self.client._create_multipart_upload(
+            self.bucket_name, output_name, headers
+        )
+
+        def copy_part(part_number):
+            offset = (part_number - 1) * part_size
+            end = min(offset + part_size, stat.size) - 1
+            headers = dict(source_headers)
+            headers["x-amz-copy-source-range"] = f"bytes={offset}-{end}"
+            etag, _ = self.client._upload_part_copy(
+                self.bucket_name, output_name, upload_id, part_number, headers
+            )
+            return Part(part_number, etag)
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.copy_workers) as executor:
+                parts = list(
+                    executor.map(
+                        copy_part, range(1, math.ceil(stat.size / part_size) + 1)
+                    )
+                )
+            self.client._complete_multipart_upload(
+                self.bucket_name, output_name, upload_id, parts
+            )
+        except Exception:
+            self.client._abort_multipart_upload(self.bucket_name, output_name, upload_id)
+            raise
+
+    @timed
     def delete_object(self, container_key, object_key, system_token=None):
         """
         delete an object from the data store
@@ -57,6 +215,7 @@ class MinioProvider(BaseStorageProvider):
             self.bucket_name, f"{self._id_to_pairtree_path(container_key)}{object_key}"
         )
 
+    @timed
     def get_object_streaming(self, container_key, object_key, system_token=None):
         """
         retrieve an object from the data store as a stream
@@ -71,11 +230,18 @@ class MinioProvider(BaseStorageProvider):
                 self.bucket_name,
                 f"{self._id_to_pairtree_path(container_key)}{object_key}",
             )
-            yield from response.stream(1024 * 1024)
+            self.timing.mark_ttfb()
+            chunks = response.stream(1024 * 1024)
+            if self.checksums is not None:
+                chunks = self.checksums.wrap_stream(
+                    chunks, response.headers.get("ETag"), container_key, object_key
+                )
+            yield from chunks
         finally:
             response.close()
             response.release_conn()
 
+    @timed
     def get_object(self, container_key, object_key, system_token=None):
         """
         retrieve an object from the data store
@@ -91,11 +257,84 @@ class MinioProvider(BaseStorageProvider):
                 self.bucket_name,
                 f"{self._id_to_pairtree_path(container_key)}{object_key}",
             )
-            return response.read()
+            self.timing.mark_ttfb()
+            data = response.read()
+            if self.checksums is not None:
+                self.checksums.verify_data(
+                    data, response.headers.get("ETag"), container_key, object_key
+                )
+            return data
         finally:
             response.close()
             response.release_conn()
 
+    @timed
+    def get_object_into(self, container_key, object_key, buffer, system_token=None):
+        """
+        retrieve an object from the data store into a writable buffer, e.g. a
+        bytearray, mmap or shared memory
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param buffer: writable buffer the object is written to
+        :param system_token: oauth system token
+        :return number of bytes written
+        :raises BufferTooSmallException: if the object does not fit in the buffer
+        :raises MinioException: if an error executing the request occured
+        """
+        try:
+            response = self.client.get_object(
+                self.bucket_name,
+                f"{self._id_to_pairtree_path(container_key)}{object_key}",
+            )
+            self.timing.mark_ttfb()
+            size = response.headers.get("Content-Length")
+            written = readinto_buffer(
+                response.readinto, buffer, None if size is None else int(size)
+            )
+            if self.checksums is not None:
+                self.checksums.verify_data(
+                    writable_view(buffer)[:written],
+                    response.headers.get("ETag"),
+                    container_key,
+                    object_key,
+                )
+            return written
+        finally:
+            response.close()
+            response.release_conn()
+
+    @timed
+    def get_object_range_streaming(
+        self, container_key, object_key, offset, length=None, system_token=None
+    ):
+        """
+        retrieve part of an object from the data store as a stream
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param offset: position of the first byte
+        :param length: number of bytes, None to read up to the end
+        :param system_token: oauth system token
+        :return content of the range as a stream
+        :raises MinioException: if an error executing the request occured
+        """
+        if length == 0:
+            return
+        response = self.client.get_object(
+            self.bucket_name,
+            f"{self._id_to_pairtree_path(container_key)}{object_key}",
+            offset=offset,
+            length=length or 0,
+        )
+        try:
+            self.timing.mark_ttfb()
+            yield from response.stream(1024 * 1024)
+        finally:
+            response.close()
+            response.release_conn()
+
+    @timed
     def get_object_and_metadata(self, container_key, object_key, system_token=None):
         """
         retrieve an object from the data store and also return header meta data
@@ -115,17 +354,20 @@ class MinioProvider(BaseStorageProvider):
                 self.bucket_name,
                 f"{self._id_to_pairtree_path(container_key)}{object_key}",
             )
+            self.timing.mark_ttfb()
             metadata = {}
             metadata["time_last_modification"] = result.last_modified
             metadata["mime"] = result.content_type
             metadata["size"] = result.size
             metadata["content-type"] = result.content_type
             metadata["content-length"] = result.size
+            metadata["etag"] = result.etag
             return {"object": response.read(), "metadata": metadata}
         finally:
             response.close()
             response.release_conn()
 
+    @timed
     def get_object_metadata(self, container_key, object_key, system_token=None):
         """
         retrieve an object from the data store
@@ -145,8 +387,52 @@ class MinioProvider(BaseStorageProvider):
         metadata["size"] = result.size
         metadata["content-type"] = result.content_type
         metadata["content-length"] = result.size
+        metadata["etag"] = result.etag
         return metadata
 
+    @timed
+    def object_exists(self, container_key, object_key, system_token=None):
+        """
+        check if an object exists in the data store with a HEAD request
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param system_token: oauth system token
+        :return True if the object exists
+        :raises MinioException: if an error executing the request occured
+        """
+        if (container_key, object_key) in self.missing_objects:
+            return False
+        try:
+            self.client.stat_object(
+                self.bucket_name,
+                f"{self._id_to_pairtree_path(container_key)}{object_key}",
+            )
+        except S3Error as e:
+            if e.code != "NoSuchKey":
+                raise
+            self.missing_objects.add((container_key, object_key))
+            return False
+        return True
+
+    @timed
+    def objects_exist(self, container_key, object_keys, system_token=None):
+        """
+        check which objects exist in a container of the data store
+
+        :param container_key: key of the container in the data store
+        :param object_keys: keys of the objects to check
+        :param system_token: oauth system token
+        :return dict with True for every object key that exists, else False
+        :raises MinioException: if an error executing the request occured
+        """
+        result = super().objects_exist(container_key, object_keys, system_token)
+        for object_key, exists in result.items():
+            if not exists:
+                self.missing_objects.add((container_key, object_key))
+        return result
+
+    @timed
     def copy_object_and_create_key(
         self,
         source_container_key,
@@ -164,16 +450,13 @@ class MinioProvider(BaseStorageProvider):
         :raises MinioException: if an error executing the request occured
         """
         output_object_key = str(uuid.uuid4())
-        self.client.copy_object(
-            self.bucket_name,
+        self._copy(
+            f"{self._id_to_pairtree_path(source_container_key)}{source_object_key}",
             f"{self._id_to_pairtree_path(output_container_key)}{output_object_key}",
-            CopySource(
-                self.bucket_name,
-                f"{self._id_to_pairtree_path(source_container_key)}{source_object_key}",
-            ),
         )
         return output_object_key
 
+    @timed
     def copy_object(
         self,
         source_container_key,
@@ -192,15 +475,13 @@ class MinioProvider(BaseStorageProvider):
         :param system_token: oauth system token
         :raises MinioException: if an error executing the request occured
         """
-        self.client.copy_object(
-            self.bucket_name,
+        self._copy(
+            f"{self._id_to_pairtree_path(source_container_key)}{source_object_key}",
             f"{self._id_to_pairtree_path(output_container_key)}{output_object_key}",
-            CopySource(
-                self.bucket_name,
-                f"{self._id_to_pairtree_path(source_container_key)}{source_object_key}",
-            ),
         )
+        self.missing_objects.discard((output_container_key, output_object_key))
 
+    @timed
     def update_object_and_key(self, container_key, object_data, system_token=None):
         """
         create an object and key in the data store
@@ -211,15 +492,10 @@ class MinioProvider(BaseStorageProvider):
          :raises MinioException: if an error executing the request occured
         """
         object_key = str(uuid.uuid4())
-        self.client.put_object(
-            self.bucket_name,
-            f"{self._id_to_pairtree_path(container_key)}{object_key}",
-            object_data,
-            length=-1,
-            part_size=10 * 1024 * 1024,
-        )
+        self._put(container_key, object_key, object_data)
         return object_key
 
+    @timed
     def update_object(self, container_key, object_key, object_data, system_token=None):
         """
         update (or create) an object in the data store
@@ -230,14 +506,210 @@ class MinioProvider(BaseStorageProvider):
         :param system_token: oauth system token
         :raises MinioException: if an error executing the request occured
         """
-        self.client.put_object(
-            self.bucket_name,
-            f"{self._id_to_pairtree_path(container_key)}{object_key}",
-            object_data,
-            length=-1,
-            part_size=10 * 1024 * 1024,
+        self._put(container_key, object_key, object_data)
+        self.missing_objects.discard((container_key, object_key))
+
+    def _uploaded_parts(self, object_name, upload_id):
+        """
+        :return: {part number: Part} of a multipart upload, None if the upload
+            no longer exists
+        """
+        parts = {}
+        marker = None
+        while True:
+            try:
+                result = self.client._list_parts(
+                    self.bucket_name, object_name, upload_id, part_number_marker=marker
+                )
+            except S3Error as e:
+                if e.code != "NoSuchUpload":
+                    raise
+                return None
+            for part in result.parts:
+                parts[part.part_number] = part
+            if not result.is_truncated:
+                return parts
+            marker = result.next_part_number_marker
+
+    @staticmethod
+    def _save_upload_state(state_path, state):
+        temp_path = f"{state_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, state_path)
+
+    def _resume_upload(self, object_name, state_path, part_size, content_type):
+        """
+        :return: (upload id, {part number: Part} already uploaded)
+        """
+        try:
+            with open(state_path, encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = {}
+        if (
+            state.get("object_name") == object_name
+            and state.get("part_size") == part_size
+            and state.get("content_type", "application/octet-stream") == content_type
+        ):
+            parts = self._uploaded_parts(object_name, state["upload_id"])
+            if parts is not None:
+                return state["upload_id"], parts
+        upload_id = self.client._create_multipart_upload(
+            self.bucket_name, object_name, {"Content-Type": content_type}
+        )
+        self._save_upload_state(
+            state_path,
+            {
+                "object_name": object_name,
+                "upload_id": upload_id,
+                "part_size": part_size,
+                "content_type": content_type,
+            },
+        )
+        if state.get("object_name") and state.get("upload_id"):
+            # the upload in the old state is superseded, don't leave its parts
+            try:
+                self.client._abort_multipart_upload(
+                    self.bucket_name, state["object_name"], state["upload_id"]
+                )
+            except S3Error:
+                pass  # already gone, or left to abort_stale_uploads
+        return upload_id, {}
+
+    @timed
+    def update_object_resumable(
+        self,
+        container_key,
+        object_key,
+        object_data,
+        state_path,
+        system_token=None,
+        part_size=MULTIPART_PART_SIZE,
+        content_type=None,
+    ):
+        """
+        update (or create) an object in the data store with a multipart upload
+        that survives restarts
+
+        The upload id is kept in ``state_path``. When the upload is started
+        again with the same state file, the parts MinIO already has are read
+        from object_data and only uploaded again when their md5 differs.
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param object_data: path or binary file object of the data
+        :param state_path: file keeping the state of the upload
+        :param system_token: oauth system token
+        :param part_size: size in bytes of one part
+        :param content_type: Content-Type of the object, defaults to
+            ``application/octet-stream``
+        :raises MinioException: if an error executing the request occured
+        """
+        content_type = content_type or "application/octet-stream"
+        if not MIN_PART_SIZE <= part_size <= MAX_PART_SIZE:
+            raise ValueError(
+                f"part_size must be between {MIN_PART_SIZE} and {MAX_PART_SIZE}"
+            )
+        if isinstance(object_data, (str, os.PathLike)):
+            with open(object_data, "rb") as f:
+                self._put_resumable(
+                    container_key, object_key, f, state_path, part_size, content_type
+                )
+        else:
+            self._put_resumable(
+                container_key,
+                object_key,
+                object_data,
+                state_path,
+                part_size,
+                content_type,
+            )
+        self.missing_objects.discard((container_key, object_key))
+
+    def _put_resumable(
+        self, container_key, object_key, object_data, state_path, part_size, content_type
+    ):
+        object_name = f"{self._id_to_pairtree_path(container_key)}{object_key}"
+        upload_id, uploaded = self._resume_upload(
+            object_name, state_path, part_size, content_type
         )
+        checksums = None
+        if self.checksums is not None:
+            checksums = Checksums(self.checksums.algorithms, part_size)
+        parts = []
+        part_number = 1
+        while True:
+            data = object_data.read(part_size)
+            if not data and parts:
+                break
+            if checksums is not None:
+                checksums.update(data)
+            part = uploaded.get(part_number)
+            md5 = hashlib.md5(data).hexdigest()
+            if part is None or part.etag.strip('"') != md5:
+                etag = self.client._upload_part(
+                    self.bucket_name, object_name, data, None, upload_id, part_number
+                )
+                part = Part(part_number, etag)
+                uploaded[part_number] = part
+                self._save_upload_state(
+                    state_path,
+                    {
+                        "object_name": object_name,
+                        "upload_id": upload_id,
+                        "part_size": part_size,
+                        "content_type": content_type,
+                        "parts": {
+                            str(n): p.etag for n, p in sorted(uploaded.items())
+                        },
+                    },
+                )
+            parts.append(Part(part_number, part.etag.strip('"')))
+            if len(data) < part_size:
+                break
+            part_number += 1
+        result = self.client._complete_multipart_upload(
+            self.bucket_name, object_name, upload_id, parts
+        )
+        os.unlink(state_path)
+        if checksums is not None:
+            self.checksums.verify(checksums, result.etag, container_key, object_key)
+
+    def abort_stale_uploads(self, older_than=24 * 60 * 60, container_key=None):
+        """
+        abort incomplete multipart uploads, e.g. of resumable uploads that
+        were never finished
 
+        :param older_than: only abort uploads started this many seconds ago
+        :param container_key: only abort uploads of objects in this container
+        :return: names of the objects whose uploads were aborted
+        """
+        prefix = self._id_to_pairtree_path(container_key) if container_key else None
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=older_than)
+        aborted = []
+        key_marker = upload_id_marker = None
+        while True:
+            result = self.client._list_multipart_uploads(
+                self.bucket_name,
+                prefix=prefix,
+                key_marker=key_marker,
+                upload_id_marker=upload_id_marker,
+            )
+            for upload in result.uploads:
+                if upload.initiated_time is None or upload.initiated_time < cutoff:
+                    self.client._abort_multipart_upload(
+                        self.bucket_name, upload.object_name, upload.upload_id
+                    )
+                    aborted.append(upload.object_name)
+            if not result.is_truncated:
+                return aborted
+            key_marker = result.next_key_marker
+            upload_id_marker = result.next_upload_id_marker
+
+    @timed
     def list_object_keys_for_container(self, container_key, system_token=None):
         """
         list all object keys for a container in the data store
@@ -252,31 +724,106 @@ class MinioProvider(BaseStorageProvider):
         )
         return objects
 
+    def list_object_keys(self, container_key, system_token=None):
+        """
+        list all object keys for a container as a list of strings
+
+        :param container_key: key of the container in the data store
+        :param system_token: oauth system token
+        :return list of object keys found in the container
+        :raises MinioException: if an error executing the request occured
+        """
+        return list(self._iter_object_keys(container_key, system_token))
+
+    def _iter_object_keys(self, container_key, system_token=None):
+        for obj in self.list_object_keys_for_container(container_key, system_token):
+            if not obj.is_dir:
+                yield obj.object_name.rsplit("/", 1)[-1]
+
+    @timed
+    def list_objects_with_metadata(self, container_key, system_token=None):
+        """
+        list all objects of a container with their size, content type, etag and
+        time of last modification
+
+        Everything is taken from a single listing that includes the user
+        metadata; objects whose content type is missing there are stat-ed a
+        few at the same time.
+
+        :param container_key: key of the container in the data store
+        :param system_token: oauth system token
+        :return list of ObjectInfo
+        :raises MinioException: if an error executing the request occured
+        """
+        prefix = self._id_to_pairtree_path(container_key)
+        infos = []
+        for obj in self.client.list_objects(
+            self.bucket_name, prefix=prefix, include_user_meta=True
+        ):
+            if obj.is_dir:
+                continue
+            metadata = {
+                key.lower(): value for key, value in (obj.metadata or {}).items()
+            }
+            infos.append(
+                ObjectInfo(
+                    obj.object_name[len(prefix):],
+                    obj.size,
+                    metadata.get("content-type"),
+                    obj.etag,
+                    obj.last_modified,
+                )
+            )
+
+        def stat(info):
+            info.content_type = self.client.stat_object(
+                self.bucket_name, f"{prefix}{info.key}"
+            ).content_type
+
+        concurrent_map(stat, [info for info in infos if info.content_type is None])
+        return infos
+
+    @timed
     def get_container_data_streaming(
-        self, container_key, system_token=None, translations=None
+        self, container_key, system_token=None, translations=None, archive_format="zip"
     ):
         """
         Retrieve a zip of a container in the data store as a stream
         :param container_key: key of the container in the data store
         :param system_token: oauth system token
         :param translations: Dict of object IDs and file names to use for them.
+        :param archive_format: ``zip``, ``tar``, ``tar.gz`` or ``tar.zst``
         :return zip of objects as a stream
         :raises MinioException: if an error executing the request occured
         """
+        if archive_format != "zip":
+            return self._tar_container(
+                container_key, system_token, translations, archive_format
+            )
         raise NotImplementedError(
             "get_container_data_streaming is not implemented for MinioProvider"
         )
 
-    def get_container_data(self, container_key, system_token=None, translations=None):
+    @timed
+    def get_container_data(
+        self, container_key, system_token=None, translations=None, archive_format="zip"
+    ):
         """
         Retrieve a zip of a container in the data store.
 
         :param container_key: key of the container in the data store
         :param system_token: oauth system token
         :param translations: Dict of object IDs and file names to use for them.
+        :param archive_format: ``zip``, ``tar``, ``tar.gz`` or ``tar.zst``
         :return list of object keys found in the container
         :raises MinioException: if an error executing the request occured
         """
+        if archive_format != "zip":
+            return b"".join(
+                self._tar_container(
+                    container_key, system_token, translations, archive_format
+                )
+            )
         translations = translations or {}
 
         def fetch_object(object_key):
@@ -320,6 +867,7 @@ class MinioProvider(BaseStorageProvider):
         zip_buffer.seek(0)
         return zip_buffer.read()
 
+    @timed
     def create_container(self, container_key, system_token=None):
         """
         create a new container with specific key in the data store
@@ -332,6 +880,7 @@ class MinioProvider(BaseStorageProvider):
             "create_container is not implemented for MinioProvider"
         )
 
+    @timed
     def create_container_and_key(self, system_token=None):
         """
         create a new container in the data store and generate key
@@ -344,6 +893,7 @@ class MinioProvider(BaseStorageProvider):
             "create_container_and_key is not implemented for MinioProvider"
         )
 
+    @timed
     def delete_container(self, container_key, system_token=None):
         """
         delete a container in the data store
@@ -360,6 +910,7 @@ class MinioProvider(BaseStorageProvider):
         for obj in objects_to_delete:
             self.client.remove_object(self.bucket_name, obj.object_name)
 
+    @timed
     def get_object_from_archive(
         self, container_key, object_key, file_name, system_token=None
     ):
@@ -376,6 +927,7 @@ class MinioProvider(BaseStorageProvider):
             "get_object_from_archive is not implemented for MinioProvider"
         )
 
+    @timed
     def get_object_from_archive_streaming(
         self, container_key, object_key, file_name, system_token=None
     ):
@@ -391,6 +943,7 @@ class MinioProvider(BaseStorageProvider):
             "get_object_from_archive_streaming is not implemented for MinioProvider"
         )
 
+    @timed
     def replace_file_in_zip_object(
         self,
         container_key,
@@ -413,3 +966,58 @@ class MinioProvider(BaseStorageProvider):
         raise NotImplementedError(
             "replace_file_in_zip_object is not implemented for MinioProvider"
         )
+
+    def _expires(self, expires):
+        if isinstance(expires, timedelta):
+            return expires
+        return timedelta(seconds=expires)
+
+    def get_object_url(
+        self,
+        container_key,
+        object_key,
+        system_token=None,
+        expires=3600,
+        content_disposition=None,
+        content_type=None,
+    ):
+        """
+        get a presigned url to download an object directly from MinIO
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param system_token: oauth system token
+        :param expires: seconds (or a timedelta) the url stays valid, at most 7 days
+        :param content_disposition: Content-Disposition header of the download,
+            e.g. 'attachment; filename="plan.pdf"'
+        :param content_type: Content-Type header of the download
+        :return the url
+        """
+        response_headers = {}
+        if content_disposition:
+            response_headers["response-content-disposition"] = content_disposition
+        if content_type:
+            response_headers["response-content-type"] = content_type
+        return self.client.presigned_get_object(
+            self.bucket_name,
+            f"{self._id_to_pairtree_path(container_key)}{object_key}",
+            expires=self._expires(expires),
+            response_headers=response_headers or None,
+        )
+
+    def get_upload_url(self, container_key, object_key, system_token=None, expires=3600):
+        """
+        get a presigned url to upload an object directly to MinIO with a PUT
+        request
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param system_token: oauth system token
+        :param expires: seconds (or a timedelta) the url stays valid, at most 7 days
+        :return the url
+        """
+        return self.client.presigned_put_object(
+            self.bucket_name,
+            f"{self._id_to_pairtree_path(container_key)}{object_key}",
+            expires=self._expires(expires),
+        )
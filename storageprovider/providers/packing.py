@@ -0,0 +1,860 @@
+import hashlib
+import io
+import json
+import logging
+import threading
+import time
+import uuid
+import zipfile
+from datetime import datetime
+from datetime import timezone
+
+from storageprovider.providers import BaseStorageProvider
+from storageprovider.providers import ObjectInfo
+from storageprovider.providers import skip_range
+from storageprovider.utils import iter_archive
+
+LOG = logging.getLogger(__name__)
+
+PACK_PREFIX = ".pack-"
+INDEX_KEY = ".pack-index"
+
+
+class PackingProvider(BaseStorageProvider):
+    """
+    Packs small objects together into pack objects.
+
+    Writes of at most ``max_object_size`` bytes are collected per container
+    and written as one pack object once ``pack_size`` bytes are pending or
+    :meth:`flush` is called. A per container index object (``.pack-index``)
+    maps every packed key to its pack, offset and size, so a packed object
+    is read with one range request and an export reads every pack once.
+    Larger objects are stored as they are.
+
+    Pending writes are only kept in memory until they are flushed, like the
+    write-back mode of :class:`storageprovider.providers.tiered.TieredProvider`.
+    Deleted or overwritten packed objects leave dead bytes in their pack
+    until :meth:`compact` rewrites it. The index is cached and written by
+    this instance only, so a container should be packed by one process.
+
+    The index is one object, so every save rewrites it whole. It is saved
+    once per pack, as a pack is only reachable through it, and when an
+    unpacked object replaces a packed one, as the stale entry would hide the
+    newer object. Deletes of packed objects are only applied to the cached
+    index and saved with the next pack or :meth:`flush`; like pending writes,
+    they are lost when the process stops without flushing.
+
+    A packed object may shadow an unpacked object written under the same key
+    before it. When that object was written through this instance, it is
+    removed once the pack is written, without extra requests to find it.
+    Older unpacked objects are removed when the key is deleted and by
+    :meth:`compact`, so they do not reappear.
+    """
+
+    def __init__(
+        self,
+        provider: BaseStorageProvider,
+        max_object_size: int = 64 * 1024,
+        pack_size: int = 4 * 1024 * 1024,
+    ):
+        """
+        :param provider: the provider storing the packs and the large objects
+        :param max_object_size: largest object in bytes that is packed
+        :param pack_size: pending bytes of a container that trigger a flush
+        """
+        self.provider = provider
+        self.max_object_size = max_object_size
+        self.pack_size = pack_size
+        self.lock = threading.RLock()
+        # {container_key: {object_key: [pack, offset, size, etag, modified]}}
+        self.indexes = {}
+        # {container_key: {object_key: (data, modified)}}
+        self.pending = {}
+        # containers whose cached index has unsaved deletes
+        self.dirty = set()
+        # {container_key: keys of objects written unpacked by this instance}
+        self.unpacked = {}
+
+    @staticmethod
+    def _internal(object_key):
+        return object_key.startswith(PACK_PREFIX)
+
+    def _index(self, container_key, system_token=None):
+        with self.lock:
+            if container_key not in self.indexes:
+                entries = {}
+                if self.provider.object_exists(container_key, INDEX_KEY, system_token):
+                    index = json.loads(
+                        self.provider.get_object(container_key, INDEX_KEY, system_token)
+                    )
+                    entries = index["entries"]
+                self.indexes[container_key] = entries
+            return self.indexes[container_key]
+
+    def _save_index(self, container_key, system_token=None):
+        data = json.dumps(
+            {"version": 1, "entries": self.indexes[container_key]},
+            separators=(",", ":"),
+        ).encode()
+        self.provider.update_object(container_key, INDEX_KEY, data, system_token)
+        self.dirty.discard(container_key)
+
+    def _small_bytes(self, object_data):
+        if isinstance(object_data, str):
+            object_data = object_data.encode()
+        if isinstance(object_data, (bytes, bytearray, memoryview)):
+            if len(object_data) <= self.max_object_size:
+                return bytes(object_data)
+        return None
+
+    def _lookup(self, container_key, object_key, system_token=None):
+        """
+        :return: ("pending", (data, modified)), ("packed", entry) or (None, None)
+        """
+        with self.lock:
+            pending = self.pending.get(container_key, {}).get(object_key)
+            if pending is not None:
+                return "pending", pending
+            entry = self._index(container_key, system_token).get(object_key)
+            if entry is not None:
+                return "packed", entry
+        return None, None
+
+    def _forget(self, container_key, object_key, system_token=None, save=False):
+        """
+        Drop an object from the pending writes and the index.
+
+        :param save: save the index right away instead of with the next pack
+            or flush, for objects that were replaced by an unpacked object
+        :return: True if the object was pending or packed
+        """
+        with self.lock:
+            pending = self.pending.get(container_key, {}).pop(object_key, None)
+            index = self._index(container_key, system_token)
+            if index.pop(object_key, None) is not None:
+                self.dirty.add(container_key)
+                if save:
+                    self._save_index(container_key, system_token)
+                return True
+            return pending is not None
+
+    def _replaced(self, container_key, object_key, system_token=None):
+        """
+        Drop the pending or packed object an unpacked object was written
+        over, once that write succeeded.
+        """
+        with self.lock:
+            self._forget(container_key, object_key, system_token, save=True)
+            self.unpacked.setdefault(container_key, set()).add(object_key)
+
+    def _remove_shadows(self, container_key, object_keys, system_token=None):
+        """
+        Remove the unpacked objects this instance wrote before the packed
+        objects with the same keys.
+        """
+        with self.lock:
+            unpacked = self.unpacked.get(container_key, set())
+            shadows = unpacked.intersection(object_keys)
+            unpacked.difference_update(shadows)
+        for object_key in sorted(shadows):
+            try:
+                self.provider.delete_object(container_key, object_key, system_token)
+            except Exception:
+                LOG.warning(f"Removing {object_key} failed.", exc_info=True)
+
+    def flush(self, container_key=None, system_token=None):
+        """
+        Write the pending objects as packs and save the indexes with unsaved
+        deletes.
+
+        :param container_key: only flush this container
+        :param system_token: oauth system token
+        """
+        with self.lock:
+            if container_key is not None:
+                keys = [container_key]
+            else:
+                keys = list(set(self.pending) | self.dirty)
+            for key in keys:
+                self._write_pack(key, system_token)
+                if key in self.dirty:
+                    self._save_index(key, system_token)
+
+    def close(self):
+        """
+        Write the pending objects and the unsaved deletes.
+        """
+        self.flush()
+
+    def _write_pack(self, container_key, system_token=None):
+        with self.lock:
+            pending = self.pending.pop(container_key, None)
+            if not pending:
+                return
+            pack = f"{PACK_PREFIX}{uuid.uuid4()}"
+            data = bytearray()
+            entries = {}
+            for object_key, (object_data, modified) in pending.items():
+                entries[object_key] = [
+                    pack,
+                    len(data),
+                    len(object_data),
+                    hashlib.md5(object_data).hexdigest(),
+                    modified,
+                ]
+                data += object_data
+            try:
+                self.provider.update_object(
+                    container_key, pack, bytes(data), system_token
+                )
+                self._index(container_key, system_token).update(entries)
+                self._save_index(container_key, system_token)
+            except Exception:
+                # keep the objects pending, newer writes win
+                pending.update(self.pending.get(container_key, {}))
+                self.pending[container_key] = pending
+                raise
+            self._remove_shadows(container_key, list(entries), system_token)
+
+    def compact(self, container_key, system_token=None, min_dead_ratio=0.25):
+        """
+        Rewrite packs with deleted or overwritten objects, remove packs no
+        object refers to anymore and unpacked objects a packed object
+        replaced.
+
+        :param container_key: key of the container in the data store
+        :param system_token: oauth system token
+        :param min_dead_ratio: rewrite a pack when at least this part of its
+            bytes is dead
+        :return: number of packs removed
+        """
+        with self.lock:
+            index = self._index(container_key, system_token)
+            live = {}
+            for object_key, entry in index.items():
+                live.setdefault(entry[0], []).append(object_key)
+            sizes = {}
+            shadowed = []
+            for info in self.provider.list_objects_with_metadata(
+                container_key, system_token
+            ):
+                if self._internal(info.key):
+                    if info.key != INDEX_KEY:
+                        sizes[info.key] = info.size
+                elif info.key in index:
+                    shadowed.append(info.key)
+            removed = [pack for pack in sizes if pack not in live]
+            rewrite = []
+            for pack, object_keys in live.items():
+                used = sum(index[key][2] for key in object_keys)
+                size = sizes.get(pack) or used
+                if size and (size - used) / size >= min_dead_ratio:
+                    rewrite.append(pack)
+            for pack in rewrite:
+                # writing the new pack removes the shadows of its objects
+                shadowed = [key for key in shadowed if key not in live[pack]]
+                data = self.provider.get_object(container_key, pack, system_token)
+                pending = self.pending.setdefault(container_key, {})
+                for object_key in live[pack]:
+                    entry = index[object_key]
+                    pending.setdefault(object_key, (_unpack(data, entry), entry[4]))
+            if rewrite:
+                self._write_pack(container_key, system_token)
+            elif container_key in self.dirty:
+                # the stored index must not refer to removed packs
+                self._save_index(container_key, system_token)
+            # unpacked objects written before a packed object with the same key
+            for object_key in shadowed + removed + rewrite:
+                try:
+                    self.provider.delete_object(container_key, object_key, system_token)
+                except Exception:
+                    LOG.warning(f"Removing {object_key} failed.", exc_info=True)
+            return len(removed) + len(rewrite)
+
+    @staticmethod
+    def _metadata(data_or_entry):
+        if isinstance(data_or_entry, tuple):
+            data, modified = data_or_entry
+            size, etag = len(data), hashlib.md5(data).hexdigest()
+        else:
+            _, _, size, etag, modified = data_or_entry
+        return {
+            "time_last_modification": datetime.fromtimestamp(modified, timezone.utc),
+            "mime": "application/octet-stream",
+            "size": size,
+            "content-type": "application/octet-stream",
+            "content-length": size,
+            "etag": etag,
+        }
+
+    def _read(self, container_key, object_key, system_token=None):
+        """
+        :return: content of a pending or packed object, None for other objects
+        """
+        state, value = self._lookup(container_key, object_key, system_token)
+        if state == "pending":
+            return value[0]
+        if state == "packed":
+            pack, offset, size = value[:3]
+            return self.provider.get_object_range(
+                container_key, pack, offset, size, system_token
+            )
+        return None
+
+    def delete_object(self, container_key, object_key, system_token=None):
+        """
+        delete an object from the data store
+
+        A pending or packed object is dropped from the index, which is saved with
+        the next pack or flush. An unpacked object it shadowed is removed as well.
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param system_token: oauth system token
+        """
+        with self.lock:
+            self.unpacked.get(container_key, set()).discard(object_key)
+        if not self._forget(container_key, object_key, system_token):
+            return self.provider.delete_object(container_key, object_key, system_token)
+        # an unpacked object written before the packed one would reappear
+        if self.provider.object_exists(container_key, object_key, system_token):
+            self.provider.delete_object(container_key, object_key, system_token)
+
+    def get_object_streaming(self, container_key, object_key, system_token=None):
+        """
+        retrieve an object from the data store as a stream
+
+        A pending object is served from memory and a packed object with a range
+        request on its pack, other objects are read from the wrapped provider.
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param system_token: oauth system token
+        :return content of the object as a stream
+        """
+        data = self._read(container_key, object_key, system_token)
+        if data is not None:
+            return iter([data])
+        return self.provider.get_object_streaming(container_key, object_key, system_token)
+
+    def get_object(self, container_key, object_key, system_token=None):
+        """
+        retrieve an object from the data store
+
+        A pending object is served from memory and a packed object with a range
+        request on its pack, other objects are read from the wrapped provider.
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param system_token: oauth system token
+        :return content of the object
+        """
+        data = self._read(container_key, object_key, system_token)
+        if data is not None:
+            return data
+        return self.provider.get_object(container_key, object_key, system_token)
+
+    def get_object_range_streaming(
+        self, container_key, object_key, offset, length=None, system_token=None
+    ):
+        """
+        retrieve part of an object from the data store as a stream
+
+        A range of a packed object is read with one range request on its pack.
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param offset: position of the first byte
+        :param length: number of bytes, None to read up to the end
+        :param system_token: oauth system token
+        :return content of the range as a stream
+        """
+        state, value = self._lookup(container_key, object_key, system_token)
+        if state == "pending":
+            return skip_range(iter([value[0]]), offset, length)
+        if state == "packed":
+            pack, start, size = value[:3]
+            offset = min(offset, size)
+            length = size - offset if length is None else min(length, size - offset)
+            if not length:
+                return iter([])
+            return self.provider.get_object_range_streaming(
+                container_key, pack, start + offset, length, system_token
+            )
+        return self.provider.get_object_range_streaming(
+            container_key, object_key, offset, length, system_token
+        )
+
+    def get_object_and_metadata(self, container_key, object_key, system_token=None):
+        """
+        retrieve an object from the data store and also return header meta data
+
+        A pending object is served from memory and a packed object with a range
+        request on its pack, other objects are read from the wrapped provider.
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param system_token: oauth system token
+        :return content of the object
+        """
+        state, value = self._lookup(container_key, object_key, system_token)
+        if state is None:
+            return self.provider.get_object_and_metadata(
+                container_key, object_key, system_token
+            )
+        return {
+            "object": self._read(container_key, object_key, system_token),
+            "metadata": self._metadata(value),
+        }
+
+    def get_object_metadata(self, container_key, object_key, system_token=None):
+        """
+        retrieve an object from the data store
+
+        Computed from the index entry for pending and packed objects.
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param system_token: oauth system token
+        :return headers of the object
+        """
+        state, value = self._lookup(container_key, object_key, system_token)
+        if state is None:
+            return self.provider.get_object_metadata(
+                container_key, object_key, system_token
+            )
+        return self._metadata(value)
+
+    def object_exists(self, container_key, object_key, system_token=None):
+        """
+        check if an object exists in the data store
+
+        True for pending and packed objects, otherwise checked in the wrapped
+        provider.
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param system_token: oauth system token
+        :return True if the object exists
+        """
+        state, _ = self._lookup(container_key, object_key, system_token)
+        if state is not None:
+            return True
+        return self.provider.object_exists(container_key, object_key, system_token)
+
+    def objects_exist(self, container_key, object_keys, system_token=None):
+        """
+        check which objects exist in a container of the data store
+
+        Checked against one listing of the container.
+
+        :param container_key: key of the container in the data store
+        :param object_keys: keys of the objects to check
+        :param system_token: oauth system token
+        :return dict with True for every object key that exists, else False
+        """
+        keys = set(self.list_object_keys(container_key, system_token))
+        return {object_key: object_key in keys for object_key in object_keys}
+
+    def copy_object_and_create_key(
+        self,
+        source_container_key,
+        source_object_key,
+        output_container_key,
+        system_token=None,
+    ):
+        """
+        Copy an object and create key in the data store
+
+        A pending or packed source is read and written again, so a small copy is
+        packed as well.
+
+        :param source_container_key: key of the source container in the data store
+        :param source_object_key: key of the source object in the container
+        :param output_container_key: key of output container in the data store
+        :param system_token: oauth system token
+        """
+        output_object_key = str(uuid.uuid4())
+        self.copy_object(
+            source_container_key,
+            source_object_key,
+            output_container_key,
+            output_object_key,
+            system_token,
+        )
+        return output_object_key
+
+    def copy_object(
+        self,
+        source_container_key,
+        source_object_key,
+        output_container_key,
+        output_object_key,
+        system_token=None,
+    ):
+        """
+        Copy an object in the data store to specific key
+
+        A pending or packed source is read and written again, so a small copy is
+        packed as well.
+
+        :param source_container_key: key of the source container in the data store
+        :param source_object_key: key of the source object in the container
+        :param output_container_key: key of output container in the data store
+        :param output_object_key: specific object key for the output object in the
+            container
+        :param system_token: oauth system token
+        """
+        data = self._read(source_container_key, source_object_key, system_token)
+        if data is not None:
+            return self.update_object(
+                output_container_key, output_object_key, data, system_token
+            )
+        result = self.provider.copy_object(
+            source_container_key,
+            source_object_key,
+            output_container_key,
+            output_object_key,
+            system_token,
+        )
+        self._replaced(output_container_key, output_object_key, system_token)
+        return result
+
+    def update_object_and_key(self, container_key, object_data, system_token=None):
+        """
+        create an object and key in the data store
+
+        Objects of at most max_object_size bytes are kept pending until a pack is
+        written.
+
+        :param container_key: key of the container in the data store
+        :param object_data: data of the object
+        :param system_token: oauth system token
+        """
+        object_key = str(uuid.uuid4())
+        self.update_object(container_key, object_key, object_data, system_token)
+        return object_key
+
+    def update_object(self, container_key, object_key, object_data, system_token=None):
+        """
+        update (or create) an object in the data store
+
+        Objects of at most max_object_size bytes are kept pending until a pack is
+        written, larger ones are written to the wrapped provider as they are.
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param object_data: data of the object
+        :param system_token: oauth system token
+        """
+        if self._internal(object_key):
+            raise ValueError(f"Object keys starting with {PACK_PREFIX} are reserved.")
+        data = self._small_bytes(object_data)
+        if data is None:
+            result = self.provider.update_object(
+                container_key, object_key, object_data, system_token
+            )
+            self._replaced(container_key, object_key, system_token)
+            return result
+        with self.lock:
+            pending = self.pending.setdefault(container_key, {})
+            pending[object_key] = (data, time.time())
+            if sum(len(value[0]) for value in pending.values()) >= self.pack_size:
+                self._write_pack(container_key, system_token)
+        return None
+
+    def _object_infos(self, container_key, system_token=None):
+        """
+        :return: {object_key: ObjectInfo} of all objects of the container
+        """
+        infos = {
+            info.key: info
+            for info in self.provider.list_objects_with_metadata(
+                container_key, system_token
+            )
+            if not self._internal(info.key)
+        }
+        with self.lock:
+            for object_key, entry in self._index(container_key, system_token).items():
+                infos[object_key] = ObjectInfo.from_metadata(
+                    object_key, self._metadata(entry)
+                )
+            for object_key, value in self.pending.get(container_key, {}).items():
+                infos[object_key] = ObjectInfo.from_metadata(
+                    object_key, self._metadata(value)
+                )
+        return infos
+
+    def list_object_keys_for_container(self, container_key, system_token=None):
+        """
+        list all object keys for a container in the data store
+
+        Lists pending and packed objects, but not the packs and the index.
+
+        :param container_key: key of the container in the data store
+        :param system_token: oauth system token
+        :return list of object keys found in the container
+        """
+        keys = {
+            key
+            for key in self.provider.list_object_keys(container_key, system_token)
+            if not self._internal(key)
+        }
+        with self.lock:
+            keys.update(self._index(container_key, system_token))
+            keys.update(self.pending.get(container_key, {}))
+        return sorted(keys)
+
+    def list_object_keys(self, container_key, system_token=None):
+        """
+        list all object keys for a container as a list of strings
+
+        Lists pending and packed objects, but not the packs and the index.
+
+        :param container_key: key of the container in the data store
+        :param system_token: oauth system token
+        :return list of object keys found in the container
+        """
+        return self.list_object_keys_for_container(container_key, system_token)
+
+    def list_objects_with_metadata(self, container_key, system_token=None):
+        """
+        list all objects of a container with their size, content type, etag and
+        time of last modification
+
+        Lists pending and packed objects, but not the packs and the index.
+
+        :param container_key: key of the container in the data store
+        :param system_token: oauth system token
+        :return list of ObjectInfo
+        """
+        infos = self._object_infos(container_key, system_token)
+        return [infos[key] for key in sorted(infos)]
+
+    def _archive_entries(self, container_key, system_token=None, translations=None):
+        """
+        Archive entries reading every pack once.
+        """
+        translations = translations or {}
+        with self.lock:
+            index = dict(self._index(container_key, system_token))
+            pending = dict(self.pending.get(container_key, {}))
+        packs = {}
+        for object_key, entry in index.items():
+            if object_key not in pending:
+                packs.setdefault(entry[0], []).append(object_key)
+        for object_key, (data, _) in pending.items():
+            yield translations.get(object_key, object_key), len(data), [data]
+        for pack, object_keys in packs.items():
+            data = self.provider.get_object(container_key, pack, system_token)
+            for object_key in object_keys:
+                entry = index[object_key]
+                yield (
+                    translations.get(object_key, object_key),
+                    entry[2],
+                    [_unpack(data, entry)],
+                )
+        for info in self.provider.list_objects_with_metadata(container_key, system_token):
+            if self._internal(info.key) or info.key in index or info.key in pending:
+                continue
+            yield (
+                translations.get(info.key, info.key),
+                None,
+                self.provider.get_object_streaming(container_key, info.key, system_token),
+            )
+
+    def get_container_data_streaming(
+        self, container_key, system_token=None, translations=None, archive_format="zip"
+    ):
+        """
+        Retrieve a zip of a container in the data store as a stream
+
+        Every pack is read once, pending objects are included.
+
+        :param container_key: key of the container in the data store
+        :param system_token: oauth system token
+        :param translations: Dict of object IDs and file names to use for them.
+        :param archive_format: ``zip``, ``tar``, ``tar.gz`` or ``tar.zst``
+        :return zip of objects as a stream
+        """
+        return iter_archive(
+            self._archive_entries(container_key, system_token, translations),
+            archive_format,
+        )
+
+    def get_container_data(
+        self, container_key, system_token=None, translations=None, archive_format="zip"
+    ):
+        """
+        Retrieve a zip of a container in the data store.
+
+        Every pack is read once, pending objects are included.
+
+        :param container_key: key of the container in the data store
+        :param system_token: oauth system token
+        :param translations: Dict of object IDs and file names to use for them.
+        :param archive_format: ``zip``, ``tar``, ``tar.gz`` or ``tar.zst``
+        :return zip of the objects in the container
+        """
+        return b"".join(
+            self.get_container_data_streaming(
+                container_key, system_token, translations, archive_format
+            )
+        )
+
+    def create_container(self, container_key, system_token=None):
+        """
+        create a new container with specific key in the data store
+
+        :param container_key: key of the container in the data store
+        :param system_token: oauth system token
+        """
+        return self.provider.create_container(container_key, system_token)
+
+    def create_container_and_key(self, system_token=None):
+        """
+        create a new container in the data store and generate key
+
+        :param system_token: oauth system token
+        :return the key generated for the container
+        """
+        return self.provider.create_container_and_key(system_token)
+
+    def delete_container(self, container_key, system_token=None):
+        """
+        delete a container in the data store
+
+        Its pending objects and cached index are dropped.
+
+        :param container_key: key of the container in the data store
+        :param system_token: oauth system token
+        """
+        with self.lock:
+            self.pending.pop(container_key, None)
+            self.indexes.pop(container_key, None)
+            self.dirty.discard(container_key)
+            self.unpacked.pop(container_key, None)
+        return self.provider.delete_container(container_key, system_token)
+
+    def get_object_from_archive(
+        self, container_key, object_key, file_name, system_token=None
+    ):
+        """
+        retrieve an object from an archive in the data store
+
+        A pending or packed archive is read whole and the file extracted here.
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param file_name: name of the file to get from the zip
+        :param system_token: oauth system token
+        :return content of the file
+        """
+        data = self._read(container_key, object_key, system_token)
+        if data is None:
+            return self.provider.get_object_from_archive(
+                container_key, object_key, file_name, system_token
+            )
+        with zipfile.ZipFile(io.BytesIO(data)) as zip_file:
+            return zip_file.read(file_name)
+
+    def get_object_from_archive_streaming(
+        self, container_key, object_key, file_name, system_token=None
+    ):
+        """
+        retrieve an object from an archive in the data storeas a stream
+
+        A pending or packed archive is read whole and the file extracted here.
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param system_token: oauth system token
+        :return content of the file as a stream
+        """
+        data = self._read(container_key, object_key, system_token)
+        if data is None:
+            return self.provider.get_object_from_archive_streaming(
+                container_key, object_key, file_name, system_token
+            )
+        return iter([self.get_object_from_archive(container_key, object_key, file_name)])
+
+    def replace_file_in_zip_object(
+        self,
+        container_key,
+        object_key,
+        file_to_replace,
+        new_file_content,
+        new_file_name,
+        system_token=None,
+    ):
+        """
+        replace a file in a zip in the data store
+
+        A pending or packed archive is first written unpacked, then replaced in
+        the wrapped provider.
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param file_to_replace: name of the file to replace in the zip
+        :param new_file_content: content of the new file
+        :param new_file_name: name of the new file
+        :param system_token: oauth system token
+        :return container and object key of the updated zip file
+        """
+        if self._read(container_key, object_key, system_token) is not None:
+            # move the archive out of its pack, it is rewritten anyway
+            data = self.get_object(container_key, object_key, system_token)
+            self.provider.update_object(container_key, object_key, data, system_token)
+            self._replaced(container_key, object_key, system_token)
+        return self.provider.replace_file_in_zip_object(
+            container_key,
+            object_key,
+            file_to_replace,
+            new_file_content,
+            new_file_name,
+            system_token,
+        )
+
+    def get_object_url(
+        self,
+        container_key,
+        object_key,
+        system_token=None,
+        expires=3600,
+        content_disposition=None,
+        content_type=None,
+    ):
+        """
+        get a temporary url to download an object directly from the data store
+
+        Pending and packed objects have no url of their own.
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param system_token: oauth system token
+        :param expires: seconds (or a timedelta) the url stays valid
+        :param content_disposition: Content-Disposition header of the download
+        :param content_type: Content-Type header of the download
+        :return the url
+        :raises NotImplementedError: if the data store can not hand out urls
+        """
+        state, _ = self._lookup(container_key, object_key, system_token)
+        if state is not None:
+            raise NotImplementedError("Packed objects have no url of their own.")
+        return self.provider.get_object_url(
+            container_key,
+            object_key,
+            system_token,
+            expires,
+            content_disposition,
+            content_type,
+        )
+
+
+def _unpack(data, entry):
+    """
+    :return: the object an index entry refers to, cut from its pack
+    """
+    offset, size = entry[1], entry[2]
+    end = offset + size
+    return bytes(data[offset:end])
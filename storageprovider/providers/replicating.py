@@ -0,0 +1,829 @@
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+from dataclasses import dataclass
+from dataclasses import field
+
+from storageprovider.providers import BaseStorageProvider
+
+LOG = logging.getLogger(__name__)
+
+
+@dataclass
+class Divergence:
+    """
+    A write that did not reach every replica.
+    """
+
+    operation: str
+    container_key: str
+    object_key: str = None
+    replicas: list = field(default_factory=list)
+    errors: list = field(default_factory=list)
+    system_token: str = None
+    time: float = field(default_factory=time.time)
+
+
+class _ReplicaState:
+    def __init__(self, provider):
+        self.provider = provider
+        self.latency = None
+        self.failed_at = None
+
+    def record(self, latency):
+        self.failed_at = None
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency = 0.8 * self.latency + 0.2 * latency
+
+    def healthy(self, cooldown):
+        return self.failed_at is None or time.monotonic() - self.failed_at > cooldown
+
+
+class ReplicatingProvider(BaseStorageProvider):
+    """
+    Writes every change to several providers concurrently.
+
+    Writes are sent to all replicas at the same time and succeed once
+    ``write_quorum`` replicas acknowledged them (``"all"`` by default), so
+    writing to two backends takes about as long as writing to the slowest
+    of them instead of the sum. Writes of one key reach every replica in the
+    order they were made, also on replicas that lag behind the quorum.
+    Replicas that failed are recorded in :attr:`divergences` and can be
+    brought back in sync with :meth:`repair`.
+
+    Reads go to the healthy replica with the lowest observed latency and
+    fall back to the others on errors. A replica that failed is skipped for
+    ``failure_cooldown`` seconds.
+    """
+
+    def __init__(
+        self,
+        replicas: list,
+        write_quorum="all",
+        failure_cooldown: float = 30.0,
+        max_workers: int = None,
+    ):
+        """
+        :param replicas: the providers to replicate to
+        :param write_quorum: number of replicas that have to acknowledge a
+            write, or ``"all"``
+        :param failure_cooldown: seconds a failed replica is avoided for reads
+        :param max_workers: size of the thread pool used for the fan-out
+        """
+        if not replicas:
+            raise ValueError("At least one replica is required.")
+        if write_quorum == "all":
+            write_quorum = len(replicas)
+        if not 1 <= write_quorum <= len(replicas):
+            raise ValueError(f"Invalid write quorum {write_quorum!r}")
+        self.replicas = [_ReplicaState(replica) for replica in replicas]
+        self.write_quorum = write_quorum
+        self.failure_cooldown = failure_cooldown
+        self.divergences = []
+        self.lock = threading.Lock()
+        # {(replica index, container_key, object_key): future of the last write}
+        self._last_writes = {}
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers or 4 * len(replicas),
+            thread_name_prefix="replicating-provider",
+        )
+
+    def close(self):
+        """
+        Wait for the writes still running on slow replicas and stop the
+        thread pool.
+        """
+        self.executor.shutdown(wait=True)
+
+    def _record_divergence(self, divergence):
+        LOG.warning(
+            f"{divergence.operation} of {divergence.container_key}/"
+            f"{divergence.object_key} failed on replicas {divergence.replicas}: "
+            f"{divergence.errors}"
+        )
+        with self.lock:
+            self.divergences.append(divergence)
+
+    def _fan_out(self, operation, container_key, object_key, system_token, call):
+        """
+        Run call(provider) on every replica and wait for the write quorum.
+
+        :return: the result of the first replica that succeeded
+        :raises ReplicationException: if the quorum can not be reached
+        """
+        futures = {
+            self._submit_write(index, container_key, object_key, call): index
+            for index in range(len(self.replicas))
+        }
+        results = {}
+        errors = {}
+        pending = set(futures)
+        while pending and len(results) < self.write_quorum:
+            if len(errors) > len(self.replicas) - self.write_quorum:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = futures[future]
+                try:
+                    results[index] = future.result()
+                except Exception as e:
+                    errors[index] = e
+
+        def finish(remaining):
+            for future in remaining:
+                index = futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    errors[index] = e
+            if errors:
+                self._record_divergence(
+                    Divergence(
+                        operation,
+                        container_key,
+                        object_key,
+                        sorted(errors),
+                        [errors[index] for index in sorted(errors)],
+                        system_token,
+                    )
+                )
+
+        if len(results) < self.write_quorum:
+            finish(pending)
+            raise ReplicationException(operation, errors)
+        if pending:
+            # quorum reached, the slow replicas finish in the background
+            self.executor.submit(finish, pending)
+        else:
+            finish(())
+        return results[min(results)]
+
+    def _submit_write(self, index, container_key, object_key, call):
+        """
+        Submit a write to a replica after the earlier writes of the same key
+        to that replica, so a replica that lags behind the quorum still
+        applies the writes of a key in order.
+        """
+        key = index, container_key, object_key
+        provider = self.replicas[index].provider
+        with self.lock:
+            previous = self._last_writes.get(key)
+
+            def ordered():
+                if previous is not None:
+                    # submitted earlier, so it is already running or done
+                    wait([previous])
+                return call(provider)
+
+            future = self.executor.submit(ordered)
+            self._last_writes[key] = future
+
+        def forget(done):
+            with self.lock:
+                if self._last_writes.get(key) is done:
+                    del self._last_writes[key]
+
+        future.add_done_callback(forget)
+        return future
+
+    def _read(self, method, *args, stream=False):
+        """
+        Call a read method on the fastest healthy replica, falling back to
+        the others on errors.
+
+        :param stream: the method returns a stream; its first chunk is read
+            here, so errors of lazy streams fail over too and the latency
+            covers the time to the first byte
+        """
+        order = sorted(
+            range(len(self.replicas)),
+            key=lambda i: (
+                not self.replicas[i].healthy(self.failure_cooldown),
+                self.replicas[i].latency or 0.0,
+            ),
+        )
+        error = None
+        for index in order:
+            state = self.replicas[index]
+            start = time.monotonic()
+            try:
+                result = getattr(state.provider, method)(*args)
+                if stream:
+                    result = _primed(result)
+            except Exception as e:
+                state.failed_at = time.monotonic()
+                error = error or e
+                continue
+            state.record(time.monotonic() - start)
+            return result
+        raise error
+
+    @staticmethod
+    def _materialize(object_data):
+        """
+        Read streamed object data once so it can be sent to every replica.
+        """
+        if hasattr(object_data, "read"):
+            return object_data.read()
+        if isinstance(object_data, (bytes, bytearray, memoryview, str)):
+            return object_data
+        return b"".join(object_data)
+
+    def repair(self):
+        """
+        Replay recorded divergences on the replicas that missed them.
+
+        Objects are copied from a replica that has them, deletes are
+        repeated. Divergences that could be repaired are removed.
+
+        :return: the divergences that could not be repaired
+        """
+        with self.lock:
+            divergences, self.divergences = self.divergences, []
+        remaining = []
+        for divergence in divergences:
+            try:
+                self._repair(divergence)
+            except Exception:
+                LOG.exception(f"Repair of {divergence} failed.")
+                remaining.append(divergence)
+        with self.lock:
+            self.divergences.extend(remaining)
+        return remaining
+
+    def _repair(self, divergence):
+        token = divergence.system_token
+        key = divergence.container_key
+        failed = [self.replicas[index].provider for index in divergence.replicas]
+        healthy = [
+            state.provider
+            for index, state in enumerate(self.replicas)
+            if index not in divergence.replicas
+        ]
+        if divergence.operation in ("delete_object", "delete_container"):
+            for provider in failed:
+                if divergence.operation == "delete_object":
+                    provider.delete_object(key, divergence.object_key, token)
+                else:
+                    provider.delete_container(key, token)
+        elif divergence.operation == "create_container":
+            for provider in failed:
+                provider.create_container(key, token)
+        else:
+            data = None
+            for provider in healthy:
+                try:
+                    data = provider.get_object(key, divergence.object_key, token)
+                    break
+                except Exception:
+                    continue
+            if data is None:
+                raise ReplicationException(divergence.operation, {})
+            for provider in failed:
+                provider.update_object(key, divergence.object_key, data, token)
+
+    def delete_object(self, container_key, object_key, system_token=None):
+        """
+        delete an object from the data store
+
+        Sent to all replicas at the same time; returns once write_quorum replicas
+        acknowledged it. Replicas that failed are recorded in divergences.
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param system_token: oauth system token
+        """
+        return self._fan_out(
+            "delete_object",
+            container_key,
+            object_key,
+            system_token,
+            lambda p: p.delete_object(container_key, object_key, system_token),
+        )
+
+    def get_object_streaming(self, container_key, object_key, system_token=None):
+        """
+        retrieve an object from the data store as a stream
+
+        Read from the fastest healthy replica. The first chunk is read before
+        returning, so a replica failing on it is failed over too.
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param system_token: oauth system token
+        :return content of the object as a stream
+        """
+        return self._read(
+            "get_object_streaming", container_key, object_key, system_token, stream=True
+        )
+
+    def get_object(self, container_key, object_key, system_token=None):
+        """
+        retrieve an object from the data store
+
+        Read from the fastest healthy replica, falling back to the others on
+        errors.
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param system_token: oauth system token
+        :return content of the object
+        """
+        return self._read("get_object", container_key, object_key, system_token)
+
+    def get_object_into(self, container_key, object_key, buffer, system_token=None):
+        """
+        retrieve an object from the data store into a writable buffer, e.g. a
+        bytearray, mmap or shared memory
+
+        Read from the fastest healthy replica, falling back to the others on
+        errors.
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param buffer: writable buffer the object is written to
+        :param system_token: oauth system token
+        :return number of bytes written
+        :raises BufferTooSmallException: if the object does not fit in the buffer
+        """
+        return self._read(
+            "get_object_into", container_key, object_key, buffer, system_token
+        )
+
+    def get_object_range_streaming(
+        self, container_key, object_key, offset, length=None, system_token=None
+    ):
+        """
+        retrieve part of an object from the data store as a stream
+
+        Read from the fastest healthy replica. The first chunk is read before
+        returning, so a replica failing on it is failed over too.
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param offset: position of the first byte
+        :param length: number of bytes, None to read up to the end
+        :param system_token: oauth system token
+        :return content of the range as a stream
+        """
+        return self._read(
+            "get_object_range_streaming",
+            container_key,
+            object_key,
+            offset,
+            length,
+            system_token,
+            stream=True,
+        )
+
+    def get_object_and_metadata(self, container_key, object_key, system_token=None):
+        """
+        retrieve an object from the data store and also return header meta data
+
+        Read from the fastest healthy replica, falling back to the others on
+        errors.
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param system_token: oauth system token
+        :return content of the object
+        """
+        return self._read(
+            "get_object_and_metadata", container_key, object_key, system_token
+        )
+
+    def get_object_metadata(self, container_key, object_key, system_token=None):
+        """
+        retrieve an object from the data store
+
+        Read from the fastest healthy replica, falling back to the others on
+        errors.
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param system_token: oauth system token
+        :return headers of the object
+        """
+        return self._read(
+            "get_object_metadata", container_key, object_key, system_token
+        )
+
+    def object_exists(self, container_key, object_key, system_token=None):
+        """
+        check if an object exists in the data store
+
+        Read from the fastest healthy replica, falling back to the others on
+        errors.
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param system_token: oauth system token
+        :return True if the object exists
+        """
+        return self._read("object_exists", container_key, object_key, system_token)
+
+    def objects_exist(self, container_key, object_keys, system_token=None):
+        """
+        check which objects exist in a container of the data store
+
+        Read from the fastest healthy replica, falling back to the others on
+        errors.
+
+        :param container_key: key of the container in the data store
+        :param object_keys: keys of the objects to check
+        :param system_token: oauth system token
+        :return dict with True for every object key that exists, else False
+        """
+        return self._read(
+            "objects_exist", container_key, list(object_keys), system_token
+        )
+
+    def copy_object_and_create_key(
+        self,
+        source_container_key,
+        source_object_key,
+        output_container_key,
+        system_token=None,
+    ):
+        """
+        Copy an object and create key in the data store
+
+        Copied on every replica, see copy_object.
+
+        :param source_container_key: key of the source container in the data store
+        :param source_object_key: key of the source object in the container
+        :param output_container_key: key of output container in the data store
+        :param system_token: oauth system token
+        """
+        output_object_key = str(uuid.uuid4())
+        self.copy_object(
+            source_container_key,
+            source_object_key,
+            output_container_key,
+            output_object_key,
+            system_token,
+        )
+        return output_object_key
+
+    def copy_object(
+        self,
+        source_container_key,
+        source_object_key,
+        output_container_key,
+        output_object_key,
+        system_token=None,
+    ):
+        """
+        Copy an object in the data store to specific key
+
+        Sent to all replicas at the same time; returns once write_quorum replicas
+        acknowledged it. Replicas that failed are recorded in divergences.
+
+        :param source_container_key: key of the source container in the data store
+        :param source_object_key: key of the source object in the container
+        :param output_container_key: key of output container in the data store
+        :param output_object_key: specific object key for the output object in the
+            container
+        :param system_token: oauth system token
+        """
+        return self._fan_out(
+            "copy_object",
+            output_container_key,
+            output_object_key,
+            system_token,
+            lambda p: p.copy_object(
+                source_container_key,
+                source_object_key,
+                output_container_key,
+                output_object_key,
+                system_token,
+            ),
+        )
+
+    def update_object_and_key(self, container_key, object_data, system_token=None):
+        """
+        create an object and key in the data store
+
+        Written to every replica, see update_object.
+
+        :param container_key: key of the container in the data store
+        :param object_data: data of the object
+        :param system_token: oauth system token
+        """
+        object_key = str(uuid.uuid4())
+        self.update_object(container_key, object_key, object_data, system_token)
+        return object_key
+
+    def update_object(self, container_key, object_key, object_data, system_token=None):
+        """
+        update (or create) an object in the data store
+
+        Sent to all replicas at the same time; returns once write_quorum replicas
+        acknowledged it. Replicas that failed are recorded in divergences.
+        Streamed data is read once and sent to every replica.
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param object_data: data of the object
+        :param system_token: oauth system token
+        """
+        data = self._materialize(object_data)
+        return self._fan_out(
+            "update_object",
+            container_key,
+            object_key,
+            system_token,
+            lambda p: p.update_object(container_key, object_key, data, system_token),
+        )
+
+    def list_object_keys_for_container(self, container_key, system_token=None):
+        """
+        list all object keys for a container in the data store
+
+        Read from the fastest healthy replica, falling back to the others on
+        errors.
+
+        :param container_key: key of the container in the data store
+        :param system_token: oauth system token
+        :return list of object keys found in the container
+        """
+        return self._read("list_object_keys_for_container", container_key, system_token)
+
+    def list_object_keys(self, container_key, system_token=None):
+        """
+        list all object keys for a container as a list of strings
+
+        Read from the fastest healthy replica, falling back to the others on
+        errors.
+
+        :param container_key: key of the container in the data store
+        :param system_token: oauth system token
+        :return list of object keys found in the container
+        """
+        return self._read("list_object_keys", container_key, system_token)
+
+    def list_objects_with_metadata(self, container_key, system_token=None):
+        """
+        list all objects of a container with their size, content type, etag and
+        time of last modification
+
+        Read from the fastest healthy replica, falling back to the others on
+        errors.
+
+        :param container_key: key of the container in the data store
+        :param system_token: oauth system token
+        :return list of ObjectInfo
+        """
+        return self._read("list_objects_with_metadata", container_key, system_token)
+
+    def get_container_data_streaming(
+        self, container_key, system_token=None, translations=None, archive_format="zip"
+    ):
+        """
+        Retrieve a zip of a container in the data store as a stream
+
+        Read from the fastest healthy replica. The first chunk is read before
+        returning, so a replica failing on it is failed over too.
+
+        :param container_key: key of the container in the data store
+        :param system_token: oauth system token
+        :param translations: Dict of object IDs and file names to use for them.
+        :param archive_format: ``zip``, ``tar``, ``tar.gz`` or ``tar.zst``
+        :return zip of objects as a stream
+        """
+        return self._read(
+            "get_container_data_streaming",
+            container_key,
+            system_token,
+            translations,
+            archive_format,
+            stream=True,
+        )
+
+    def get_container_data(
+        self, container_key, system_token=None, translations=None, archive_format="zip"
+    ):
+        """
+        Retrieve a zip of a container in the data store.
+
+        Read from the fastest healthy replica, falling back to the others on
+        errors.
+
+        :param container_key: key of the container in the data store
+        :param system_token: oauth system token
+        :param translations: Dict of object IDs and file names to use for them.
+        :param archive_format: ``zip``, ``tar``, ``tar.gz`` or ``tar.zst``
+        :return zip of the objects in the container
+        """
+        return self._read(
+            "get_container_data",
+            container_key,
+            system_token,
+            translations,
+            archive_format,
+        )
+
+    def create_container(self, container_key, system_token=None):
+        """
+        create a new container with specific key in the data store
+
+        Sent to all replicas at the same time; returns once write_quorum replicas
+        acknowledged it. Replicas that failed are recorded in divergences.
+
+        :param container_key: key of the container in the data store
+        :param system_token: oauth system token
+        """
+        return self._fan_out(
+            "create_container",
+            container_key,
+            None,
+            system_token,
+            lambda p: p.create_container(container_key, system_token),
+        )
+
+    def create_container_and_key(self, system_token=None):
+        """
+        create a new container in the data store and generate key
+
+        Created on every replica, see create_container.
+
+        :param system_token: oauth system token
+        :return the key generated for the container
+        """
+        container_key = str(uuid.uuid4())
+        self.create_container(container_key, system_token)
+        return container_key
+
+    def delete_container(self, container_key, system_token=None):
+        """
+        delete a container in the data store
+
+        Sent to all replicas at the same time; returns once write_quorum replicas
+        acknowledged it. Replicas that failed are recorded in divergences.
+
+        :param container_key: key of the container in the data store
+        :param system_token: oauth system token
+        """
+        return self._fan_out(
+            "delete_container",
+            container_key,
+            None,
+            system_token,
+            lambda p: p.delete_container(container_key, system_token),
+        )
+
+    def get_object_from_archive(
+        self, container_key, object_key, file_name, system_token=None
+    ):
+        """
+        retrieve an object from an archive in the data store
+
+        Read from the fastest healthy replica, falling back to the others on
+        errors.
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param file_name: name of the file to get from the zip
+        :param system_token: oauth system token
+        :return content of the file
+        """
+        return self._read(
+            "get_object_from_archive", container_key, object_key, file_name, system_token
+        )
+
+    def get_object_from_archive_streaming(
+        self, container_key, object_key, file_name, system_token=None
+    ):
+        """
+        retrieve an object from an archive in the data storeas a stream
+
+        Read from the fastest healthy replica. The first chunk is read before
+        returning, so a replica failing on it is failed over too.
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param system_token: oauth system token
+        :return content of the file as a stream
+        """
+        return self._read(
+            "get_object_from_archive_streaming",
+            container_key,
+            object_key,
+            file_name,
+            system_token,
+            stream=True,
+        )
+
+    def replace_file_in_zip_object(
+        self,
+        container_key,
+        object_key,
+        file_to_replace,
+        new_file_content,
+        new_file_name,
+        system_token=None,
+    ):
+        """
+        replace a file in a zip in the data store
+
+        Sent to all replicas at the same time; returns once write_quorum replicas
+        acknowledged it. Replicas that failed are recorded in divergences.
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param file_to_replace: name of the file to replace in the zip
+        :param new_file_content: content of the new file
+        :param new_file_name: name of the new file
+        :param system_token: oauth system token
+        :return container and object key of the updated zip file
+        """
+        content = self._materialize(new_file_content)
+        return self._fan_out(
+            "replace_file_in_zip_object",
+            container_key,
+            object_key,
+            system_token,
+            lambda p: p.replace_file_in_zip_object(
+                container_key,
+                object_key,
+                file_to_replace,
+                content,
+                new_file_name,
+                system_token,
+            ),
+        )
+
+    def get_object_url(
+        self,
+        container_key,
+        object_key,
+        system_token=None,
+        expires=3600,
+        content_disposition=None,
+        content_type=None,
+    ):
+        """
+        get a temporary url to download an object directly from the data store
+
+        The url points at the fastest healthy replica.
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param system_token: oauth system token
+        :param expires: seconds (or a timedelta) the url stays valid
+        :param content_disposition: Content-Disposition header of the download
+        :param content_type: Content-Type header of the download
+        :return the url
+        :raises NotImplementedError: if the data store can not hand out urls
+        """
+        return self._read(
+            "get_object_url",
+            container_key,
+            object_key,
+            system_token,
+            expires,
+            content_disposition,
+            content_type,
+        )
+
+
+def _primed(chunks):
+    """
+    Read the first chunk of a stream.
+
+    :return: a stream of the same chunks
+    """
+    chunks = iter(chunks)
+    try:
+        first = next(chunks)
+    except StopIteration:
+        return iter([])
+    return _chain(first, chunks)
+
+
+def _chain(first, chunks):
+    try:
+        yield first
+        yield from chunks
+    finally:
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            close()
+
+
+class ReplicationException(Exception):
+    def __init__(self, operation, errors):
+        self.operation = operation
+        self.errors = errors
+
+    def __str__(self):
+        return (
+            f"{self.operation} did not reach the write quorum, "
+            f"failed replicas: {self.errors!r}"
+        )
@@ -0,0 +1,705 @@
+import logging
+import threading
+import uuid
+
+from storageprovider.providers import BaseStorageProvider
+from storageprovider.providers import writable_view
+
+LOG = logging.getLogger(__name__)
+
+WRITE_THROUGH = "write-through"
+WRITE_BACK = "write-back"
+
+
+class TieredProvider(BaseStorageProvider):
+    """
+    Puts a fast storage tier in front of a slow one.
+
+    Reads are served from the fast tier when possible; misses are read from
+    the slow tier and admitted to the fast tier when they are at most
+    ``max_cached_size`` bytes, so giant archives never push out the rest of
+    the cache.
+
+    In ``write-through`` mode writes go to the slow tier first and are then
+    cached. In ``write-back`` mode writes only go to the fast tier and are
+    written to the slow tier by :meth:`flush` (called periodically when
+    ``flush_interval`` is set, and before any operation that needs the slow
+    tier to be up to date). Deletes always go to both tiers.
+
+    Errors of the fast tier are logged and never fail a call, except for
+    writes in write-back mode where the fast tier holds the only copy.
+    """
+
+    def __init__(
+        self,
+        fast: BaseStorageProvider,
+        slow: BaseStorageProvider,
+        max_cached_size: int = 8 * 1024 * 1024,
+        write_mode: str = WRITE_THROUGH,
+        flush_interval: float = None,
+    ):
+        """
+        :param fast: the fast tier, e.g. an in-memory or filesystem provider
+        :param slow: the slow tier, e.g. an Augeias or MinIO provider
+        :param max_cached_size: largest object in bytes admitted to the fast tier
+        :param write_mode: ``write-through`` or ``write-back``
+        :param flush_interval: seconds between background flushes in write-back
+            mode, None to only flush when needed or asked
+        """
+        if write_mode not in (WRITE_THROUGH, WRITE_BACK):
+            raise ValueError(f"Unknown write mode {write_mode!r}")
+        self.fast = fast
+        self.slow = slow
+        self.max_cached_size = max_cached_size
+        self.write_mode = write_mode
+        self.lock = threading.Condition()
+        # {(container_key, object_key): (version, system_token)}
+        self.dirty = {}
+        # keys being written to the slow tier by flush
+        self.flushing = set()
+        self._version = 0
+        self._stop = threading.Event()
+        self._flusher = None
+        if write_mode == WRITE_BACK and flush_interval:
+            self._flusher = threading.Thread(
+                target=self._flush_periodically, args=(flush_interval,), daemon=True
+            )
+            self._flusher.start()
+
+    def _flush_periodically(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.flush()
+            except Exception:
+                LOG.exception("Periodic flush of the write-back tier failed.")
+
+    def close(self):
+        """
+        Stop the background flusher and flush all pending writes.
+        """
+        self._stop.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        self.flush()
+
+    def flush(self, container_key=None, object_key=None):
+        """
+        Write pending write-back objects to the slow tier.
+
+        :param container_key: only flush objects of this container
+        :param object_key: only flush this object
+        :raises Exception: the first error, after all objects were tried
+        """
+        with self.lock:
+            pending = [
+                (key, version, system_token)
+                for key, (version, system_token) in self.dirty.items()
+                if (container_key is None or key[0] == container_key)
+                and (object_key is None or key[1] == object_key)
+            ]
+        error = None
+        for (c_key, o_key), version, system_token in pending:
+            with self.lock:
+                self.lock.wait_for(lambda: (c_key, o_key) not in self.flushing)
+                if self.dirty.get((c_key, o_key), (None,))[0] != version:
+                    # deleted, overwritten or flushed in the meantime
+                    continue
+                self.flushing.add((c_key, o_key))
+            try:
+                data = self.fast.get_object(c_key, o_key)
+                self.slow.update_object(c_key, o_key, data, system_token)
+            except Exception as e:
+                LOG.exception(f"Flushing {c_key}/{o_key} to the slow tier failed.")
+                error = error or e
+                continue
+            else:
+                with self.lock:
+                    if self.dirty.get((c_key, o_key), (None,))[0] == version:
+                        del self.dirty[c_key, o_key]
+            finally:
+                with self.lock:
+                    self.flushing.discard((c_key, o_key))
+                    self.lock.notify_all()
+        if error is not None:
+            raise error
+
+    def _discard(self, container_key, object_key=None):
+        """
+        Drop the pending writes of an object, or of a whole container, and
+        wait for their flushes in progress.
+
+        :return: True if a pending write was dropped
+        """
+
+        def matches(key):
+            if key[0] != container_key:
+                return False
+            return object_key is None or key[1] == object_key
+
+        with self.lock:
+            dropped = [key for key in self.dirty if matches(key)]
+            for key in dropped:
+                del self.dirty[key]
+            self.lock.wait_for(lambda: not any(map(matches, self.flushing)))
+        return bool(dropped)
+
+    def _is_dirty(self, container_key, object_key):
+        with self.lock:
+            return (container_key, object_key) in self.dirty
+
+    def _fast_call(self, method, *args):
+        try:
+            return getattr(self.fast, method)(*args)
+        except Exception:
+            LOG.debug(f"Fast tier {method}{args} failed.", exc_info=True)
+            return None
+
+    def _admit(self, container_key, object_key, data):
+        if data is not None and len(data) <= self.max_cached_size:
+            self._fast_call("update_object", container_key, object_key, data)
+        else:
+            self._fast_call("delete_object", container_key, object_key)
+
+    def _read_fast(self, method, container_key, object_key, *args):
+        try:
+            return True, getattr(self.fast, method)(container_key, object_key, *args)
+        except Exception:
+            if self._is_dirty(container_key, object_key):
+                raise
+            return False, None
+
+    def _small_bytes(self, object_data):
+        if isinstance(object_data, (bytes, bytearray, memoryview)):
+            if len(object_data) <= self.max_cached_size:
+                return bytes(object_data)
+        return None
+
+    def _tee(self, container_key, object_key, chunks):
+        cached = []
+        size = 0
+        for chunk in chunks:
+            if cached is not None:
+                size += len(chunk)
+                if size <= self.max_cached_size:
+                    cached.append(chunk)
+                else:
+                    cached = None
+            yield chunk
+        if cached is not None:
+            self._admit(container_key, object_key, b"".join(cached))
+
+    def delete_object(self, container_key, object_key, system_token=None):
+        """
+        delete an object from the data store
+
+        Deleted from both tiers, after dropping a pending write-back write of the
+        object and waiting for a flush of it in progress.
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param system_token: oauth system token
+        """
+        was_dirty = self._discard(container_key, object_key)
+        self._fast_call("delete_object", container_key, object_key)
+        try:
+            return self.slow.delete_object(container_key, object_key, system_token)
+        except Exception:
+            if not was_dirty:
+                raise
+            # the object only existed in the fast tier
+
+    def get_object_streaming(self, container_key, object_key, system_token=None):
+        """
+        retrieve an object from the data store as a stream
+
+        Served from the fast tier when it holds the object; otherwise read from
+        the slow tier and admitted to the fast tier when it is at most
+        max_cached_size bytes.
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param system_token: oauth system token
+        :return content of the object as a stream
+        """
+        hit, _ = self._read_fast("get_object_metadata", container_key, object_key)
+        if hit:
+            return self.fast.get_object_streaming(container_key, object_key)
+        return self._tee(
+            container_key,
+            object_key,
+            self.slow.get_object_streaming(container_key, object_key, system_token),
+        )
+
+    def get_object(self, container_key, object_key, system_token=None):
+        """
+        retrieve an object from the data store
+
+        Served from the fast tier when it holds the object; otherwise read from
+        the slow tier and admitted to the fast tier when it is at most
+        max_cached_size bytes.
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param system_token: oauth system token
+        :return content of the object
+        """
+        hit, data = self._read_fast("get_object", container_key, object_key)
+        if hit:
+            return data
+        data = self.slow.get_object(container_key, object_key, system_token)
+        self._admit(container_key, object_key, data)
+        return data
+
+    def get_object_into(self, container_key, object_key, buffer, system_token=None):
+        """
+        retrieve an object from the data store into a writable buffer, e.g. a
+        bytearray, mmap or shared memory
+
+        Served from the fast tier when it holds the object; otherwise read from
+        the slow tier and admitted to the fast tier when it is at most
+        max_cached_size bytes.
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param buffer: writable buffer the object is written to
+        :param system_token: oauth system token
+        :return number of bytes written
+        :raises BufferTooSmallException: if the object does not fit in the buffer
+        """
+        hit, written = self._read_fast(
+            "get_object_into", container_key, object_key, buffer
+        )
+        if hit:
+            return written
+        written = self.slow.get_object_into(
+            container_key, object_key, buffer, system_token
+        )
+        if written <= self.max_cached_size:
+            self._admit(container_key, object_key, bytes(writable_view(buffer)[:written]))
+        return written
+
+    def get_object_range_streaming(
+        self, container_key, object_key, offset, length=None, system_token=None
+    ):
+        """
+        retrieve part of an object from the data store as a stream
+
+        Served from the fast tier when it holds the object, otherwise from the
+        slow tier.
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param offset: position of the first byte
+        :param length: number of bytes, None to read up to the end
+        :param system_token: oauth system token
+        :return content of the range as a stream
+        """
+        hit, _ = self._read_fast("get_object_metadata", container_key, object_key)
+        if hit:
+            return self.fast.get_object_range_streaming(
+                container_key, object_key, offset, length
+            )
+        return self.slow.get_object_range_streaming(
+            container_key, object_key, offset, length, system_token
+        )
+
+    def get_object_and_metadata(self, container_key, object_key, system_token=None):
+        """
+        retrieve an object from the data store and also return header meta data
+
+        Served from the fast tier for unflushed write-back writes, otherwise from
+        the slow tier.
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param system_token: oauth system token
+        :return content of the object
+        """
+        if self._is_dirty(container_key, object_key):
+            return self.fast.get_object_and_metadata(container_key, object_key)
+        result = self.slow.get_object_and_metadata(
+            container_key, object_key, system_token
+        )
+        self._admit(container_key, object_key, result["object"])
+        return result
+
+    def get_object_metadata(self, container_key, object_key, system_token=None):
+        """
+        retrieve an object from the data store
+
+        Served from the fast tier for unflushed write-back writes, otherwise from
+        the slow tier.
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param system_token: oauth system token
+        :return headers of the object
+        """
+        if self._is_dirty(container_key, object_key):
+            return self.fast.get_object_metadata(container_key, object_key)
+        return self.slow.get_object_metadata(container_key, object_key, system_token)
+
+    def object_exists(self, container_key, object_key, system_token=None):
+        """
+        check if an object exists in the data store
+
+        True for unflushed write-back writes, otherwise checked in the slow tier.
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param system_token: oauth system token
+        :return True if the object exists
+        """
+        if self._is_dirty(container_key, object_key):
+            return True
+        return self.slow.object_exists(container_key, object_key, system_token)
+
+    def objects_exist(self, container_key, object_keys, system_token=None):
+        """
+        check which objects exist in a container of the data store
+
+        True for unflushed write-back writes, otherwise checked in the slow tier.
+
+        :param container_key: key of the container in the data store
+        :param object_keys: keys of the objects to check
+        :param system_token: oauth system token
+        :return dict with True for every object key that exists, else False
+        """
+        object_keys = list(object_keys)
+        with self.lock:
+            dirty = {key for key in object_keys if (container_key, key) in self.dirty}
+        result = dict.fromkeys(dirty, True)
+        result.update(
+            self.slow.objects_exist(
+                container_key,
+                [key for key in object_keys if key not in dirty],
+                system_token,
+            )
+        )
+        return result
+
+    def copy_object_and_create_key(
+        self,
+        source_container_key,
+        source_object_key,
+        output_container_key,
+        system_token=None,
+    ):
+        """
+        Copy an object and create key in the data store
+
+        The source object is flushed first and copied in the slow tier.
+
+        :param source_container_key: key of the source container in the data store
+        :param source_object_key: key of the source object in the container
+        :param output_container_key: key of output container in the data store
+        :param system_token: oauth system token
+        """
+        self.flush(source_container_key, source_object_key)
+        return self.slow.copy_object_and_create_key(
+            source_container_key, source_object_key, output_container_key, system_token
+        )
+
+    def copy_object(
+        self,
+        source_container_key,
+        source_object_key,
+        output_container_key,
+        output_object_key,
+        system_token=None,
+    ):
+        """
+        Copy an object in the data store to specific key
+
+        The source object is flushed first and copied in the slow tier.
+
+        :param source_container_key: key of the source container in the data store
+        :param source_object_key: key of the source object in the container
+        :param output_container_key: key of output container in the data store
+        :param output_object_key: specific object key for the output object in the
+            container
+        :param system_token: oauth system token
+        """
+        self.flush(source_container_key, source_object_key)
+        self._discard(output_container_key, output_object_key)
+        self._fast_call("delete_object", output_container_key, output_object_key)
+        return self.slow.copy_object(
+            source_container_key,
+            source_object_key,
+            output_container_key,
+            output_object_key,
+            system_token,
+        )
+
+    def update_object_and_key(self, container_key, object_data, system_token=None):
+        """
+        create an object and key in the data store
+
+        In write-back mode small objects are only written to the fast tier until
+        they are flushed.
+
+        :param container_key: key of the container in the data store
+        :param object_data: data of the object
+        :param system_token: oauth system token
+        """
+        if self.write_mode == WRITE_BACK and self._small_bytes(object_data) is not None:
+            object_key = str(uuid.uuid4())
+            self.update_object(container_key, object_key, object_data, system_token)
+            return object_key
+        object_key = self.slow.update_object_and_key(
+            container_key, object_data, system_token
+        )
+        self._admit(container_key, object_key, self._small_bytes(object_data))
+        return object_key
+
+    def update_object(self, container_key, object_key, object_data, system_token=None):
+        """
+        update (or create) an object in the data store
+
+        In write-back mode small objects are only written to the fast tier until
+        they are flushed; other writes go to the slow tier and are then cached.
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param object_data: data of the object
+        :param system_token: oauth system token
+        """
+        data = self._small_bytes(object_data)
+        if self.write_mode == WRITE_BACK and data is not None:
+            self.fast.update_object(container_key, object_key, data)
+            with self.lock:
+                self._version += 1
+                self.dirty[container_key, object_key] = (self._version, system_token)
+            return None
+        self._discard(container_key, object_key)
+        result = self.slow.update_object(
+            container_key, object_key, object_data, system_token
+        )
+        self._admit(container_key, object_key, data)
+        return result
+
+    def list_object_keys_for_container(self, container_key, system_token=None):
+        """
+        list all object keys for a container in the data store
+
+        The container is flushed first and listed in the slow tier.
+
+        :param container_key: key of the container in the data store
+        :param system_token: oauth system token
+        :return list of object keys found in the container
+        """
+        self.flush(container_key)
+        return self.slow.list_object_keys_for_container(container_key, system_token)
+
+    def list_object_keys(self, container_key, system_token=None):
+        """
+        list all object keys for a container as a list of strings
+
+        The container is flushed first and listed in the slow tier.
+
+        :param container_key: key of the container in the data store
+        :param system_token: oauth system token
+        :return list of object keys found in the container
+        """
+        self.flush(container_key)
+        return self.slow.list_object_keys(container_key, system_token)
+
+    def list_objects_with_metadata(self, container_key, system_token=None):
+        """
+        list all objects of a container with their size, content type, etag and
+        time of last modification
+
+        The container is flushed first and listed in the slow tier.
+
+        :param container_key: key of the container in the data store
+        :param system_token: oauth system token
+        :return list of ObjectInfo
+        """
+        self.flush(container_key)
+        return self.slow.list_objects_with_metadata(container_key, system_token)
+
+    def get_container_data_streaming(
+        self, container_key, system_token=None, translations=None, archive_format="zip"
+    ):
+        """
+        Retrieve a zip of a container in the data store as a stream
+
+        The container is flushed first and exported from the slow tier.
+
+        :param container_key: key of the container in the data store
+        :param system_token: oauth system token
+        :param translations: Dict of object IDs and file names to use for them.
+        :param archive_format: ``zip``, ``tar``, ``tar.gz`` or ``tar.zst``
+        :return zip of objects as a stream
+        """
+        self.flush(container_key)
+        return self.slow.get_container_data_streaming(
+            container_key, system_token, translations, archive_format
+        )
+
+    def get_container_data(
+        self, container_key, system_token=None, translations=None, archive_format="zip"
+    ):
+        """
+        Retrieve a zip of a container in the data store.
+
+        The container is flushed first and exported from the slow tier.
+
+        :param container_key: key of the container in the data store
+        :param system_token: oauth system token
+        :param translations: Dict of object IDs and file names to use for them.
+        :param archive_format: ``zip``, ``tar``, ``tar.gz`` or ``tar.zst``
+        :return zip of the objects in the container
+        """
+        self.flush(container_key)
+        return self.slow.get_container_data(
+            container_key, system_token, translations, archive_format
+        )
+
+    def create_container(self, container_key, system_token=None):
+        """
+        create a new container with specific key in the data store
+
+        Created in both tiers.
+
+        :param container_key: key of the container in the data store
+        :param system_token: oauth system token
+        """
+        result = self.slow.create_container(container_key, system_token)
+        self._fast_call("create_container", container_key)
+        return result
+
+    def create_container_and_key(self, system_token=None):
+        """
+        create a new container in the data store and generate key
+
+        Created in both tiers.
+
+        :param system_token: oauth system token
+        :return the key generated for the container
+        """
+        container_key = self.slow.create_container_and_key(system_token)
+        self._fast_call("create_container", container_key)
+        return container_key
+
+    def delete_container(self, container_key, system_token=None):
+        """
+        delete a container in the data store
+
+        Deleted from both tiers, dropping its pending write-back writes.
+
+        :param container_key: key of the container in the data store
+        :param system_token: oauth system token
+        """
+        self._discard(container_key)
+        self._fast_call("delete_container", container_key)
+        return self.slow.delete_container(container_key, system_token)
+
+    def get_object_from_archive(
+        self, container_key, object_key, file_name, system_token=None
+    ):
+        """
+        retrieve an object from an archive in the data store
+
+        Read from the fast tier when it holds the object, otherwise from the slow
+        tier.
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param file_name: name of the file to get from the zip
+        :param system_token: oauth system token
+        :return content of the file
+        """
+        hit, data = self._read_fast(
+            "get_object_from_archive", container_key, object_key, file_name
+        )
+        if hit:
+            return data
+        return self.slow.get_object_from_archive(
+            container_key, object_key, file_name, system_token
+        )
+
+    def get_object_from_archive_streaming(
+        self, container_key, object_key, file_name, system_token=None
+    ):
+        """
+        retrieve an object from an archive in the data storeas a stream
+
+        The object is flushed first and read from the slow tier.
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param system_token: oauth system token
+        :return content of the file as a stream
+        """
+        self.flush(container_key, object_key)
+        return self.slow.get_object_from_archive_streaming(
+            container_key, object_key, file_name, system_token
+        )
+
+    def replace_file_in_zip_object(
+        self,
+        container_key,
+        object_key,
+        file_to_replace,
+        new_file_content,
+        new_file_name,
+        system_token=None,
+    ):
+        """
+        replace a file in a zip in the data store
+
+        The object is flushed first, replaced in the slow tier and dropped from
+        the fast tier.
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param file_to_replace: name of the file to replace in the zip
+        :param new_file_content: content of the new file
+        :param new_file_name: name of the new file
+        :param system_token: oauth system token
+        :return container and object key of the updated zip file
+        """
+        self.flush(container_key, object_key)
+        self._fast_call("delete_object", container_key, object_key)
+        return self.slow.replace_file_in_zip_object(
+            container_key,
+            object_key,
+            file_to_replace,
+            new_file_content,
+            new_file_name,
+            system_token,
+        )
+
+    def get_object_url(
+        self,
+        container_key,
+        object_key,
+        system_token=None,
+        expires=3600,
+        content_disposition=None,
+        content_type=None,
+    ):
+        """
+        get a temporary url to download an object directly from the data store
+
+        The object is flushed first, the url points at the slow tier.
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param system_token: oauth system token
+        :param expires: seconds (or a timedelta) the url stays valid
+        :param content_disposition: Content-Disposition header of the download
+        :param content_type: Content-Type header of the download
+        :return the url
+        :raises NotImplementedError: if the data store can not hand out urls
+        """
+        self.flush(container_key, object_key)
+        return self.slow.get_object_url(
+            container_key,
+            object_key,
+            system_token,
+            expires,
+            content_disposition,
+            content_type,
+        )
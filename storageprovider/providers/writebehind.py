@@ -0,0 +1,1024 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from dataclasses import field
+from datetime import datetime
+from datetime import timezone
+
+from storageprovider.providers import BaseStorageProvider
+from storageprovider.providers import ObjectInfo
+from storageprovider.providers import skip_range
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+LOG = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass
+class WriteBehindStatus:
+    """
+    State of the spool: the number of writes waiting for an upload, being
+    uploaded and given up on (with their last error), and the bytes spooled.
+    """
+
+    pending: int = 0
+    uploading: int = 0
+    failed: dict = field(default_factory=dict)
+    spooled_bytes: int = 0
+
+    @property
+    def ok(self):
+        return not self.failed
+
+
+class _Entry:
+    """
+    One spooled write.
+    """
+
+    def __init__(
+        self, path, state_path, container_key, object_key, size, etag, modified
+    ):
+        self.path = path
+        self.state_path = state_path
+        self.container_key = container_key
+        self.object_key = object_key
+        self.size = size
+        self.etag = etag
+        self.modified = modified
+        self.system_token = None
+        self.attempts = 0
+        self.not_before = 0
+        self.error = None
+
+    @property
+    def key(self):
+        return self.container_key, self.object_key
+
+    def metadata(self):
+        return {
+            "time_last_modification": datetime.fromtimestamp(self.modified, timezone.utc),
+            "mime": "application/octet-stream",
+            "size": self.size,
+            "content-type": "application/octet-stream",
+            "content-length": self.size,
+            "etag": self.etag,
+        }
+
+    def state(self):
+        return {
+            "container_key": self.container_key,
+            "object_key": self.object_key,
+            "size": self.size,
+            "etag": self.etag,
+            "modified": self.modified,
+        }
+
+
+class WriteBehindProvider(BaseStorageProvider):
+    """
+    Acknowledges writes as soon as they are in a local spool directory and
+    uploads them in the background.
+
+    Every write is fsynced to ``spool_dir`` before ``update_object`` returns
+    and then uploaded by a pool of ``workers`` threads. Writes of one object
+    are uploaded in order and a write that was not picked up yet is replaced
+    by a newer write of the same object. Failed uploads are retried
+    ``max_retries`` times with an exponential backoff and are then kept in
+    the spool until :meth:`retry_failed`. When ``max_spool_size`` bytes are
+    spooled, writes block until uploads make room.
+
+    Reads of spooled objects are served from the spool. Deletes, copies,
+    exports and urls first wait for the spooled writes they depend on.
+
+    Every instance spools to a directory of its own in ``spool_dir``, held
+    with an exclusive ``flock`` on a lock file next to it, so instances can
+    share a ``spool_dir``. Spooled writes survive a restart: a new instance
+    takes over the directories whose lock is free, those of instances that
+    stopped, and uploads their writes. System tokens are never written to
+    disk, such writes are uploaded with ``recovery_token``.
+    """
+
+    def __init__(
+        self,
+        provider: BaseStorageProvider,
+        spool_dir: str,
+        workers: int = 4,
+        max_spool_size: int = 1024 * 1024 * 1024,
+        max_retries: int = 5,
+        retry_delay: float = 1.0,
+        recovery_token: str = None,
+        put_timeout: float = None,
+    ):
+        """
+        :param provider: the provider the writes are uploaded to
+        :param spool_dir: directory holding the spool directories of the
+            instances
+        :param workers: number of upload threads
+        :param max_spool_size: spooled bytes at which writes start to block
+        :param max_retries: retries of a failed upload before it is given up on
+        :param retry_delay: seconds before the first retry, doubled every retry
+        :param recovery_token: system token for writes spooled by an instance
+            that stopped
+        :param put_timeout: seconds a write waits for room in the spool before
+            raising SpoolFullException, None to wait as long as it takes
+        """
+        if fcntl is None:
+            raise ValueError("WriteBehindProvider needs fcntl to lock its spool")
+        self.provider = provider
+        self.spool_dir = os.fspath(spool_dir)
+        self.max_spool_size = max_spool_size
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.recovery_token = recovery_token
+        self.put_timeout = put_timeout
+        self.condition = threading.Condition()
+        # {(container_key, object_key): _Entry}
+        self.queued = {}
+        self.uploading = {}
+        self.failed = {}
+        self.spooled_bytes = 0
+        self._seq = 0
+        self._stop = False
+        os.makedirs(self.spool_dir, exist_ok=True)
+        # {spool directory: open lock file holding its flock}
+        self._locks = {}
+        self.instance_dir = os.path.join(self.spool_dir, uuid.uuid4().hex)
+        self._lock(self.instance_dir)
+        os.mkdir(self.instance_dir)
+        _fsync_dir(self.spool_dir)
+        with self.condition:
+            self._recover()
+        self._workers = [
+            threading.Thread(target=self._work, daemon=True) for _ in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def _path(self, seq, suffix):
+        return os.path.join(self.instance_dir, f"{seq:016d}{suffix}")
+
+    def _lock(self, directory):
+        """
+        Take the exclusive lock of a spool directory.
+
+        :return: True if the lock was free
+        """
+        f = open(f"{directory}.lock", "a")
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        self._locks[directory] = f
+        return True
+
+    def _release(self, directory):
+        """
+        Release the lock of a spool directory, removing it when it is empty.
+        """
+        f = self._locks.pop(directory)
+        try:
+            try:
+                os.rmdir(directory)
+            except FileNotFoundError:
+                pass
+            os.unlink(f"{directory}.lock")
+        except OSError:
+            # still holds spooled writes, a later instance takes them over
+            pass
+        f.close()
+
+    def _recover(self):
+        """
+        Take over the spool directories of instances that stopped. Called
+        with the condition held.
+        """
+        entries = []
+        names = {
+            name[: -len(".lock")] if name.endswith(".lock") else name
+            for name in os.listdir(self.spool_dir)
+        }
+        for name in sorted(names):
+            directory = os.path.join(self.spool_dir, name)
+            if directory == self.instance_dir or os.path.isfile(directory):
+                continue
+            if not self._lock(directory):
+                # the spool of a running instance
+                continue
+            if os.path.isdir(directory):
+                entries.extend(self._recover_dir(directory))
+            else:
+                # removed by its instance, or the instance stopped before
+                # creating it
+                self._release(directory)
+        # the latest write of an object wins
+        for entry in sorted(entries, key=lambda entry: entry.modified):
+            entry.system_token = self.recovery_token
+            self._add(entry)
+        if self.queued:
+            LOG.info(f"Recovered {len(self.queued)} spooled writes.")
+
+    def _recover_dir(self, directory):
+        """
+        :return: the acknowledged writes in the spool directory of an instance
+            that stopped, after removing its unacknowledged writes
+        """
+        entries = []
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            if name.endswith(".tmp"):
+                os.unlink(path)
+                continue
+            if not name.endswith(".json"):
+                continue
+            data_path = f"{path[: -len('.json')]}.data"
+            try:
+                with open(path, encoding="utf-8") as f:
+                    state = json.load(f)
+                entries.append(_Entry(data_path, path, **state))
+            except (OSError, ValueError, TypeError):
+                LOG.warning(f"Spooled write {path} is unreadable.", exc_info=True)
+        known = {entry.path for entry in entries}
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if name.endswith(".data") and path not in known:
+                # written, but never acknowledged
+                os.unlink(path)
+        return entries
+
+    def _add(self, entry):
+        """
+        Queue a spooled write, replacing writes of the same object that were
+        not picked up yet. Called with the condition held.
+        """
+        for entries in (self.queued, self.failed):
+            old = entries.pop(entry.key, None)
+            if old is not None:
+                self._remove(old)
+        self.queued[entry.key] = entry
+        self.spooled_bytes += entry.size
+        self.condition.notify_all()
+
+    def _remove(self, entry):
+        """
+        Remove a spooled write from disk. Called with the condition held.
+        """
+        self.spooled_bytes -= entry.size
+        for path in (entry.state_path, entry.path):
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+        self.condition.notify_all()
+
+    def _spool(self, container_key, object_key, object_data, system_token):
+        with self.condition:
+            if not self.condition.wait_for(
+                lambda: self.spooled_bytes < self.max_spool_size, self.put_timeout
+            ):
+                raise SpoolFullException(self.spooled_bytes, self.max_spool_size)
+            self._seq += 1
+            seq = self._seq
+        if isinstance(object_data, str):
+            object_data = object_data.encode()
+        if isinstance(object_data, (bytes, bytearray, memoryview)):
+            chunks = [object_data]
+        elif hasattr(object_data, "read"):
+            chunks = iter(lambda: object_data.read(CHUNK_SIZE), b"")
+        else:
+            chunks = object_data
+        digest = hashlib.md5()
+        size = 0
+        path = self._path(seq, ".data")
+        state_path = self._path(seq, ".json")
+        try:
+            with open(path, "wb") as f:
+                for chunk in chunks:
+                    digest.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+                f.flush()
+                os.fsync(f.fileno())
+            etag = digest.hexdigest()
+            entry = _Entry(
+                path, state_path, container_key, object_key, size, etag, time.time()
+            )
+            with open(f"{state_path}.tmp", "w", encoding="utf-8") as f:
+                json.dump(entry.state(), f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(f"{state_path}.tmp", state_path)
+            _fsync_dir(self.instance_dir)
+        except BaseException:
+            for temp in (path, f"{state_path}.tmp"):
+                if os.path.exists(temp):
+                    os.unlink(temp)
+            raise
+        entry.system_token = system_token
+        with self.condition:
+            self._add(entry)
+
+    def _next(self):
+        """
+        :return: (the oldest write to upload now or None, seconds to wait)
+        """
+        now = time.monotonic()
+        wait = None
+        for key, entry in self.queued.items():
+            if key in self.uploading:
+                continue
+            if entry.not_before <= now:
+                return entry, None
+            delay = entry.not_before - now
+            wait = delay if wait is None else min(wait, delay)
+        return None, wait
+
+    def _work(self):
+        while True:
+            with self.condition:
+                entry, wait = self._next()
+                while entry is None:
+                    if self._stop:
+                        return
+                    self.condition.wait(wait)
+                    entry, wait = self._next()
+                del self.queued[entry.key]
+                self.uploading[entry.key] = entry
+            try:
+                self._upload(entry)
+            except Exception as e:
+                with self.condition:
+                    del self.uploading[entry.key]
+                    self._failed(entry, e)
+            else:
+                with self.condition:
+                    del self.uploading[entry.key]
+                    self._remove(entry)
+
+    def _upload(self, entry):
+        with open(entry.path, "rb") as f:
+            data = f.read() if entry.size <= CHUNK_SIZE else f
+            self.provider.update_object(
+                entry.container_key, entry.object_key, data, entry.system_token
+            )
+
+    def _failed(self, entry, error):
+        """
+        Schedule a retry of a failed upload. Called with the condition held.
+        """
+        entry.attempts += 1
+        entry.error = error
+        if entry.key in self.queued:
+            # a newer write replaces it
+            self._remove(entry)
+        elif entry.attempts > self.max_retries:
+            LOG.error(
+                f"Uploading {entry.container_key}/{entry.object_key} failed "
+                f"{entry.attempts} times, keeping it in the spool.",
+                exc_info=error,
+            )
+            self.failed[entry.key] = entry
+        else:
+            LOG.warning(
+                f"Uploading {entry.container_key}/{entry.object_key} failed, "
+                f"retrying.",
+                exc_info=error,
+            )
+            entry.not_before = (
+                time.monotonic() + self.retry_delay * 2 ** (entry.attempts - 1)
+            )
+            self.queued[entry.key] = entry
+        self.condition.notify_all()
+
+    def retry_failed(self):
+        """
+        Queue the uploads that were given up on again.
+        """
+        with self.condition:
+            for entry in self.failed.values():
+                if entry.key in self.queued:
+                    self._remove(entry)
+                    continue
+                entry.attempts = 0
+                entry.not_before = 0
+                self.queued[entry.key] = entry
+            self.failed.clear()
+            self.condition.notify_all()
+
+    def status(self):
+        """
+        :return: WriteBehindStatus of the spool
+        """
+        with self.condition:
+            return WriteBehindStatus(
+                pending=len(self.queued),
+                uploading=len(self.uploading),
+                failed={
+                    f"{entry.container_key}/{entry.object_key}": repr(entry.error)
+                    for entry in self.failed.values()
+                },
+                spooled_bytes=self.spooled_bytes,
+            )
+
+    def flush(self, container_key=None, object_key=None, timeout=None):
+        """
+        Wait until the spooled writes are uploaded or given up on.
+
+        :param container_key: only wait for writes of this container
+        :param object_key: only wait for writes of this object
+        :param timeout: seconds to wait at most, None to wait as long as it
+            takes
+        :return: WriteBehindStatus of the spool
+        """
+
+        def done():
+            return not any(
+                (container_key is None or key[0] == container_key)
+                and (object_key is None or key[1] == object_key)
+                for entries in (self.queued, self.uploading)
+                for key in entries
+            )
+
+        with self.condition:
+            self.condition.wait_for(done, timeout)
+        return self.status()
+
+    def close(self, timeout=None):
+        """
+        Upload the spooled writes, stop the workers and release the spool.
+
+        :param timeout: seconds to wait for the uploads at most, None to wait
+            as long as it takes. Writes that are left are uploaded by the
+            next instance using the spool_dir
+        """
+        self.flush(timeout=timeout)
+        with self.condition:
+            self._stop = True
+            self.condition.notify_all()
+        for worker in self._workers:
+            worker.join()
+        with self.condition:
+            for directory in list(self._locks):
+                self._release(directory)
+
+    def _spooled(self, container_key, object_key):
+        """
+        :return: (latest spooled write of the object, its data file opened
+            for reading), (None, None) if it has none
+        """
+        key = container_key, object_key
+        with self.condition:
+            for entries in (self.queued, self.uploading, self.failed):
+                entry = entries.get(key)
+                if entry is not None:
+                    # opened with the condition held, so it is not removed first
+                    return entry, open(entry.path, "rb")
+        return None, None
+
+    def _spooled_keys(self, container_key):
+        with self.condition:
+            return {
+                key[1]: entry
+                for entries in (self.failed, self.uploading, self.queued)
+                for key, entry in entries.items()
+                if key[0] == container_key
+            }
+
+    def _discard(self, container_key=None, object_key=None):
+        """
+        Drop the spooled writes of an object, or of a whole container, and
+        wait for their uploads in progress.
+
+        :return: True if a spooled write was dropped
+        """
+
+        def matches(key):
+            if key[0] != container_key:
+                return False
+            return object_key is None or key[1] == object_key
+
+        with self.condition:
+            dropped = False
+            for entries in (self.queued, self.failed):
+                for key in [key for key in entries if matches(key)]:
+                    self._remove(entries.pop(key))
+                    dropped = True
+            self.condition.wait_for(lambda: not any(map(matches, self.uploading)))
+        return dropped
+
+    def delete_object(self, container_key, object_key, system_token=None):
+        """
+        delete an object from the data store
+
+        Spooled writes of the object are dropped and uploads of it in progress
+        waited for before it is deleted.
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param system_token: oauth system token
+        """
+        if self._discard(container_key, object_key) and not self.provider.object_exists(
+            container_key, object_key, system_token
+        ):
+            return None
+        return self.provider.delete_object(container_key, object_key, system_token)
+
+    def get_object_streaming(self, container_key, object_key, system_token=None):
+        """
+        retrieve an object from the data store as a stream
+
+        A spooled write of the object is served from the spool, otherwise the
+        object is read from the wrapped provider.
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param system_token: oauth system token
+        :return content of the object as a stream
+        """
+        entry, f = self._spooled(container_key, object_key)
+        if entry is not None:
+            return _read_file(f)
+        return self.provider.get_object_streaming(container_key, object_key, system_token)
+
+    def get_object(self, container_key, object_key, system_token=None):
+        """
+        retrieve an object from the data store
+
+        A spooled write of the object is served from the spool, otherwise the
+        object is read from the wrapped provider.
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param system_token: oauth system token
+        :return content of the object
+        """
+        entry, f = self._spooled(container_key, object_key)
+        if entry is not None:
+            with f:
+                return f.read()
+        return self.provider.get_object(container_key, object_key, system_token)
+
+    def get_object_into(self, container_key, object_key, buffer, system_token=None):
+        """
+        retrieve an object from the data store into a writable buffer, e.g. a
+        bytearray, mmap or shared memory
+
+        A spooled write of the object is served from the spool, otherwise the
+        object is read from the wrapped provider.
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param buffer: writable buffer the object is written to
+        :param system_token: oauth system token
+        :return number of bytes written
+        :raises BufferTooSmallException: if the object does not fit in the buffer
+        """
+        entry, f = self._spooled(container_key, object_key)
+        if entry is not None:
+            f.close()
+            return super().get_object_into(
+                container_key, object_key, buffer, system_token
+            )
+        return self.provider.get_object_into(
+            container_key, object_key, buffer, system_token
+        )
+
+    def get_object_range_streaming(
+        self, container_key, object_key, offset, length=None, system_token=None
+    ):
+        """
+        retrieve part of an object from the data store as a stream
+
+        A spooled write of the object is served from the spool, otherwise the
+        object is read from the wrapped provider.
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param offset: position of the first byte
+        :param length: number of bytes, None to read up to the end
+        :param system_token: oauth system token
+        :return content of the range as a stream
+        """
+        entry, f = self._spooled(container_key, object_key)
+        if entry is not None:
+            f.seek(min(offset, entry.size))
+            return skip_range(_read_file(f), 0, length)
+        return self.provider.get_object_range_streaming(
+            container_key, object_key, offset, length, system_token
+        )
+
+    def get_object_and_metadata(self, container_key, object_key, system_token=None):
+        """
+        retrieve an object from the data store and also return header meta data
+
+        A spooled write of the object is served from the spool, otherwise the
+        object is read from the wrapped provider.
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param system_token: oauth system token
+        :return content of the object
+        """
+        entry, f = self._spooled(container_key, object_key)
+        if entry is not None:
+            with f:
+                return {"object": f.read(), "metadata": entry.metadata()}
+        return self.provider.get_object_and_metadata(
+            container_key, object_key, system_token
+        )
+
+    def get_object_metadata(self, container_key, object_key, system_token=None):
+        """
+        retrieve an object from the data store
+
+        Computed from the spooled write of the object when there is one.
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param system_token: oauth system token
+        :return headers of the object
+        """
+        entry, f = self._spooled(container_key, object_key)
+        if entry is not None:
+            f.close()
+            return entry.metadata()
+        return self.provider.get_object_metadata(container_key, object_key, system_token)
+
+    def object_exists(self, container_key, object_key, system_token=None):
+        """
+        check if an object exists in the data store
+
+        True for objects with a spooled write, otherwise checked in the wrapped
+        provider.
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param system_token: oauth system token
+        :return True if the object exists
+        """
+        if object_key in self._spooled_keys(container_key):
+            return True
+        return self.provider.object_exists(container_key, object_key, system_token)
+
+    def objects_exist(self, container_key, object_keys, system_token=None):
+        """
+        check which objects exist in a container of the data store
+
+        True for objects with a spooled write, otherwise checked in the wrapped
+        provider.
+
+        :param container_key: key of the container in the data store
+        :param object_keys: keys of the objects to check
+        :param system_token: oauth system token
+        :return dict with True for every object key that exists, else False
+        """
+        object_keys = list(object_keys)
+        spooled = self._spooled_keys(container_key)
+        stored = [key for key in object_keys if key not in spooled]
+        exists = self.provider.objects_exist(container_key, stored, system_token)
+        return {key: key in spooled or exists[key] for key in object_keys}
+
+    def copy_object_and_create_key(
+        self,
+        source_container_key,
+        source_object_key,
+        output_container_key,
+        system_token=None,
+    ):
+        """
+        Copy an object and create key in the data store
+
+        The spooled writes of the source are uploaded first.
+
+        :param source_container_key: key of the source container in the data store
+        :param source_object_key: key of the source object in the container
+        :param output_container_key: key of output container in the data store
+        :param system_token: oauth system token
+        """
+        self.flush(source_container_key, source_object_key)
+        return self.provider.copy_object_and_create_key(
+            source_container_key, source_object_key, output_container_key, system_token
+        )
+
+    def copy_object(
+        self,
+        source_container_key,
+        source_object_key,
+        output_container_key,
+        output_object_key,
+        system_token=None,
+    ):
+        """
+        Copy an object in the data store to specific key
+
+        The spooled writes of the source are uploaded first, those of the output
+        are dropped.
+
+        :param source_container_key: key of the source container in the data store
+        :param source_object_key: key of the source object in the container
+        :param output_container_key: key of output container in the data store
+        :param output_object_key: specific object key for the output object in the
+            container
+        :param system_token: oauth system token
+        """
+        self.flush(source_container_key, source_object_key)
+        self._discard(output_container_key, output_object_key)
+        return self.provider.copy_object(
+            source_container_key,
+            source_object_key,
+            output_container_key,
+            output_object_key,
+            system_token,
+        )
+
+    def update_object_and_key(self, container_key, object_data, system_token=None):
+        """
+        create an object and key in the data store
+
+        Returns once the object is fsynced to the spool, it is uploaded in the
+        background.
+
+        :param container_key: key of the container in the data store
+        :param object_data: data of the object
+        :param system_token: oauth system token
+        """
+        object_key = str(uuid.uuid4())
+        self.update_object(container_key, object_key, object_data, system_token)
+        return object_key
+
+    def update_object(self, container_key, object_key, object_data, system_token=None):
+        """
+        update (or create) an object in the data store
+
+        Returns once the object is fsynced to the spool, it is uploaded in the
+        background. Blocks while max_spool_size bytes are spooled.
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param object_data: data of the object
+        :param system_token: oauth system token
+        :raises SpoolFullException: if there is no room before put_timeout
+        """
+        self._spool(container_key, object_key, object_data, system_token)
+        return None
+
+    def list_object_keys_for_container(self, container_key, system_token=None):
+        """
+        list all object keys for a container in the data store
+
+        Includes the objects with a spooled write.
+
+        :param container_key: key of the container in the data store
+        :param system_token: oauth system token
+        :return list of object keys found in the container
+        """
+        keys = set(self.provider.list_object_keys(container_key, system_token))
+        keys.update(self._spooled_keys(container_key))
+        return sorted(keys)
+
+    def list_object_keys(self, container_key, system_token=None):
+        """
+        list all object keys for a container as a list of strings
+
+        Includes the objects with a spooled write.
+
+        :param container_key: key of the container in the data store
+        :param system_token: oauth system token
+        :return list of object keys found in the container
+        """
+        return self.list_object_keys_for_container(container_key, system_token)
+
+    def list_objects_with_metadata(self, container_key, system_token=None):
+        """
+        list all objects of a container with their size, content type, etag and
+        time of last modification
+
+        Includes the objects with a spooled write, with the metadata of that
+        write.
+
+        :param container_key: key of the container in the data store
+        :param system_token: oauth system token
+        :return list of ObjectInfo
+        """
+        spooled = self._spooled_keys(container_key)
+        infos = {
+            info.key: info
+            for info in self.provider.list_objects_with_metadata(
+                container_key, system_token
+            )
+        }
+        for object_key, entry in spooled.items():
+            infos[object_key] = ObjectInfo.from_metadata(object_key, entry.metadata())
+        return [infos[key] for key in sorted(infos)]
+
+    def get_container_data_streaming(
+        self, container_key, system_token=None, translations=None, archive_format="zip"
+    ):
+        """
+        Retrieve a zip of a container in the data store as a stream
+
+        The spooled writes of the container are uploaded first.
+
+        :param container_key: key of the container in the data store
+        :param system_token: oauth system token
+        :param translations: Dict of object IDs and file names to use for them.
+        :param archive_format: ``zip``, ``tar``, ``tar.gz`` or ``tar.zst``
+        :return zip of objects as a stream
+        """
+        self.flush(container_key)
+        return self.provider.get_container_data_streaming(
+            container_key, system_token, translations, archive_format
+        )
+
+    def get_container_data(
+        self, container_key, system_token=None, translations=None, archive_format="zip"
+    ):
+        """
+        Retrieve a zip of a container in the data store.
+
+        The spooled writes of the container are uploaded first.
+
+        :param container_key: key of the container in the data store
+        :param system_token: oauth system token
+        :param translations: Dict of object IDs and file names to use for them.
+        :param archive_format: ``zip``, ``tar``, ``tar.gz`` or ``tar.zst``
+        :return zip of the objects in the container
+        """
+        self.flush(container_key)
+        return self.provider.get_container_data(
+            container_key, system_token, translations, archive_format
+        )
+
+    def create_container(self, container_key, system_token=None):
+        """
+        create a new container with specific key in the data store
+
+        :param container_key: key of the container in the data store
+        :param system_token: oauth system token
+        """
+        return self.provider.create_container(container_key, system_token)
+
+    def create_container_and_key(self, system_token=None):
+        """
+        create a new container in the data store and generate key
+
+        :param system_token: oauth system token
+        :return the key generated for the container
+        """
+        return self.provider.create_container_and_key(system_token)
+
+    def delete_container(self, container_key, system_token=None):
+        """
+        delete a container in the data store
+
+        Spooled writes of the container are dropped and uploads in progress waited
+        for first.
+
+        :param container_key: key of the container in the data store
+        :param system_token: oauth system token
+        """
+        self._discard(container_key)
+        return self.provider.delete_container(container_key, system_token)
+
+    def get_object_from_archive(
+        self, container_key, object_key, file_name, system_token=None
+    ):
+        """
+        retrieve an object from an archive in the data store
+
+        The spooled writes of the object are uploaded first.
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param file_name: name of the file to get from the zip
+        :param system_token: oauth system token
+        :return content of the file
+        """
+        self.flush(container_key, object_key)
+        return self.provider.get_object_from_archive(
+            container_key, object_key, file_name, system_token
+        )
+
+    def get_object_from_archive_streaming(
+        self, container_key, object_key, file_name, system_token=None
+    ):
+        """
+        retrieve an object from an archive in the data storeas a stream
+
+        The spooled writes of the object are uploaded first.
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param system_token: oauth system token
+        :return content of the file as a stream
+        """
+        self.flush(container_key, object_key)
+        return self.provider.get_object_from_archive_streaming(
+            container_key, object_key, file_name, system_token
+        )
+
+    def replace_file_in_zip_object(
+        self,
+        container_key,
+        object_key,
+        file_to_replace,
+        new_file_content,
+        new_file_name,
+        system_token=None,
+    ):
+        """
+        replace a file in a zip in the data store
+
+        The spooled writes of the object are uploaded first.
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param file_to_replace: name of the file to replace in the zip
+        :param new_file_content: content of the new file
+        :param new_file_name: name of the new file
+        :param system_token: oauth system token
+        :return container and object key of the updated zip file
+        """
+        self.flush(container_key, object_key)
+        return self.provider.replace_file_in_zip_object(
+            container_key,
+            object_key,
+            file_to_replace,
+            new_file_content,
+            new_file_name,
+            system_token,
+        )
+
+    def get_object_url(
+        self,
+        container_key,
+        object_key,
+        system_token=None,
+        expires=3600,
+        content_disposition=None,
+        content_type=None,
+    ):
+        """
+        get a temporary url to download an object directly from the data store
+
+        The spooled writes of the object are uploaded first.
+
+        :param container_key: key of the container in the data store
+        :param object_key: specific object key for the object in the container
+        :param system_token: oauth system token
+        :param expires: seconds (or a timedelta) the url stays valid
+        :param content_disposition: Content-Disposition header of the download
+        :param content_type: Content-Type header of the download
+        :return the url
+        :raises NotImplementedError: if the data store can not hand out urls
+        """
+        self.flush(container_key, object_key)
+        return self.provider.get_object_url(
+            container_key,
+            object_key,
+            system_token,
+            expires,
+            content_disposition,
+            content_type,
+        )
+
+
+def _read_file(f, chunk_size=CHUNK_SIZE):
+    with f:
+        yield from iter(lambda: f.read(chunk_size), b"")
+
+
+def _fsync_dir(path):
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class SpoolFullException(Exception):
+    def __init__(self, spooled_bytes, max_spool_size):
+        self.spooled_bytes = spooled_bytes
+        self.max_spool_size = max_spool_size
+
+    def __str__(self):
+        return (
+            f"{self.spooled_bytes} bytes spooled, no room for a write before the "
+            f"timeout (max_spool_size {self.max_spool_size})"
+        )
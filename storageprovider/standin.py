@@ -0,0 +1,260 @@
+"""
+A local stand-in for an Augeias server.
+
+It implements the part of the Augeias REST api used by
+:class:`storageprovider.providers.augeias.AugeiasProvider` on top of
+in-memory providers, so development tools like the load generator can run
+without a real Augeias instance. It is not meant for production use.
+"""
+import json
+import re
+import threading
+from email.utils import format_datetime
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qsl
+from urllib.parse import unquote
+from wsgiref.simple_server import WSGIRequestHandler
+from wsgiref.simple_server import WSGIServer
+from wsgiref.simple_server import make_server
+
+from storageprovider.providers.memory import InMemoryProvider
+from storageprovider.providers.memory import InvalidArchiveException
+from storageprovider.providers.memory import NotFoundException
+
+CONTAINERS_RE = re.compile(r"^/collections/(?P<collection>[^/]+)/containers/?$")
+CONTAINER_RE = re.compile(
+    r"^/collections/(?P<collection>[^/]+)/containers/(?P<container_key>[^/]+)/?$"
+)
+OBJECT_RE = re.compile(
+    r"^/collections/(?P<collection>[^/]+)/containers/(?P<container_key>[^/]+)"
+    r"/(?P<object_key>[^/]+)(?:/(?P<file_name>.+))?$"
+)
+
+STATUS = {
+    200: "200 OK",
+    201: "201 Created",
+    400: "400 Bad Request",
+    404: "404 Not Found",
+    405: "405 Method Not Allowed",
+}
+
+
+class HTTPError(Exception):
+    def __init__(self, status_code, message):
+        self.status_code = status_code
+        self.message = message
+
+
+class AugeiasStandin:
+    """
+    WSGI application mimicking an Augeias server.
+
+    Every collection is stored in its own
+    :class:`storageprovider.providers.memory.InMemoryProvider`.
+    """
+
+    def __init__(self, provider_factory=InMemoryProvider):
+        self.provider_factory = provider_factory
+        self.lock = threading.Lock()
+        self.collections = {}
+
+    def provider(self, collection) -> InMemoryProvider:
+        with self.lock:
+            if collection not in self.collections:
+                self.collections[collection] = self.provider_factory()
+            return self.collections[collection]
+
+    def __call__(self, environ, start_response):
+        method = environ["REQUEST_METHOD"]
+        path = unquote(environ.get("PATH_INFO", ""))
+        try:
+            status_code, headers, body = self.dispatch(method, path, environ)
+        except (HTTPError, NotFoundException, InvalidArchiveException) as e:
+            status_code = getattr(e, "status_code", None) or (
+                404 if isinstance(e, NotFoundException) else 400
+            )
+            headers = [("Content-Type", "text/plain")]
+            body = str(e).encode()
+        headers.append(("Content-Length", str(len(body))))
+        start_response(STATUS[status_code], headers)
+        return [b""] if method == "HEAD" else [body]
+
+    def dispatch(self, method, path, environ):
+        match = CONTAINERS_RE.match(path)
+        if match:
+            if method != "POST":
+                raise HTTPError(405, "Method not allowed")
+            container_key = self.provider(match["collection"]).create_container_and_key()
+            return self._json(201, {"container_key": container_key})
+
+        match = CONTAINER_RE.match(path)
+        if match:
+            return self._container_view(
+                method, match["collection"], match["container_key"], environ
+            )
+
+        match = OBJECT_RE.match(path)
+        if match:
+            if match["file_name"] == "meta":
+                return self._meta_view(method, *match.group(1, 2, 3))
+            if match["file_name"]:
+                return self._archive_view(method, *match.group(1, 2, 3, 4), environ)
+            return self._object_view(method, *match.group(1, 2, 3), environ)
+        raise HTTPError(404, "Not found")
+
+    def _container_view(self, method, collection, container_key, environ):
+        provider = self.provider(collection)
+        if method == "PUT":
+            provider.create_container(container_key)
+            return self._json(200, {"container_key": container_key})
+        if method == "DELETE":
+            provider.delete_container(container_key)
+            return self._json(200, {"container_key": container_key})
+        if method == "POST":
+            data = self._object_data(collection, environ)
+            object_key = provider.update_object_and_key(container_key, data)
+            return self._json(201, {"object_key": object_key})
+        if method in ("GET", "HEAD"):
+            if "application/zip" in environ.get("HTTP_ACCEPT", ""):
+                translations = dict(parse_qsl(environ.get("QUERY_STRING", "")))
+                data = provider.get_container_data(
+                    container_key, translations=translations
+                )
+                return 200, [("Content-Type", "application/zip")], data
+            return self._json(200, provider.list_object_keys_for_container(container_key))
+        raise HTTPError(405, "Method not allowed")
+
+    def _object_view(self, method, collection, container_key, object_key, environ):
+        provider = self.provider(collection)
+        if method in ("GET", "HEAD"):
+            result = provider.get_object_and_metadata(container_key, object_key)
+            headers = [
+                ("Content-Type", result["metadata"]["mime"]),
+                ("ETag", f'"{result["metadata"]["etag"]}"'),
+                (
+                    "Last-Modified",
+                    format_datetime(
+                        result["metadata"]["time_last_modification"], usegmt=True
+                    ),
+                ),
+            ]
+            return 200, headers, result["object"]
+        if method == "PUT":
+            data = self._object_data(collection, environ)
+            provider.update_object(container_key, object_key, data)
+            return self._json(200, {"object_key": object_key})
+        if method == "DELETE":
+            provider.delete_object(container_key, object_key)
+            return self._json(200, {"object_key": object_key})
+        raise HTTPError(405, "Method not allowed")
+
+    def _meta_view(self, method, collection, container_key, object_key):
+        if method not in ("GET", "HEAD"):
+            raise HTTPError(405, "Method not allowed")
+        metadata = self.provider(collection).get_object_metadata(
+            container_key, object_key
+        )
+        return self._json(
+            200,
+            {
+                "mime": metadata["mime"],
+                "size": metadata["size"],
+                "time_last_modification": metadata["time_last_modification"].isoformat(),
+            },
+        )
+
+    def _archive_view(
+        self, method, collection, container_key, object_key, file_name, environ
+    ):
+        provider = self.provider(collection)
+        if method in ("GET", "HEAD"):
+            content = provider.get_object_from_archive(
+                container_key, object_key, file_name
+            )
+            return 200, [("Content-Type", "application/octet-stream")], content
+        if method == "PUT":
+            params = dict(parse_qsl(environ.get("QUERY_STRING", "")))
+            result = provider.replace_file_in_zip_object(
+                container_key,
+                object_key,
+                file_name,
+                self._read_body(environ),
+                params.get("new_file_name", file_name),
+            )
+            return self._json(200, result)
+        raise HTTPError(405, "Method not allowed")
+
+    def _object_data(self, collection, environ):
+        body = self._read_body(environ)
+        if environ.get("CONTENT_TYPE", "").startswith("application/json"):
+            source = json.loads(body)
+            return self.provider(source.get("collection_key", collection)).get_object(
+                source["container_key"], source["object_key"]
+            )
+        return body
+
+    @staticmethod
+    def _read_body(environ):
+        length = int(environ.get("CONTENT_LENGTH") or 0)
+        return environ["wsgi.input"].read(length) if length else b""
+
+    @staticmethod
+    def _json(status_code, value):
+        return (
+            status_code,
+            [("Content-Type", "application/json")],
+            json.dumps(value).encode(),
+        )
+
+
+class _ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class _QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class StandinServer:
+    """
+    Serves an :class:`AugeiasStandin` from a background thread.
+
+    Usage::
+
+        with StandinServer() as server:
+            provider = AugeiasProvider(server.url, "collection")
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, app=None):
+        self.app = app or AugeiasStandin()
+        self.server = make_server(
+            host,
+            port,
+            self.app,
+            server_class=_ThreadingWSGIServer,
+            handler_class=_QuietRequestHandler,
+        )
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if self.thread is not None:
+            self.thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
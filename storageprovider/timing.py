@@ -0,0 +1,262 @@
+import functools
+import inspect
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable
+
+LOG = logging.getLogger(__name__)
+
+
+@dataclass
+class CallTiming:
+    """
+    Timing breakdown of a single storage provider call.
+
+    All durations are in seconds. ``connect`` is only filled in when the
+    underlying client reports connection setup separately, otherwise it is
+    part of ``ttfb``.
+    """
+
+    operation: str
+    container_key: str = None
+    object_key: str = None
+    connect: float = None
+    ttfb: float = None
+    transfer: float = None
+    total: float = None
+    bytes: int = 0
+    start_time: float = None
+    error: BaseException = None
+    _started: float = None
+
+    @property
+    def end_time(self):
+        if self.start_time is None or self.total is None:
+            return None
+        return self.start_time + self.total
+
+    @property
+    def attributes(self):
+        """
+        OpenTelemetry style span attributes for this call.
+        """
+        attributes = {
+            "storageprovider.operation": self.operation,
+            "storageprovider.bytes": self.bytes,
+        }
+        optional = {
+            "storageprovider.container_key": self.container_key,
+            "storageprovider.object_key": self.object_key,
+            "storageprovider.connect": self.connect,
+            "storageprovider.ttfb": self.ttfb,
+            "storageprovider.transfer": self.transfer,
+            "storageprovider.total": self.total,
+        }
+        attributes.update({k: v for k, v in optional.items() if v is not None})
+        return attributes
+
+
+class TimingRecorder:
+    """
+    Collects :class:`CallTiming` objects for the calls of a provider.
+
+    Every finished timing is passed to the registered hooks, kept as
+    :attr:`last` for the calling thread and logged as a warning when it took
+    longer than ``slow_call_threshold`` seconds.
+    """
+
+    def __init__(self, slow_call_threshold: float = None, hooks: list = None):
+        self.slow_call_threshold = slow_call_threshold
+        self.hooks = list(hooks or [])
+        self._local = threading.local()
+
+    def add_hook(self, hook: Callable[[CallTiming], None]):
+        self.hooks.append(hook)
+
+    @property
+    def last(self) -> CallTiming:
+        """
+        The timing of the last call finished by the current thread.
+        """
+        return getattr(self._local, "last", None)
+
+    @property
+    def current(self) -> CallTiming:
+        return getattr(self._local, "current", None)
+
+    def start(self, operation, container_key=None, object_key=None) -> CallTiming:
+        return CallTiming(
+            operation=operation,
+            container_key=container_key,
+            object_key=object_key,
+            start_time=time.time(),
+            _started=time.perf_counter(),
+        )
+
+    def activate(self, timing: CallTiming):
+        return _ActiveTiming(self._local, timing)
+
+    def mark_ttfb(self, at: float = None):
+        """
+        Mark the moment the response of the current call started to arrive.
+
+        :param at: a :func:`time.perf_counter` value, defaults to now
+        """
+        timing = self.current
+        if timing is None or timing.ttfb is not None:
+            return
+        at = time.perf_counter() if at is None else at
+        timing.ttfb = max(at - timing._started, 0.0)
+
+    def finish(self, timing: CallTiming, error: BaseException = None):
+        timing.total = time.perf_counter() - timing._started
+        timing.error = error
+        if timing.ttfb is None:
+            timing.ttfb = timing.total
+        timing.ttfb = min(timing.ttfb, timing.total)
+        timing.transfer = timing.total - timing.ttfb
+        self._local.last = timing
+        if (
+            self.slow_call_threshold is not None
+            and timing.total >= self.slow_call_threshold
+        ):
+            LOG.warning(
+                "Slow storage call %s (container %s, object %s): total %.3fs, "
+                "connect %s, ttfb %.3fs, transfer %.3fs, %d bytes",
+                timing.operation,
+                timing.container_key,
+                timing.object_key,
+                timing.total,
+                "n/a" if timing.connect is None else f"{timing.connect:.3f}s",
+                timing.ttfb,
+                timing.transfer,
+                timing.bytes,
+            )
+        for hook in self.hooks:
+            try:
+                hook(timing)
+            except Exception:
+                LOG.exception(f"Timing hook {hook!r} failed.")
+
+    def measure_stream(self, timing: CallTiming, iterable):
+        """
+        Wrap a chunk iterator so the call is finished once it is consumed.
+        """
+        iterator = iter(iterable)
+        error = None
+        try:
+            while True:
+                with self.activate(timing):
+                    try:
+                        chunk = next(iterator)
+                    except StopIteration:
+                        break
+                    self.mark_ttfb()
+                # listings stream objects, only count data
+                timing.bytes += _payload_size(chunk)
+                yield chunk
+        except GeneratorExit:
+            raise
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+            self.finish(timing, error)
+
+
+class _ActiveTiming:
+    def __init__(self, local, timing):
+        self.local = local
+        self.timing = timing
+
+    def __enter__(self):
+        self.previous = getattr(self.local, "current", None)
+        self.local.current = self.timing
+        return self.timing
+
+    def __exit__(self, *exc_info):
+        self.local.current = self.previous
+
+
+class OpenTelemetryHook:
+    """
+    Timing hook reporting every call as an OpenTelemetry span.
+
+    :param tracer: an ``opentelemetry.trace.Tracer``
+    """
+
+    def __init__(self, tracer):
+        self.tracer = tracer
+
+    def __call__(self, timing: CallTiming):
+        span = self.tracer.start_span(
+            f"storageprovider.{timing.operation}",
+            start_time=int(timing.start_time * 1e9),
+            attributes=timing.attributes,
+        )
+        if timing.error is not None:
+            span.record_exception(timing.error)
+        span.end(end_time=int(timing.end_time * 1e9))
+
+
+def _payload_size(value):
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, memoryview):
+        return value.nbytes
+    if isinstance(value, dict) and "object" in value:
+        return _payload_size(value["object"])
+    return 0
+
+
+def timed(func):
+    """
+    Record a :class:`CallTiming` for every call of a provider method.
+
+    The provider needs a ``timing`` attribute holding a
+    :class:`TimingRecorder`. Streaming results are timed until the returned
+    iterator is exhausted or closed.
+    """
+    operation = func.__name__
+    signature = inspect.signature(func)
+
+    def start(self, args, kwargs):
+        arguments = signature.bind_partial(self, *args, **kwargs).arguments
+        timing = self.timing.start(
+            operation,
+            arguments.get("container_key", arguments.get("source_container_key")),
+            arguments.get("object_key", arguments.get("source_object_key")),
+        )
+        timing.bytes += _payload_size(arguments.get("object_data"))
+        return timing
+
+    if inspect.isgeneratorfunction(func):
+
+        @functools.wraps(func)
+        def generator_wrapper(self, *args, **kwargs):
+            timing = start(self, args, kwargs)
+            yield from self.timing.measure_stream(timing, func(self, *args, **kwargs))
+
+        return generator_wrapper
+
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        timing = start(self, args, kwargs)
+        try:
+            with self.timing.activate(timing):
+                result = func(self, *args, **kwargs)
+        except BaseException as e:
+            self.timing.finish(timing, e)
+            raise
+        if inspect.isgenerator(result):
+            return self.timing.measure_stream(timing, result)
+        timing.bytes += _payload_size(result)
+        self.timing.finish(timing)
+        return result
+
+    return wrapper
@@ -0,0 +1,280 @@
+import io
+import tarfile
+import tempfile
+import threading
+import time
+import zipfile
+import zlib
+from datetime import datetime
+from datetime import timezone
+
+try:
+    import zstandard as _zstandard
+except ImportError:  # pragma: no cover
+    _zstandard = None
+
+#: archive formats of container exports
+ARCHIVE_FORMATS = ("zip", "tar", "tar.gz", "tar.zst")
+
+
+class ChunkWriter(io.RawIOBase):
+    """
+    Write-only, non-seekable file object collecting the written chunks.
+
+    Archive writers (zipfile, tarfile) can write into it while the chunks
+    are handed out as a stream with :meth:`drain`.
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self.chunks.append(bytes(b))
+        self.position += len(b)
+        return len(b)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        chunks = self.chunks
+        self.chunks = []
+        return chunks
+
+
+def iter_zip(entries):
+    """
+    Stream a zip archive.
+
+    Entries are written one after the other so only the chunk being written
+    is held in memory.
+
+    :param entries: iterable of ``(file name, size, chunks)`` tuples, size can
+        be None when unknown.
+    :return: generator of zip chunks
+    """
+    writer = ChunkWriter()
+    with zipfile.ZipFile(writer, "w") as zip_file:
+        for name, size, chunks in entries:
+            info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+            if size is not None:
+                info.file_size = size
+            with zip_file.open(info, "w", force_zip64=size is None) as entry:
+                for chunk in chunks:
+                    entry.write(chunk)
+                    yield from writer.drain()
+            yield from writer.drain()
+    yield from writer.drain()
+
+
+def _tar_compressor(archive_format):
+    if archive_format == "tar":
+        return None
+    if archive_format == "tar.gz":
+        return zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    if archive_format == "tar.zst":
+        if _zstandard is None:
+            raise ValueError("tar.zst archives need the zstandard package")
+        return _zstandard.ZstdCompressor().compressobj()
+    raise ValueError(f"Unknown archive format {archive_format!r}")
+
+
+def iter_archive(entries, archive_format="zip"):
+    """
+    Stream a zip or tar archive, see :func:`iter_zip` and :func:`iter_tar`.
+    """
+    if archive_format == "zip":
+        return iter_zip(entries)
+    return iter_tar(entries, archive_format)
+
+
+def _read_and_close(f, chunk_size=1024 * 1024):
+    with f:
+        yield from iter(lambda: f.read(chunk_size), b"")
+
+
+def iter_tar(entries, archive_format="tar"):
+    """
+    Stream a tar archive, optionally compressed.
+
+    Headers and data are written as they come, so only the chunk being
+    written is held in memory. Entries of unknown size are spooled first,
+    because a tar header holds the size.
+
+    :param entries: iterable of ``(file name, size, chunks)`` tuples, size can
+        be None when unknown.
+    :param archive_format: ``tar``, ``tar.gz`` or ``tar.zst``
+    :return: generator of archive chunks
+    :raises ValueError: for an unknown or unavailable archive format
+    """
+    return _iter_tar(entries, _tar_compressor(archive_format))
+
+
+def _iter_tar(entries, compressor):
+    offset = 0
+
+    def emit(data):
+        nonlocal offset
+        offset += len(data)
+        if compressor is not None:
+            data = compressor.compress(data)
+        return [data] if data else []
+
+    for name, size, chunks in entries:
+        if size is None:
+            spooled = spool(chunks, 8 * 1024 * 1024)
+            size = spooled.seek(0, io.SEEK_END)
+            spooled.seek(0)
+            chunks = _read_and_close(spooled)
+        info = tarfile.TarInfo(name)
+        info.size = size
+        info.mode = 0o644
+        info.mtime = int(time.time())
+        yield from emit(info.tobuf(tarfile.PAX_FORMAT))
+        written = 0
+        for chunk in chunks:
+            written += len(chunk)
+            yield from emit(chunk)
+        if written != size:
+            raise ValueError(f"{name} has {written} bytes instead of {size}")
+        if size % tarfile.BLOCKSIZE:
+            yield from emit(tarfile.NUL * (tarfile.BLOCKSIZE - size % tarfile.BLOCKSIZE))
+    # end of archive marker, padded to a full record like tarfile does
+    end = offset + 2 * tarfile.BLOCKSIZE
+    end = -(-end // tarfile.RECORDSIZE) * tarfile.RECORDSIZE
+    yield from emit(tarfile.NUL * (end - offset))
+    if compressor is not None:
+        yield compressor.flush()
+
+
+class IterStream(io.RawIOBase):
+    """
+    Read-only file object over an iterable of byte chunks.
+
+    Lets a streamed object body be handed to APIs that expect a file
+    (``requests``, ``minio.put_object``) without reading it into memory.
+    """
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.leftover = b""
+
+    def readable(self):
+        return True
+
+    def close(self):
+        close = getattr(self.chunks, "close", None)
+        if close is not None:
+            close()
+        super().close()
+
+    def readinto(self, b):
+        while not self.leftover:
+            try:
+                self.leftover = next(self.chunks)
+            except StopIteration:
+                return 0
+        size = min(len(b), len(self.leftover))
+        b[:size] = self.leftover[:size]
+        self.leftover = self.leftover[size:]
+        return size
+
+
+class ExpiringSet:
+    """
+    Set whose members are forgotten ``ttl`` seconds after they were added.
+
+    With a ttl of None or 0 nothing is ever remembered.
+    """
+
+    def __init__(self, ttl=None, clock=time.monotonic):
+        self.ttl = ttl
+        self.clock = clock
+        self.members = {}
+        self.lock = threading.Lock()
+
+    def add(self, member):
+        if not self.ttl:
+            return
+        with self.lock:
+            now = self.clock()
+            if len(self.members) > 10000:
+                self.members = {
+                    m: expires for m, expires in self.members.items() if expires > now
+                }
+            self.members[member] = now + self.ttl
+
+    def discard(self, member):
+        with self.lock:
+            self.members.pop(member, None)
+
+    def clear(self):
+        with self.lock:
+            self.members.clear()
+
+    def __contains__(self, member):
+        with self.lock:
+            expires = self.members.get(member)
+            if expires is None:
+                return False
+            if expires <= self.clock():
+                del self.members[member]
+                return False
+            return True
+
+
+def metadata_size(metadata):
+    """
+    :return: the object size from provider metadata, None if unknown
+    """
+    size = metadata.get("size", metadata.get("content-length"))
+    return None if size is None else int(size)
+
+
+def metadata_etag(metadata):
+    """
+    :return: the unquoted ETag from provider metadata, None if unknown
+    """
+    etag = metadata.get("etag")
+    return etag.strip('"') if etag else None
+
+
+def metadata_last_modified(metadata):
+    """
+    :return: the time of last modification from provider metadata as an
+        aware datetime (UTC when the provider gave no timezone), None if
+        unknown
+    """
+    value = metadata.get("time_last_modification")
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    if not isinstance(value, datetime):
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def spool(chunks, max_size):
+    """
+    Collect chunks in a file kept in memory up to max_size bytes and spilled
+    to a temporary file beyond that.
+
+    :return: a :class:`tempfile.SpooledTemporaryFile` positioned at the start
+    """
+    spooled = tempfile.SpooledTemporaryFile(max_size=max_size)
+    try:
+        for chunk in chunks:
+            spooled.write(chunk)
+    except BaseException:
+        spooled.close()
+        raise
+    spooled.seek(0)
+    return spooled
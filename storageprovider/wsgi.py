@@ -0,0 +1,209 @@
+"""
+Serve provider objects from WSGI applications.
+
+:func:`serve_object` answers a request for an object the way a static file
+server would: it sends ``ETag``, ``Last-Modified`` and ``Accept-Ranges``
+headers, answers ``If-None-Match`` / ``If-Modified-Since`` with a 304 and a
+single byte ``Range`` with a 206, and sends no body for HEAD requests. The
+object metadata is read first, so revalidations and HEAD requests never
+transfer the object, and ranges are read with a range request.
+
+:func:`object_response` wraps it in a Pyramid response and needs the
+optional ``pyramid`` package.
+"""
+import re
+from email.utils import format_datetime
+from email.utils import parsedate_to_datetime
+
+from storageprovider.utils import IterStream
+from storageprovider.utils import metadata_etag
+from storageprovider.utils import metadata_last_modified
+from storageprovider.utils import metadata_size
+
+BLOCK_SIZE = 1024 * 1024
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+STATUS = {
+    200: "200 OK",
+    206: "206 Partial Content",
+    304: "304 Not Modified",
+    416: "416 Range Not Satisfiable",
+}
+
+
+def _last_modified(metadata):
+    value = metadata_last_modified(metadata)
+    return None if value is None else value.replace(microsecond=0)
+
+
+def _content_type(metadata):
+    return (
+        metadata.get("mime")
+        or metadata.get("content-type")
+        or metadata.get("Content-Type")
+        or "application/octet-stream"
+    )
+
+
+def _parse_date(value):
+    try:
+        return parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def _etag_matches(header, etag):
+    if etag is None:
+        return False
+    candidates = [tag.strip() for tag in header.split(",")]
+    return "*" in candidates or any(
+        tag.removeprefix("W/").strip('"') == etag for tag in candidates
+    )
+
+
+def _not_modified(environ, etag, last_modified):
+    if_none_match = environ.get("HTTP_IF_NONE_MATCH")
+    if if_none_match:
+        return _etag_matches(if_none_match, etag)
+    since = _parse_date(environ.get("HTTP_IF_MODIFIED_SINCE"))
+    return since is not None and last_modified is not None and last_modified <= since
+
+
+def _range(environ, size, etag, last_modified):
+    """
+    :return: None to send the whole object, (start, end) inclusive or
+        "unsatisfiable"
+    """
+    header = environ.get("HTTP_RANGE")
+    if not header or size is None:
+        return None
+    if_range = environ.get("HTTP_IF_RANGE")
+    if if_range:
+        if if_range.startswith(('"', 'W/"')):
+            if not _etag_matches(if_range, etag) or if_range.startswith("W/"):
+                return None
+        elif _parse_date(if_range) != last_modified or last_modified is None:
+            return None
+    match = RANGE_RE.match(header.replace(" ", ""))
+    if not match or match.groups() == ("", ""):
+        # multiple ranges and other units are answered with the whole object
+        return None
+    first, last = match.groups()
+    if first == "":
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return "unsatisfiable"
+    return start, end
+
+
+def serve_object(
+    provider,
+    container_key,
+    object_key,
+    environ,
+    start_response,
+    system_token=None,
+    content_disposition=None,
+    block_size=BLOCK_SIZE,
+):
+    """
+    answer a GET or HEAD request for an object
+
+    :param provider: the storage provider
+    :param container_key: key of the container in the data store
+    :param object_key: specific object key for the object in the container
+    :param environ: WSGI environ of the request
+    :param start_response: WSGI start_response callable
+    :param system_token: oauth system token
+    :param content_disposition: value of the Content-Disposition header
+    :param block_size: block size passed to ``wsgi.file_wrapper``
+    :return: WSGI response iterable
+    """
+    metadata = provider.get_object_metadata(container_key, object_key, system_token)
+    size = metadata_size(metadata)
+    etag = metadata_etag(metadata)
+    last_modified = _last_modified(metadata)
+    headers = [("Accept-Ranges", "bytes")]
+    if etag:
+        headers.append(("ETag", f'"{etag}"'))
+    if last_modified is not None:
+        headers.append(("Last-Modified", format_datetime(last_modified, usegmt=True)))
+    if _not_modified(environ, etag, last_modified):
+        start_response(STATUS[304], headers)
+        return []
+    headers.append(("Content-Type", _content_type(metadata)))
+    if content_disposition:
+        headers.append(("Content-Disposition", content_disposition))
+    byte_range = _range(environ, size, etag, last_modified)
+    if byte_range == "unsatisfiable":
+        headers.append(("Content-Range", f"bytes */{size}"))
+        headers.append(("Content-Length", "0"))
+        start_response(STATUS[416], headers)
+        return []
+    if byte_range is None:
+        status = 200
+        start, length = 0, size
+    else:
+        status = 206
+        start, end = byte_range
+        length = end - start + 1
+        headers.append(("Content-Range", f"bytes {start}-{end}/{size}"))
+    if length is not None:
+        headers.append(("Content-Length", str(length)))
+    start_response(STATUS[status], headers)
+    if environ["REQUEST_METHOD"] == "HEAD":
+        return []
+    file_wrapper = environ.get("wsgi.file_wrapper")
+    if start == 0 and length == size:
+        open_object = getattr(provider, "open_object", None)
+        if file_wrapper is not None and open_object is not None:
+            # a real file lets the server use sendfile
+            return file_wrapper(open_object(container_key, object_key), block_size)
+        chunks = provider.get_object_streaming(container_key, object_key, system_token)
+    else:
+        chunks = provider.get_object_range_streaming(
+            container_key, object_key, start, length, system_token
+        )
+    if file_wrapper is not None:
+        return file_wrapper(IterStream(chunks), block_size)
+    return chunks
+
+
+def object_response(
+    request,
+    provider,
+    container_key,
+    object_key,
+    system_token=None,
+    content_disposition=None,
+):
+    """
+    build a Pyramid response for an object, see :func:`serve_object`
+
+    :param request: the Pyramid request
+    :return: a :class:`pyramid.response.Response`
+    """
+    from pyramid.response import Response
+
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started["status"] = status
+        started["headers"] = headers
+
+    app_iter = serve_object(
+        provider,
+        container_key,
+        object_key,
+        request.environ,
+        start_response,
+        system_token,
+        content_disposition,
+    )
+    return Response(
+        status=started["status"], headerlist=started["headers"], app_iter=app_iter
+    )
@@ -0,0 +1,112 @@
+"""
+Benchmarks for the hot paths of the providers.
+
+Every benchmark is a context manager yielding the operation to measure, so
+setup and teardown (patching, filling the stand-ins) stay out of the numbers.
+"""
+import os
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable
+from unittest.mock import patch
+
+from tests.benchmarks.standins import FakeAugeiasRequests
+from tests.benchmarks.standins import augeias_provider
+from tests.benchmarks.standins import minio_provider
+
+KiB = 1024
+MiB = 1024 * KiB
+
+IDENTIFIER = "urn:x-vioe:dossiers/2025.0001234:bijlagen+foto's*oud"
+
+
+@dataclass
+class Benchmark:
+    name: str
+    factory: Callable
+    payload: int = 0  # bytes handled by one run of the operation
+
+    def __call__(self):
+        return self.factory()
+
+
+BENCHMARKS = []
+
+
+def benchmark(name, payload=0):
+    def register(func):
+        BENCHMARKS.append(Benchmark(name, contextmanager(func), payload))
+        return func
+
+    return register
+
+
+def _fill_minio_container(provider, container_key, count, size):
+    keys = []
+    for i in range(count):
+        object_key = f"object-{i:05d}"
+        provider.update_object(container_key, object_key, os.urandom(size))
+        keys.append(object_key)
+    return keys
+
+
+@benchmark("minio_clean_identifier")
+def minio_clean_identifier():
+    provider = minio_provider()
+    yield lambda: provider._clean_identifier(IDENTIFIER)
+
+
+@benchmark("minio_id_to_pairtree_path")
+def minio_id_to_pairtree_path():
+    provider = minio_provider()
+    yield lambda: provider._id_to_pairtree_path(IDENTIFIER)
+
+
+@benchmark("minio_get_container_data", payload=100 * 32 * KiB)
+def minio_get_container_data():
+    provider = minio_provider()
+    keys = _fill_minio_container(provider, "dossier", 100, 32 * KiB)
+    translations = {key: f"{key}.pdf" for key in keys}
+    yield lambda: provider.get_container_data("dossier", translations=translations)
+
+
+@benchmark("minio_get_object_and_metadata", payload=256 * KiB)
+def minio_get_object_and_metadata():
+    provider = minio_provider()
+    provider.update_object("container", "object", os.urandom(256 * KiB))
+    yield lambda: provider.get_object_and_metadata("container", "object")
+
+
+@benchmark("augeias_get_object_and_metadata", payload=256 * KiB)
+def augeias_get_object_and_metadata():
+    fake_requests = FakeAugeiasRequests()
+    fake_requests.add_object("container", "object", os.urandom(256 * KiB))
+    provider = augeias_provider()
+    with patch("storageprovider.providers.augeias.requests", fake_requests):
+        yield lambda: provider.get_object_and_metadata("container", "object")
+
+
+@benchmark("minio_get_object_streaming", payload=16 * MiB)
+def minio_get_object_streaming():
+    provider = minio_provider()
+    provider.update_object("container", "object", os.urandom(16 * MiB))
+
+    def run():
+        for _chunk in provider.get_object_streaming("container", "object"):
+            pass
+
+    yield run
+
+
+@benchmark("augeias_get_object_streaming", payload=16 * MiB)
+def augeias_get_object_streaming():
+    fake_requests = FakeAugeiasRequests()
+    fake_requests.add_object("container", "object", os.urandom(16 * MiB))
+    provider = augeias_provider()
+
+    def run():
+        for _chunk in provider.get_object_streaming("container", "object"):
+            pass
+
+    with patch("storageprovider.providers.augeias.requests", fake_requests):
+        yield run
@@ -0,0 +1,169 @@
+"""
+Run the benchmarks, store baselines and compare against them.
+
+Usage::
+
+    python -m tests.benchmarks                 # run and compare to baseline
+    python -m tests.benchmarks --save          # run and store a new baseline
+    python -m tests.benchmarks --check -k zip  # fail on regressions
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+from tests.benchmarks.cases import BENCHMARKS
+
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+
+def _calibrate(run, min_round_time):
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            run()
+        if time.perf_counter() - start >= min_round_time or number >= 1_000_000:
+            return number
+        number *= 10
+
+
+def run_benchmark(benchmark, rounds=10, min_round_time=0.01):
+    """
+    Measure latency, throughput and peak memory of one benchmark.
+
+    :param benchmark: a :class:`tests.benchmarks.cases.Benchmark`
+    :param rounds: number of timed rounds
+    :param min_round_time: minimal duration of a round in seconds, fast
+        operations are repeated within a round until it takes this long
+    :return: dict with the measurements, latencies are in seconds
+    """
+    with benchmark() as run:
+        run()  # warm up
+        number = _calibrate(run, min_round_time)
+        latencies = []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            for _ in range(number):
+                run()
+            latencies.append((time.perf_counter() - start) / number)
+
+        tracemalloc.start()
+        try:
+            tracemalloc.reset_peak()
+            run()
+            peak_memory = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    latencies.sort()
+    mean = statistics.fmean(latencies)
+    return {
+        "latency_median": statistics.median(latencies),
+        "latency_p95": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+        "ops_per_second": 1 / mean,
+        "bytes_per_second": benchmark.payload / mean,
+        "peak_memory": peak_memory,
+    }
+
+
+def compare(results, baseline, tolerance=0.2):
+    """
+    Compare results to a baseline.
+
+    :return: tuple of the report lines and the names of regressed benchmarks
+    """
+    lines = [
+        f"{'benchmark':<34} {'median':>11} {'baseline':>11} {'change':>8} "
+        f"{'peak mem':>10} {'baseline':>10} {'change':>8}"
+    ]
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        latency_change = memory_change = None
+        if base:
+            latency_change = result["latency_median"] / base["latency_median"] - 1
+            if base["peak_memory"]:
+                memory_change = result["peak_memory"] / base["peak_memory"] - 1
+        regressed = any(
+            change is not None and change > tolerance
+            for change in (latency_change, memory_change)
+        )
+        if regressed:
+            regressions.append(name)
+        lines.append(
+            f"{name:<34} {_duration(result['latency_median']):>11} "
+            f"{_duration(base['latency_median']) if base else '-':>11} "
+            f"{_change(latency_change):>8} "
+            f"{_size(result['peak_memory']):>10} "
+            f"{_size(base['peak_memory']) if base else '-':>10} "
+            f"{_change(memory_change):>8}" + ("  REGRESSION" if regressed else "")
+        )
+    return lines, regressions
+
+
+def _duration(seconds):
+    for unit, factor in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= factor:
+            return f"{seconds / factor:.2f}{unit}"
+    return f"{seconds / 1e-9:.0f}ns"
+
+
+def _size(size):
+    for unit, factor in (("MiB", 1024**2), ("KiB", 1024)):
+        if size >= factor:
+            return f"{size / factor:.1f}{unit}"
+    return f"{size}B"
+
+
+def _change(change):
+    return "-" if change is None else f"{change:+.0%}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m tests.benchmarks")
+    parser.add_argument("-k", dest="pattern", help="only run matching benchmarks")
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--save", action="store_true", help="store as new baseline")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="allowed slowdown or memory growth as a fraction (default 0.2)",
+    )
+    parser.add_argument(
+        "--check", action="store_true", help="exit with status 1 on regressions"
+    )
+    args = parser.parse_args(argv)
+
+    results = {}
+    for benchmark in BENCHMARKS:
+        if args.pattern and args.pattern not in benchmark.name:
+            continue
+        results[benchmark.name] = run_benchmark(benchmark, rounds=args.rounds)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    lines, regressions = compare(results, baseline, args.tolerance)
+    print("\n".join(lines))
+
+    if args.save:
+        baseline.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Baseline written to {args.baseline}")
+    if args.check and regressions:
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
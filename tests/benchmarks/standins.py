@@ -0,0 +1,167 @@
+"""
+In-process stand-ins for the Augeias REST api and the MinIO client.
+
+They keep objects in memory and hand out response objects with the same
+interface the providers use, so the benchmarks measure the client code
+without any network traffic.
+"""
+import hashlib
+import json
+from datetime import datetime
+from datetime import timedelta
+from datetime import timezone
+from urllib.parse import urlparse
+
+from minio.datatypes import Object
+from minio.error import S3Error
+
+from storageprovider.providers.augeias import AugeiasProvider
+from storageprovider.providers.minio import MinioProvider
+
+LAST_MODIFIED = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+class FakeMinioResponse:
+    def __init__(self, data):
+        self.data = data
+        self.position = 0
+        self.headers = {"Content-Length": str(len(data))}
+
+    def read(self, amt=None):
+        if amt is None:
+            amt = len(self.data) - self.position
+        chunk = self.data[self.position : self.position + amt]
+        self.position += len(chunk)
+        return chunk
+
+    def stream(self, amt=64 * 1024):
+        while True:
+            chunk = self.read(amt)
+            if not chunk:
+                return
+            yield chunk
+
+    def close(self):
+        pass
+
+    def release_conn(self):
+        pass
+
+
+class FakeMinioClient:
+    """
+    Implements the subset of :class:`minio.Minio` used by MinioProvider.
+    """
+
+    def __init__(self):
+        self.buckets = {}
+        self.etags = {}
+
+    def _bucket(self, bucket_name):
+        return self.buckets.setdefault(bucket_name, {})
+
+    def _get(self, bucket_name, object_name):
+        try:
+            return self._bucket(bucket_name)[object_name]
+        except KeyError:
+            raise S3Error(
+                "NoSuchKey", "Object does not exist", object_name, None, None, None
+            )
+
+    def put_object(self, bucket_name, object_name, data, length=-1, **kwargs):
+        if hasattr(data, "read"):
+            data = data.read()
+        self._bucket(bucket_name)[object_name] = bytes(data)
+        self.etags[bucket_name, object_name] = hashlib.md5(data).hexdigest()
+
+    def get_object(self, bucket_name, object_name, **kwargs):
+        return FakeMinioResponse(self._get(bucket_name, object_name))
+
+    def stat_object(self, bucket_name, object_name, **kwargs):
+        data = self._get(bucket_name, object_name)
+        return Object(
+            bucket_name,
+            object_name,
+            last_modified=LAST_MODIFIED,
+            etag=self.etags[bucket_name, object_name],
+            size=len(data),
+            content_type="application/octet-stream",
+        )
+
+    def list_objects(self, bucket_name, prefix=None, recursive=False, **kwargs):
+        prefix = prefix or ""
+        for object_name, data in sorted(self._bucket(bucket_name).items()):
+            if not object_name.startswith(prefix):
+                continue
+            if not recursive and "/" in object_name[len(prefix) :]:
+                continue
+            yield Object(
+                bucket_name,
+                object_name,
+                last_modified=LAST_MODIFIED,
+                etag=self.etags[bucket_name, object_name],
+                size=len(data),
+            )
+
+    def remove_object(self, bucket_name, object_name, **kwargs):
+        self._bucket(bucket_name).pop(object_name, None)
+        self.etags.pop((bucket_name, object_name), None)
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, content=b"", headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+        self.elapsed = timedelta(0)
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8", "replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+    def iter_content(self, chunk_size=1):
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i : i + chunk_size]
+
+
+class FakeAugeiasRequests:
+    """
+    Replaces the ``requests`` module used by AugeiasProvider.
+
+    Only object reads are served, which is all the benchmarks need.
+    """
+
+    def __init__(self):
+        self.objects = {}
+
+    def add_object(self, container_key, object_key, data):
+        self.objects[container_key, object_key] = (data, hashlib.md5(data).hexdigest())
+
+    def get(self, url, headers=None, stream=False, **kwargs):
+        path = urlparse(url).path
+        parts = path.split("/containers/", 1)[1].split("/")
+        if len(parts) != 2 or tuple(parts) not in self.objects:
+            return FakeResponse(404, b"not found")
+        data, etag = self.objects[tuple(parts)]
+        return FakeResponse(
+            200,
+            data,
+            headers={
+                "Content-Type": "application/octet-stream",
+                "Content-Length": str(len(data)),
+                "ETag": etag,
+            },
+        )
+
+
+def minio_provider():
+    provider = MinioProvider("localhost:9000", "access", "secret", "benchmark")
+    provider.client = FakeMinioClient()
+    return provider
+
+
+def augeias_provider():
+    return AugeiasProvider("http://augeias.benchmark", "benchmark")
@@ -1,6 +1,10 @@
+import io
+
 import pytest
 from unittest.mock import patch, MagicMock
 from storageprovider.providers.augeias import AugeiasProvider, InvalidStateException
+from storageprovider.checksum import ChecksumMismatchException
+from storageprovider.providers import BufferTooSmallException
 
 
 @pytest.fixture
@@ -56,6 +60,55 @@ def test_retrieves_object_successfully(mock_requests, augeias_provider):
     assert result == b"object content"
 
 
+@patch("storageprovider.providers.augeias.requests")
+def test_retrieves_object_into_buffer(mock_requests, augeias_provider):
+    mock_requests.get.return_value.status_code = 200
+    mock_requests.get.return_value.headers = {"Content-Length": "14"}
+    mock_requests.get.return_value.raw = io.BytesIO(b"object content")
+    buffer = bytearray(20)
+    written = augeias_provider.get_object_into("container", "object", buffer)
+    mock_requests.get.assert_called_once_with(
+        "http://localhost:8000/collections/test-collection/containers/container/object",
+        headers={},
+        stream=True,
+    )
+    assert written == 14
+    assert buffer[:written] == b"object content"
+    mock_requests.get.return_value.close.assert_called_once()
+
+
+@patch("storageprovider.providers.augeias.requests")
+def test_object_into_too_small_buffer(mock_requests, augeias_provider):
+    mock_requests.get.return_value.status_code = 200
+    mock_requests.get.return_value.headers = {"Content-Length": "14"}
+    mock_requests.get.return_value.raw = io.BytesIO(b"object content")
+    with pytest.raises(BufferTooSmallException) as e:
+        augeias_provider.get_object_into("container", "object", bytearray(4))
+    assert e.value.object_size == 14
+    mock_requests.get.return_value.close.assert_called_once()
+
+
+@patch("storageprovider.providers.augeias.requests")
+def test_retrieves_object_range(mock_requests, augeias_provider):
+    mock_requests.get.return_value.status_code = 206
+    mock_requests.get.return_value.iter_content.return_value = [b"234"]
+    result = augeias_provider.get_object_range("container", "object", 2, 3)
+    mock_requests.get.assert_called_once_with(
+        "http://localhost:8000/collections/test-collection/containers/container/object",
+        headers={"Range": "bytes=2-4"},
+        stream=True,
+    )
+    assert result == b"234"
+
+
+@patch("storageprovider.providers.augeias.requests")
+def test_retrieves_object_range_when_range_is_ignored(mock_requests, augeias_provider):
+    mock_requests.get.return_value.status_code = 200
+    mock_requests.get.return_value.iter_content.return_value = [b"01234", b"56789"]
+    result = augeias_provider.get_object_range("container", "object", 3)
+    assert result == b"3456789"
+
+
 @patch("storageprovider.providers.augeias.requests")
 def test_retrieves_object_and_metadata_successfully(mock_requests, augeias_provider):
     mock_requests.get.return_value.status_code = 200
@@ -347,4 +400,91 @@ def test_fails_to_replace_file_in_zip_due_to_invalid_file_name(mock_requests, au
             "container", "object", "invalid_file", new_file_content, "new_file.pdf"
         )
     assert context.value.status_code == 400
-    assert str(context.value) == "Invalid file name, http status code: 400"
\ No newline at end of file
+    assert str(context.value) == "Invalid file name, http status code: 400"
+
+@patch("storageprovider.providers.augeias.requests")
+def test_object_exists_uses_head(mock_requests, augeias_provider):
+    mock_requests.head.return_value.status_code = 200
+    assert augeias_provider.object_exists("container", "object") is True
+    mock_requests.head.assert_called_once_with(
+        "http://localhost:8000/collections/test-collection/containers/container/object",
+        headers={},
+    )
+    mock_requests.head.return_value.status_code = 404
+    assert augeias_provider.object_exists("container", "object") is False
+    mock_requests.head.return_value.status_code = 500
+    with pytest.raises(InvalidStateException):
+        augeias_provider.object_exists("container", "object")
+
+
+@patch("storageprovider.providers.augeias.requests")
+def test_object_exists_caches_missing_objects(mock_requests):
+    provider = AugeiasProvider("http://localhost:8000", "test", missing_cache_ttl=60)
+    mock_requests.head.return_value.status_code = 404
+    mock_requests.put.return_value.status_code = 200
+    assert provider.object_exists("container", "object") is False
+    assert provider.object_exists("container", "object") is False
+    assert mock_requests.head.call_count == 1
+    provider.update_object("container", "object", b"data")
+    mock_requests.head.return_value.status_code = 200
+    assert provider.object_exists("container", "object") is True
+
+
+@patch("storageprovider.providers.augeias.requests")
+def test_objects_exist(mock_requests, augeias_provider):
+    mock_requests.head.side_effect = lambda url, headers: MagicMock(
+        status_code=200 if url.endswith("/a") else 404
+    )
+    assert augeias_provider.objects_exist("container", ["a", "b"]) == {
+        "a": True,
+        "b": False,
+    }
+    mock_requests.get.assert_not_called()
+
+
+@patch("storageprovider.providers.augeias.requests")
+def test_objects_exist_lists_container_for_many_keys(mock_requests, augeias_provider):
+    keys = [f"object-{index}" for index in range(30)]
+    mock_requests.get.return_value.status_code = 200
+    mock_requests.get.return_value.content = b'["object-1", "other"]'
+    result = augeias_provider.objects_exist("container", keys)
+    assert [key for key, exists in result.items() if exists] == ["object-1"]
+    mock_requests.head.assert_not_called()
+    mock_requests.get.return_value.status_code = 404
+    assert not any(augeias_provider.objects_exist("container", keys).values())
+
+
+@patch("storageprovider.providers.augeias.requests")
+def test_list_objects_with_metadata(mock_requests, augeias_provider):
+    mock_requests.get.return_value.status_code = 200
+    mock_requests.get.return_value.content = b'["object"]'
+    mock_requests.head.return_value.status_code = 200
+    mock_requests.head.return_value.headers = {
+        "Content-Length": "4",
+        "Content-Type": "application/pdf",
+        "ETag": '"abc"',
+        "Last-Modified": "Mon, 19 Oct 2026 10:00:00 GMT",
+    }
+    [info] = augeias_provider.list_objects_with_metadata("container")
+    assert info.key == "object"
+    assert info.size == 4
+    assert info.content_type == "application/pdf"
+    assert info.etag == "abc"
+    assert info.last_modified.year == 2026
+
+
+@patch("storageprovider.providers.augeias.requests")
+def test_checksum_mismatch_on_download(mock_requests):
+    provider = AugeiasProvider("http://localhost:8000", "test", checksums=("md5",))
+    mock_requests.get.return_value.status_code = 200
+    mock_requests.get.return_value.iter_content.return_value = [b"corrupt"]
+    mock_requests.get.return_value.content = b"corrupt"
+    mock_requests.get.return_value.headers = {"ETag": '"%s"' % ("0" * 32)}
+    with pytest.raises(ChecksumMismatchException):
+        list(provider.get_object_streaming("container", "object"))
+    with pytest.raises(ChecksumMismatchException):
+        provider.get_object("container", "object")
+    # the ETag is that of the archive
+    assert list(
+        provider.get_object_from_archive_streaming("container", "object", "file")
+    ) == [b"corrupt"]
@@ -0,0 +1,202 @@
+import io
+import mmap
+import os
+import tarfile
+import zipfile
+
+import pytest
+
+from storageprovider.providers import BufferTooSmallException
+from storageprovider.providers.filesystem import FilesystemProvider
+
+
+@pytest.fixture
+def provider(tmp_path):
+    return FilesystemProvider(str(tmp_path))
+
+
+def make_zip(**files):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zip_file:
+        for name, content in files.items():
+            zip_file.writestr(name, content)
+    return buffer.getvalue()
+
+
+def test_uses_pairtree_layout(provider, tmp_path):
+    provider.update_object("container", "object", b"data")
+    assert (tmp_path / "co/nt/ai/ne/r/object").read_bytes() == b"data"
+
+
+def test_update_and_get_object(provider):
+    provider.update_object("container", "object", b"data")
+    assert provider.get_object("container", "object") == b"data"
+    assert list(provider.get_object_streaming("container", "object")) == [b"data"]
+
+
+def test_update_object_from_file_and_iterable(provider):
+    provider.update_object("container", "file", io.BytesIO(b"data"))
+    provider.update_object("container", "chunks", iter([b"da", b"ta"]))
+    assert provider.get_object("container", "file") == b"data"
+    assert provider.get_object("container", "chunks") == b"data"
+
+
+def test_failed_write_leaves_no_partial_object(provider, tmp_path):
+    def chunks():
+        yield b"partial"
+        raise IOError("connection lost")
+
+    provider.update_object("container", "object", b"old")
+    with pytest.raises(IOError):
+        provider.update_object("container", "object", chunks())
+    assert provider.get_object("container", "object") == b"old"
+    assert os.listdir(tmp_path / "co/nt/ai/ne/r") == ["object"]
+
+
+def test_invalid_object_key(provider):
+    with pytest.raises(ValueError):
+        provider.get_object("container", "../object")
+    with pytest.raises(ValueError):
+        provider.update_object("container", "..", b"data")
+
+
+def test_open_object_and_mmap(provider):
+    provider.update_object("container", "object", b"data")
+    with provider.open_object("container", "object") as f:
+        assert f.fileno() >= 0
+        assert f.read() == b"data"
+    mapped = provider.get_object_mmap("container", "object")
+    assert mapped[:] == b"data"
+    mapped.close()
+    provider.update_object("container", "empty", b"")
+    assert provider.get_object_mmap("container", "empty") == b""
+
+
+def test_get_object_into_mmap(provider):
+    provider.update_object("container", "object", b"data")
+    buffer = mmap.mmap(-1, 8)
+    assert provider.get_object_into("container", "object", buffer) == 4
+    assert buffer[:4] == b"data"
+    with pytest.raises(BufferTooSmallException):
+        provider.get_object_into("container", "object", bytearray(3))
+
+
+def test_get_object_range(provider):
+    provider.update_object("container", "object", b"0123456789")
+    assert provider.get_object_range("container", "object", 2, 3) == b"234"
+    assert provider.get_object_range("container", "object", 7) == b"789"
+    assert provider.get_object_range("container", "object", 7, 0) == b""
+
+
+def test_get_missing_object(provider):
+    with pytest.raises(FileNotFoundError):
+        provider.get_object("container", "missing")
+
+
+def test_metadata(provider):
+    provider.update_object("container", "object.pdf", b"data")
+    metadata = provider.get_object_metadata("container", "object.pdf")
+    assert metadata["size"] == 4
+    assert metadata["mime"] == "application/pdf"
+    assert metadata["etag"]
+    result = provider.get_object_and_metadata("container", "object.pdf")
+    assert result["object"] == b"data"
+    assert result["metadata"] == metadata
+
+
+def test_delete_object(provider):
+    provider.update_object("container", "object", b"data")
+    provider.delete_object("container", "object")
+    assert provider.list_object_keys_for_container("container") == []
+
+
+def test_copy_object(provider):
+    provider.update_object("container", "object", b"data" * 100000)
+    provider.copy_object("container", "object", "other", "copy")
+    object_key = provider.copy_object_and_create_key("container", "object", "other")
+    assert provider.get_object("other", "copy") == b"data" * 100000
+    assert provider.get_object("other", object_key) == b"data" * 100000
+
+
+def test_list_skips_other_containers(provider):
+    provider.update_object("ab", "object", b"data")
+    provider.update_object("abcd", "object", b"data")
+    assert provider.list_object_keys_for_container("ab") == ["object"]
+
+
+def test_containers(provider):
+    container_key = provider.create_container_and_key()
+    assert provider.list_object_keys_for_container(container_key) == []
+    provider.update_object(container_key, "object", b"data")
+    provider.delete_container(container_key)
+    with pytest.raises(FileNotFoundError):
+        provider.list_object_keys_for_container(container_key)
+
+
+def test_delete_container_keeps_nested_containers(provider):
+    provider.update_object("ab", "object", b"data")
+    provider.update_object("abcd", "object", b"data")
+    provider.delete_container("ab")
+    assert provider.get_object("abcd", "object") == b"data"
+
+
+def test_get_container_data(provider):
+    provider.update_object("container", "a", b"A")
+    provider.update_object("container", "b", b"B" * (3 * 1024 * 1024))
+    chunks = list(
+        provider.get_container_data_streaming("container", translations={"a": "a.txt"})
+    )
+    assert len(chunks) > 1
+    for data in (b"".join(chunks), provider.get_container_data("container")):
+        with zipfile.ZipFile(io.BytesIO(data)) as zip_file:
+            assert zip_file.read("b") == b"B" * (3 * 1024 * 1024)
+    with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as zip_file:
+        assert zip_file.read("a.txt") == b"A"
+
+
+def test_get_container_data_as_tar_gz(provider):
+    provider.update_object("container", "a", b"A")
+    chunks = provider.get_container_data_streaming(
+        "container", translations={"a": "a.txt"}, archive_format="tar.gz"
+    )
+    with tarfile.open(fileobj=io.BytesIO(b"".join(chunks)), mode="r:gz") as tar:
+        assert tar.extractfile("a.txt").read() == b"A"
+
+
+def test_archive(provider):
+    provider.update_object(
+        "container", "zip", make_zip(**{"old.txt": b"old", "keep.txt": b"keep"})
+    )
+    assert provider.get_object_from_archive("container", "zip", "old.txt") == b"old"
+    assert b"".join(
+        provider.get_object_from_archive_streaming("container", "zip", "keep.txt")
+    ) == b"keep"
+    with pytest.raises(FileNotFoundError):
+        provider.get_object_from_archive("container", "zip", "missing.txt")
+
+    result = provider.replace_file_in_zip_object(
+        "container", "zip", "old.txt", b"new", "new.txt"
+    )
+    assert result == {"container_key": "container", "object_key": "zip"}
+    with zipfile.ZipFile(io.BytesIO(provider.get_object("container", "zip"))) as z:
+        assert sorted(z.namelist()) == ["keep.txt", "new.txt"]
+        assert z.read("new.txt") == b"new"
+
+
+def test_object_exists(provider):
+    provider.update_object("container", "object", b"data")
+    assert provider.object_exists("container", "object")
+    assert not provider.object_exists("missing", "object")
+    assert provider.objects_exist("container", ["object", "missing"]) == {
+        "object": True,
+        "missing": False,
+    }
+
+
+def test_list_objects_with_metadata(provider):
+    provider.update_object("container", "object.pdf", b"data")
+    [info] = provider.list_objects_with_metadata("container")
+    assert info.key == "object.pdf"
+    assert info.size == 4
+    assert info.content_type == "application/pdf"
+    assert info.last_modified is not None
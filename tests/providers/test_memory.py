@@ -0,0 +1,279 @@
+import io
+import tarfile
+import zipfile
+
+import pytest
+
+from storageprovider.providers import BaseStorageProvider
+from storageprovider.providers import BufferTooSmallException
+from storageprovider.providers.memory import InMemoryProvider
+from storageprovider.providers.memory import InvalidArchiveException
+from storageprovider.providers.memory import NotFoundException
+
+
+@pytest.fixture
+def provider():
+    provider = InMemoryProvider()
+    provider.create_container("container")
+    return provider
+
+
+def make_zip(**files):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zip_file:
+        for name, content in files.items():
+            zip_file.writestr(name, content)
+    return buffer.getvalue()
+
+
+def test_update_and_get_object(provider):
+    provider.update_object("container", "object", b"data")
+    assert provider.get_object("container", "object") == b"data"
+    assert list(provider.get_object_streaming("container", "object")) == [b"data"]
+
+
+def test_get_object_into(provider):
+    provider.update_object("container", "object", b"data")
+    buffer = bytearray(6)
+    assert provider.get_object_into("container", "object", buffer) == 4
+    assert buffer == b"data\0\0"
+    with pytest.raises(BufferTooSmallException):
+        provider.get_object_into("container", "object", bytearray(3))
+    with pytest.raises(TypeError):
+        provider.get_object_into("container", "object", b"read-only")
+
+
+def test_default_get_object_into_uses_stream(provider):
+    provider.update_object("container", "object", b"x" * 10)
+    buffer = memoryview(bytearray(16)).cast("B", (4, 4))
+    written = BaseStorageProvider.get_object_into(provider, "container", "object", buffer)
+    assert written == 10
+    with pytest.raises(BufferTooSmallException):
+        BaseStorageProvider.get_object_into(
+            provider, "container", "object", bytearray(9)
+        )
+
+
+def test_get_object_range(provider):
+    provider.update_object("container", "object", b"0123456789")
+    assert provider.get_object_range("container", "object", 2, 3) == b"234"
+    assert provider.get_object_range("container", "object", 7) == b"789"
+
+
+def test_default_range_skips_chunks(provider):
+    provider.update_object("container", "object", b"0123456789")
+    provider._stream = lambda data: iter([data[:4], data[4:8], data[8:]])
+    chunks = BaseStorageProvider.get_object_range_streaming(
+        provider, "container", "object", 3, 6
+    )
+    assert list(chunks) == [b"3", b"4567", b"8"]
+    chunks = BaseStorageProvider.get_object_range_streaming(
+        provider, "container", "object", 5
+    )
+    assert list(chunks) == [b"567", b"89"]
+
+
+def test_update_object_from_file(provider):
+    provider.update_object("container", "object", io.BytesIO(b"data"))
+    assert provider.get_object("container", "object") == b"data"
+
+
+def test_get_missing_object(provider):
+    with pytest.raises(NotFoundException):
+        provider.get_object("container", "missing")
+    with pytest.raises(NotFoundException):
+        provider.get_object("missing", "object")
+
+
+def test_get_object_and_metadata(provider):
+    provider.update_object("container", "object", b"data")
+    result = provider.get_object_and_metadata("container", "object")
+    assert result["object"] == b"data"
+    assert result["metadata"]["size"] == 4
+    assert result["metadata"]["content-length"] == 4
+    assert result["metadata"]["mime"] == "application/octet-stream"
+    assert result["metadata"]["etag"] == "8d777f385d3dfec8815d20f7496026dc"
+
+
+def test_get_object_metadata(provider):
+    provider.update_object("container", "object", b"data")
+    metadata = provider.get_object_metadata("container", "object")
+    assert metadata["size"] == 4
+    assert metadata["time_last_modification"] is not None
+
+
+def test_delete_object(provider):
+    provider.update_object("container", "object", b"data")
+    provider.delete_object("container", "object")
+    assert provider.list_object_keys_for_container("container") == []
+    with pytest.raises(NotFoundException):
+        provider.delete_object("container", "object")
+
+
+def test_copy_object(provider):
+    provider.update_object("container", "object", b"data")
+    provider.copy_object("container", "object", "other", "copy")
+    object_key = provider.copy_object_and_create_key("container", "object", "other")
+    assert provider.get_object("other", "copy") == b"data"
+    assert provider.get_object("other", object_key) == b"data"
+
+
+def test_update_object_and_key(provider):
+    object_key = provider.update_object_and_key("container", b"data")
+    assert provider.list_object_keys_for_container("container") == [object_key]
+
+
+def test_containers(provider):
+    container_key = provider.create_container_and_key()
+    assert provider.list_object_keys_for_container(container_key) == []
+    provider.delete_container(container_key)
+    with pytest.raises(NotFoundException):
+        provider.list_object_keys_for_container(container_key)
+    with pytest.raises(NotFoundException):
+        provider.delete_container(container_key)
+
+
+def test_get_container_data(provider):
+    provider.update_object("container", "a", b"A")
+    provider.update_object("container", "b", b"B" * 3 * 1024 * 1024)
+    data = provider.get_container_data("container", translations={"a": "a.txt"})
+    with zipfile.ZipFile(io.BytesIO(data)) as zip_file:
+        assert sorted(zip_file.namelist()) == ["a.txt", "b"]
+        assert zip_file.read("a.txt") == b"A"
+        assert zip_file.read("b") == b"B" * 3 * 1024 * 1024
+
+
+def test_get_container_data_streaming(provider):
+    provider.update_object("container", "a", b"A")
+    chunks = list(provider.get_container_data_streaming("container"))
+    assert len(chunks) > 1
+    with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as zip_file:
+        assert zip_file.read("a") == b"A"
+
+
+@pytest.mark.parametrize("archive_format, mode", [("tar", "r:"), ("tar.gz", "r:gz")])
+def test_get_container_data_as_tar(provider, archive_format, mode):
+    provider.update_object("container", "a", b"A")
+    provider.update_object("container", "b", b"B" * 3 * 1024 * 1024)
+    data = provider.get_container_data(
+        "container", translations={"a": "a.txt"}, archive_format=archive_format
+    )
+    with tarfile.open(fileobj=io.BytesIO(data), mode=mode) as tar:
+        assert sorted(tar.getnames()) == ["a.txt", "b"]
+        assert tar.extractfile("a.txt").read() == b"A"
+        assert tar.extractfile("b").read() == b"B" * 3 * 1024 * 1024
+
+
+def test_unknown_archive_format(provider):
+    with pytest.raises(ValueError):
+        provider.get_container_data("container", archive_format="rar")
+
+
+def test_tar_fetches_small_objects_ahead(provider):
+    for index in range(5):
+        provider.update_object("container", f"small-{index}", b"x" * index)
+    provider.update_object("container", "large", b"L" * 100)
+    provider.read_ahead_size = 10
+    provider.read_ahead_window = 2
+    chunks = BaseStorageProvider._tar_container(provider, "container")
+    with tarfile.open(fileobj=io.BytesIO(b"".join(chunks))) as tar:
+        assert tar.extractfile("large").read() == b"L" * 100
+        assert tar.extractfile("small-4").read() == b"xxxx"
+
+
+def test_get_object_from_archive(provider):
+    provider.update_object("container", "zip", make_zip(**{"file.txt": b"content"}))
+    assert provider.get_object_from_archive("container", "zip", "file.txt") == (
+        b"content"
+    )
+    assert list(
+        provider.get_object_from_archive_streaming("container", "zip", "file.txt")
+    ) == [b"content"]
+    with pytest.raises(NotFoundException):
+        provider.get_object_from_archive("container", "zip", "missing.txt")
+
+
+def test_get_object_from_archive_not_a_zip(provider):
+    provider.update_object("container", "object", b"data")
+    with pytest.raises(InvalidArchiveException):
+        provider.get_object_from_archive("container", "object", "file.txt")
+
+
+def test_replace_file_in_zip_object(provider):
+    provider.update_object(
+        "container", "zip", make_zip(**{"old.txt": b"old", "keep.txt": b"keep"})
+    )
+    result = provider.replace_file_in_zip_object(
+        "container", "zip", "old.txt", b"new", "new.txt"
+    )
+    assert result == {"container_key": "container", "object_key": "zip"}
+    data = provider.get_object("container", "zip")
+    with zipfile.ZipFile(io.BytesIO(data)) as zip_file:
+        assert sorted(zip_file.namelist()) == ["keep.txt", "new.txt"]
+        assert zip_file.read("new.txt") == b"new"
+
+
+def test_simulated_latency_and_bandwidth():
+    delays = []
+    provider = InMemoryProvider(latency=0.01, bandwidth=1000, sleep=delays.append)
+    provider.update_object("container", "object", b"x" * 500)
+    assert delays == [pytest.approx(0.51)]
+    delays.clear()
+    provider.get_object_metadata("container", "object")
+    assert delays == [pytest.approx(0.01)]
+    delays.clear()
+    list(provider.get_object_streaming("container", "object"))
+    assert sum(delays) == pytest.approx(0.51)
+
+
+def test_urls_are_not_supported(provider):
+    with pytest.raises(NotImplementedError):
+        provider.get_object_url("container", "object")
+    with pytest.raises(NotImplementedError):
+        provider.get_upload_url("container", "object")
+
+
+def test_object_exists(provider):
+    provider.update_object("container", "object", b"data")
+    assert provider.object_exists("container", "object")
+    assert not provider.object_exists("container", "missing")
+    assert not provider.object_exists("missing", "object")
+    assert provider.objects_exist("container", ["object", "missing"]) == {
+        "object": True,
+        "missing": False,
+    }
+
+
+def test_list_objects_with_metadata(provider):
+    provider.update_object("container", "b", b"data")
+    provider.update_object("container", "a", b"")
+    infos = provider.list_objects_with_metadata("container")
+    assert [(info.key, info.size) for info in infos] == [("a", 0), ("b", 4)]
+    assert infos[1].etag == provider.get_object_metadata("container", "b")["etag"]
+
+
+def test_copy_container(provider):
+    for index in range(20):
+        provider.update_object("container", f"object-{index}", b"data %d" % index)
+    report = provider.copy_container("container", "snapshot", max_workers=4)
+    assert report.ok
+    assert report.copied == sorted(f"object-{index}" for index in range(20))
+    for index in range(20):
+        assert provider.get_object("snapshot", f"object-{index}") == b"data %d" % index
+
+
+def test_copy_container_reports_failed_objects(provider):
+    provider.update_object("container", "a", b"a")
+    provider.update_object("container", "b", b"b")
+    original = provider.copy_object
+
+    def copy_object(source_container, source_object, *args):
+        if source_object == "b":
+            raise OSError("copy failed")
+        return original(source_container, source_object, *args)
+
+    provider.copy_object = copy_object
+    report = provider.copy_container("container", "snapshot")
+    assert report.copied == ["a"]
+    assert list(report.failed) == ["b"]
+    assert not report.ok
@@ -1,6 +1,22 @@
 import pytest
+from datetime import datetime
+from datetime import timedelta
+from datetime import timezone
+import json
+import tarfile
 import unittest
+import zipfile
 from unittest.mock import MagicMock
+import hashlib
+import io
+from minio.datatypes import Object
+from minio.datatypes import Part
+from minio.error import S3Error
+from storageprovider.client import StorageProviderClient
+from storageprovider.checksum import ChecksumMismatchException
+from storageprovider.providers import BufferTooSmallException
+from storageprovider.providers import ObjectInfo
+from storageprovider.providers.minio import MIN_PART_SIZE
 from storageprovider.providers.minio import MinioProvider
 
 
@@ -12,6 +28,7 @@ def minio_provider():
     bucket_name = "test-bucket"
     provider = MinioProvider(server_url, access_key, secret_key, bucket_name)
     provider.client = MagicMock()
+    provider.client.stat_object.return_value.size = 1234
     return provider
 
 
@@ -72,6 +89,46 @@ def test_get_object(minio_provider):
     mock_response.release_conn.assert_called_once()
 
 
+def test_get_object_into(minio_provider):
+    mock_response = MagicMock()
+    mock_response.headers = {"Content-Length": "4"}
+    mock_response.readinto = io.BytesIO(b"data").readinto
+    minio_provider.client.get_object.return_value = mock_response
+    buffer = bytearray(8)
+
+    written = minio_provider.get_object_into("container", "object", buffer)
+
+    assert written == 4
+    assert buffer == b"data\0\0\0\0"
+    mock_response.close.assert_called_once()
+    mock_response.release_conn.assert_called_once()
+
+
+def test_get_object_into_too_small_buffer(minio_provider):
+    mock_response = MagicMock()
+    mock_response.headers = {}
+    mock_response.readinto = io.BytesIO(b"data").readinto
+    minio_provider.client.get_object.return_value = mock_response
+
+    with pytest.raises(BufferTooSmallException):
+        minio_provider.get_object_into("container", "object", bytearray(3))
+    mock_response.close.assert_called_once()
+
+
+def test_get_object_range_streaming(minio_provider):
+    mock_response = MagicMock()
+    mock_response.stream.return_value = [b"234"]
+    minio_provider.client.get_object.return_value = mock_response
+
+    chunks = minio_provider.get_object_range_streaming("container", "object", 2, 3)
+
+    assert list(chunks) == [b"234"]
+    minio_provider.client.get_object.assert_called_once_with(
+        minio_provider.bucket_name, "co/nt/ai/ne/r/object", offset=2, length=3
+    )
+    mock_response.release_conn.assert_called_once()
+
+
 def test_get_object_and_metadata(minio_provider):
     container_key = "container"
     object_key = "object"
@@ -81,6 +138,7 @@ def test_get_object_and_metadata(minio_provider):
     mock_stat.last_modified = "2023-01-01T00:00:00Z"
     mock_stat.content_type = "application/json"
     mock_stat.size = 1234
+    mock_stat.etag = "d41d8cd98f00b204e9800998ecf8427e"
     minio_provider.client.get_object.return_value = mock_response
     minio_provider.client.stat_object.return_value = mock_stat
 
@@ -94,6 +152,7 @@ def test_get_object_and_metadata(minio_provider):
             "size": 1234,
             "content-type": "application/json",
             "content-length": 1234,
+            "etag": "d41d8cd98f00b204e9800998ecf8427e",
         },
     }
     minio_provider.client.get_object.assert_called_once_with(
@@ -113,6 +172,7 @@ def test_get_object_metadata(minio_provider):
     mock_stat.last_modified = "2023-01-01T00:00:00Z"
     mock_stat.content_type = "application/json"
     mock_stat.size = 1234
+    mock_stat.etag = "d41d8cd98f00b204e9800998ecf8427e"
     minio_provider.client.stat_object.return_value = mock_stat
 
     result = minio_provider.get_object_metadata(container_key, object_key)
@@ -123,6 +183,7 @@ def test_get_object_metadata(minio_provider):
         "size": 1234,
         "content-type": "application/json",
         "content-length": 1234,
+        "etag": "d41d8cd98f00b204e9800998ecf8427e",
     }
     minio_provider.client.stat_object.assert_called_once_with(
         minio_provider.bucket_name, "co/nt/ai/ne/r/object"
@@ -139,7 +200,7 @@ def test_copy_object_and_create_key(minio_provider):
             source_container_key, source_object_key, output_container_key
         )
     assert result == mock_uuid
-    minio_provider.client.copy_object.assert_called_once()
+    minio_provider.client._execute.assert_called_once()
 
 
 def test_copy_object(minio_provider):
@@ -150,7 +211,7 @@ def test_copy_object(minio_provider):
     minio_provider.copy_object(
         source_container_key, source_object_key, output_container_key, output_object_key
     )
-    minio_provider.client.copy_object.assert_called_once()
+    minio_provider.client._execute.assert_called_once()
 
 
 def test_update_object_and_key(minio_provider):
@@ -183,6 +244,28 @@ def test_list_object_keys_for_container(minio_provider):
     minio_provider.client.list_objects.assert_called_once()
 
 
+def listing(*object_names):
+    """
+    :return: a list_objects mock yielding minio objects, like the real client
+    """
+
+    def list_objects(bucket_name, prefix=None, **kwargs):
+        for object_name in object_names:
+            yield Object(bucket_name, object_name, size=1, etag="abc")
+
+    return list_objects
+
+
+def test_list_object_keys_from_listing_generator(minio_provider):
+    minio_provider.client.list_objects.side_effect = listing(
+        "co/nt/ai/ne/r/a", "co/nt/ai/ne/r/sub/", "co/nt/ai/ne/r/b"
+    )
+    assert minio_provider.list_object_keys("container") == ["a", "b"]
+    assert minio_provider.timing.last.bytes == 0
+    keys = [f"key-{i}" for i in range(minio_provider.exists_listing_threshold)]
+    assert not any(minio_provider.objects_exist("container", keys).values())
+
+
 def test_get_container_data_streaming_not_implemented(minio_provider):
     with pytest.raises(NotImplementedError):
         minio_provider.get_container_data_streaming("container")
@@ -204,6 +287,17 @@ def test_get_container_data(minio_provider):
     minio_provider.client.get_object.assert_called_once()
 
 
+def test_client_spooled_zip_falls_back_to_container_data(minio_provider):
+    minio_provider.client.list_objects.side_effect = listing("co/nt/ai/ne/r/object")
+    minio_provider.client.get_object.return_value.read.return_value = b"data"
+    client = StorageProviderClient(minio_provider)
+
+    spooled = client.get_container_data("container", spooled=True)
+
+    with zipfile.ZipFile(spooled) as zip_file:
+        assert zip_file.read("object") == b"data"
+
+
 def test_create_container_not_implemented(minio_provider):
     with pytest.raises(NotImplementedError):
         minio_provider.create_container("container")
@@ -237,3 +331,425 @@ def test_replace_file_in_zip_object_not_implemented(minio_provider):
         minio_provider.replace_file_in_zip_object(
             "container", "object", "file_to_replace", b"new_content", "new_file_name"
         )
+
+
+def test_get_object_url(minio_provider):
+    minio_provider.client.presigned_get_object.return_value = "http://minio/signed"
+    result = minio_provider.get_object_url(
+        "container",
+        "object",
+        expires=60,
+        content_disposition='attachment; filename="plan.pdf"',
+        content_type="application/pdf",
+    )
+    assert result == "http://minio/signed"
+    minio_provider.client.presigned_get_object.assert_called_once_with(
+        minio_provider.bucket_name,
+        "co/nt/ai/ne/r/object",
+        expires=timedelta(seconds=60),
+        response_headers={
+            "response-content-disposition": 'attachment; filename="plan.pdf"',
+            "response-content-type": "application/pdf",
+        },
+    )
+
+
+def test_get_upload_url(minio_provider):
+    minio_provider.get_upload_url("container", "object")
+    minio_provider.client.presigned_put_object.assert_called_once_with(
+        minio_provider.bucket_name,
+        "co/nt/ai/ne/r/object",
+        expires=timedelta(seconds=3600),
+    )
+
+
+def test_object_exists(minio_provider):
+    assert minio_provider.object_exists("container", "object") is True
+    minio_provider.client.stat_object.assert_called_once_with(
+        minio_provider.bucket_name, "co/nt/ai/ne/r/object"
+    )
+    minio_provider.client.stat_object.side_effect = S3Error(
+        "NoSuchKey", "missing", "co/nt/ai/ne/r/object", "request", "host", None
+    )
+    assert minio_provider.object_exists("container", "object") is False
+
+
+def test_objects_exist_lists_container_for_many_keys(minio_provider):
+    mock_obj = MagicMock(is_dir=False, object_name="co/nt/ai/ne/r/object-1")
+    minio_provider.client.list_objects.return_value = [mock_obj]
+    keys = [f"object-{index}" for index in range(30)]
+    result = minio_provider.objects_exist("container", keys)
+    assert [key for key, exists in result.items() if exists] == ["object-1"]
+    minio_provider.client.stat_object.assert_not_called()
+
+
+def test_list_objects_with_metadata(minio_provider):
+    with_type = MagicMock(
+        is_dir=False,
+        object_name="co/nt/ai/ne/r/a",
+        size=4,
+        etag="abc",
+        metadata={"Content-Type": "application/pdf"},
+    )
+    without_type = MagicMock(
+        is_dir=False, object_name="co/nt/ai/ne/r/b", size=2, etag="def", metadata=None
+    )
+    minio_provider.client.list_objects.return_value = [with_type, without_type]
+    minio_provider.client.stat_object.return_value.content_type = "text/plain"
+    infos = minio_provider.list_objects_with_metadata("container")
+    minio_provider.client.list_objects.assert_called_once_with(
+        minio_provider.bucket_name, prefix="co/nt/ai/ne/r/", include_user_meta=True
+    )
+    assert [(i.key, i.size, i.content_type, i.etag) for i in infos] == [
+        ("a", 4, "application/pdf", "abc"),
+        ("b", 2, "text/plain", "def"),
+    ]
+    minio_provider.client.stat_object.assert_called_once_with(
+        minio_provider.bucket_name, "co/nt/ai/ne/r/b"
+    )
+
+
+def test_copy_object_uses_single_copy_without_stat(minio_provider):
+    minio_provider.copy_object("source", "object", "output", "copy")
+    minio_provider.client.stat_object.assert_not_called()
+    minio_provider.client.copy_object.assert_not_called()
+    args, kwargs = minio_provider.client._execute.call_args
+    assert args == ("PUT", minio_provider.bucket_name)
+    assert kwargs["object_name"] == "ou/tp/ut/copy"
+    assert kwargs["headers"]["x-amz-copy-source"] == "/test-bucket/so/ur/ce/object"
+    minio_provider.client._create_multipart_upload.assert_not_called()
+
+
+def test_copy_object_too_large_for_single_copy(minio_provider):
+    minio_provider.client._execute.side_effect = S3Error(
+        "InvalidRequest", "too large", None, None, None, None
+    )
+    stat = minio_provider.client.stat_object.return_value
+    stat.size = 6 * 1024 * 1024 * 1024
+    stat.etag = "abc"
+    stat.metadata = {
+        "Content-Type": "application/zip",
+        "Content-Disposition": "attachment",
+        "x-amz-meta-author": "someone",
+        "ETag": "abc",
+        "Content-Length": str(stat.size),
+    }
+    minio_provider.client._create_multipart_upload.return_value = "upload-id"
+    minio_provider.client._upload_part_copy.return_value = ("etag", None)
+    minio_provider.copy_object("source", "object", "output", "copy")
+    minio_provider.client._create_multipart_upload.assert_called_once_with(
+        minio_provider.bucket_name,
+        "ou/tp/ut/copy",
+        {
+            "Content-Type": "application/zip",
+            "Content-Disposition": "attachment",
+            "x-amz-meta-author": "someone",
+        },
+    )
+    assert minio_provider.client._upload_part_copy.call_count == 24
+    minio_provider.client._complete_multipart_upload.assert_called_once()
+
+
+def test_refused_single_copy_of_small_object_is_raised(minio_provider):
+    minio_provider.client._execute.side_effect = S3Error(
+        "InvalidRequest", "refused", None, None, None, None
+    )
+    with pytest.raises(S3Error):
+        minio_provider.copy_object("source", "object", "output", "copy")
+    minio_provider.client._create_multipart_upload.assert_not_called()
+
+
+def test_copy_object_uses_concurrent_part_copies_for_large_objects():
+    provider = MinioProvider(
+        "localhost:9000",
+        "key",
+        "secret",
+        "bucket",
+        multipart_copy_threshold=10 * 1024 * 1024,
+        copy_part_size=5 * 1024 * 1024,
+    )
+    provider.client = MagicMock()
+    stat = provider.client.stat_object.return_value
+    stat.size = 12 * 1024 * 1024
+    stat.etag = "abc"
+    stat.metadata = {"Content-Type": "application/zip"}
+    provider.client._create_multipart_upload.return_value = "upload-id"
+    provider.client._upload_part_copy.side_effect = (
+        lambda bucket, name, upload_id, number, headers: (f"etag-{number}", None)
+    )
+    provider.copy_object("source", "object", "output", "copy")
+
+    provider.client._execute.assert_not_called()
+    provider.client._create_multipart_upload.assert_called_once_with(
+        "bucket", "ou/tp/ut/copy", {"Content-Type": "application/zip"}
+    )
+    ranges = sorted(
+        (c[0][3], c[0][4]["x-amz-copy-source-range"])
+        for c in provider.client._upload_part_copy.call_args_list
+    )
+    assert ranges == [
+        (1, "bytes=0-5242879"),
+        (2, "bytes=5242880-10485759"),
+        (3, "bytes=10485760-12582911"),
+    ]
+    headers = provider.client._upload_part_copy.call_args[0][4]
+    assert headers["x-amz-copy-source"] == "/bucket/so/ur/ce/object"
+    assert headers["x-amz-copy-source-if-match"] == "abc"
+    (bucket, name, upload_id, parts), _ = (
+        provider.client._complete_multipart_upload.call_args
+    )
+    assert [(p.part_number, p.etag) for p in parts] == [
+        (1, "etag-1"),
+        (2, "etag-2"),
+        (3, "etag-3"),
+    ]
+
+
+def test_failed_part_copy_aborts_upload():
+    provider = MinioProvider(
+        "localhost:9000", "key", "secret", "bucket", multipart_copy_threshold=0
+    )
+    provider.client = MagicMock()
+    provider.client.stat_object.return_value.size = 1024
+    provider.client.stat_object.return_value.metadata = {}
+    provider.client._create_multipart_upload.return_value = "upload-id"
+    provider.client._upload_part_copy.side_effect = OSError("connection reset")
+    with pytest.raises(OSError):
+        provider.copy_object("source", "object", "output", "copy")
+    provider.client._abort_multipart_upload.assert_called_once_with(
+        "bucket", "ou/tp/ut/copy", "upload-id"
+    )
+    provider.client._complete_multipart_upload.assert_not_called()
+
+
+def test_invalid_copy_part_size():
+    with pytest.raises(ValueError):
+        MinioProvider("localhost:9000", "key", "secret", "bucket", copy_part_size=1)
+
+
+def test_copy_container(minio_provider):
+    minio_provider.client.list_objects.side_effect = listing(
+        "co/nt/ai/ne/r/a", "co/nt/ai/ne/r/sub/", "co/nt/ai/ne/r/b"
+    )
+    report = minio_provider.copy_container("container", "snapshot")
+    assert report.copied == ["a", "b"]
+    copied = sorted(
+        (c[1]["object_name"], c[1]["headers"]["x-amz-copy-source"])
+        for c in minio_provider.client._execute.call_args_list
+    )
+    assert copied == [
+        ("sn/ap/sh/ot/a", "/test-bucket/co/nt/ai/ne/r/a"),
+        ("sn/ap/sh/ot/b", "/test-bucket/co/nt/ai/ne/r/b"),
+    ]
+
+
+def test_checksums_on_upload():
+    provider = MinioProvider(
+        "localhost:9000", "key", "secret", "bucket", checksums=("md5", "sha256")
+    )
+    provider.client = MagicMock()
+
+    def put_object(bucket, name, data, length, part_size):
+        assert data.read() == b"data"
+        return MagicMock(etag=hashlib.md5(b"data").hexdigest())
+
+    provider.client.put_object.side_effect = put_object
+    provider.update_object("container", "object", io.BytesIO(b"data"))
+    assert provider.checksums.last.hexdigests()["sha256"] == (
+        hashlib.sha256(b"data").hexdigest()
+    )
+    provider.client.put_object.side_effect = None
+    provider.client.put_object.return_value.etag = "0" * 32
+    with pytest.raises(ChecksumMismatchException):
+        provider.update_object("container", "object", b"data")
+
+
+def test_checksums_on_streaming_download():
+    provider = MinioProvider(
+        "localhost:9000", "key", "secret", "bucket", checksums=["md5"]
+    )
+    provider.client = MagicMock()
+    response = provider.client.get_object.return_value
+    response.stream.return_value = [b"da", b"ta"]
+    response.headers = {"ETag": '"%s"' % hashlib.md5(b"data").hexdigest()}
+    assert b"".join(provider.get_object_streaming("container", "object")) == b"data"
+    response.stream.return_value = [b"da", b"tx"]
+    with pytest.raises(ChecksumMismatchException):
+        list(provider.get_object_streaming("container", "object"))
+
+
+RESUMABLE_DATA = b"a" * MIN_PART_SIZE + b"b" * MIN_PART_SIZE + b"c" * 100
+
+
+def md5(data):
+    return hashlib.md5(data).hexdigest()
+
+
+def upload_part(bucket_name, object_name, data, headers, upload_id, part_number):
+    return md5(data)
+
+
+def test_update_object_resumable(minio_provider, tmp_path):
+    state_path = tmp_path / "upload.json"
+    minio_provider.client._create_multipart_upload.return_value = "upload-1"
+    minio_provider.client._upload_part.side_effect = upload_part
+
+    minio_provider.update_object_resumable(
+        "container",
+        "object",
+        io.BytesIO(RESUMABLE_DATA),
+        state_path,
+        part_size=MIN_PART_SIZE,
+    )
+
+    assert minio_provider.client._upload_part.call_count == 3
+    args = minio_provider.client._complete_multipart_upload.call_args.args
+    assert args[:3] == ("test-bucket", "co/nt/ai/ne/r/object", "upload-1")
+    assert [(p.part_number, p.etag) for p in args[3]] == [
+        (1, md5(b"a" * MIN_PART_SIZE)),
+        (2, md5(b"b" * MIN_PART_SIZE)),
+        (3, md5(b"c" * 100)),
+    ]
+    assert minio_provider.client._create_multipart_upload.call_args.args[2] == {
+        "Content-Type": "application/octet-stream"
+    }
+    minio_provider.client._abort_multipart_upload.assert_not_called()
+    assert not state_path.exists()
+
+
+def test_update_object_resumable_uploads_missing_parts(minio_provider, tmp_path):
+    state_path = tmp_path / "upload.json"
+    state_path.write_text(
+        json.dumps(
+            {
+                "object_name": "co/nt/ai/ne/r/object",
+                "upload_id": "upload-1",
+                "part_size": MIN_PART_SIZE,
+            }
+        )
+    )
+    minio_provider.client._list_parts.return_value = MagicMock(
+        parts=[Part(1, md5(b"a" * MIN_PART_SIZE)), Part(2, "torn part")],
+        is_truncated=False,
+    )
+    minio_provider.client._upload_part.side_effect = upload_part
+
+    minio_provider.update_object_resumable(
+        "container",
+        "object",
+        io.BytesIO(RESUMABLE_DATA),
+        state_path,
+        part_size=MIN_PART_SIZE,
+    )
+
+    minio_provider.client._create_multipart_upload.assert_not_called()
+    uploaded = [c.args[5] for c in minio_provider.client._upload_part.call_args_list]
+    assert uploaded == [2, 3]
+    parts = minio_provider.client._complete_multipart_upload.call_args.args[3]
+    assert [p.part_number for p in parts] == [1, 2, 3]
+
+
+def test_update_object_resumable_restarts_vanished_upload(minio_provider, tmp_path):
+    state_path = tmp_path / "upload.json"
+    state_path.write_text(
+        json.dumps(
+            {
+                "object_name": "co/nt/ai/ne/r/object",
+                "upload_id": "aborted",
+                "part_size": MIN_PART_SIZE,
+            }
+        )
+    )
+    minio_provider.client._list_parts.side_effect = S3Error(
+        "NoSuchUpload", "missing", "co/nt/ai/ne/r/object", "request", "host", None
+    )
+    minio_provider.client._create_multipart_upload.return_value = "upload-2"
+    minio_provider.client._upload_part.side_effect = upload_part
+
+    minio_provider.update_object_resumable(
+        "container", "object", io.BytesIO(b"small"), state_path, part_size=MIN_PART_SIZE
+    )
+
+    args = minio_provider.client._complete_multipart_upload.call_args.args
+    assert args[2] == "upload-2"
+    assert [p.etag for p in args[3]] == [md5(b"small")]
+    minio_provider.client._abort_multipart_upload.assert_called_once_with(
+        "test-bucket", "co/nt/ai/ne/r/object", "aborted"
+    )
+
+
+def test_update_object_resumable_aborts_superseded_upload(minio_provider, tmp_path):
+    state_path = tmp_path / "upload.json"
+    state_path.write_text(
+        json.dumps(
+            {
+                "object_name": "co/nt/ai/ne/r/other",
+                "upload_id": "upload-1",
+                "part_size": MIN_PART_SIZE,
+            }
+        )
+    )
+    minio_provider.client._create_multipart_upload.return_value = "upload-2"
+    minio_provider.client._upload_part.side_effect = upload_part
+
+    minio_provider.update_object_resumable(
+        "container",
+        "object",
+        io.BytesIO(b"small"),
+        state_path,
+        part_size=MIN_PART_SIZE,
+        content_type="text/plain",
+    )
+
+    minio_provider.client._list_parts.assert_not_called()
+    minio_provider.client._create_multipart_upload.assert_called_once_with(
+        "test-bucket", "co/nt/ai/ne/r/object", {"Content-Type": "text/plain"}
+    )
+    minio_provider.client._abort_multipart_upload.assert_called_once_with(
+        "test-bucket", "co/nt/ai/ne/r/other", "upload-1"
+    )
+    assert minio_provider.client._complete_multipart_upload.call_args.args[2] == (
+        "upload-2"
+    )
+
+
+def test_abort_stale_uploads(minio_provider):
+    now = datetime.now(timezone.utc)
+    minio_provider.client._list_multipart_uploads.return_value = MagicMock(
+        uploads=[
+            MagicMock(
+                object_name="co/nt/ai/ne/r/old",
+                upload_id="1",
+                initiated_time=now - timedelta(days=2),
+            ),
+            MagicMock(
+                object_name="co/nt/ai/ne/r/new", upload_id="2", initiated_time=now
+            ),
+        ],
+        is_truncated=False,
+    )
+
+    assert minio_provider.abort_stale_uploads(container_key="container") == [
+        "co/nt/ai/ne/r/old"
+    ]
+    minio_provider.client._list_multipart_uploads.assert_called_once_with(
+        "test-bucket", prefix="co/nt/ai/ne/r/", key_marker=None, upload_id_marker=None
+    )
+    minio_provider.client._abort_multipart_upload.assert_called_once_with(
+        "test-bucket", "co/nt/ai/ne/r/old", "1"
+    )
+
+
+def test_get_container_data_as_tar(minio_provider):
+    minio_provider.list_objects_with_metadata = MagicMock(
+        return_value=[ObjectInfo("a", 1), ObjectInfo("b", 2)]
+    )
+    minio_provider.get_object = MagicMock(side_effect=[b"A", b"BB"])
+
+    data = minio_provider.get_container_data(
+        "container", translations={"a": "a.txt"}, archive_format="tar"
+    )
+
+    with tarfile.open(fileobj=io.BytesIO(data)) as tar:
+        assert tar.getnames() == ["a.txt", "b"]
+        assert tar.extractfile("b").read() == b"BB"
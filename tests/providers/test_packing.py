@@ -0,0 +1,280 @@
+import io
+import json
+import tarfile
+import zipfile
+from unittest.mock import MagicMock
+
+import pytest
+from minio.datatypes import Object
+from minio.error import S3Error
+
+from storageprovider.providers.memory import InMemoryProvider
+from storageprovider.providers.memory import NotFoundException
+from storageprovider.providers.minio import MinioProvider
+from storageprovider.providers.packing import INDEX_KEY
+from storageprovider.providers.packing import PackingProvider
+
+
+@pytest.fixture
+def backend():
+    backend = MagicMock(wraps=InMemoryProvider())
+    backend.create_container("container")
+    return backend
+
+
+@pytest.fixture
+def provider(backend):
+    return PackingProvider(backend, max_object_size=10, pack_size=20)
+
+
+def _packs(backend):
+    return [
+        key
+        for key in backend.list_object_keys("container")
+        if key.startswith(".pack-") and key != INDEX_KEY
+    ]
+
+
+def test_small_writes_are_packed(provider, backend):
+    provider.update_object("container", "a", b"aaaaa")
+    provider.update_object("container", "b", b"bbbbb")
+    backend.update_object.assert_not_called()
+    provider.flush()
+    assert len(_packs(backend)) == 1
+    index = json.loads(backend.get_object("container", INDEX_KEY))
+    assert sorted(index["entries"]) == ["a", "b"]
+    assert "a" not in backend.list_object_keys("container")
+
+
+def test_pack_is_written_when_full(provider, backend):
+    for key in "abcd":
+        provider.update_object("container", key, b"x" * 5)
+    assert len(_packs(backend)) == 1
+    assert provider.pending == {}
+
+
+def test_large_writes_are_not_packed(provider, backend):
+    provider.update_object("container", "large", b"x" * 11)
+    assert backend.get_object("container", "large") == b"x" * 11
+    assert provider.get_object("container", "large") == b"x" * 11
+
+
+def test_read_pending_and_packed(provider, backend):
+    provider.update_object("container", "a", b"aaaaa")
+    assert provider.get_object("container", "a") == b"aaaaa"
+    provider.update_object("container", "b", "bbb")
+    provider.flush()
+    assert provider.get_object("container", "a") == b"aaaaa"
+    assert list(provider.get_object_streaming("container", "b")) == [b"bbb"]
+    backend.get_object_range.assert_called()
+
+
+def test_packed_object_read_with_range_request(provider, backend):
+    provider.update_object("container", "a", b"aaaaa")
+    provider.update_object("container", "b", b"0123456789")
+    provider.flush()
+    backend.get_object.reset_mock()
+    assert provider.get_object("container", "b") == b"0123456789"
+    assert provider.get_object_range("container", "b", 2, 3) == b"234"
+    assert provider.get_object_range("container", "b", 8) == b"89"
+    assert provider.get_object_range("container", "b", 12) == b""
+    backend.get_object.assert_not_called()
+
+
+def test_metadata_of_packed_object(provider):
+    provider.update_object("container", "a", b"aaaaa")
+    provider.flush()
+    metadata = provider.get_object_metadata("container", "a")
+    assert metadata["size"] == 5
+    assert metadata["etag"] == "594f803b380a41396ed63dca39503542"
+    result = provider.get_object_and_metadata("container", "a")
+    assert result["object"] == b"aaaaa"
+    assert provider.object_exists("container", "a")
+    assert not provider.object_exists("container", "b")
+
+
+def test_listing_hides_packs(provider):
+    provider.update_object("container", "a", b"aaaaa")
+    provider.flush()
+    provider.update_object("container", "b", b"bbbbb")
+    provider.update_object("container", "large", b"x" * 11)
+    assert provider.list_object_keys_for_container("container") == ["a", "b", "large"]
+    infos = provider.list_objects_with_metadata("container")
+    assert [(info.key, info.size) for info in infos] == [
+        ("a", 5),
+        ("b", 5),
+        ("large", 11),
+    ]
+    assert provider.objects_exist("container", ["a", "c"]) == {"a": True, "c": False}
+
+
+def test_delete(provider):
+    provider.update_object("container", "a", b"aaaaa")
+    provider.update_object("container", "b", b"bbbbb")
+    provider.delete_object("container", "a")
+    provider.flush()
+    provider.delete_object("container", "b")
+    provider.update_object("container", "large", b"x" * 11)
+    provider.delete_object("container", "large")
+    assert provider.list_object_keys("container") == []
+    with pytest.raises(NotFoundException):
+        provider.get_object("container", "b")
+
+
+def test_index_is_loaded_by_new_instance(provider, backend):
+    provider.update_object("container", "a", b"aaaaa")
+    provider.close()
+    other = PackingProvider(backend, max_object_size=10)
+    assert other.get_object("container", "a") == b"aaaaa"
+
+
+def test_overwrite_with_large_object(provider, backend):
+    provider.update_object("container", "a", b"aaaaa")
+    provider.flush()
+    provider.update_object("container", "a", b"x" * 11)
+    assert provider.get_object("container", "a") == b"x" * 11
+    assert provider.list_object_keys("container") == ["a"]
+
+
+def test_reserved_keys(provider):
+    with pytest.raises(ValueError):
+        provider.update_object("container", INDEX_KEY, b"{}")
+
+
+def test_copy_packed_object(provider):
+    provider.update_object("container", "a", b"aaaaa")
+    provider.flush()
+    object_key = provider.copy_object_and_create_key("container", "a", "container")
+    assert provider.get_object("container", object_key) == b"aaaaa"
+
+
+def test_compact(provider, backend):
+    for key in "abcd":
+        provider.update_object("container", key, b"x" * 5)
+    old_pack = _packs(backend)[0]
+    provider.update_object("container", "e", b"y" * 5)
+    provider.flush()
+    provider.delete_object("container", "a")
+    provider.delete_object("container", "b")
+    provider.update_object("container", "e", b"z" * 5)
+    provider.flush()
+    assert len(_packs(backend)) == 3
+    assert provider.compact("container") == 2
+    packs = _packs(backend)
+    assert len(packs) == 2
+    assert old_pack not in packs
+    assert provider.list_object_keys("container") == ["c", "d", "e"]
+    assert provider.get_object("container", "c") == b"x" * 5
+    assert provider.get_object("container", "e") == b"z" * 5
+
+
+def test_compact_removes_shadowed_objects(provider, backend):
+    backend.update_object("container", "a", b"old")
+    provider.update_object("container", "a", b"new")
+    provider.flush()
+    assert provider.get_object("container", "a") == b"new"
+    provider.compact("container")
+    assert not backend.object_exists("container", "a")
+    assert provider.get_object("container", "a") == b"new"
+
+
+def test_export_reads_each_pack_once(provider, backend):
+    provider.update_object("container", "a", b"aaaaa")
+    provider.update_object("container", "b", b"bbbbb")
+    provider.flush()
+    provider.update_object("container", "c", b"ccccc")
+    provider.update_object("container", "large", b"x" * 11)
+    backend.get_object_range.reset_mock()
+    data = provider.get_container_data("container", translations={"a": "a.txt"})
+    with zipfile.ZipFile(io.BytesIO(data)) as zip_file:
+        assert sorted(zip_file.namelist()) == ["a.txt", "b", "c", "large"]
+        assert zip_file.read("b") == b"bbbbb"
+    backend.get_object_range.assert_not_called()
+    data = provider.get_container_data("container", archive_format="tar")
+    with tarfile.open(fileobj=io.BytesIO(data)) as tar:
+        assert tar.extractfile("large").read() == b"x" * 11
+
+
+def test_packed_archive(provider):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zip_file:
+        zip_file.writestr("file.txt", b"content")
+    provider.max_object_size = len(buffer.getvalue())
+    provider.update_object("container", "zip", buffer.getvalue())
+    provider.flush()
+    assert provider.get_object_from_archive("container", "zip", "file.txt") == b"content"
+    provider.replace_file_in_zip_object(
+        "container", "zip", "file.txt", b"new", "new.txt"
+    )
+    assert provider.get_object_from_archive("container", "zip", "new.txt") == b"new"
+
+
+def test_packing_over_unpacked_object_removes_it(provider, backend):
+    provider.update_object("container", "a", b"x" * 11)
+    provider.update_object("container", "a", b"small")
+    assert backend.get_object("container", "a") == b"x" * 11
+    provider.flush()
+    assert "a" not in backend.list_object_keys("container")
+    provider.delete_object("container", "a")
+    assert not provider.object_exists("container", "a")
+
+
+def test_delete_removes_shadowed_object(provider, backend):
+    backend.update_object("container", "a", b"old")
+    provider.update_object("container", "a", b"new")
+    provider.delete_object("container", "a")
+    assert not provider.object_exists("container", "a")
+    provider.update_object("container", "b", b"bbb")
+    provider.flush()
+    backend.update_object("container", "b", b"old")
+    provider.delete_object("container", "b")
+    assert provider.list_object_keys("container") == []
+
+
+def test_deletes_are_saved_with_the_next_flush(provider, backend):
+    provider.update_object("container", "a", b"aaaaa")
+    provider.update_object("container", "b", b"bbbbb")
+    provider.flush()
+    backend.update_object.reset_mock()
+    provider.delete_object("container", "a")
+    provider.delete_object("container", "b")
+    backend.update_object.assert_not_called()
+    provider.flush()
+    backend.update_object.assert_called_once()
+    index = json.loads(backend.get_object("container", INDEX_KEY))
+    assert index["entries"] == {}
+
+
+def test_failed_overwrite_keeps_packed_object(provider, backend):
+    provider.update_object("container", "a", b"old")
+    provider.flush()
+    backend.update_object.side_effect = IOError("unavailable")
+    with pytest.raises(IOError):
+        provider.update_object("container", "a", b"x" * 11)
+    backend.copy_object.side_effect = IOError("unavailable")
+    backend.update_object.side_effect = None
+    backend.update_object("container", "large", b"x" * 11)
+    with pytest.raises(IOError):
+        provider.copy_object("container", "large", "container", "a")
+    assert provider.object_exists("container", "a")
+    assert provider.get_object("container", "a") == b"old"
+
+
+def test_flush_on_minio_does_not_list():
+    minio = MinioProvider("localhost:9000", "key", "secret", "bucket")
+    minio.client = MagicMock()
+    minio.client.stat_object.side_effect = S3Error(
+        "NoSuchKey", "missing", None, None, None, None
+    )
+
+    def list_objects(bucket_name, prefix=None, **kwargs):
+        yield Object(bucket_name, f"{prefix}object", size=1)
+
+    minio.client.list_objects.side_effect = list_objects
+    provider = PackingProvider(minio, max_object_size=10, pack_size=1024)
+    for i in range(minio.exists_listing_threshold + 5):
+        provider.update_object("container", f"key-{i}", b"data")
+    provider.flush()
+    # the pack and the index
+    assert minio.client.put_object.call_count == 2
+    minio.client.list_objects.assert_not_called()
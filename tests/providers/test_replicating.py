@@ -0,0 +1,163 @@
+import io
+import threading
+import time
+from unittest.mock import MagicMock
+
+import pytest
+
+from storageprovider.providers.memory import InMemoryProvider
+from storageprovider.providers.replicating import ReplicatingProvider
+from storageprovider.providers.replicating import ReplicationException
+
+
+@pytest.fixture
+def replicas():
+    return [InMemoryProvider(), InMemoryProvider()]
+
+
+@pytest.fixture
+def provider(replicas):
+    provider = ReplicatingProvider(replicas)
+    yield provider
+    provider.close()
+
+
+def failing(replica, *methods):
+    mock = MagicMock(wraps=replica)
+    for method in methods:
+        getattr(mock, method).side_effect = OSError("backend down")
+    return mock
+
+
+def test_invalid_quorum(replicas):
+    with pytest.raises(ValueError):
+        ReplicatingProvider(replicas, write_quorum=3)
+    with pytest.raises(ValueError):
+        ReplicatingProvider([])
+
+
+def test_writes_reach_all_replicas(provider, replicas):
+    provider.update_object("container", "object", b"data")
+    object_key = provider.update_object_and_key("container", io.BytesIO(b"file"))
+    provider.copy_object("container", "object", "container", "copy")
+    for replica in replicas:
+        assert replica.get_object("container", "object") == b"data"
+        assert replica.get_object("container", object_key) == b"file"
+        assert replica.get_object("container", "copy") == b"data"
+    provider.delete_object("container", "object")
+    provider.delete_container("container")
+    for replica in replicas:
+        assert "container" not in replica.containers
+
+
+def test_writes_are_concurrent():
+    replicas = [InMemoryProvider(latency=0.2), InMemoryProvider(latency=0.2)]
+    provider = ReplicatingProvider(replicas)
+    start = time.monotonic()
+    provider.update_object("container", "object", b"data")
+    assert time.monotonic() - start < 0.35
+    provider.close()
+
+
+def test_all_quorum_fails_and_records_divergence(replicas):
+    provider = ReplicatingProvider([replicas[0], failing(replicas[1], "update_object")])
+    with pytest.raises(ReplicationException):
+        provider.update_object("container", "object", b"data")
+    assert len(provider.divergences) == 1
+    divergence = provider.divergences[0]
+    assert divergence.operation == "update_object"
+    assert divergence.replicas == [1]
+    assert divergence.object_key == "object"
+
+
+def test_quorum_of_one_succeeds_and_repairs(replicas):
+    broken = failing(replicas[1], "update_object")
+    provider = ReplicatingProvider([replicas[0], broken], write_quorum=1)
+    provider.update_object("container", "object", b"data")
+    provider.close()
+    assert len(provider.divergences) == 1
+
+    broken.update_object.side_effect = None
+    assert provider.repair() == []
+    assert replicas[1].get_object("container", "object") == b"data"
+    assert provider.divergences == []
+
+
+def test_quorum_does_not_wait_for_slow_replica(replicas):
+    release = threading.Event()
+    slow = MagicMock(wraps=replicas[1])
+    slow.update_object.side_effect = lambda *args: release.wait(5)
+    provider = ReplicatingProvider([replicas[0], slow], write_quorum=1)
+    start = time.monotonic()
+    provider.update_object("container", "object", b"data")
+    assert time.monotonic() - start < 1
+    release.set()
+    provider.close()
+
+
+def test_reads_fall_back_to_healthy_replica(replicas):
+    replicas[1].update_object("container", "object", b"data")
+    provider = ReplicatingProvider(
+        [failing(replicas[0], "get_object"), replicas[1]]
+    )
+    assert provider.get_object("container", "object") == b"data"
+    assert provider.replicas[0].failed_at is not None
+    assert provider.get_object("container", "object") == b"data"
+    provider.close()
+
+
+def test_reads_prefer_fastest_replica():
+    slow = MagicMock(wraps=InMemoryProvider(latency=0.05))
+    fast = MagicMock(wraps=InMemoryProvider())
+    provider = ReplicatingProvider([slow, fast])
+    provider.update_object("container", "object", b"data")
+    provider.replicas[0].record(0.05)
+    provider.replicas[1].record(0.001)
+    for _ in range(3):
+        provider.get_object("container", "object")
+    assert fast.get_object.call_count == 3
+    slow.get_object.assert_not_called()
+    provider.close()
+
+
+def test_all_replicas_failing_raises(replicas):
+    provider = ReplicatingProvider(replicas)
+    with pytest.raises(Exception):
+        provider.get_object("container", "missing")
+    provider.close()
+
+
+def test_streaming_reads_fall_back_on_first_chunk(replicas):
+    replicas[1].update_object("container", "object", b"data")
+    # the in-memory stream only raises when it is iterated
+    provider = ReplicatingProvider(replicas)
+    provider.replicas[0].record(0.001)
+    provider.replicas[1].record(0.05)
+    assert b"".join(provider.get_object_streaming("container", "object")) == b"data"
+    assert provider.replicas[0].failed_at is not None
+    assert b"".join(
+        provider.get_object_range_streaming("container", "object", 1, 2)
+    ) == b"at"
+    provider.close()
+
+
+def test_writes_of_a_key_are_ordered_on_lagging_replica(replicas):
+    release = threading.Event()
+    lagging = MagicMock(wraps=replicas[1])
+    writes = []
+
+    def update_object(container_key, object_key, data, system_token=None):
+        if data == b"first":
+            release.wait(5)
+        writes.append(data)
+        return replicas[1].update_object(container_key, object_key, data)
+
+    lagging.update_object.side_effect = update_object
+    provider = ReplicatingProvider([replicas[0], lagging], write_quorum=1)
+    provider.update_object("container", "object", b"first")
+    provider.update_object("container", "object", b"second")
+    time.sleep(0.05)
+    release.set()
+    provider.close()
+    assert writes == [b"first", b"second"]
+    assert replicas[1].get_object("container", "object") == b"second"
@@ -0,0 +1,188 @@
+import threading
+from unittest.mock import MagicMock
+
+import pytest
+
+from storageprovider.providers.memory import InMemoryProvider
+from storageprovider.providers.memory import NotFoundException
+from storageprovider.providers.tiered import TieredProvider
+
+
+@pytest.fixture
+def fast():
+    return MagicMock(wraps=InMemoryProvider())
+
+
+@pytest.fixture
+def slow():
+    slow = MagicMock(wraps=InMemoryProvider())
+    slow.create_container("container")
+    return slow
+
+
+@pytest.fixture
+def provider(fast, slow):
+    return TieredProvider(fast, slow, max_cached_size=10)
+
+
+@pytest.fixture
+def write_back(fast, slow):
+    return TieredProvider(fast, slow, max_cached_size=10, write_mode="write-back")
+
+
+def test_invalid_write_mode(fast, slow):
+    with pytest.raises(ValueError):
+        TieredProvider(fast, slow, write_mode="write-around")
+
+
+def test_read_through_caches_small_objects(provider, slow):
+    slow.update_object("container", "object", b"small")
+    assert provider.get_object("container", "object") == b"small"
+    assert provider.get_object("container", "object") == b"small"
+    assert slow.get_object.call_count == 1
+
+
+def test_read_through_skips_large_objects(provider, fast, slow):
+    slow.update_object("container", "object", b"x" * 11)
+    provider.get_object("container", "object")
+    provider.get_object("container", "object")
+    assert slow.get_object.call_count == 2
+    fast.update_object.assert_not_called()
+
+
+def test_streaming_read_through(provider, slow):
+    slow.update_object("container", "object", b"small")
+    assert list(provider.get_object_streaming("container", "object")) == [b"small"]
+    assert list(provider.get_object_streaming("container", "object")) == [b"small"]
+    assert slow.get_object_streaming.call_count == 1
+
+
+def test_read_into_buffer_caches_small_objects(provider, slow):
+    slow.update_object("container", "object", b"small")
+    for _ in range(2):
+        buffer = bytearray(8)
+        assert provider.get_object_into("container", "object", buffer) == 5
+        assert buffer[:5] == b"small"
+    assert slow.get_object_into.call_count == 1
+
+
+def test_write_through(provider, fast, slow):
+    provider.update_object("container", "object", b"small")
+    assert slow.get_object("container", "object") == b"small"
+    assert fast.get_object("container", "object") == b"small"
+    provider.update_object("container", "object", b"x" * 11)
+    assert slow.get_object("container", "object") == b"x" * 11
+    with pytest.raises(NotFoundException):
+        fast.get_object("container", "object")
+
+
+def test_write_through_update_object_and_key(provider, fast, slow):
+    object_key = provider.update_object_and_key("container", b"small")
+    assert slow.get_object("container", object_key) == b"small"
+    assert fast.get_object("container", object_key) == b"small"
+
+
+def test_write_back(write_back, fast, slow):
+    write_back.update_object("container", "object", b"small")
+    slow.update_object.assert_not_called()
+    assert write_back.get_object("container", "object") == b"small"
+    assert write_back.get_object_metadata("container", "object")["size"] == 5
+    write_back.flush()
+    assert slow.get_object("container", "object") == b"small"
+    assert not write_back.dirty
+
+
+def test_write_back_large_objects_are_written_through(write_back, slow):
+    write_back.update_object("container", "object", b"x" * 11)
+    assert slow.get_object("container", "object") == b"x" * 11
+    assert not write_back.dirty
+
+
+def test_write_back_flushes_before_listing_and_copying(write_back, slow):
+    write_back.update_object("container", "object", b"small")
+    assert write_back.list_object_keys_for_container("container") == ["object"]
+    write_back.update_object("container", "other", b"other")
+    write_back.copy_object("container", "other", "container", "copy")
+    assert slow.get_object("container", "copy") == b"other"
+
+
+def test_write_back_background_flush(fast, slow):
+    provider = TieredProvider(
+        fast, slow, write_mode="write-back", flush_interval=0.01
+    )
+    provider.update_object("container", "object", b"small")
+    provider.close()
+    assert slow.get_object("container", "object") == b"small"
+
+
+def test_delete_propagates_to_both_tiers(provider, fast, slow):
+    provider.update_object("container", "object", b"small")
+    provider.delete_object("container", "object")
+    with pytest.raises(NotFoundException):
+        fast.get_object("container", "object")
+    with pytest.raises(NotFoundException):
+        slow.get_object("container", "object")
+
+
+def test_delete_of_unflushed_object(write_back, slow):
+    write_back.update_object("container", "object", b"small")
+    write_back.delete_object("container", "object")
+    write_back.flush()
+    slow.update_object.assert_not_called()
+
+
+def test_delete_waits_for_flush_in_progress(write_back, slow):
+    started = threading.Event()
+    release = threading.Event()
+    upload = slow.update_object.side_effect
+
+    def update_object(*args):
+        started.set()
+        release.wait(5)
+        return slow._mock_wraps.update_object(*args)
+
+    slow.update_object.side_effect = update_object
+    write_back.update_object("container", "object", b"small")
+    flusher = threading.Thread(target=write_back.flush)
+    flusher.start()
+    started.wait(5)
+    deleter = threading.Thread(
+        target=write_back.delete_object, args=("container", "object")
+    )
+    deleter.start()
+    deleter.join(0.05)
+    assert deleter.is_alive()
+    release.set()
+    flusher.join()
+    deleter.join()
+    slow.update_object.side_effect = upload
+    assert not slow.object_exists("container", "object")
+
+
+def test_delete_container_propagates_to_both_tiers(write_back, fast, slow):
+    write_back.create_container("other")
+    write_back.update_object("other", "object", b"small")
+    write_back.delete_container("other")
+    assert not write_back.dirty
+    fast.delete_container.assert_called_once_with("other")
+    slow.delete_container.assert_called_once_with("other", None)
+
+
+def test_fast_tier_errors_fall_back_to_slow(slow):
+    fast = MagicMock()
+    fast.get_object.side_effect = OSError("disk full")
+    fast.update_object.side_effect = OSError("disk full")
+    provider = TieredProvider(fast, slow)
+    slow.update_object("container", "object", b"small")
+    assert provider.get_object("container", "object") == b"small"
+
+
+def test_object_exists_sees_unflushed_writes(write_back, slow):
+    write_back.update_object("container", "object", b"small")
+    slow.update_object("container", "other", b"other")
+    assert write_back.object_exists("container", "object")
+    assert write_back.objects_exist("container", ["object", "other", "missing"]) == {
+        "object": True,
+        "other": True,
+        "missing": False,
+    }
@@ -0,0 +1,215 @@
+import io
+import os
+import threading
+from unittest.mock import MagicMock
+
+import pytest
+
+from storageprovider.providers.memory import InMemoryProvider
+from storageprovider.providers.memory import NotFoundException
+from storageprovider.providers.writebehind import SpoolFullException
+from storageprovider.providers.writebehind import WriteBehindProvider
+
+
+@pytest.fixture
+def backend():
+    backend = MagicMock(wraps=InMemoryProvider())
+    backend.create_container("container")
+    return backend
+
+
+@pytest.fixture
+def provider(backend, tmp_path):
+    provider = WriteBehindProvider(backend, tmp_path / "spool", retry_delay=0.01)
+    yield provider
+    provider.close()
+
+
+@pytest.fixture
+def stalled(backend, tmp_path):
+    # no workers, writes stay in the spool
+    return WriteBehindProvider(backend, tmp_path / "spool", workers=0)
+
+
+def test_write_is_uploaded(provider, backend):
+    provider.update_object("container", "object", b"data")
+    status = provider.flush()
+    assert status.ok and status.pending == 0 and status.spooled_bytes == 0
+    assert backend.get_object("container", "object") == b"data"
+    assert os.listdir(provider.instance_dir) == []
+
+
+def test_streams_are_spooled(provider, backend):
+    provider.update_object("container", "a", io.BytesIO(b"file"))
+    provider.update_object("container", "b", iter([b"ch", b"unks"]))
+    provider.update_object("container", "c", "text")
+    provider.flush()
+    assert backend.get_object("container", "a") == b"file"
+    assert backend.get_object("container", "b") == b"chunks"
+    assert backend.get_object("container", "c") == b"text"
+
+
+def test_reads_are_served_from_spool(stalled, backend):
+    stalled.update_object("container", "object", b"0123456789")
+    assert stalled.get_object("container", "object") == b"0123456789"
+    assert b"".join(stalled.get_object_streaming("container", "object")) == b"0123456789"
+    assert stalled.get_object_range("container", "object", 2, 3) == b"234"
+    assert stalled.get_object_range("container", "object", 8) == b"89"
+    buffer = bytearray(16)
+    assert stalled.get_object_into("container", "object", buffer) == 10
+    metadata = stalled.get_object_metadata("container", "object")
+    assert metadata["size"] == 10
+    assert metadata["etag"] == "781e5e245d69b566979b86e28d23f2c7"
+    assert stalled.get_object_and_metadata("container", "object")["object"] == (
+        b"0123456789"
+    )
+    assert stalled.object_exists("container", "object")
+    assert stalled.objects_exist("container", ["object", "other"]) == {
+        "object": True,
+        "other": False,
+    }
+    backend.get_object.assert_not_called()
+    backend.update_object.assert_not_called()
+
+
+def test_listing_includes_spooled_writes(stalled, backend):
+    backend.update_object("container", "stored", b"xx")
+    stalled.update_object("container", "spooled", b"x")
+    assert stalled.list_object_keys_for_container("container") == ["spooled", "stored"]
+    infos = stalled.list_objects_with_metadata("container")
+    assert [(info.key, info.size) for info in infos] == [("spooled", 1), ("stored", 2)]
+
+
+def test_newer_write_replaces_queued_write(stalled, backend, tmp_path):
+    stalled.update_object("container", "object", b"old")
+    stalled.update_object("container", "object", b"new")
+    assert stalled.status().pending == 1
+    assert stalled.status().spooled_bytes == 3
+    assert len(os.listdir(stalled.instance_dir)) == 2
+    assert stalled.get_object("container", "object") == b"new"
+
+
+def test_writes_of_one_object_are_uploaded_in_order(backend, tmp_path):
+    release = threading.Event()
+    uploads = []
+
+    def update_object(container_key, object_key, data, system_token=None):
+        uploads.append(data)
+        release.wait(5)
+
+    backend.update_object.side_effect = update_object
+    provider = WriteBehindProvider(backend, tmp_path / "spool", workers=4)
+    provider.update_object("container", "object", b"1")
+    provider.flush(timeout=0.1)
+    provider.update_object("container", "object", b"2")
+    provider.update_object("container", "object", b"3")
+    assert provider.flush(timeout=0.1).uploading == 1
+    assert provider.get_object("container", "object") == b"3"
+    release.set()
+    provider.close()
+    assert uploads == [b"1", b"3"]
+
+
+def test_failed_uploads_are_retried(provider, backend):
+    backend.update_object.side_effect = [IOError("unavailable"), None]
+    provider.update_object("container", "object", b"data")
+    assert provider.flush().ok
+    assert backend.update_object.call_count == 2
+
+
+def test_failed_uploads_are_kept(backend, tmp_path):
+    provider = WriteBehindProvider(
+        backend, tmp_path / "spool", max_retries=1, retry_delay=0.01
+    )
+    backend.update_object.side_effect = IOError("unavailable")
+    provider.update_object("container", "object", b"data")
+    status = provider.flush()
+    assert list(status.failed) == ["container/object"]
+    assert provider.get_object("container", "object") == b"data"
+    backend.update_object.side_effect = None
+    provider.retry_failed()
+    assert provider.flush().ok
+    assert backend.get_object("container", "object") == b"data"
+    provider.close()
+
+
+def test_back_pressure(backend, tmp_path):
+    provider = WriteBehindProvider(
+        backend, tmp_path / "spool", workers=0, max_spool_size=4, put_timeout=0.01
+    )
+    provider.update_object("container", "a", b"data")
+    with pytest.raises(SpoolFullException):
+        provider.update_object("container", "b", b"more")
+
+
+def test_spool_survives_restart(stalled, backend, tmp_path):
+    stalled.update_object("container", "object", b"data", "token")
+    stalled.close(timeout=0)
+    provider = WriteBehindProvider(backend, tmp_path / "spool", recovery_token="other")
+    provider.close()
+    backend.update_object.assert_called_once_with(
+        "container", "object", b"data", "other"
+    )
+    assert os.listdir(provider.spool_dir) == []
+
+
+def test_unacknowledged_writes_are_removed(backend, tmp_path):
+    spool_dir = tmp_path / "spool"
+    (spool_dir / "stopped").mkdir(parents=True)
+    (spool_dir / "stopped" / "0000000000000001.data").write_bytes(b"partial")
+    (spool_dir / "stopped" / "0000000000000002.json.tmp").write_text("{")
+    provider = WriteBehindProvider(backend, spool_dir, workers=0)
+    assert os.listdir(spool_dir / "stopped") == []
+    assert provider.status().pending == 0
+    provider.close()
+    assert os.listdir(spool_dir) == []
+
+
+def test_instances_share_spool_dir(backend, tmp_path):
+    first = WriteBehindProvider(backend, tmp_path / "spool", workers=0)
+    first.update_object("container", "first", b"1")
+    second = WriteBehindProvider(backend, tmp_path / "spool", workers=0)
+    second.update_object("container", "second", b"2")
+    # the spool of a running instance is left alone
+    assert second.status().pending == 1
+    assert len(os.listdir(first.instance_dir)) == 2
+    assert first.get_object("container", "first") == b"1"
+    first.close(timeout=0)
+    third = WriteBehindProvider(backend, tmp_path / "spool")
+    third.close()
+    assert backend.get_object("container", "first") == b"1"
+    assert not backend.object_exists("container", "second")
+    second.close(timeout=0)
+    # kept for the next instance
+    name = os.path.basename(second.instance_dir)
+    assert sorted(os.listdir(tmp_path / "spool")) == [name, f"{name}.lock"]
+
+
+def test_delete_drops_spooled_write(stalled, backend):
+    stalled.update_object("container", "object", b"data")
+    stalled.delete_object("container", "object")
+    assert stalled.status().pending == 0
+    backend.delete_object.assert_not_called()
+    with pytest.raises(NotFoundException):
+        stalled.get_object("container", "object")
+
+
+def test_delete_of_stored_object(provider, backend):
+    provider.update_object("container", "object", b"data")
+    provider.flush()
+    provider.update_object("container", "object", b"newer")
+    provider.delete_object("container", "object")
+    provider.flush()
+    assert not backend.object_exists("container", "object")
+
+
+def test_export_waits_for_spooled_writes(provider):
+    provider.update_object("container", "object", b"data")
+    assert provider.get_container_data("container")
+    assert provider.status().pending == 0
+
+
+def test_update_object_and_key(provider, backend):
+    object_key = provider.update_object_and_key("container", b"data")
+    provider.flush()
+    assert backend.get_object("container", object_key) == b"data"
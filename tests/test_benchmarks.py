@@ -0,0 +1,29 @@
+import pytest
+
+from tests.benchmarks.cases import BENCHMARKS
+from tests.benchmarks.runner import compare
+from tests.benchmarks.runner import run_benchmark
+
+
+@pytest.mark.parametrize("benchmark", BENCHMARKS, ids=lambda b: b.name)
+def test_benchmark_runs(benchmark):
+    result = run_benchmark(benchmark, rounds=1, min_round_time=0)
+    assert result["latency_median"] > 0
+    assert result["ops_per_second"] > 0
+    assert result["peak_memory"] >= 0
+
+
+def test_compare_reports_regressions():
+    baseline = {
+        "fast": {"latency_median": 1.0, "peak_memory": 100},
+        "slow": {"latency_median": 1.0, "peak_memory": 100},
+    }
+    results = {
+        "fast": {"latency_median": 1.1, "peak_memory": 100},
+        "slow": {"latency_median": 1.5, "peak_memory": 100},
+        "new": {"latency_median": 1.0, "peak_memory": 100},
+    }
+    lines, regressions = compare(results, baseline, tolerance=0.2)
+    assert regressions == ["slow"]
+    assert len(lines) == 4
+    assert "REGRESSION" in lines[2]
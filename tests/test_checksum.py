@@ -0,0 +1,76 @@
+import hashlib
+import io
+
+import pytest
+
+from storageprovider.checksum import ChecksumMismatchException
+from storageprovider.checksum import Checksums
+from storageprovider.checksum import ChecksumVerifier
+from storageprovider.checksum import HashingReader
+
+
+def test_checksums():
+    checksums = Checksums(("md5", "sha256"))
+    checksums.update(b"da")
+    checksums.update(b"ta")
+    assert checksums.size == 4
+    assert checksums.hexdigests() == {
+        "md5": hashlib.md5(b"data").hexdigest(),
+        "sha256": hashlib.sha256(b"data").hexdigest(),
+    }
+    assert checksums.matches_etag(f'"{hashlib.md5(b"data").hexdigest()}"')
+    assert checksums.matches_etag(hashlib.md5(b"other").hexdigest()) is False
+    assert checksums.matches_etag("not-an-md5") is None
+    assert checksums.matches_etag(None) is None
+
+
+def test_multipart_etag():
+    data = b"x" * 10 + b"y" * 10 + b"z" * 5
+    parts = [data[:10], data[10:20], data[20:]]
+    expected = hashlib.md5(
+        b"".join(hashlib.md5(part).digest() for part in parts)
+    ).hexdigest()
+    checksums = Checksums(part_size=10)
+    for chunk in (data[:7], data[7:23], data[23:]):
+        checksums.update(chunk)
+    assert checksums.multipart_etag() == f"{expected}-3"
+    assert checksums.matches_etag(f"{expected}-3")
+    assert checksums.matches_etag(f"{expected}-2") is None
+    assert checksums.matches_etag(f"{'0' * 32}-3") is False
+
+
+def test_multipart_etag_without_part_size():
+    checksums = Checksums()
+    checksums.update(b"data")
+    assert checksums.multipart_etag() is None
+    assert checksums.matches_etag(f"{hashlib.md5(b'data').hexdigest()}-1") is None
+    verifier = ChecksumVerifier()
+    assert list(verifier.wrap_stream([b"data"], f"{'0' * 32}-1", "c", "o")) == [b"data"]
+    data, checksums = verifier.wrap_upload(b"data", part_size=4)
+    assert checksums.matches_etag(checksums.multipart_etag())
+
+
+def test_unknown_algorithm():
+    with pytest.raises(ValueError):
+        ChecksumVerifier(("md7",))
+
+
+def test_hashing_reader():
+    checksums = Checksums()
+    reader = HashingReader(io.BytesIO(b"data"), checksums)
+    assert reader.len == 4
+    assert reader.read() == b"data"
+    assert checksums.hexdigests()["md5"] == hashlib.md5(b"data").hexdigest()
+    reader = HashingReader(iter([b"da", b"ta"]), Checksums())
+    assert not hasattr(reader, "len")
+    assert reader.read() == b"data"
+
+
+def test_wrap_stream_verifies_at_the_end():
+    verifier = ChecksumVerifier(("md5", "sha256"))
+    etag = hashlib.md5(b"data").hexdigest()
+    assert b"".join(verifier.wrap_stream([b"da", b"ta"], etag, "c", "o")) == b"data"
+    assert verifier.last.hexdigests()["sha256"] == hashlib.sha256(b"data").hexdigest()
+    stream = verifier.wrap_stream([b"da", b"tx"], etag, "c", "o")
+    with pytest.raises(ChecksumMismatchException):
+        list(stream)
@@ -1,6 +1,10 @@
+import io
+import zipfile
+
 import pytest
 from unittest.mock import Mock
 from storageprovider.client import StorageProviderClient
+from storageprovider.providers.memory import InMemoryProvider
 
 test_container_key = "test_container_key"
 test_object_key = "test_object_key"
@@ -37,6 +41,51 @@ def test_retrieves_object(storage_provider_client):
     )
 
 
+def test_retrieves_spooled_object():
+    client = StorageProviderClient(InMemoryProvider(), spool_size=4)
+    client.provider.create_container("container")
+    client.provider.update_object("container", "small", b"data")
+    client.provider.update_object("container", "large", b"x" * 10)
+    with client.get_object("container", "small", spooled=True) as f:
+        assert not f._rolled
+        assert f.read() == b"data"
+    with client.get_object("container", "large", spooled=True) as f:
+        assert f._rolled
+        assert f.read() == b"x" * 10
+
+
+def test_retrieves_spooled_container_data_and_archive_entry():
+    client = StorageProviderClient(InMemoryProvider(), spool_size=16)
+    client.provider.create_container("container")
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zip_file:
+        zip_file.writestr("file.txt", "content")
+    client.provider.update_object("container", "archive", archive.getvalue())
+    with client.get_container_data("container", spooled=True) as f:
+        with zipfile.ZipFile(f) as zip_file:
+            assert zip_file.namelist() == ["archive"]
+    with client.get_object_from_archive(
+        "container", "archive", "file.txt", spooled=True
+    ) as f:
+        assert f.read() == b"content"
+
+
+def test_retrieves_object_into_buffer(storage_provider_client):
+    buffer = bytearray(8)
+    storage_provider_client.get_object_into(test_container_key, test_object_key, buffer)
+    storage_provider_client.provider.get_object_into.assert_called_once_with(
+        test_container_key, test_object_key, buffer, None
+    )
+
+
+def test_downloads_object_to_path(tmp_path):
+    client = StorageProviderClient(InMemoryProvider())
+    client.provider.create_container("container")
+    client.provider.update_object("container", "object", b"data")
+    assert client.download_to_path("container", "object", tmp_path / "object") == 4
+    assert (tmp_path / "object").read_bytes() == b"data"
+
+
 def test_retrieves_object_metadata(storage_provider_client):
     storage_provider_client.get_object_metadata(test_container_key, test_object_key)
     storage_provider_client.provider.get_object_metadata.assert_called_once_with(
@@ -133,13 +182,13 @@ def test_copies_object(storage_provider_client):
 def test_retrieves_container_data(storage_provider_client):
     storage_provider_client.get_container_data(test_container_key)
     storage_provider_client.provider.get_container_data.assert_called_once_with(
-        test_container_key, None, None
+        test_container_key, None, None, "zip"
     )
 
 def test_retrieves_container_data_streaming(storage_provider_client):
     storage_provider_client.get_container_data_streaming(test_container_key)
     storage_provider_client.provider.get_container_data_streaming.assert_called_once_with(
-        test_container_key, None, None
+        test_container_key, None, None, "zip"
     )
 
 def test_creates_container_and_key(storage_provider_client):
@@ -152,4 +201,35 @@ def test_retrieves_object_from_archive_streaming(storage_provider_client):
     )
     storage_provider_client.provider.get_object_from_archive_streaming.assert_called_once_with(
         test_container_key, test_object_key, test_file_name, None
-    )
\ No newline at end of file
+    )
+
+def test_lists_object_keys(storage_provider_client):
+    storage_provider_client.list_object_keys(test_container_key)
+    storage_provider_client.provider.list_object_keys.assert_called_once_with(
+        test_container_key, None
+    )
+
+
+def test_gets_object_url(storage_provider_client):
+    storage_provider_client.get_object_url(
+        test_container_key, test_object_key, content_type="application/pdf"
+    )
+    storage_provider_client.provider.get_object_url.assert_called_once_with(
+        test_container_key, test_object_key, None, 3600, None, "application/pdf"
+    )
+
+
+def test_gets_upload_url(storage_provider_client):
+    storage_provider_client.get_upload_url(
+        test_container_key, test_object_key, expires=60
+    )
+    storage_provider_client.provider.get_upload_url.assert_called_once_with(
+        test_container_key, test_object_key, None, 60
+    )
+
+
+def test_copies_container(storage_provider_client):
+    storage_provider_client.copy_container(test_container_key, "output")
+    storage_provider_client.provider.copy_container.assert_called_once_with(
+        test_container_key, "output", None, 8
+    )
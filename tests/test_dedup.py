@@ -0,0 +1,150 @@
+import hashlib
+import io
+import json
+from unittest.mock import MagicMock
+
+import pytest
+
+from storageprovider.client import StorageProviderClient
+from storageprovider.dedup import Deduplicator
+from storageprovider.providers.memory import InMemoryProvider
+
+
+@pytest.fixture
+def provider():
+    return MagicMock(wraps=InMemoryProvider())
+
+
+@pytest.fixture
+def client(provider):
+    return StorageProviderClient(provider, dedup_container_key="index")
+
+
+def sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def uploads(provider):
+    return [c for c in provider.update_object.call_args_list if c[0][0] != "index"]
+
+
+def test_duplicate_upload_is_copied(client, provider):
+    first = client.update_object_and_key("dossier-1", b"attachment")
+    second = client.update_object_and_key("dossier-2", io.BytesIO(b"attachment"))
+    assert client.get_object("dossier-2", second) == b"attachment"
+    assert len(uploads(provider)) == 1
+    provider.copy_object.assert_called_once_with(
+        "dossier-1", first, "dossier-2", second, None
+    )
+
+
+def test_different_content_is_uploaded(client, provider):
+    client.update_object("dossier", "a", b"one")
+    client.update_object("dossier", "b", iter([b"tw", b"o"]))
+    assert client.get_object("dossier", "b") == b"two"
+    assert len(uploads(provider)) == 2
+    provider.copy_object.assert_not_called()
+
+
+def test_reupload_of_same_object_is_skipped(client, provider):
+    client.update_object("dossier", "a", b"one")
+    client.update_object("dossier", "a", b"one")
+    assert len(uploads(provider)) == 1
+    provider.copy_object.assert_not_called()
+
+
+def test_deleted_source_falls_back_to_upload(client, provider):
+    client.update_object("dossier", "a", b"one")
+    client.delete_object("dossier", "a")
+    client.update_object("dossier", "b", b"one")
+    assert client.get_object("dossier", "b") == b"one"
+    client.update_object("dossier", "c", b"one")
+    provider.copy_object.assert_called_with("dossier", "b", "dossier", "c", None)
+
+
+def test_large_uploads_are_spooled_to_disk(provider):
+    dedup = Deduplicator(provider, "index", spool_size=4)
+    dedup.update_object("dossier", "a", b"0123456789")
+    dedup.update_object("dossier", "b", b"0123456789")
+    provider.copy_object.assert_called_once()
+    assert provider.get_object("dossier", "b") == b"0123456789"
+
+
+def test_without_dedup_uploads_are_passed_through(provider):
+    client = StorageProviderClient(provider)
+    client.update_object("dossier", "a", b"one")
+    client.update_object("dossier", "b", b"one")
+    assert provider.update_object.call_count == 2
+
+
+def test_overwritten_source_is_not_copied(client, provider):
+    client.update_object("dossier", "a", b"one")
+    client.update_object("dossier", "a", b"two")
+    client.update_object("dossier", "b", b"one")
+    assert client.get_object("dossier", "b") == b"one"
+    provider.copy_object.assert_not_called()
+    entry = json.loads(provider.get_object("index", "sha256-" + sha256(b"one")))
+    assert entry["object_key"] == "b"
+
+
+def test_source_changed_around_the_index_is_uploaded(client, provider):
+    client.update_object("dossier", "a", b"one")
+    provider.update_object("dossier", "a", b"two")
+    client.update_object("dossier", "a", b"one")
+    assert client.get_object("dossier", "a") == b"one"
+    provider.update_object("dossier", "a", b"two")
+    client.update_object("dossier", "b", b"one")
+    assert client.get_object("dossier", "b") == b"one"
+    assert len(uploads(provider)) == 5
+    provider.copy_object.assert_not_called()
+
+
+def test_delete_drops_index_entry(client, provider):
+    client.update_object("dossier", "a", b"one")
+    client.delete_object("dossier", "a")
+    assert provider.list_object_keys("index") == []
+
+
+def test_multipart_etag_recorded_at_upload():
+    provider = MagicMock(wraps=InMemoryProvider())
+    provider.get_object_metadata.side_effect = lambda c, o, t=None: {
+        "size": 3,
+        "etag": '"0123-2"',
+    }
+    dedup = Deduplicator(provider, "index")
+    dedup.update_object("dossier", "a", b"one")
+    dedup.update_object("dossier", "b", b"one")
+    provider.copy_object.assert_called_once()
+    provider.get_object_metadata.side_effect = lambda c, o, t=None: {
+        "size": 3,
+        "etag": '"4567-2"',
+    }
+    dedup.update_object("dossier", "c", b"one")
+    provider.copy_object.assert_called_once()
+
+
+def test_without_etags_modification_time_is_checked():
+    provider = MagicMock(wraps=InMemoryProvider())
+    modified = ["2026-01-01T00:00:00+00:00"]
+    provider.get_object_metadata.side_effect = lambda c, o, t=None: {
+        "size": 3,
+        "time_last_modification": modified[0],
+    }
+    dedup = Deduplicator(provider, "index")
+    dedup.update_object("dossier", "a", b"one")
+    dedup.update_object("dossier", "b", b"one")
+    provider.copy_object.assert_called_once_with("dossier", "a", "dossier", "b", None)
+    modified[0] = "2026-01-02T00:00:00+00:00"
+    dedup.update_object("dossier", "c", b"one")
+    provider.copy_object.assert_called_once()
+
+
+def test_index_keys_are_flat(client, provider):
+    client.update_object("dossier/sub", "a", b"one")
+    assert all("/" not in key for key in provider.list_object_keys("index"))
+
+
+def test_update_object_returns_provider_result(provider):
+    provider.update_object.return_value = "uploaded"
+    client = StorageProviderClient(provider, dedup_container_key="index")
+    assert client.update_object("dossier", "a", b"one") == "uploaded"
@@ -0,0 +1,73 @@
+import json
+from unittest.mock import MagicMock
+
+import pytest
+
+from storageprovider.download import IncompleteDownloadException
+from storageprovider.download import download_to_path
+from storageprovider.providers.memory import InMemoryProvider
+
+DATA = bytes(range(256)) * 16
+
+
+@pytest.fixture
+def provider():
+    provider = MagicMock(wraps=InMemoryProvider())
+    provider.create_container("container")
+    provider.update_object("container", "object", DATA)
+    return provider
+
+
+def failing_stream(data, fail_after):
+    def stream(*args):
+        yield data[:fail_after]
+        raise ConnectionError("connection reset")
+
+    return stream
+
+
+def test_download(provider, tmp_path):
+    path = tmp_path / "object"
+    assert download_to_path(provider, "container", "object", path) == len(DATA)
+    assert path.read_bytes() == DATA
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["object"]
+
+
+def test_resume_after_failure(provider, tmp_path):
+    path = tmp_path / "object"
+    provider.get_object_streaming.side_effect = failing_stream(DATA, 1000)
+    with pytest.raises(ConnectionError):
+        download_to_path(provider, "container", "object", path)
+    assert not path.exists()
+    state = json.loads((tmp_path / "object.part.json").read_text())
+    assert state["offset"] == 1000
+
+    assert download_to_path(provider, "container", "object", path) == len(DATA)
+    assert path.read_bytes() == DATA
+    provider.get_object_range_streaming.assert_called_once_with(
+        "container", "object", 1000, None, None
+    )
+    assert not (tmp_path / "object.part.json").exists()
+
+
+def test_changed_object_starts_over(provider, tmp_path):
+    path = tmp_path / "object"
+    provider.get_object_streaming.side_effect = failing_stream(DATA, 1000)
+    with pytest.raises(ConnectionError):
+        download_to_path(provider, "container", "object", path)
+    provider.get_object_streaming.side_effect = None
+    provider.update_object("container", "object", b"new" * 10)
+
+    assert download_to_path(provider, "container", "object", path) == 30
+    assert path.read_bytes() == b"new" * 10
+    provider.get_object_range_streaming.assert_not_called()
+
+
+def test_short_stream_is_incomplete(provider, tmp_path):
+    path = tmp_path / "object"
+    provider.get_object_streaming.side_effect = lambda *args: iter([DATA[:10]])
+    with pytest.raises(IncompleteDownloadException) as e:
+        download_to_path(provider, "container", "object", path)
+    assert e.value.received == 10
+    assert e.value.size == len(DATA)
+    assert not path.exists()
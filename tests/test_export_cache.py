@@ -0,0 +1,100 @@
+import io
+import os
+import zipfile
+from unittest.mock import MagicMock
+
+import pytest
+
+from storageprovider.client import StorageProviderClient
+from storageprovider.export_cache import ExportCache
+from storageprovider.providers.memory import InMemoryProvider
+
+
+@pytest.fixture
+def provider():
+    provider = MagicMock(wraps=InMemoryProvider())
+    provider.create_container("container")
+    provider.update_object("container", "a", b"A")
+    provider.update_object("container", "b", b"B")
+    return provider
+
+
+def names(data):
+    with zipfile.ZipFile(io.BytesIO(data)) as zip_file:
+        return sorted(zip_file.namelist())
+
+
+def test_needs_one_cache_location(provider, tmp_path):
+    with pytest.raises(ValueError):
+        ExportCache(provider)
+    with pytest.raises(ValueError):
+        ExportCache(provider, str(tmp_path), "exports")
+
+
+def test_serves_cached_export(provider, tmp_path):
+    cache = ExportCache(provider, cache_dir=str(tmp_path))
+    first = cache.get_container_data("container")
+    second = cache.get_container_data("container")
+    assert first == second
+    assert names(first) == ["a", "b"]
+    assert provider.get_container_data_streaming.call_count == 1
+    assert len(os.listdir(tmp_path)) == 1
+
+
+def test_rebuilds_changed_container(provider, tmp_path):
+    cache = ExportCache(provider, cache_dir=str(tmp_path))
+    cache.get_container_data("container")
+    provider.update_object("container", "c", b"C")
+    assert names(cache.get_container_data("container")) == ["a", "b", "c"]
+    assert provider.get_container_data_streaming.call_count == 2
+    assert len(os.listdir(tmp_path)) == 1
+
+
+def test_translations_and_format_are_part_of_the_fingerprint(provider, tmp_path):
+    cache = ExportCache(provider, cache_dir=str(tmp_path))
+    fingerprint = cache.fingerprint("container")
+    assert cache.fingerprint("container") == fingerprint
+    assert cache.fingerprint("container", translations={"a": "a.txt"}) != fingerprint
+    assert cache.fingerprint("container", archive_format="tar") != fingerprint
+
+
+def test_formats_and_translations_are_cached_side_by_side(provider, tmp_path):
+    cache = ExportCache(provider, cache_dir=str(tmp_path))
+    cache.get_container_data("container")
+    cache.get_container_data("container", archive_format="tar")
+    cache.get_container_data("container", translations={"a": "a.txt"})
+    assert len(os.listdir(tmp_path)) == 3
+    cache.get_container_data("container")
+    cache.get_container_data("container", archive_format="tar")
+    assert provider.get_container_data_streaming.call_count == 3
+    provider.update_object("container", "c", b"C")
+    cache.get_container_data("container", archive_format="tar")
+    assert len(os.listdir(tmp_path)) == 3
+
+
+def test_unfinished_build_is_not_cached(provider, tmp_path):
+    cache = ExportCache(provider, cache_dir=str(tmp_path))
+    chunks = cache.get_container_data_streaming("container")
+    next(chunks)
+    chunks.close()
+    assert os.listdir(tmp_path) == []
+
+
+def test_cache_container(provider):
+    cache = ExportCache(provider, cache_container_key="exports")
+    provider.create_container("exports")
+    first = cache.get_container_data("container", archive_format="tar")
+    assert cache.get_container_data("container", archive_format="tar") == first
+    assert provider.get_container_data_streaming.call_count == 1
+    provider.update_object("container", "c", b"C")
+    cache.get_container_data("container", archive_format="tar")
+    assert len(provider.list_object_keys("exports")) == 1
+
+
+def test_client_uses_export_cache(provider, tmp_path):
+    cache = ExportCache(provider, cache_dir=str(tmp_path))
+    client = StorageProviderClient(provider, export_cache=cache)
+    client.get_container_data("container")
+    with client.get_container_data("container", spooled=True) as f:
+        assert names(f.read()) == ["a", "b"]
+    assert provider.get_container_data_streaming.call_count == 1
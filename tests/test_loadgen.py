@@ -0,0 +1,76 @@
+import argparse
+
+import pytest
+
+from storageprovider.client import StorageProviderClient
+from storageprovider.loadgen import LoadGenerator
+from storageprovider.loadgen import main
+from storageprovider.loadgen import parse_mix
+from storageprovider.loadgen import parse_size
+from storageprovider.loadgen import percentile
+from storageprovider.providers.augeias import AugeiasProvider
+from storageprovider.providers.memory import InMemoryProvider
+from storageprovider.standin import StandinServer
+
+
+def test_parse_size():
+    assert parse_size("512") == 512
+    assert parse_size("64KiB") == 64 * 1024
+    assert parse_size("1.5MB") == 1_500_000
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_size("lots")
+
+
+def test_parse_mix():
+    assert parse_mix("read=70,write=30") == {"read": 70.0, "write": 30.0}
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_mix("unknown=1")
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_mix("read=0")
+
+
+def test_percentile():
+    values = list(range(1, 101))
+    assert percentile(values, 0.5) == 50
+    assert percentile(values, 0.99) == 99
+    assert percentile([7], 0.95) == 7
+    assert percentile([], 0.5) is None
+
+
+def test_load_generator_against_standin():
+    with StandinServer() as server:
+        client = StorageProviderClient(AugeiasProvider(server.url, "loadgen"))
+        generator = LoadGenerator(
+            client,
+            "container",
+            parse_mix("read=1,write=1,metadata=1,list=1,export=1"),
+            object_size=128,
+            objects=3,
+            seed=1,
+        )
+        generator.prepare()
+        report = generator.run(concurrency=2, operations=40)
+        generator.cleanup()
+        assert client.list_object_keys("container") == []
+    assert report.total_operations == 40
+    assert not report.errors
+    summary = report.summary()
+    assert set(summary) <= {"read", "write", "metadata", "list", "export"}
+    for stats in summary.values():
+        assert stats["p50"] <= stats["p95"] <= stats["p99"]
+    assert "total: 40 operations" in report.format()
+
+
+def test_main_with_standin(capsys):
+    assert main(["--provider", "standin", "--operations", "10", "--objects", "2"]) == 0
+    assert "total: 10 operations" in capsys.readouterr().out
+
+
+def test_main_keeps_user_container(monkeypatch):
+    memory = InMemoryProvider()
+    memory.create_container("existing")
+    memory.update_object("existing", "precious", b"data")
+    monkeypatch.setattr("storageprovider.loadgen.build_provider", lambda args: memory)
+    argv = ["--provider", "standin", "--operations", "5", "--objects", "2"]
+    assert main(argv + ["--container", "existing"]) == 0
+    assert memory.list_object_keys("existing") == ["precious"]
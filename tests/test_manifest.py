@@ -0,0 +1,123 @@
+import json
+from unittest.mock import MagicMock
+
+import pytest
+
+from storageprovider.client import StorageProviderClient
+from storageprovider.manifest import Manifests
+from storageprovider.providers.memory import InMemoryProvider
+
+
+@pytest.fixture
+def provider():
+    provider = MagicMock(wraps=InMemoryProvider())
+    provider.create_container("container")
+    return provider
+
+
+@pytest.fixture
+def client(provider):
+    return StorageProviderClient(provider, manifest_container_key="manifests")
+
+
+def manifest(provider):
+    return json.loads(provider.get_object("manifests", "container"))
+
+
+def test_listing_builds_manifest_once(client, provider):
+    provider.update_object("container", "a", b"aaa")
+    provider.update_object("container", "b", b"bb")
+    assert client.list_object_keys("container") == ["a", "b"]
+    assert manifest(provider)["version"] == 1
+    provider.list_objects_with_metadata.reset_mock()
+    provider.list_object_keys.reset_mock()
+    provider.get_object.reset_mock()
+    assert client.list_object_keys("container") == ["a", "b"]
+    infos = client.list_objects_with_metadata("container")
+    assert [(info.key, info.size, info.etag) for info in infos] == [
+        ("a", 3, "47bce5c74f589f4867dbd57e9ca9f808"),
+        ("b", 2, "21ad0bd836b90d08f4cf640b4c298e7c"),
+    ]
+    assert infos[0].last_modified is not None
+    provider.list_objects_with_metadata.assert_not_called()
+    provider.list_object_keys.assert_not_called()
+    assert provider.get_object.call_count == 2
+
+
+def test_writes_update_manifest(client, provider):
+    client.list_object_keys("container")
+    client.update_object("container", "a", b"aaa")
+    object_key = client.update_object_and_key("container", b"bb")
+    client.copy_object("container", "a", "container", "c")
+    assert sorted(manifest(provider)["objects"]) == sorted(["a", "c", object_key])
+    client.update_object("container", "a", b"aaaa")
+    assert manifest(provider)["objects"]["a"][0] == 4
+    client.delete_object("container", "c")
+    assert sorted(manifest(provider)["objects"]) == sorted(["a", object_key])
+    assert manifest(provider)["version"] == 6
+
+
+def test_writes_without_manifest_leave_it_to_the_next_read(client, provider):
+    client.update_object("container", "a", b"aaa")
+    assert not provider.object_exists("manifests", "container")
+    assert client.list_object_keys("container") == ["a"]
+
+
+def test_repair(client, provider):
+    client.update_object("container", "a", b"aaa")
+    client.update_object("container", "b", b"bb")
+    client.list_object_keys("container")
+    provider.update_object("container", "b", b"changed")
+    provider.update_object("container", "c", b"c")
+    provider.delete_object("container", "a")
+    assert client.list_object_keys("container") == ["a", "b"]
+    diff = client.repair_manifest("container")
+    assert (diff.added, diff.removed, diff.changed) == (["c"], ["a"], ["b"])
+    assert not diff.ok
+    assert client.list_object_keys("container") == ["b", "c"]
+    assert client.repair_manifest("container").ok
+
+
+def test_failed_update_is_logged(client, provider, caplog):
+    client.list_object_keys("container")
+    provider.get_object.side_effect = IOError("unavailable")
+    client.update_object("container", "a", b"aaa")
+    assert "Updating the manifest of container failed." in caplog.text
+    provider.get_object.side_effect = None
+    assert client.repair_manifest("container").added == ["a"]
+
+
+def test_delete_container_drops_manifest(client, provider):
+    client.list_object_keys("container")
+    client.delete_container("container")
+    assert not provider.object_exists("manifests", "container")
+
+
+def test_repair_without_manifests():
+    with pytest.raises(ValueError):
+        StorageProviderClient(InMemoryProvider()).repair_manifest("container")
+
+
+def test_manifests_directly(provider):
+    manifests = Manifests(provider)
+    provider.update_object("container", "a", b"aaa")
+    assert manifests.get("container")["objects"]["a"][0] == 3
+    manifests.forget("container", "a")
+    assert manifests.list_object_keys("container") == []
+
+
+def test_raw_listing_keeps_provider_type(client, provider):
+    provider.list_object_keys_for_container.return_value = b'["a"]'
+    assert client.list_object_keys_for_container("container") == b'["a"]'
+
+
+def test_manifests_are_locked_per_container(provider):
+    manifests = Manifests(provider)
+    lock = manifests._container_lock("a")
+    with lock:
+        # another container is not blocked
+        provider.update_object("b", "x", b"x")
+        manifests.get("b")
+        manifests.forget("b", "x")
+    assert manifests._container_lock("a") is lock
+    assert manifests.list_object_keys("b") == []
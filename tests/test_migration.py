@@ -0,0 +1,147 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from storageprovider.checksum import Checksums
+from storageprovider.migration import MigrationState
+from storageprovider.migration import Migrator
+from storageprovider.migration import main
+from storageprovider.migration import migrate_container
+from storageprovider.providers.filesystem import FilesystemProvider
+from storageprovider.providers.memory import InMemoryProvider
+
+
+@pytest.fixture
+def source():
+    source = InMemoryProvider()
+    for index in range(20):
+        source.update_object("container", f"object-{index}", b"data %d" % index)
+    return source
+
+
+@pytest.fixture
+def target():
+    return MagicMock(wraps=InMemoryProvider())
+
+
+def test_migrate_container(source, target):
+    report = migrate_container(source, target, "container", "copy", workers=4)
+    assert report.ok
+    assert report.copied == 20
+    assert report.bytes == sum(len(b"data %d" % i) for i in range(20))
+    for index in range(20):
+        assert target.get_object("copy", f"object-{index}") == b"data %d" % index
+
+
+def test_skips_objects_already_present(source, target):
+    target.update_object("container", "object-1", b"data 1")
+    target.update_object("container", "object-2", b"stale!")
+    report = migrate_container(source, target, "container")
+    assert report.skipped == 1
+    assert report.copied == 19
+    assert target.get_object("container", "object-2") == b"data 2"
+
+
+def test_resumes_from_state_file(source, target, tmp_path):
+    state_file = str(tmp_path / "migration.state")
+    state = MigrationState(state_file)
+    state.mark_done("container", "object-0")
+    state.mark_done("container", "object-1")
+    state.close()
+    with open(state_file, "a") as f:
+        f.write('{"container": "contai')
+
+    report = migrate_container(source, target, "container", state=state_file)
+    assert report.resumed == 2
+    assert report.copied == 18
+    assert len(MigrationState(state_file).done) == 20
+
+
+def test_failed_objects_are_reported_and_retried(source, target, tmp_path):
+    state_file = str(tmp_path / "migration.state")
+    target.update_object.side_effect = [OSError("target down")] + [None] * 19
+    report = migrate_container(
+        source, target, "container", workers=1, state=state_file, verify=False
+    )
+    assert list(report.failed) == ["object-0"]
+    target.update_object.side_effect = None
+    report = migrate_container(source, target, "container", state=state_file)
+    assert report.ok
+    assert report.resumed == 19
+    assert report.copied == 1
+
+
+def test_verify_detects_corruption(source):
+    target = MagicMock(wraps=InMemoryProvider())
+    target.get_object_metadata.side_effect = lambda c, o, t=None: {"size": 6}
+    target.get_object_streaming.side_effect = lambda c, o, t=None: iter([b"garbag"])
+    migrator = Migrator(source, target, skip_existing=False)
+    report = migrator.migrate_container("container")
+    assert len(report.failed) == 20
+    assert "md5" in report.failed["object-1"]
+
+
+def test_verify_rereads_objects_without_md5_etag(source, tmp_path):
+    target = FilesystemProvider(str(tmp_path))
+    report = migrate_container(source, target, "container")
+    assert report.ok
+    assert report.copied == 20
+
+
+def test_cli(source, tmp_path):
+    source_root = tmp_path / "source"
+    FilesystemProvider(str(source_root)).update_object("container", "object", b"data")
+    argv = [
+        "--source", "filesystem", "--source-root", str(source_root),
+        "--target", "filesystem", "--target-root", str(tmp_path / "target"),
+        "--state-file", str(tmp_path / "state"),
+        "container",
+    ]
+    assert main(argv) == 0
+    target = FilesystemProvider(str(tmp_path / "target"))
+    assert target.get_object("container", "object") == b"data"
+
+
+def test_verify_multipart_etag_without_reading_back(source):
+    target = MagicMock(wraps=InMemoryProvider())
+
+    def metadata(container_key, object_key, system_token=None):
+        checksums = Checksums(part_size=4)
+        checksums.update(source.get_object("container", object_key))
+        return {"size": checksums.size, "etag": checksums.multipart_etag()}
+
+    target.get_object_metadata.side_effect = metadata
+    report = migrate_container(
+        source, target, "container", skip_existing=False, part_size=4
+    )
+    assert report.ok
+    target.get_object_streaming.assert_not_called()
+
+
+def without(provider, *fields):
+    mock = MagicMock(wraps=provider)
+
+    def metadata(container_key, object_key, system_token=None):
+        result = provider.get_object_metadata(container_key, object_key)
+        return {k: v for k, v in result.items() if k not in fields}
+
+    mock.get_object_metadata.side_effect = metadata
+    return mock
+
+
+@pytest.mark.parametrize("fields", [("etag",), ("etag", "time_last_modification")])
+def test_skip_existing_without_etags(fields):
+    target = InMemoryProvider()
+    target.update_object("container", "stale", b"old")
+    target.update_object("container", "same", b"same")
+    source = InMemoryProvider()
+    source.update_object("container", "stale", b"new")
+    source.update_object("container", "same", b"same")
+    if "time_last_modification" not in fields:
+        # copied after the source changed
+        target.update_object("container", "same", b"same")
+    report = migrate_container(
+        without(source, *fields), without(target, *fields), "container"
+    )
+    assert (report.copied, report.skipped) == (1, 1)
+    assert target.get_object("container", "stale") == b"new"
@@ -0,0 +1,156 @@
+import hashlib
+import io
+import json
+import tarfile
+import zipfile
+
+import pytest
+
+from storageprovider.client import StorageProviderClient
+from storageprovider.providers import BufferTooSmallException
+from storageprovider.providers.augeias import AugeiasProvider
+from storageprovider.providers.augeias import InvalidStateException
+from storageprovider.standin import StandinServer
+
+
+@pytest.fixture(scope="module")
+def server():
+    with StandinServer() as server:
+        yield server
+
+
+@pytest.fixture
+def provider(server):
+    return AugeiasProvider(server.url, "test-collection")
+
+
+@pytest.fixture
+def container_key(provider):
+    container_key = provider.create_container_and_key()
+    yield container_key
+    provider.delete_container(container_key)
+
+
+def test_object_round_trip(provider, container_key):
+    provider.update_object(container_key, "object", b"content")
+    assert provider.get_object(container_key, "object") == b"content"
+    assert b"".join(provider.get_object_streaming(container_key, "object")) == (
+        b"content"
+    )
+    metadata = provider.get_object_metadata(container_key, "object")
+    assert metadata["size"] == 7
+    assert metadata["Content-Length"] == 7
+    provider.delete_object(container_key, "object")
+    with pytest.raises(InvalidStateException) as e:
+        provider.get_object(container_key, "object")
+    assert e.value.status_code == 404
+
+
+def test_get_object_into(provider, container_key):
+    provider.update_object(container_key, "object", b"content")
+    buffer = bytearray(16)
+    assert provider.get_object_into(container_key, "object", buffer) == 7
+    assert buffer[:7] == b"content"
+    with pytest.raises(BufferTooSmallException):
+        provider.get_object_into(container_key, "object", bytearray(6))
+
+
+def test_download_to_path(provider, container_key, tmp_path):
+    provider.update_object(container_key, "object", b"content")
+    assert provider.get_object_range(container_key, "object", 2, 3) == b"nte"
+    client = StorageProviderClient(provider)
+    assert client.download_to_path(container_key, "object", tmp_path / "object") == 7
+    assert (tmp_path / "object").read_bytes() == b"content"
+
+
+def test_create_key_and_copy(provider, container_key):
+    object_key = provider.update_object_and_key(container_key, b"content")
+    copy_key = provider.copy_object_and_create_key(
+        container_key, object_key, container_key
+    )
+    provider.copy_object(container_key, object_key, container_key, "copy")
+    assert provider.get_object(container_key, copy_key) == b"content"
+    assert provider.get_object(container_key, "copy") == b"content"
+    keys = json.loads(provider.list_object_keys_for_container(container_key))
+    assert sorted(keys) == sorted([object_key, copy_key, "copy"])
+
+
+def test_container_zip_with_translations(provider, container_key):
+    provider.update_object(container_key, "a", b"A")
+    provider.update_object(container_key, "b", b"B")
+    data = provider.get_container_data(container_key, translations={"a": "a.txt"})
+    with zipfile.ZipFile(io.BytesIO(data)) as zip_file:
+        assert sorted(zip_file.namelist()) == ["a.txt", "b"]
+        assert zip_file.read("a.txt") == b"A"
+
+
+def test_container_tar_with_translations(provider, container_key):
+    provider.update_object(container_key, "a", b"A")
+    provider.update_object(container_key, "b", b"B")
+    chunks = provider.get_container_data_streaming(
+        container_key, translations={"a": "a.txt"}, archive_format="tar"
+    )
+    with tarfile.open(fileobj=io.BytesIO(b"".join(chunks))) as tar:
+        assert sorted(tar.getnames()) == ["a.txt", "b"]
+        assert tar.extractfile("a.txt").read() == b"A"
+
+
+def test_archive_entries(provider, container_key):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zip_file:
+        zip_file.writestr("file.txt", b"old")
+    provider.update_object(container_key, "archive", buffer.getvalue())
+    assert provider.get_object_from_archive(container_key, "archive", "file.txt") == (
+        b"old"
+    )
+    provider.replace_file_in_zip_object(
+        container_key, "archive", "file.txt", b"new", "new.txt"
+    )
+    assert provider.get_object_from_archive(container_key, "archive", "new.txt") == (
+        b"new"
+    )
+
+
+def test_object_exists(provider, container_key):
+    provider.update_object(container_key, "object", b"content")
+    assert provider.object_exists(container_key, "object")
+    assert not provider.object_exists(container_key, "missing")
+    keys = ["object"] + [f"missing-{index}" for index in range(30)]
+    result = provider.objects_exist(container_key, keys)
+    assert [key for key, exists in result.items() if exists] == ["object"]
+
+
+def test_list_objects_with_metadata(provider, container_key):
+    provider.update_object(container_key, "object", b"content")
+    [info] = provider.list_objects_with_metadata(container_key)
+    assert info.key == "object"
+    assert info.size == 7
+    assert info.etag == hashlib.md5(b"content").hexdigest()
+    assert info.last_modified is not None
+
+
+def test_copy_container(provider, container_key):
+    provider.update_object(container_key, "a", b"A")
+    provider.update_object(container_key, "b", b"B")
+    output_key = provider.create_container_and_key()
+    report = provider.copy_container(container_key, output_key)
+    assert report.copied == ["a", "b"]
+    assert provider.get_object(output_key, "b") == b"B"
+    provider.delete_container(output_key)
+
+
+def test_checksums(server, container_key):
+    provider = AugeiasProvider(
+        server.url, "test-collection", checksums=("md5", "sha256")
+    )
+    provider.update_object(container_key, "object", io.BytesIO(b"content"))
+    assert provider.checksums.last.hexdigests()["md5"] == (
+        hashlib.md5(b"content").hexdigest()
+    )
+    assert b"".join(provider.get_object_streaming(container_key, "object")) == (
+        b"content"
+    )
+    assert provider.checksums.last.hexdigests()["sha256"] == (
+        hashlib.sha256(b"content").hexdigest()
+    )
+    assert provider.get_object(container_key, "object") == b"content"
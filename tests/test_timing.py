@@ -0,0 +1,145 @@
+import logging
+from datetime import timedelta
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+import pytest
+
+from storageprovider.providers.augeias import AugeiasProvider
+from storageprovider.timing import OpenTelemetryHook
+from storageprovider.timing import TimingRecorder
+from storageprovider.timing import timed
+
+
+class DummyProvider:
+    def __init__(self, slow_call_threshold=None):
+        self.timing = TimingRecorder(slow_call_threshold=slow_call_threshold)
+
+    @timed
+    def get_object(self, container_key, object_key, system_token=None):
+        self.timing.mark_ttfb()
+        return b"content"
+
+    @timed
+    def update_object(self, container_key, object_key, object_data, system_token=None):
+        return None
+
+    @timed
+    def copy_object(
+        self,
+        source_container_key,
+        source_object_key,
+        output_container_key,
+        output_object_key,
+        system_token=None,
+    ):
+        return None
+
+    @timed
+    def get_object_streaming(self, container_key, object_key, system_token=None):
+        yield b"chunk1"
+        yield b"chunk2"
+
+    @timed
+    def delete_object(self, container_key, object_key, system_token=None):
+        raise ValueError("boom")
+
+
+@pytest.fixture
+def provider():
+    return DummyProvider()
+
+
+def test_timing_of_call(provider):
+    assert provider.get_object("container", "object") == b"content"
+    timing = provider.timing.last
+    assert timing.operation == "get_object"
+    assert timing.container_key == "container"
+    assert timing.object_key == "object"
+    assert timing.bytes == 7
+    assert timing.total >= timing.ttfb >= 0
+    assert timing.transfer == pytest.approx(timing.total - timing.ttfb)
+    assert timing.connect is None
+    assert timing.error is None
+
+
+def test_timing_counts_uploaded_bytes(provider):
+    provider.update_object("container", "object", b"12345")
+    assert provider.timing.last.bytes == 5
+
+
+def test_timing_of_copy_uses_source_keys(provider):
+    provider.copy_object("source", "object", "output", "copy")
+    assert provider.timing.last.container_key == "source"
+    assert provider.timing.last.object_key == "object"
+
+
+def test_timing_of_stream_finishes_when_consumed(provider):
+    hook = MagicMock()
+    provider.timing.add_hook(hook)
+    stream = provider.get_object_streaming("container", "object")
+    hook.assert_not_called()
+    assert list(stream) == [b"chunk1", b"chunk2"]
+    hook.assert_called_once()
+    timing = hook.call_args[0][0]
+    assert timing.operation == "get_object_streaming"
+    assert timing.bytes == 12
+
+
+def test_timing_of_stream_closed_early(provider):
+    stream = provider.get_object_streaming("container", "object")
+    next(stream)
+    stream.close()
+    assert provider.timing.last.bytes == 6
+    assert provider.timing.last.error is None
+
+
+def test_timing_records_error(provider):
+    with pytest.raises(ValueError):
+        provider.delete_object("container", "object")
+    assert isinstance(provider.timing.last.error, ValueError)
+
+
+def test_failing_hook_does_not_break_call(provider):
+    provider.timing.add_hook(MagicMock(side_effect=RuntimeError))
+    assert provider.get_object("container", "object") == b"content"
+
+
+def test_slow_calls_are_logged(caplog):
+    provider = DummyProvider(slow_call_threshold=0)
+    with caplog.at_level(logging.WARNING, logger="storageprovider.timing"):
+        provider.get_object("container", "object")
+    assert "Slow storage call get_object" in caplog.text
+
+
+def test_fast_calls_are_not_logged(caplog):
+    provider = DummyProvider(slow_call_threshold=60)
+    with caplog.at_level(logging.WARNING, logger="storageprovider.timing"):
+        provider.get_object("container", "object")
+    assert caplog.text == ""
+
+
+def test_open_telemetry_hook(provider):
+    tracer = MagicMock()
+    provider.timing.add_hook(OpenTelemetryHook(tracer))
+    provider.get_object("container", "object")
+    tracer.start_span.assert_called_once()
+    args, kwargs = tracer.start_span.call_args
+    assert args[0] == "storageprovider.get_object"
+    assert kwargs["attributes"]["storageprovider.container_key"] == "container"
+    assert kwargs["attributes"]["storageprovider.object_key"] == "object"
+    assert kwargs["attributes"]["storageprovider.bytes"] == 7
+    tracer.start_span.return_value.end.assert_called_once()
+
+
+@patch("storageprovider.providers.augeias.requests")
+def test_augeias_ttfb_uses_response_elapsed(mock_requests):
+    provider = AugeiasProvider("http://localhost:8000", "test-collection")
+    mock_requests.get.return_value.status_code = 200
+    mock_requests.get.return_value.content = b"object content"
+    mock_requests.get.return_value.elapsed = timedelta(0)
+    provider.get_object("container", "object")
+    timing = provider.timing.last
+    assert timing.operation == "get_object"
+    assert timing.bytes == 14
+    assert timing.ttfb <= timing.total
@@ -0,0 +1,121 @@
+from email.utils import format_datetime
+from wsgiref.util import FileWrapper
+from wsgiref.util import setup_testing_defaults
+
+import pytest
+
+from storageprovider.providers.filesystem import FilesystemProvider
+from storageprovider.providers.memory import InMemoryProvider
+from storageprovider.wsgi import serve_object
+
+DATA = b"0123456789"
+
+
+@pytest.fixture
+def provider():
+    provider = InMemoryProvider()
+    provider.create_container("container")
+    provider.update_object("container", "object", DATA)
+    return provider
+
+
+def request(provider, method="GET", **headers):
+    environ = {"REQUEST_METHOD": method}
+    environ.update({f"HTTP_{key.upper()}": value for key, value in headers.items()})
+    setup_testing_defaults(environ)
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started["status"] = status
+        started["headers"] = dict(headers)
+
+    result = serve_object(provider, "container", "object", environ, start_response)
+    body = b"".join(result)
+    return started["status"], started["headers"], body
+
+
+def test_get(provider):
+    status, headers, body = request(provider)
+    assert status == "200 OK"
+    assert body == DATA
+    assert headers["Content-Length"] == "10"
+    assert headers["Accept-Ranges"] == "bytes"
+    etag = provider.get_object_metadata("container", "object")["etag"]
+    assert headers["ETag"] == f'"{etag}"'
+
+
+def test_head_sends_no_body(provider):
+    status, headers, body = request(provider, "HEAD")
+    assert status == "200 OK"
+    assert headers["Content-Length"] == "10"
+    assert body == b""
+
+
+@pytest.mark.parametrize(
+    "header, content_range, expected",
+    [
+        ("bytes=2-4", "bytes 2-4/10", b"234"),
+        ("bytes=7-", "bytes 7-9/10", b"789"),
+        ("bytes=-3", "bytes 7-9/10", b"789"),
+        ("bytes=8-100", "bytes 8-9/10", b"89"),
+    ],
+)
+def test_range(provider, header, content_range, expected):
+    status, headers, body = request(provider, range=header)
+    assert status == "206 Partial Content"
+    assert headers["Content-Range"] == content_range
+    assert headers["Content-Length"] == str(len(expected))
+    assert body == expected
+
+
+def test_unsatisfiable_range(provider):
+    status, headers, body = request(provider, range="bytes=10-")
+    assert status == "416 Range Not Satisfiable"
+    assert headers["Content-Range"] == "bytes */10"
+
+
+def test_multiple_ranges_get_the_whole_object(provider):
+    status, _, body = request(provider, range="bytes=0-1,4-5")
+    assert status == "200 OK"
+    assert body == DATA
+
+
+def test_if_range_with_old_etag_gets_the_whole_object(provider):
+    status, _, body = request(provider, range="bytes=2-4", if_range='"old"')
+    assert status == "200 OK"
+    assert body == DATA
+
+
+def test_if_none_match(provider):
+    _, headers, _ = request(provider)
+    status, _, body = request(provider, if_none_match=headers["ETag"])
+    assert status == "304 Not Modified"
+    assert body == b""
+    status, _, _ = request(provider, if_none_match='"other"')
+    assert status == "200 OK"
+
+
+def test_if_modified_since(provider):
+    modified = provider.get_object_metadata("container", "object")[
+        "time_last_modification"
+    ]
+    status, _, _ = request(
+        provider, if_modified_since=format_datetime(modified, usegmt=True)
+    )
+    assert status == "304 Not Modified"
+    status, _, _ = request(provider, if_modified_since="Mon, 01 Jan 2001 00:00:00 GMT")
+    assert status == "200 OK"
+
+
+def test_file_wrapper_gets_the_file(tmp_path):
+    provider = FilesystemProvider(str(tmp_path))
+    provider.update_object("container", "object", DATA)
+    environ = {"REQUEST_METHOD": "GET", "wsgi.file_wrapper": FileWrapper}
+    setup_testing_defaults(environ)
+    result = serve_object(
+        provider, "container", "object", environ, lambda status, headers: None
+    )
+    assert isinstance(result, FileWrapper)
+    assert result.filelike.name.endswith("object")
+    assert b"".join(result) == DATA
+    result.close()